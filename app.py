@@ -3,7 +3,6 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import streamlit as st
 import os
-import json
 
 # Inicializar Firebase UNA SOLA VEZ
 def inicializar_firebase():
@@ -68,11 +67,21 @@ import urllib.parse
 from datetime import date
 import pandas as pd
 from pathlib import Path
-import unicodedata
 from typing import Optional, Tuple, Dict, List, Any
 from modules.caja_chica import mostrar_caja_chica
+from modules.telemetria import (
+    eventos as telemetria_eventos,
+    exportar_jsonl,
+    exportar_prometheus,
+    limpiar as limpiar_telemetria,
+    registrar as registrar_telemetria,
+    resumen_operaciones,
+)
 import requests
 import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # ==================== CSS GLOBAL PARA OCULTAR BOTONES DE INCREMENTO ====================
 st.markdown("""
@@ -1019,6 +1028,7 @@ from modules.logic import (
     guardar_fotos_avance,
     crear_avance_dict,
     preparar_historial_avances,
+    agrupar_reportes_asistentes,
     validar_insumo,
     validar_obra,
     validar_insumo_duplicado,
@@ -1041,14 +1051,24 @@ from modules.logic import (
     validar_hito_pago,
     validar_donacion,
     calcular_valor_donacion,
-    calcular_resumen_donaciones,
-    impacto_donacion_en_presupuesto
+    impacto_donaciones_desde_total,
+    resumen_donaciones_desde_totales,
+    calcular_eficiencia_desde_rollup,
+    resumen_trabajos_desde_totales,
+    analizar_consumo_materiales,
+    consumo_por_partida,
+    consumo_acumulado_diario,
+    detectar_partes_duplicados,
+    construir_resumen_portafolio,
+    calcular_totales_portafolio
 )
 from modules.database import (
+    verificar_conexion,
     cargar_obras,
+    invalidar_indice_obras,
     agregar_obra,
     guardar_datos_obra,
-    agregar_avance,
+    registrar_avance,
     limpiar_avances_obra,
     cargar_insumos,
     agregar_insumo,
@@ -1065,198 +1085,99 @@ from modules.database import (
     agregar_hito_pago,
     actualizar_hito_pago,
     eliminar_hito_pago,
-    obtener_trabajos_adicionales,
+    listar_trabajos_adicionales,
+    obtener_totales_trabajos_obra,
+    reconstruir_totales_trabajos,
+    ESTADOS_TRABAJO,
     agregar_trabajo_adicional,
     actualizar_trabajo_adicional,
     eliminar_trabajo_adicional,
-    obtener_donaciones_obra,
+    listar_donaciones,
+    obtener_totales_donaciones,
     agregar_donacion,
     actualizar_donacion,
     eliminar_donacion,
     obtener_donantes_obra,
+    buscar_donantes,
     agregar_donante,
     actualizar_donante,
-    eliminar_donante
+    eliminar_donante,
+    cargar_resumenes_obras,
+    reconstruir_resumenes_obras,
+    reconstruir_resumen_obra,
+    obtener_rollup_obra,
+    obtener_version_datos_obra,
+    obtener_version_insumos,
+    obtener_consumo_materiales,
+    reconstruir_consumo_materiales,
+    obtener_datos_flujo_caja,
+    obtener_resumen_obra,
+    obtener_config_kpi,
+    guardar_config_kpi,
+    obtener_obras_asignadas,
+    listar_asignaciones_usuarios,
+    guardar_asignacion_usuario,
+    eliminar_asignacion_usuario,
+    listar_partes_pendientes,
+    contar_pendientes_por_obra,
+    resolver_partes_pendientes,
+    reconstruir_rollup_obra,
+    eliminar_avance,
+    verificar_rollup_obra
+)
+from modules.precios import construir_indice_precios
+from modules.productividad import calcular_productividad_obra
+from modules.flujo_caja import (
+    construir_flujo_diario,
+    delta_escenario,
+    aplicar_escenario,
+    posicion_caja,
+    resumen_flujo,
+    flujo_portafolio,
+    tabla_hitos,
+)
+from modules.curva_s import (
+    norm_txt,
+    freq_label,
+    autofreq_from_cronograma,
+    build_plan_df,
+    build_real_df,
+    avance_programado,
+)
+from modules.empleados import (
+    obtener_plantel,
+    obtener_directorio,
+    construir_plantel,
+    buscar_en_plantel,
+    agregar_empleado,
+    actualizar_empleado,
+    eliminar_empleado,
+)
+from modules.importacion import (
+    importar_cronograma,
+    importar_insumos,
+    importar_precios_proveedor,
+    importar_empleados
+)
+from modules.offline import (
+    ESTADO_CONFLICTO,
+    nuevo_id_parte,
+    descargar_snapshot_catalogos,
+    cargar_snapshot_catalogos,
+    listar_obras_con_snapshot,
+    guardar_borrador,
+    cargar_borrador,
+    cargar_fotos_borrador,
+    eliminar_borrador,
+    guardar_parte_offline,
+    listar_partes_locales,
+    contar_partes_pendientes,
+    sincronizar_partes,
+    resolver_conflicto,
+    limpiar_partes_sincronizados
 )
 
-# ==================== HELPERS ====================
-def _norm_txt(s: str) -> str:
-    s = str(s or "").strip().lower()
-    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
-
-def _freq_label(code: str) -> str:
-    return {"D": "Diario", "W": "Semanal", "M": "Mensual"}.get(code, "Semanal")
-
-def _parse_ts(x):
-    try:
-        return pd.to_datetime(x).normalize()
-    except Exception:
-        return None
-
-def _autofreq_from_cronograma(items: list) -> str:
-    """
-    Elige automáticamente la vista:
-    - <= 45 días: Diario
-    - <= 210 días: Semanal
-    - > 210 días: Mensual
-    """
-    if not items:
-        return "W"
-
-    starts, ends = [], []
-    for it in items:
-        s = _parse_ts(it.get("fecha_inicio"))
-        e = _parse_ts(it.get("fecha_fin"))
-        if s is not None and e is not None:
-            starts.append(s)
-            ends.append(e)
-
-    if not starts or not ends:
-        return "W"
-
-    span_days = int((max(ends) - min(starts)).days) + 1
-    if span_days <= 45:
-        return "D"
-    if span_days <= 210:
-        return "W"
-    return "M"
-
-def _resample_sum(df: pd.DataFrame, freq_code: str) -> pd.DataFrame:
-    """Re-muestrea sumando por periodo (manteniendo fecha como inicio del periodo)."""
-    if df.empty:
-        return df
-    df = df.copy()
-    df.index = pd.to_datetime(df.index).normalize()
-
-    if freq_code == "D":
-        return df
-
-    if freq_code == "W":
-        # Semana iniciando lunes (fecha = lunes)
-        out = df.resample("W-MON", label="left", closed="left").sum()
-        out.index = out.index.normalize()
-        return out
-
-    # Mensual (fecha = 1er día del mes)
-    out = df.resample("MS").sum()
-    out.index = out.index.normalize()
-    return out
-
-def _build_plan_df(crono_items: list, freq_code: str, filtro_partida: str = None) -> pd.DataFrame:
-    """
-    Construye PV por periodo desde cronograma:
-    distribuye monto_planificado uniforme entre días [inicio..fin].
-    Retorna columns: fecha, plan_dia
-    
-    Args:
-        crono_items: Lista de partidas del cronograma
-        freq_code: Código de frecuencia para agrupar
-        filtro_partida: Nombre de partida para filtrar (None = todas)
-    """
-    if not crono_items:
-        return pd.DataFrame(columns=["fecha", "plan_dia"])
-
-    series = pd.Series(dtype="float64")
-
-    for it in crono_items:
-        # Filtrar por partida si se especifica
-        if filtro_partida:
-            nombre_partida = it.get("nombre", "")
-            if _norm_txt(nombre_partida) != _norm_txt(filtro_partida):
-                continue
-        
-        s = _parse_ts(it.get("fecha_inicio"))
-        e = _parse_ts(it.get("fecha_fin"))
-        try:
-            monto = float(it.get("monto_planificado", 0) or 0)
-        except Exception:
-            monto = 0.0
-
-        if s is None or e is None or monto <= 0:
-            continue
-        if e < s:
-            continue
-
-        days = pd.date_range(s, e, freq="D")
-        if len(days) == 0:
-            continue
-
-        daily = monto / len(days)
-        s_part = pd.Series(daily, index=days)
-        series = series.add(s_part, fill_value=0) if not series.empty else s_part
-
-    if series.empty:
-        return pd.DataFrame(columns=["fecha", "plan_dia"])
-
-    df = series.to_frame("plan_dia")
-    df.index.name = "fecha"
-    df = _resample_sum(df, freq_code)
-    return df.reset_index()
-
-def _extract_total_from_avance(av: dict) -> float:
-    """
-    Intenta obtener el costo ejecutado del avance (AC) de forma robusta.
-    Soporta distintos nombres de llave según tu modules.logic.
-    """
-    tot = av.get("totales")
-    if isinstance(tot, dict):
-        for k in ("total_ejecutado", "total_general_ejecutado", "total", "total_general", "total_costos"):
-            v = tot.get(k)
-            if isinstance(v, (int, float)):
-                return float(v)
-        # fallback: suma valores numéricos del dict
-        s = 0.0
-        for v in tot.values():
-            if isinstance(v, (int, float)):
-                s += float(v)
-        return float(s)
-
-    # fallback si el avance trae un campo directo
-    for k in ("total_ejecutado", "total_general_ejecutado", "total", "total_general", "monto", "costo"):
-        v = av.get(k)
-        if isinstance(v, (int, float)):
-            return float(v)
-
-    return 0.0
-
-def _build_real_df(avances: list, freq_code: str, filtro_partida: str = None) -> pd.DataFrame:
-    """
-    Construye AC por periodo desde avances (partes diarios).
-    Retorna columns: fecha, real_dia
-    
-    Args:
-        avances: Lista de partes diarios
-        freq_code: Código de frecuencia para agrupar
-        filtro_partida: Nombre de partida para filtrar (None = todas)
-    """
-    if not avances:
-        return pd.DataFrame(columns=["fecha", "real_dia"])
-
-    rows = []
-    for av in avances:
-        # Filtrar por partida si se especifica
-        if filtro_partida:
-            nombre_en_avance = av.get("nombre_partida", "")
-            if _norm_txt(nombre_en_avance) != _norm_txt(filtro_partida):
-                continue
-        
-        f = av.get("fecha") or av.get("Fecha") or av.get("date")
-        ts = _parse_ts(f)
-        if ts is None:
-            continue
-        total = _extract_total_from_avance(av)
-        if total <= 0:
-            continue
-        rows.append((ts, float(total)))
-
-    if not rows:
-        return pd.DataFrame(columns=["fecha", "real_dia"])
-
-    df = pd.DataFrame(rows, columns=["fecha", "real_dia"]).groupby("fecha", as_index=True).sum()
-    df = _resample_sum(df, freq_code)
-    df = df.reset_index()
-    return df
-
+# ==================== CURVA S ====================
 def render_curva_s(cronograma_all: list, avances: list, rol: str = "jefe"):
     """
     Renderiza Curva S con opción de filtrar por partida individual.
@@ -1302,8 +1223,8 @@ def render_curva_s(cronograma_all: list, avances: list, rol: str = "jefe"):
     st.divider()
     
     # Vista automática (pero con opción avanzada opcional)
-    freq_code = _autofreq_from_cronograma(cron_aprob or cron_pend)
-    st.caption(f"Vista automática: {_freq_label(freq_code)}")
+    freq_code = autofreq_from_cronograma(cron_aprob or cron_pend)
+    st.caption(f"Vista automática: {freq_label(freq_code)}")
 
     # KPIs rápidos (para que sea obvio por qué no grafica)
     k1, k2, k3 = st.columns(3)
@@ -1320,12 +1241,12 @@ def render_curva_s(cronograma_all: list, avances: list, rol: str = "jefe"):
         st.info("Tus partidas están Pendientes. Se mostrará 'Plan (Pendiente - borrador)' hasta que el JEFE apruebe.")
 
     # Construir dataframes con filtro de partida
-    plan_df = _build_plan_df(cron_aprob, freq_code, filtro_partida)
-    real_df = _build_real_df(avances, freq_code, filtro_partida)
+    plan_df = build_plan_df(cron_aprob, freq_code, filtro_partida)
+    real_df = build_real_df(avances, freq_code, filtro_partida)
 
     borr_df = pd.DataFrame(columns=["fecha", "plan_pend_dia"])
     if rol == "pasante" and cron_pend:
-        tmp = _build_plan_df(cron_pend, freq_code, filtro_partida)
+        tmp = build_plan_df(cron_pend, freq_code, filtro_partida)
         if not tmp.empty:
             borr_df = tmp.rename(columns={"plan_dia": "plan_pend_dia"})
 
@@ -1385,34 +1306,29 @@ def render_curva_s(cronograma_all: list, avances: list, rol: str = "jefe"):
         st.dataframe(det.reset_index(), use_container_width=True, hide_index=True)
 
 # ==================== HELPERS KPI ====================
-
-# Crear carpeta si no existe (no toca tu database)
-for folder in ["obras_kpi"]:
-    os.makedirs(_path(folder), exist_ok=True)
-
-def _kpi_file_path(obra_codigo: str) -> str:
-    return _path("obras_kpi", f"{obra_codigo}.json")
-
+# La configuración KPI vive en el documento de la obra (database.obtener_config_kpi)
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
 def kpi_cargar_config(obra_codigo: str) -> dict:
-    archivo = _kpi_file_path(obra_codigo)
-    plantilla = {"avance_programado": 0.0}
+    return obtener_config_kpi(obra_codigo)
 
-    if os.path.exists(archivo):
-        try:
-            with open(archivo, "r", encoding="utf-8") as f:
-                datos = json.load(f)
-            if not isinstance(datos, dict):
-                return plantilla
-            datos.setdefault("avance_programado", 0.0)
-            return datos
-        except Exception:
-            return plantilla
-    return plantilla
+def kpi_guardar_config(obra_codigo: str, cambios: dict, version_esperada: Optional[int] = None) -> Tuple[bool, str]:
+    ok, msg = guardar_config_kpi(
+        obra_codigo, cambios, version_esperada, usuario=st.session_state.get("usuario_logueado", "")
+    )
+    kpi_cargar_config.clear()
+    return ok, msg
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _avance_programado_cronograma(obra_codigo: str, version_datos: int, hoy: str) -> float:
+    """PV a la fecha / PV total del cronograma aprobado; se recalcula al cambiar los datos o el día."""
+    return avance_programado(obtener_cronograma_obra(obra_codigo), date.fromisoformat(hoy))
 
-def kpi_guardar_config(obra_codigo: str, datos: dict):
-    archivo = _kpi_file_path(obra_codigo)
-    with open(archivo, "w", encoding="utf-8") as f:
-        json.dump(datos, f, indent=2, ensure_ascii=False, default=str)
+def kpi_avance_programado(obra_codigo: str) -> Tuple[float, bool]:
+    """(avance programado a hoy en %, True si sale del cronograma; False si es la meta manual)."""
+    pct = _avance_programado_cronograma(obra_codigo, obtener_version_datos_obra(obra_codigo), date.today().isoformat())
+    if pct > 0:
+        return pct, True
+    return float(kpi_cargar_config(obra_codigo).get("avance_programado_manual", 0.0) or 0.0), False
 
 def semaforo_presupuesto(pct):
     if pct is None:
@@ -1456,7 +1372,8 @@ def calcular_avance_real_total(avances: list) -> float:
     return float(total)
 
 # ==================== RESTRICCIÓN DE OBRAS POR PASANTE ====================
-# Ajusta aquí si en tu empresa cambian los usuarios o nombres
+# Las obras de cada pasante se asignan desde el panel del jefe (asignaciones_usuarios).
+# Las palabras clave solo se usan para pasantes que aún no tienen asignación.
 PASANTE_OBRA_KEYWORDS = {
     # pasante-pachacutec => obra Ventanilla / Pachacutec
     "pasante-pachacutec": ["pachacutec", "ventanilla"],
@@ -1477,15 +1394,15 @@ def obtener_obra_asignada_pasante(obras: dict, usuario: str):
         # Fallback: usa el tag del usuario pasante-<tag>
         kws = [usuario.split("pasante-", 1)[1]]
 
-    kws = [_norm_txt(k) for k in kws if str(k).strip()]
+    kws = [norm_txt(k) for k in kws if str(k).strip()]
 
     best_score = 0
     best_cod = None
     best_nom = None
 
     for cod, nom in (obras or {}).items():
-        cod_n = _norm_txt(cod)
-        nom_n = _norm_txt(nom)
+        cod_n = norm_txt(cod)
+        nom_n = norm_txt(nom)
 
         score = 0
         for kw in kws:
@@ -1503,6 +1420,447 @@ def obtener_obra_asignada_pasante(obras: dict, usuario: str):
         return None, None
     return best_cod, best_nom
 
+def obras_asignadas_usuario(usuario: str, cargar_obras_respaldo) -> Dict[str, str]:
+    """
+    {codigo: nombre} de las obras del usuario, leídas una vez por sesión desde asignaciones_usuarios.
+    Sin asignación registrada, busca por palabras clave entre las obras de `cargar_obras_respaldo()`.
+    """
+    clave = f"obras_asignadas_{usuario}"
+    if clave not in st.session_state:
+        asignadas = obtener_obras_asignadas(usuario)
+        if not asignadas:
+            cod, nom = obtener_obra_asignada_pasante(cargar_obras_respaldo(), usuario)
+            asignadas = {cod: nom} if cod else {}
+        if not asignadas:
+            # Sin guardar en sesión: la asignación que haga el jefe se toma al recargar
+            return {}
+        st.session_state[clave] = asignadas
+    return st.session_state[clave]
+
+# ==================== NAVEGACIÓN POR SECCIONES ====================
+SECCIONES_OBRA_JEFE = ["Parte Diario", "Historial de Avances", "Cronograma Valorizado", "Caja Chica", "Donaciones", "Productividad", "Materiales", "Flujo de Caja"]
+SECCIONES_OBRA_PASANTE = ["Parte Diario", "Historial de Avances", "Cronograma Valorizado"]
+
+# Widgets del parte diario cuyo valor debe conservarse mientras se navega por otra sección
+PREFIJOS_ESTADO_PARTE = (
+    "responsable_input_", "avance_input_", "partida_selectbox_", "name_partida_otra_",
+    "cantidad_ejecutada_", "unidad_input_", "descripcion_avance_", "horas_input_",
+    "rendimiento_input_", "precio_venta_", "obs_final_", "empleado_mo_", "sueldo_mo_",
+    "cant_mat_", "cant_eq_", "cant_otros_", "desc_mat_", "desc_eq_", "desc_otros_",
+    "precio_mat_", "precio_eq_", "precio_otros_",
+)
+
+PREFETCH_TTL_S = 30
+
+
+def _selector_seccion(secciones: List[str], key: str) -> str:
+    """Navegador de secciones de la obra. A diferencia de st.tabs, solo se ejecuta la sección activa."""
+    return st.radio("Sección", secciones, horizontal=True, label_visibility="collapsed", key=key)
+
+
+def _preservar_estado_widgets(prefijos: Tuple[str, ...]):
+    """Streamlit descarta el estado de los widgets que no se dibujan; reasignarlo lo mantiene vivo."""
+    for k in list(st.session_state.keys()):
+        if isinstance(k, str) and k.startswith(prefijos):
+            st.session_state[k] = st.session_state[k]
+
+
+@st.cache_resource
+def _pool_prefetch() -> Dict[str, Any]:
+    return {"executor": ThreadPoolExecutor(max_workers=2), "tareas": {}, "lock": threading.Lock()}
+
+
+def _cargadores_seccion(seccion: str) -> Dict[str, Any]:
+    """Lecturas con las que arranca cada sección (las que vale la pena adelantar)."""
+    return {
+        "Historial de Avances": {"historial": preparar_historial_avances},
+        "Cronograma Valorizado": {"cronograma": obtener_cronograma_obra, "hitos": obtener_hitos_pago_obra},
+        "Donaciones": {"donaciones": listar_donaciones},
+    }.get(seccion, {})
+
+
+def _firma_prefetch(
+    rollup: Optional[Dict[str, Any]], resumen_don: Optional[Dict[str, Any]] = None
+) -> Tuple[float, float, int, float]:
+    """
+    Cambia cuando se registra o elimina un parte o una donación (cantidad y total
+    de obras_resumen), así no se sirve un historial ni una página de donaciones
+    adelantados viejos.
+    """
+    rollup = rollup or {}
+    resumen_don = resumen_don or {}
+    return (
+        float(rollup.get("partes", 0) or 0),
+        float(rollup.get("gastado_total", 0) or 0),
+        int(resumen_don.get("cantidad_donaciones", 0) or 0),
+        float(resumen_don.get("total_general", 0) or 0),
+    )
+
+
+def _prefetch_siguiente_seccion(secciones: List[str], actual: str, obra_codigo: str, firma: Tuple[float, float, int, float]):
+    """Lanza en segundo plano las lecturas de la sección que sigue a la activa."""
+    idx = secciones.index(actual) if actual in secciones else -1
+    if idx < 0 or idx + 1 >= len(secciones):
+        return
+    pool = _pool_prefetch()
+    ahora = time.time()
+    with pool["lock"]:
+        for clave_t in [k for k, (t, _) in pool["tareas"].items() if ahora - t > PREFETCH_TTL_S]:
+            pool["tareas"].pop(clave_t, None)
+        for clave, cargador in _cargadores_seccion(secciones[idx + 1]).items():
+            llave = (obra_codigo, clave, firma)
+            if llave not in pool["tareas"]:
+                pool["tareas"][llave] = (ahora, pool["executor"].submit(cargador, obra_codigo))
+
+
+def _obtener_prefetch(obra_codigo: str, clave: str, firma: Tuple[float, float, int, float], cargador):
+    """Usa el resultado adelantado si está vigente; si no, lee normalmente."""
+    pool = _pool_prefetch()
+    with pool["lock"]:
+        tarea = pool["tareas"].pop((obra_codigo, clave, firma), None)
+    if tarea and time.time() - tarea[0] <= PREFETCH_TTL_S:
+        try:
+            return tarea[1].result(timeout=15)
+        except Exception:
+            pass
+    return cargador(obra_codigo)
+
+
+def _registrar_tiempo_seccion(seccion: str, inicio: float):
+    """Registra en la telemetría el tiempo de render de la sección activa."""
+    registrar_telemetria(f"seccion.{seccion}", (time.perf_counter() - inicio) * 1000, "ui")
+
+def _render_telemetria():
+    """Panel de telemetría (solo jefe, con ?telemetria=1 en la URL): p50/p95 por operación y exportación."""
+    filas = resumen_operaciones(incluir_anidadas=st.checkbox("Incluir llamadas anidadas", value=False, key="tel_anidadas"))
+    if not filas:
+        st.info("Todavía no hay mediciones en este proceso.")
+        return
+
+    df = pd.DataFrame(filas)
+    categorias = sorted(df["categoria"].unique())
+    elegidas = st.multiselect("Categorías", categorias, default=categorias, key="tel_categorias")
+    df = df[df["categoria"].isin(elegidas)]
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Operaciones medidas", f"{int(df['llamadas'].sum()):,}")
+    c2.metric("Errores", f"{int(df['errores'].sum()):,}")
+    c3.metric("Tiempo total", f"{df['total_ms'].sum() / 1000:,.1f} s")
+
+    st.dataframe(
+        df.rename(columns={
+            "categoria": "Categoría", "op": "Operación", "llamadas": "Llamadas", "errores": "Errores",
+            "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "max_ms": "Máx (ms)", "total_ms": "Total (ms)",
+            "docs": "Docs", "bytes": "Bytes",
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    errores = [e for e in telemetria_eventos() if not e["ok"]][-20:]
+    if errores:
+        with st.expander(f"Últimos errores ({len(errores)})"):
+            st.dataframe(pd.DataFrame(errores)[["op", "categoria", "ms", "error"]], use_container_width=True, hide_index=True)
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.download_button("⬇️ JSON lines", data=exportar_jsonl(), file_name="telemetria.jsonl",
+                           mime="application/x-ndjson", use_container_width=True)
+    with c2:
+        st.download_button("⬇️ Prometheus", data=exportar_prometheus(), file_name="telemetria.prom",
+                           mime="text/plain", use_container_width=True)
+    with c3:
+        if st.button("🗑️ Vaciar buffer", use_container_width=True, key="tel_limpiar"):
+            limpiar_telemetria()
+            st.rerun()
+
+# ==================== REPORTES DE ASISTENTES ====================
+REPORTES_POR_PAGINA = 10
+
+
+@st.cache_data(ttl=600, max_entries=32, show_spinner=False)
+def _reportes_asistentes_obra(obra_codigo: str, version_datos: int) -> Dict[str, Any]:
+    """Agregación por asistente; `version_datos` es parte de la clave, así se recalcula solo cuando cambian los partes."""
+    return agrupar_reportes_asistentes(obtener_avances_obra(obra_codigo))
+
+# ==================== PRODUCTIVIDAD ====================
+@st.cache_data(ttl=600, max_entries=16, show_spinner=False)
+def _productividad_obra(obra_codigo: str, version_datos: int) -> Dict[str, Any]:
+    """Agregados de productividad cacheados por versión de datos de la obra."""
+    return calcular_productividad_obra(obtener_avances_obra(obra_codigo))
+
+
+def _render_productividad(obra_codigo: str):
+    st.markdown("### 📐 Productividad de Mano de Obra")
+    st.caption("Calculada sobre todos los partes de la obra; se recalcula solo cuando cambian los partes.")
+
+    prod = _productividad_obra(obra_codigo, obtener_version_datos_obra(obra_codigo))
+    res = prod["resumen"]
+    if not res["partes"]:
+        st.info("Aún no hay partes diarios para analizar.")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Eficiencia ponderada", f"{res['eficiencia_ponderada']:.1f}%")
+    c2.metric("HH totales", f"{res['hh_total']:,.0f}")
+    c3.metric("Costo MO", f"S/. {res['costo_mo_total']:,.2f}")
+    c4.metric("Trabajadores", res["trabajadores"])
+
+    vista = st.radio(
+        "Vista", ["Por partida", "Por trabajador", "Tendencia semanal", "Atípicos"],
+        horizontal=True, label_visibility="collapsed", key=f"vista_productividad_{obra_codigo}"
+    )
+    if vista == "Por partida":
+        st.dataframe(prod["por_partida"], use_container_width=True, hide_index=True)
+    elif vista == "Por trabajador":
+        st.dataframe(prod["por_trabajador"], use_container_width=True, hide_index=True)
+    elif vista == "Tendencia semanal":
+        semanal = prod["por_semana"]
+        if semanal.empty:
+            st.info("No hay partes con fecha válida.")
+        else:
+            st.line_chart(semanal.pivot(index="semana", columns="partida", values="hh_por_unidad"))
+            st.dataframe(semanal, use_container_width=True, hide_index=True)
+    else:
+        atipicos = prod["atipicos"]
+        if atipicos.empty:
+            st.success("✅ No se detectaron partes atípicos.")
+        else:
+            st.caption("HH por unidad muy por encima o por debajo de la mediana de su partida.")
+            st.dataframe(atipicos, use_container_width=True, hide_index=True)
+
+# ==================== CONSUMO DE MATERIALES ====================
+@st.cache_data(ttl=600, max_entries=16, show_spinner=False)
+def _consumo_materiales_obra(obra_codigo: str, version_datos: int) -> List[Dict[str, Any]]:
+    """Libro de consumo de la obra; el libro cambia junto con los partes, así que basta la versión de datos."""
+    return obtener_consumo_materiales(obra_codigo)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _indice_precios(version_insumos: int) -> Dict[str, Any]:
+    """Índice de precios por fecha del catálogo; se arma una vez por versión del catálogo de insumos."""
+    return construir_indice_precios(cargar_insumos())
+
+
+def _render_materiales(obra_codigo: str):
+    st.markdown("### 🧱 Consumo de Materiales")
+    st.caption("Acumulado desde las líneas de materiales de los partes diarios, comparado con el precio del catálogo vigente en las fechas de consumo.")
+
+    consumos = _consumo_materiales_obra(obra_codigo, obtener_version_datos_obra(obra_codigo))
+    if not consumos:
+        st.info("No hay consumo de materiales registrado para esta obra.")
+        if st.button("🔄 Reconstruir desde los partes", key=f"reconstruir_consumo_{obra_codigo}"):
+            with st.spinner("Reconstruyendo..."):
+                _, errores = reconstruir_consumo_materiales(obra_codigo)
+            if errores:
+                st.error(errores[0])
+            else:
+                _consumo_materiales_obra.clear()
+                st.rerun()
+        return
+
+    tabla = analizar_consumo_materiales(consumos, cargar_insumos(), _indice_precios(obtener_version_insumos()))
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Insumos consumidos", len(tabla))
+    c2.metric("Costo de materiales", f"S/. {tabla['costo'].sum():,.2f}")
+    c3.metric("Con sobreprecio > 5%", int((tabla["variacion_pct"] > 5).sum()))
+
+    st.markdown("**Top 10 por costo**")
+    st.bar_chart(tabla.head(10).set_index("insumo")["costo"])
+    st.dataframe(tabla, use_container_width=True, hide_index=True)
+
+    por_clave = {c.get("insumo", c["id"]): c for c in consumos}
+    elegido = st.selectbox("Detalle de insumo", sorted(por_clave), key=f"detalle_consumo_{obra_codigo}")
+    if elegido:
+        consumo = por_clave[elegido]
+        col_a, col_b = st.columns(2)
+        with col_a:
+            st.caption("Por partida")
+            st.dataframe(consumo_por_partida(consumo), use_container_width=True, hide_index=True)
+        with col_b:
+            st.caption("Acumulado por día")
+            diario = consumo_acumulado_diario(consumo)
+            if diario.empty:
+                st.info("Sin fechas válidas.")
+            else:
+                st.line_chart(diario.set_index("fecha")["cantidad_acumulada"])
+
+# ==================== DONACIONES ====================
+def _resumen_donaciones(obra_codigo: str) -> Dict[str, Any]:
+    """Totales de donaciones desde obras_resumen; una obra sin el desglose por donante se reconstruye una vez."""
+    totales = obtener_totales_donaciones(obra_codigo)
+    if totales is None:
+        reconstruir_resumen_obra(obra_codigo)
+        totales = obtener_totales_donaciones(obra_codigo) or {}
+    return resumen_donaciones_desde_totales(totales)
+
+# ==================== FLUJO DE CAJA ====================
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def _flujo_caja_obra(obra_codigo: str, version: str) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Flujo diario base (saldo inicial 0) y los hitos de la obra.
+    `version` cambia con cualquier escritura que toca el resumen (hitos, cronograma,
+    caja chica, donaciones), así la serie solo se recalcula cuando cambian sus datos.
+    """
+    datos = obtener_datos_flujo_caja(obra_codigo)
+    diario = construir_flujo_diario(datos["cronograma"], datos["hitos"], datos["movimientos"], datos["donaciones"])
+    return diario, datos["hitos"]
+
+
+def _version_flujo_caja(obra_codigo: str) -> str:
+    resumen = obtener_resumen_obra(obra_codigo)
+    return f"{obtener_version_datos_obra(obra_codigo)}|{resumen.get('actualizado_en', '')}"
+
+
+def _con_saldo_inicial(diario: pd.DataFrame, saldo_inicial: float) -> pd.DataFrame:
+    return diario.assign(saldo=diario["saldo"] + saldo_inicial) if saldo_inicial else diario
+
+
+def _render_flujo_caja(obra_codigo: str):
+    st.markdown("### 💵 Flujo de Caja Proyectado")
+    st.caption(
+        "Hitos de pago y donaciones en efectivo como ingresos; gasto planificado del cronograma "
+        "y egresos aprobados de caja chica como salidas."
+    )
+
+    base, hitos = _flujo_caja_obra(obra_codigo, _version_flujo_caja(obra_codigo))
+    if base.empty:
+        st.info("No hay cronograma, hitos ni movimientos con fecha para proyectar.")
+        return
+
+    c1, c2 = st.columns(2)
+    with c1:
+        saldo_ini = st.number_input("Saldo inicial (S/.)", value=0.0, step=1000.0, key=f"flujo_saldo_{obra_codigo}")
+    with c2:
+        frecuencia = st.radio(
+            "Frecuencia", ["D", "W"], format_func=freq_label, index=1, horizontal=True, key=f"flujo_freq_{obra_codigo}"
+        )
+    base = _con_saldo_inicial(base, saldo_ini)
+
+    # Escenario: retraso (o adelanto) en días por hito; solo se mueven esos montos sobre la serie base
+    escenario = base
+    tabla = tabla_hitos(hitos)
+    if not tabla.empty:
+        with st.expander("🧪 Escenario: cambiar la fecha de cobro de hitos"):
+            editor = st.data_editor(
+                tabla.assign(fecha=tabla["fecha"].dt.date, retraso=0)[["id", "descripcion", "fecha", "monto", "estado", "retraso"]],
+                column_config={
+                    "id": None,
+                    "retraso": st.column_config.NumberColumn("Retraso (días)", step=1),
+                },
+                disabled=["descripcion", "fecha", "monto", "estado"],
+                hide_index=True,
+                use_container_width=True,
+                key=f"flujo_escenario_{obra_codigo}",
+            )
+            retrasos = {r["id"]: int(r["retraso"] or 0) for r in editor.to_dict("records") if r.get("retraso")}
+            escenario = aplicar_escenario(base, delta_escenario(hitos, retrasos))
+
+    res_base, res_esc = resumen_flujo(base), resumen_flujo(escenario)
+    m1, m2, m3 = st.columns(3)
+    m1.metric(
+        "Saldo final", f"S/. {res_esc['saldo_final']:,.2f}",
+        delta=f"{res_esc['saldo_final'] - res_base['saldo_final']:,.2f}" if escenario is not base else None,
+    )
+    m2.metric(
+        "Saldo mínimo", f"S/. {res_esc['saldo_minimo']:,.2f}",
+        delta=f"{res_esc['saldo_minimo'] - res_base['saldo_minimo']:,.2f}" if escenario is not base else None,
+        help=f"Fecha: {res_esc['fecha_saldo_minimo']}",
+    )
+    m3.metric("Primer día en déficit", str(res_esc["primer_deficit"] or "—"))
+    if res_esc["primer_deficit"]:
+        st.warning(f"⚠️ La caja proyectada queda en negativo desde el {res_esc['primer_deficit']}.")
+
+    vista = posicion_caja(escenario, frecuencia)
+    grafico = pd.DataFrame({"Escenario": vista["saldo"]})
+    if escenario is not base:
+        grafico["Base"] = posicion_caja(base, frecuencia)["saldo"]
+    st.line_chart(grafico)
+    st.dataframe(
+        vista.rename_axis("Fecha").reset_index().style.format({c: "{:,.2f}" for c in vista.columns}),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+def _render_flujo_portafolio(resumenes: List[Dict[str, Any]]):
+    """Suma de los flujos por obra; cada obra se cachea por la fecha de actualización de su resumen."""
+    diarios = {
+        r["codigo"]: _flujo_caja_obra(r["codigo"], str(r.get("actualizado_en", "")))[0]
+        for r in resumenes
+    }
+    total = flujo_portafolio(diarios)
+    if total.empty:
+        st.info("Ninguna obra tiene datos para proyectar.")
+        return
+    res = resumen_flujo(total)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Saldo final", f"S/. {res['saldo_final']:,.2f}")
+    c2.metric("Saldo mínimo", f"S/. {res['saldo_minimo']:,.2f}", help=f"Fecha: {res['fecha_saldo_minimo']}")
+    c3.metric("Primer día en déficit", str(res["primer_deficit"] or "—"))
+    semanal = posicion_caja(total, "W")
+    st.line_chart(pd.DataFrame({
+        codigo: posicion_caja(d, "W")["saldo"] for codigo, d in diarios.items() if not d.empty
+    }).ffill().fillna(0.0).assign(Portafolio=semanal["saldo"]))
+
+# ==================== IMPORTACIÓN MASIVA ====================
+def _render_importacion(tipo: str, obra_codigo: Optional[str] = None, key: str = "imp", opciones: Optional[Dict[str, Any]] = None):
+    """
+    Carga de CSV/Excel (S10 / MS Project) para cronograma, insumos, empleados o lista de precios.
+    Muestra el resumen y el reporte de errores por fila de la última importación.
+    """
+    ayuda = {
+        "cronograma": "Columnas: Partida/Nombre de tarea, Inicio/Comienzo, Fin, Monto/Costo, Descripción (opcional)",
+        "insumos": "Columnas: Insumo/Descripción, Unidad/Und., Precio Unitario/Precio, Tipo (mano de obra, materiales, equipos, otros)",
+        "empleados": "Columnas: Nombre, Cargo, DNI, Teléfono (opcional)",
+        "precios": "Columnas: Insumo/Descripción, Precio Unitario/Precio",
+    }
+    st.caption(ayuda.get(tipo, ""))
+    archivo = st.file_uploader(
+        "Archivo CSV o Excel",
+        type=["csv", "xlsx", "xls"],
+        key=f"uploader_{key}_{tipo}"
+    )
+
+    if archivo is not None and st.button("📥 Importar", use_container_width=True, type="primary", key=f"btn_{key}_{tipo}"):
+        try:
+            with st.spinner("Validando e importando..."):
+                if tipo == "cronograma":
+                    resultado = importar_cronograma(
+                        obra_codigo, archivo,
+                        creado_por=st.session_state.get("usuario_logueado", "jefe")
+                    )
+                elif tipo == "insumos":
+                    resultado = importar_insumos(archivo)
+                elif tipo == "precios":
+                    resultado = importar_precios_proveedor(archivo, **(opciones or {}))
+                else:
+                    resultado = importar_empleados(obra_codigo, archivo)
+            st.session_state[f"resultado_{key}_{tipo}"] = resultado
+        except Exception as e:
+            st.error(f"❌ No se pudo importar el archivo: {str(e)}")
+
+    resultado = st.session_state.get(f"resultado_{key}_{tipo}")
+    if resultado:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Filas leídas", resultado["total"])
+        c2.metric("Importadas", resultado["importados"])
+        c3.metric("Con errores", len(resultado["errores"]))
+        if resultado["importados"]:
+            st.success(f"✅ {resultado['mensaje']}")
+        else:
+            st.warning(resultado["mensaje"])
+        if resultado["errores"]:
+            df_err = pd.DataFrame(resultado["errores"]).rename(columns={"fila": "Fila", "error": "Error"})
+            st.dataframe(df_err, use_container_width=True, hide_index=True)
+            st.download_button(
+                "⬇️ Descargar reporte de errores",
+                df_err.to_csv(index=False).encode("utf-8-sig"),
+                file_name=f"errores_importacion_{tipo}.csv",
+                mime="text/csv",
+                key=f"dl_{key}_{tipo}"
+            )
+
 # ==================== PDF / DRIVE HELPERS ====================
 def _get_drive_conf() -> Tuple[Optional[str], Optional[str]]:
     """Obtiene (webapp_url, token) desde st.secrets o variables de entorno."""
@@ -1524,10 +1882,10 @@ def _safe_pdf_filename(s: str) -> str:
     s = "".join(c for c in s if c.isalnum() or c in ["-", "_", "."])
     return s or "reporte.pdf"
 
-def _avance_to_pdf_bytes(obra_codigo: str, obra_nombre: str, avance: dict, rol: str) -> Optional[bytes]:
-    """Convierte un avance (parte diario) a PDF (bytes)."""
+def _avance_to_pdf_archivo(obra_codigo: str, obra_nombre: str, avance: dict, rol: str) -> Optional[str]:
+    """Convierte un avance (parte diario) a PDF en un archivo temporal y retorna su ruta."""
     try:
-        from modules.pdf_report import build_parte_pdf
+        from modules.pdf_report import build_parte_pdf_archivo
     except Exception as e:
         st.error(f"No se pudo importar el generador PDF (pdf_report). Revisa requirements.txt. Detalle: {e}")
         return None
@@ -1615,7 +1973,7 @@ def _avance_to_pdf_bytes(obra_codigo: str, obra_nombre: str, avance: dict, rol:
             continue
 
     try:
-        return build_parte_pdf(
+        return build_parte_pdf_archivo(
             obra_code=obra_codigo,
             obra_name=obra_nombre,
             fecha=fecha,
@@ -1629,6 +1987,35 @@ def _avance_to_pdf_bytes(obra_codigo: str, obra_nombre: str, avance: dict, rol:
         st.error(f"Error al generar PDF: {e}")
         return None
 
+@st.cache_resource
+def _sembrar_registro_obras() -> int:
+    """Una vez por proceso: completa registro_obras con las obras de data/obras/registro.json."""
+    from modules.registro_obras import sembrar_registro
+    try:
+        return sembrar_registro()
+    except Exception:
+        return 0
+
+@st.cache_resource
+def _barrer_derivados() -> Dict[str, int]:
+    """Una vez por proceso: limpia data/tmp_imgs (temporales huérfanos, nombres viejos y exceso sobre el tope)."""
+    from modules.derivados import barrer
+    return barrer()
+
+def _pdf_sesion() -> Optional[str]:
+    """Ruta del PDF del parte en la sesión, si el archivo sigue existiendo (limpiar_pdfs lo borra al vencer)."""
+    ruta = st.session_state.get("pdf_path")
+    return ruta if ruta and os.path.exists(ruta) else None
+
+def _descartar_pdf_sesion():
+    ruta = st.session_state.get("pdf_path")
+    if ruta:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+    st.session_state.pdf_path = None
+
 def _render_pdf_panel():
     """Panel post-guardado para descargar/subir PDF."""
     if not st.session_state.get("show_pdf_panel"):
@@ -1648,11 +2035,12 @@ def _render_pdf_panel():
     st.markdown("---")
     st.subheader("📄 Parte diario en PDF")
 
-    if st.session_state.get("pdf_bytes") is None:
-        st.session_state.pdf_bytes = _avance_to_pdf_bytes(obra_codigo, obra_nombre, avance, rol=rol)
+    # La sesión guarda solo la ruta del PDF; si venció se vuelve a generar
+    if _pdf_sesion() is None:
+        st.session_state.pdf_path = _avance_to_pdf_archivo(obra_codigo, obra_nombre, avance, rol=rol)
 
-    pdf_bytes = st.session_state.get("pdf_bytes")
-    if not pdf_bytes:
+    pdf_path = _pdf_sesion()
+    if not pdf_path:
         st.info("No se pudo generar el PDF con los datos actuales.")
         return
 
@@ -1668,7 +2056,7 @@ def _render_pdf_panel():
     with c1:
         st.download_button(
             "⬇️ Descargar PDF",
-            data=pdf_bytes,
+            data=Path(pdf_path).read_bytes(),
             file_name=filename,
             mime="application/pdf",
             use_container_width=True,
@@ -1682,7 +2070,7 @@ def _render_pdf_panel():
             try:
                 from modules.drive_upload import upload_pdf_base64
                 with st.spinner("Subiendo a Google Drive..."):
-                    resp = upload_pdf_base64(webapp_url, token, obra_codigo, filename, pdf_bytes)
+                    resp = upload_pdf_base64(webapp_url, token, obra_codigo, filename, Path(pdf_path).read_bytes())
                     
                     if isinstance(resp, dict):
                         if resp.get("ok"):
@@ -1706,7 +2094,7 @@ def _render_pdf_panel():
             st.session_state.show_pdf_panel = False
             st.session_state.pdf_meta = {}
             st.session_state.pdf_avance = {}
-            st.session_state.pdf_bytes = None
+            _descartar_pdf_sesion()
             st.session_state.parte_enviado = False
 
     st.markdown("---")
@@ -1885,8 +2273,10 @@ if "pdf_meta" not in st.session_state:
     st.session_state.pdf_meta = {}
 if "pdf_avance" not in st.session_state:
     st.session_state.pdf_avance = {}
-if "pdf_bytes" not in st.session_state:
-    st.session_state.pdf_bytes = None
+if "pdf_path" not in st.session_state:
+    st.session_state.pdf_path = None
+_barrer_derivados()
+_sembrar_registro_obras()
 if "parte_enviado" not in st.session_state:
     st.session_state.parte_enviado = False
 if "insumos_eq_confirmados" not in st.session_state:
@@ -1981,6 +2371,7 @@ if st.session_state["auth"] == "jefe":
             st.session_state.obra_seleccionada = nuevo_codigo
             st.session_state.mostrar_form_obra = False
             st.session_state.mostrar_insumos = False
+            st.session_state.mostrar_importar_insumos = False
             # Limpiar estados de gestión de empleados al cambiar de obra
             st.session_state.mostrar_empleados_obra = False
             st.session_state.mostrar_editor_empleado = False
@@ -1995,31 +2386,60 @@ if st.session_state["auth"] == "jefe":
         if st.button("📊 Ver Reportes de Asistentes", use_container_width=True, key="btn_reportes_sidebar"):
             st.session_state.mostrar_reportes = True
             st.rerun()
+        if st.button("🗂️ Portafolio de Obras", use_container_width=True, key="btn_portafolio_sidebar"):
+            st.session_state.mostrar_portafolio = True
+            st.rerun()
+        if st.button("👥 Asignar Obras a Usuarios", use_container_width=True, key="btn_asignaciones_sidebar"):
+            st.session_state.mostrar_asignaciones = True
+            st.rerun()
+        # Oculto: solo aparece abriendo la app con ?telemetria=1
+        if st.query_params.get("telemetria") == "1":
+            if st.button("⏱️ Telemetría", use_container_width=True, key="btn_telemetria_sidebar"):
+                st.session_state.mostrar_telemetria = True
+                st.rerun()
         # ==================== KPI: Avance Programado ====================
         if st.session_state.obra_seleccionada:
-            cfg_kpi = kpi_cargar_config(st.session_state.obra_seleccionada)
+            obra_kpi = st.session_state.obra_seleccionada
+            programado, del_cronograma = kpi_avance_programado(obra_kpi)
 
             st.divider()
-            st.markdown("### 📅 Cronograma (Input Manual)")
-            nuevo_programado = st.number_input(
-                "¿Cuánto % debería llevar la obra HOY?",
-                min_value=0.0,
-                max_value=100.0,
-                value=float(cfg_kpi.get("avance_programado", 0.0)),
-                step=1.0,
-                help="Ingresa el porcentaje programado acumulado según el cronograma oficial."
-            )
+            st.markdown("### 📅 Avance Programado")
+            if del_cronograma:
+                st.metric(
+                    "¿Cuánto % debería llevar la obra HOY?",
+                    f"{programado:.1f}%",
+                    help="Calculado del cronograma aprobado: PV acumulado a hoy / PV total (Curva S)."
+                )
+            else:
+                cfg_kpi = kpi_cargar_config(obra_kpi)
+                st.caption("La obra no tiene cronograma aprobado; define la meta manualmente.")
+                nuevo_programado = st.number_input(
+                    "¿Cuánto % debería llevar la obra HOY?",
+                    min_value=0.0,
+                    max_value=100.0,
+                    value=programado,
+                    step=1.0,
+                    help="Porcentaje programado acumulado según el cronograma oficial."
+                )
 
-            if nuevo_programado != float(cfg_kpi.get("avance_programado", 0.0)):
-                cfg_kpi["avance_programado"] = nuevo_programado
-                kpi_guardar_config(st.session_state.obra_seleccionada, cfg_kpi)
-                st.success("¡Meta actualizada!")
-                st.rerun()
+                if nuevo_programado != programado:
+                    ok_kpi, msg_kpi = kpi_guardar_config(
+                        obra_kpi, {"avance_programado_manual": nuevo_programado}, cfg_kpi.get("version", 0)
+                    )
+                    if ok_kpi:
+                        st.success("¡Meta actualizada!")
+                        st.rerun()
+                    else:
+                        st.warning(msg_kpi)
 
         if st.button("➕ Agregar Nueva Obra", key="agregar_obra_btn", use_container_width=True):
             st.session_state.mostrar_form_obra = True
             st.rerun()
 
+        if st.button("📥 Importar Insumos", key="importar_insumos_btn", use_container_width=True):
+            st.session_state.mostrar_importar_insumos = True
+            st.rerun()
+
         st.divider()
 
     # ==================== SECCIÓN: REPORTES DE ASISTENTES (PANTALLA COMPLETA) ====================
@@ -2039,85 +2459,79 @@ if st.session_state["auth"] == "jefe":
         obras = cargar_obras()
         
         if obras:
-            nombres_obras = list(obras.values())
             codigos_obras = list(obras.keys())
             
+            # Contador de pendientes de todas las obras: una consulta a obras_resumen
+            pendientes_por_obra = contar_pendientes_por_obra()
+            
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                obra_seleccionada_nombre = st.selectbox(
+                # Se elige por código: dos obras pueden tener el mismo nombre
+                obra_seleccionada_codigo = st.selectbox(
                     "🏗️ Seleccionar obra para revisar reportes:",
-                    ["-- Seleccionar --"] + nombres_obras,
+                    [None] + codigos_obras,
+                    format_func=lambda c: "-- Seleccionar --" if c is None else (
+                        f"{obras[c]} (⚠️ {pendientes_por_obra[c]})" if pendientes_por_obra.get(c) else obras[c]
+                    ),
                     key="select_obra_reportes"
                 )
             
-            if obra_seleccionada_nombre != "-- Seleccionar --":
-                # Obtener el código de la obra seleccionada
-                obra_idx = nombres_obras.index(obra_seleccionada_nombre)
-                obra_codigo = codigos_obras[obra_idx]
+            if obra_seleccionada_codigo is not None:
+                obra_codigo = obra_seleccionada_codigo
                 
-                # Obtener TODOS los avances (partes diarios) de esta obra desde Firebase
-                avances_obra = obtener_avances_obra(obra_codigo)
+                # Agregación cacheada por versión de datos de la obra: una lectura de un campo
+                # y solo se vuelven a descargar los partes cuando cambian
+                agregado_reportes = _reportes_asistentes_obra(obra_codigo, obtener_version_datos_obra(obra_codigo))
+                reportes_por_asistente = agregado_reportes["reportes"]
+                estadisticas_asistentes = agregado_reportes["estadisticas"]
+                resumen_general = agregado_reportes["general"]
+                
+                # Cola de revisión de la obra (solo los partes pendientes, indexados por obra y fecha)
+                cola_revision = listar_partes_pendientes(obra_codigo)
+                pendientes_asistente: Dict[str, int] = {}
+                for entrada in cola_revision:
+                    pendientes_asistente[entrada.get("responsable", "")] = pendientes_asistente.get(entrada.get("responsable", ""), 0) + 1
+                usuario_revisor = st.session_state.get("usuario_logueado") or "jefe"
+                
+                if cola_revision:
+                    with st.expander(f"⏳ Cola de revisión ({len(cola_revision)} pendientes)", expanded=True):
+                        etiquetas_cola = {
+                            e["avance_id"]: f"{e.get('fecha', '')} · {e.get('responsable', '')} · "
+                                            f"{e.get('nombre_partida') or 'Sin partida'} · S/. {float(e.get('total', 0) or 0):,.2f}"
+                            for e in cola_revision
+                        }
+                        seleccion_cola = st.multiselect(
+                            "Partes a revisar:",
+                            list(etiquetas_cola.keys()),
+                            format_func=lambda i: etiquetas_cola.get(i, i),
+                            key=f"seleccion_cola_{obra_codigo}"
+                        )
+                        col_a, col_b, col_c = st.columns(3)
+                        with col_a:
+                            todos_cola = st.checkbox("Aplicar a todos", key=f"todos_cola_{obra_codigo}")
+                        ids_cola = list(etiquetas_cola.keys()) if todos_cola else seleccion_cola
+                        with col_b:
+                            if st.button("✅ Aprobar seleccionados", use_container_width=True, type="primary",
+                                         disabled=not ids_cola, key="aprobar_cola"):
+                                ok_cola, msg_cola = resolver_partes_pendientes(obra_codigo, ids_cola, True, usuario_revisor)
+                                (st.success if ok_cola else st.error)(msg_cola)
+                                if ok_cola:
+                                    st.rerun()
+                        with col_c:
+                            if st.button("❌ Rechazar seleccionados", use_container_width=True,
+                                         disabled=not ids_cola, key="rechazar_cola"):
+                                ok_cola, msg_cola = resolver_partes_pendientes(obra_codigo, ids_cola, False, usuario_revisor)
+                                (st.success if ok_cola else st.error)(msg_cola)
+                                if ok_cola:
+                                    st.rerun()
                 
-                if not avances_obra:
-                    st.info(f"📭 No hay reportes registrados para la obra **{obra_seleccionada_nombre}**")
+                if not reportes_por_asistente:
+                    st.info(f"📭 No hay reportes registrados para la obra **{obras[obra_codigo]}**")
                     st.write("Los asistentes deben crear partes diarios para que aparezcan aquí.")
                 else:
-                    # Organizar por asistente
-                    reportes_por_asistente = {}
-                    
-                    for avance in avances_obra:
-                        responsable = avance.get("responsable", "Desconocido")
-                        fecha = avance.get("fecha", "")
-                        avance_pct = avance.get("avance", 0)
-                        observaciones = avance.get("observaciones", "")
-                        fotos = avance.get("fotos", [])
-                        estado = avance.get("estado", "Aprobado")
-                        
-                        # Obtener información de la partida
-                        partida_info = avance.get("partida", {})
-                        actividad = partida_info.get("nombre", "Sin actividad especificada")
-                        cantidad_ejecutada = partida_info.get("cantidad_ejecutada", 0)
-                        unidad = partida_info.get("unidad", "")
-                        horas = partida_info.get("jornal_horas", 8)
-                        rendimiento = partida_info.get("rendimiento", 0)
-                        
-                        # Obtener totales de costos
-                        totales = avance.get("totales", {})
-                        total_mo = totales.get("mano_de_obra", 0)
-                        total_mat = totales.get("materiales", 0)
-                        total_eq = totales.get("equipos", 0)
-                        total_otros = totales.get("otros", 0)
-                        total_ejecutado = float(total_mo or 0) + float(total_mat or 0) + float(total_eq or 0) + float(total_otros or 0)
-                        
-                        # Costos detallados
-                        costos = avance.get("costos", {})
-                        
-                        if responsable not in reportes_por_asistente:
-                            reportes_por_asistente[responsable] = []
-                        
-                        reportes_por_asistente[responsable].append({
-                            "dia": fecha,
-                            "actividad": actividad,
-                            "horas": horas,
-                            "avance": avance_pct,
-                            "cantidad_ejecutada": cantidad_ejecutada,
-                            "unidad": unidad,
-                            "rendimiento": rendimiento,
-                            "observaciones": observaciones,
-                            "fotos": fotos,
-                            "estado": estado,
-                            "total_mo": total_mo,
-                            "total_mat": total_mat,
-                            "total_eq": total_eq,
-                            "total_otros": total_otros,
-                            "total_ejecutado": total_ejecutado,
-                            "costos": costos,
-                        })
-                    
-                    # Obtener lista de asistentes únicos
+                    # Asistentes en orden alfabético (la agregación ya los entrega ordenados)
                     asistentes = list(reportes_por_asistente.keys())
-                    asistentes.sort()
                     
                     # ==================== RESUMEN GENERAL ====================
                     st.markdown("### 📈 Resumen General")
@@ -2125,27 +2539,16 @@ if st.session_state["auth"] == "jefe":
                     col1, col2, col3, col4 = st.columns(4)
                     
                     with col1:
-                        st.metric("👷 Asistentes", len(asistentes))
+                        st.metric("👷 Asistentes", resumen_general["asistentes"])
                     
                     with col2:
-                        total_reportes = sum(len(reportes) for reportes in reportes_por_asistente.values())
-                        st.metric("📋 Total Reportes", total_reportes)
+                        st.metric("📋 Total Reportes", resumen_general["reportes"])
                     
                     with col3:
-                        # Contar reportes pendientes
-                        reportes_pendientes = sum(
-                            1 for reportes in reportes_por_asistente.values() 
-                            for r in reportes if r.get("estado") == "Pendiente"
-                        )
-                        st.metric("⏳ Pendientes", reportes_pendientes)
+                        st.metric("⏳ Pendientes", len(cola_revision))
                     
                     with col4:
-                        # Calcular total de horas trabajadas
-                        total_horas = sum(
-                            r["horas"] for reportes in reportes_por_asistente.values() 
-                            for r in reportes
-                        )
-                        st.metric("⏱️ Total Horas", f"{total_horas} h")
+                        st.metric("⏱️ Total Horas", f"{resumen_general['horas']:g} h")
                     
                     st.divider()
                     
@@ -2166,11 +2569,7 @@ if st.session_state["auth"] == "jefe":
                         st.divider()
                         
                         for p in asistentes:
-                            reportes = reportes_por_asistente[p]
-                            
-                            # Calcular estadísticas
-                            pendientes = sum(1 for r in reportes if r.get("estado") == "Pendiente")
-                            total = len(reportes)
+                            pendientes = pendientes_asistente.get(p, 0)
                             
                             # Determinar si mostrar según filtro
                             mostrar = (
@@ -2216,10 +2615,10 @@ if st.session_state["auth"] == "jefe":
                             
                             if p in reportes_por_asistente:
                                 reportes = reportes_por_asistente[p]
+                                est_p = estadisticas_asistentes[p]
                                 
-                                # Ordenar reportes
-                                reverse = ordenar == "Más reciente primero"
-                                reportes_ordenados = sorted(reportes, key=lambda x: x["dia"], reverse=reverse)
+                                # Ya vienen ordenados por día; el orden inverso no requiere reordenar
+                                reportes_ordenados = reportes[::-1] if ordenar == "Más reciente primero" else reportes
                                 
                                 # ==================== ESTADÍSTICAS DEL ASISTENTE ====================
                                 st.markdown("#### 📊 Estadísticas del Asistente")
@@ -2227,30 +2626,44 @@ if st.session_state["auth"] == "jefe":
                                 col1, col2, col3, col4, col5 = st.columns(5)
                                 
                                 with col1:
-                                    st.metric("📋 Reportes", len(reportes))
+                                    st.metric("📋 Reportes", est_p["reportes"])
                                 
                                 with col2:
-                                    total_horas_p = sum(r["horas"] for r in reportes)
-                                    st.metric("⏱️ Horas", f"{total_horas_p} h")
+                                    st.metric("⏱️ Horas", f"{est_p['horas']:g} h")
                                 
                                 with col3:
-                                    avance_total_p = sum(r["avance"] for r in reportes)
-                                    st.metric("📈 Avance", f"{avance_total_p}%")
+                                    st.metric("📈 Avance", f"{est_p['avance']:g}%")
                                 
                                 with col4:
-                                    total_gastado_p = sum(r["total_ejecutado"] for r in reportes)
-                                    st.metric("💰 Total Gastado", f"S/. {total_gastado_p:,.2f}")
+                                    st.metric("💰 Total Gastado", f"S/. {est_p['total_ejecutado']:,.2f}")
                                 
                                 with col5:
-                                    pendientes_p = sum(1 for r in reportes if r.get("estado") == "Pendiente")
-                                    st.metric("⏳ Pendientes", pendientes_p)
+                                    st.metric("⏳ Pendientes", est_p["pendientes"])
+                                
+                                st.caption(
+                                    f"Del {est_p['primera_fecha']} al {est_p['ultima_fecha']} · "
+                                    f"MO S/. {est_p['total_mo']:,.2f} · Mat. S/. {est_p['total_mat']:,.2f} · "
+                                    f"Eq. S/. {est_p['total_eq']:,.2f} · Otros S/. {est_p['total_otros']:,.2f}"
+                                )
                                 
                                 st.divider()
                                 
                                 # ==================== DETALLE DE REPORTES ====================
                                 st.markdown("#### 📄 Detalle de Reportes")
                                 
-                                for i, reporte in enumerate(reportes_ordenados):
+                                # Paginado: no se dibujan cientos de expanders a la vez
+                                total_paginas = max(1, -(-len(reportes_ordenados) // REPORTES_POR_PAGINA))
+                                pagina = 1
+                                if total_paginas > 1:
+                                    pagina = int(st.number_input(
+                                        f"Página (de {total_paginas})", min_value=1, max_value=total_paginas,
+                                        value=1, step=1, key=f"pagina_reportes_{p}"
+                                    ))
+                                inicio_pag = (pagina - 1) * REPORTES_POR_PAGINA
+                                pagina_reportes = reportes_ordenados[inicio_pag:inicio_pag + REPORTES_POR_PAGINA]
+                                st.caption(f"Mostrando {inicio_pag + 1}–{inicio_pag + len(pagina_reportes)} de {len(reportes_ordenados)}")
+                                
+                                for i, reporte in enumerate(pagina_reportes, start=inicio_pag):
                                     # Determinar color según estado
                                     if reporte.get("estado") == "Pendiente":
                                         icono_estado = "⏳"
@@ -2261,7 +2674,7 @@ if st.session_state["auth"] == "jefe":
                                     
                                     titulo_expander = f"{icono_estado} {reporte['dia']} - {reporte['actividad']} ({color_estado} {reporte.get('estado', 'Aprobado')})"
                                     
-                                    with st.expander(titulo_expander, expanded=(i==0)):
+                                    with st.expander(titulo_expander, expanded=(i == inicio_pag)):
                                         
                                         # Información general
                                         st.markdown("##### 📋 Información General")
@@ -2379,9 +2792,12 @@ if st.session_state["auth"] == "jefe":
                                                     use_container_width=True,
                                                     type="primary"
                                                 ):
-                                                    st.success(f"✅ Reporte del {reporte['dia']} aprobado")
-                                                    st.info("💡 Funcionalidad pendiente: actualizar estado en Firebase")
-                                                    # TODO: Implementar actualización de estado en Firebase
+                                                    ok_rev, msg_rev = resolver_partes_pendientes(obra_codigo, [reporte["id"]], True, usuario_revisor)
+                                                    if ok_rev:
+                                                        st.success(f"✅ Reporte del {reporte['dia']} aprobado")
+                                                        st.rerun()
+                                                    else:
+                                                        st.error(f"❌ {msg_rev}")
                                             
                                             with col2:
                                                 if st.button(
@@ -2389,9 +2805,12 @@ if st.session_state["auth"] == "jefe":
                                                     key=f"rechazar_{p}_{i}",
                                                     use_container_width=True
                                                 ):
-                                                    st.warning(f"⚠️ Reporte del {reporte['dia']} rechazado")
-                                                    st.info("💡 Funcionalidad pendiente: eliminar reporte de Firebase")
-                                                    # TODO: Implementar eliminación en Firebase
+                                                    ok_rev, msg_rev = resolver_partes_pendientes(obra_codigo, [reporte["id"]], False, usuario_revisor)
+                                                    if ok_rev:
+                                                        st.warning(f"⚠️ Reporte del {reporte['dia']} rechazado")
+                                                        st.rerun()
+                                                    else:
+                                                        st.error(f"❌ {msg_rev}")
                                         else:
                                             st.success(f"✅ Reporte aprobado el {reporte['dia']}")
                             else:
@@ -2406,6 +2825,185 @@ if st.session_state["auth"] == "jefe":
         # Salir de esta sección para que no muestre el resto del código del jefe
         st.stop()
     
+    # ==================== SECCIÓN: TELEMETRÍA (PANTALLA COMPLETA) ====================
+    if st.session_state.get("mostrar_telemetria"):
+        col1, col2 = st.columns([1, 10])
+        with col1:
+            if st.button("← Volver", use_container_width=False, key="volver_telemetria"):
+                st.session_state.mostrar_telemetria = False
+                st.rerun()
+
+        st.markdown("# ⏱️ TELEMETRÍA DE RENDIMIENTO")
+        st.caption("Latencia de Firestore, subidas, PDF y secciones en este proceso (últimas mediciones de todas las sesiones).")
+        _render_telemetria()
+        st.stop()
+
+    # ==================== SECCIÓN: ASIGNACIÓN DE OBRAS A USUARIOS (PANTALLA COMPLETA) ====================
+    if st.session_state.get("mostrar_asignaciones"):
+        col1, col2 = st.columns([1, 10])
+        with col1:
+            if st.button("← Volver", use_container_width=False, key="volver_asignaciones"):
+                st.session_state.mostrar_asignaciones = False
+                st.rerun()
+
+        st.markdown("# 👥 ASIGNACIÓN DE OBRAS A USUARIOS")
+        st.caption("Cada pasante ve solo las obras que tenga asignadas (puede tener varias).")
+
+        obras_todas = cargar_obras()
+        asignaciones = listar_asignaciones_usuarios()
+
+        if asignaciones:
+            st.dataframe(
+                pd.DataFrame([
+                    {"Usuario": u, "Obras": ", ".join(sorted(o.values()))}
+                    for u, o in sorted(asignaciones.items())
+                ]),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("Aún no hay asignaciones. Los pasantes sin asignación se ubican por palabras clave del usuario.")
+
+        st.divider()
+        opciones_usuario = ["➕ Nuevo usuario"] + sorted(asignaciones)
+        usuario_sel = st.selectbox("Usuario", opciones_usuario, key="asig_usuario_sel")
+        if usuario_sel == opciones_usuario[0]:
+            usuario_asig = st.text_input("Nombre de usuario", placeholder="pasante-...", key="asig_usuario_nuevo").strip()
+            actuales = []
+        else:
+            usuario_asig = usuario_sel
+            actuales = [c for c in asignaciones.get(usuario_sel, {}) if c in obras_todas]
+
+        with st.form(f"form_asignacion_{usuario_sel}"):
+            obras_sel = st.multiselect(
+                "Obras asignadas",
+                list(obras_todas),
+                default=actuales,
+                format_func=lambda c: obras_todas.get(c, c),
+            )
+            c_guardar, c_quitar = st.columns(2)
+            guardar_asig = c_guardar.form_submit_button("💾 Guardar", use_container_width=True, type="primary")
+            quitar_asig = c_quitar.form_submit_button(
+                "🗑️ Quitar asignación", use_container_width=True, disabled=usuario_sel == opciones_usuario[0]
+            )
+
+        if guardar_asig:
+            if not usuario_asig:
+                st.error("❌ Indica el usuario.")
+            elif not obras_sel:
+                st.error("❌ Selecciona al menos una obra.")
+            else:
+                ok_asig, msg_asig = guardar_asignacion_usuario(
+                    usuario_asig,
+                    {c: obras_todas.get(c, c) for c in obras_sel},
+                    st.session_state.get("usuario_logueado", "jefe"),
+                )
+                if ok_asig:
+                    st.success(f"✅ {msg_asig}")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {msg_asig}")
+        elif quitar_asig:
+            ok_asig, msg_asig = eliminar_asignacion_usuario(usuario_asig)
+            if ok_asig:
+                st.success(f"✅ {msg_asig}")
+                st.rerun()
+            else:
+                st.error(f"❌ {msg_asig}")
+
+        st.stop()
+
+    # ==================== SECCIÓN: PORTAFOLIO DE OBRAS (PANTALLA COMPLETA) ====================
+    if st.session_state.get("mostrar_portafolio"):
+        col1, col2 = st.columns([1, 10])
+        with col1:
+            if st.button("← Volver", use_container_width=False, key="volver_portafolio"):
+                st.session_state.mostrar_portafolio = False
+                st.rerun()
+
+        st.markdown("# 🗂️ PORTAFOLIO DE OBRAS")
+        st.caption("Vista consolidada de todas las obras (resúmenes precalculados por obra)")
+
+        # Una sola consulta: obras_resumen
+        resumenes_port = cargar_resumenes_obras()
+        filas_port = construir_resumen_portafolio(resumenes_port)
+
+        if not filas_port:
+            st.info("Aún no hay resúmenes de obras. Usa 'Reconstruir resúmenes' para generarlos.")
+        else:
+            tot_port = calcular_totales_portafolio(filas_port)
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Obras", tot_port["obras"])
+            c2.metric("Presupuesto (con donaciones)", f"S/. {tot_port['presupuesto_ampliado']:,.2f}")
+            c3.metric("Gastado", f"S/. {tot_port['gastado']:,.2f}", delta=f"{tot_port['porcentaje_gastado']:.1f}%")
+            c4.metric("Saldo Caja Chica", f"S/. {tot_port['caja_saldo']:,.2f}")
+            st.progress(min(tot_port["porcentaje_gastado"] / 100, 1.0))
+            st.divider()
+
+            filas_tabla = []
+            for f in filas_port:
+                _, estado_pres = semaforo_presupuesto(f["porcentaje_gastado"])
+                _, estado_tiempo = semaforo_tiempo(f["avance_real"], f["avance_programado"])
+                filas_tabla.append({
+                    "Obra": f["nombre"],
+                    "Presupuesto (S/.)": f["presupuesto_ampliado"],
+                    "Gastado (S/.)": f["gastado"],
+                    "Semáforo Presupuesto": estado_pres,
+                    "Avance Real (%)": f["avance_real"],
+                    "Avance Programado (%)": f["avance_programado"],
+                    "Semáforo Tiempo": estado_tiempo,
+                    "SPI": f["spi"],
+                    "Donaciones (S/.)": f["donaciones"],
+                    "Caja Chica (S/.)": f["caja_saldo"],
+                    "Gastos por aprobar": f["caja_pendientes"],
+                })
+            df_port = pd.DataFrame(filas_tabla)
+
+            solo_alertas = st.checkbox("Mostrar solo obras en ROJO", key="port_solo_rojo")
+            if solo_alertas:
+                df_port = df_port[
+                    df_port["Semáforo Presupuesto"].str.startswith("ROJO")
+                    | df_port["Semáforo Tiempo"].str.startswith("RETRASO CRÍTICO")
+                ]
+
+            st.dataframe(
+                df_port.style.format({
+                    "Presupuesto (S/.)": "{:,.2f}",
+                    "Gastado (S/.)": "{:,.2f}",
+                    "Avance Real (%)": "{:.1f}",
+                    "Avance Programado (%)": "{:.1f}",
+                    "SPI": "{:.2f}",
+                    "Donaciones (S/.)": "{:,.2f}",
+                    "Caja Chica (S/.)": "{:,.2f}",
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+
+            with st.expander("💵 Flujo de caja proyectado del portafolio"):
+                _render_flujo_portafolio(resumenes_port)
+
+        with st.expander("🔧 Mantenimiento de resúmenes"):
+            st.caption("Recalcula los resúmenes desde los datos originales (usar si se editaron datos fuera de la app).")
+            if st.button("🔄 Reconstruir resúmenes", key="btn_reconstruir_resumenes"):
+                with st.spinner("Reconstruyendo..."):
+                    ok_res, errores_res = reconstruir_resumenes_obras()
+                st.success(f"✅ {ok_res} resumen(es) reconstruido(s)")
+                for err in errores_res:
+                    st.error(err)
+
+            if st.button("🔍 Verificar rollups de presupuesto", key="btn_verificar_rollups"):
+                for f in filas_port:
+                    coincide, difs = verificar_rollup_obra(f["codigo"])
+                    if coincide:
+                        st.success(f"✅ {f['nombre']}: rollup correcto")
+                    else:
+                        st.warning(f"⚠️ {f['nombre']}: {len(difs)} diferencia(s). Se reconstruyó el rollup.")
+                        st.code("\n".join(difs[:20]))
+                        reconstruir_rollup_obra(f["codigo"])
+
+        st.stop()
+
     # ==================== TÍTULO PRINCIPAL (SOLO SE MUESTRA CUANDO NO ESTÁN LOS REPORTES) ====================
     st.title("Modo Jefe de Obra")
 
@@ -2449,6 +3047,8 @@ if st.session_state["auth"] == "jefe":
                 )
 
             if st.form_submit_button("✅ Guardar Obra", use_container_width=True, type="primary"):
+                # Sin caché: otra sesión pudo crear la obra hace segundos
+                invalidar_indice_obras()
                 obras_actuales = cargar_obras()
                 es_valido, mensaje = validar_obra(nuevo_codigo, nuevo_nombre, obras_actuales)
 
@@ -2498,6 +3098,30 @@ if st.session_state["auth"] == "jefe":
             st.session_state.mostrar_form_obra = False
             st.rerun()
 
+    # ==================== SECCIÓN: IMPORTAR INSUMOS ====================
+    elif st.session_state.get("mostrar_importar_insumos"):
+        st.header("📥 Importar Catálogo de Insumos")
+
+        if st.button("← Volver", use_container_width=False, key="volver_importar_insumos"):
+            st.session_state.mostrar_importar_insumos = False
+            st.rerun()
+
+        st.caption("Los insumos que ya existen en el catálogo (mismo nombre) se reportan y no se duplican.")
+        _render_importacion("insumos", key="insumos_jefe")
+
+        st.divider()
+        st.subheader("💲 Actualizar precios (lista de proveedor)")
+        st.caption("Cada precio se guarda como una nueva versión con fecha de vigencia; los precios anteriores se conservan.")
+        col_v, col_f = st.columns(2)
+        with col_v:
+            vigente_desde = st.date_input("Vigente desde", value=date.today(), key="precios_vigente_desde")
+        with col_f:
+            fuente_precios = st.text_input("Proveedor", placeholder="Nombre del proveedor", key="precios_fuente")
+        _render_importacion(
+            "precios", key="precios_jefe",
+            opciones={"vigente_desde": vigente_desde, "fuente": fuente_precios.strip() or "proveedor"}
+        )
+
     # ==================== SECCIÓN: GESTIÓN DE EMPLEADOS ====================
     elif "mostrar_empleados" in st.session_state and st.session_state.mostrar_empleados:
         st.header("Gestión de Empleados (Mano de Obra)")
@@ -2506,9 +3130,9 @@ if st.session_state["auth"] == "jefe":
             st.session_state.mostrar_empleados = False
             st.rerun()
 
-        # Cargar empleados desde Firebase
-        empleados_docs = db.collection("empleados").stream()
-        empleados = [{"id": d.id, **d.to_dict()} for d in empleados_docs]
+        # Directorio general (cacheado; se recarga solo cuando cambia algún plantel)
+        directorio = obtener_directorio()
+        empleados = directorio["empleados"]
 
         st.subheader("Agregar Nuevo Empleado")
         
@@ -2538,30 +3162,40 @@ if st.session_state["auth"] == "jefe":
                         "numero": numero_emp.strip(),
                         "fecha_registro": date.today().isoformat()
                     }
-                    db.collection("empleados").add(nuevo_empleado)
-                    st.success(f"✅ Empleado {nombre_emp} agregado correctamente")
-                    st.rerun()
+                    ok_emp, msg_emp = agregar_empleado(None, nuevo_empleado)
+                    if ok_emp:
+                        st.success(f"✅ {msg_emp}")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ {msg_emp}")
 
         if empleados:
             st.subheader("Listado de Empleados")
-            df_emp = pd.DataFrame(empleados)
-            df_emp = df_emp[["nombre", "cargo", "dni", "numero"]]
+            busqueda_emp = st.text_input("🔎 Buscar por nombre, cargo o DNI", key="buscar_emp_general")
+            empleados_filtrados = buscar_en_plantel(directorio, busqueda_emp)
+            df_emp = pd.DataFrame(empleados_filtrados, columns=["nombre", "cargo", "dni", "numero"])
             df_emp.columns = ["Nombre", "Cargo", "DNI", "Teléfono"]
             st.dataframe(df_emp, use_container_width=True, hide_index=True)
 
             st.subheader("Eliminar Empleado")
-            nombres_emp = [f"{e['nombre']} - {e['cargo']} (DNI: {e['dni']})" for e in empleados]
-            
-            if nombres_emp:
-                emp_seleccionado = st.selectbox("Selecciona un empleado para eliminar:", nombres_emp)
-                idx_sel = nombres_emp.index(emp_seleccionado)
-                emp_id = empleados[idx_sel]["id"]
+            if empleados_filtrados:
+                emp_id = st.selectbox(
+                    "Selecciona un empleado para eliminar:",
+                    [e["id"] for e in empleados_filtrados],
+                    format_func=lambda i: directorio["por_id"][i]["etiqueta"],
+                )
+                emp_sel = directorio["por_id"][emp_id]
 
-                st.warning(f"**Se eliminará:** {empleados[idx_sel]['nombre']}")
+                st.warning(f"**Se eliminará:** {emp_sel['nombre']}")
                 if st.button("🗑️ Eliminar empleado", use_container_width=True, type="secondary"):
-                    db.collection("empleados").document(emp_id).delete()
-                    st.success("✅ Empleado eliminado correctamente")
-                    st.rerun()
+                    ok_emp, msg_emp = eliminar_empleado(emp_id)
+                    if ok_emp:
+                        st.success("✅ Empleado eliminado correctamente")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ {msg_emp}")
+            else:
+                st.info("Ningún empleado coincide con la búsqueda.")
         else:
             st.info("⚠️ No hay empleados registrados. Agrega uno usando el formulario de arriba.")
 
@@ -2589,8 +3223,7 @@ if st.session_state["auth"] == "jefe":
                 
                 col1, col2 = st.columns(2)
                 with col1:
-                    obra_sel = st.selectbox("Seleccionar Obra:", list(obras.values()), key="obra_trab_adic")
-                    obra_codigo = [k for k, v in obras.items() if v == obra_sel][0]
+                    obra_codigo = st.selectbox("Seleccionar Obra:", list(obras), format_func=obras.get, key="obra_trab_adic")
                 
                 with col2:
                     st.write("")
@@ -2641,19 +3274,37 @@ if st.session_state["auth"] == "jefe":
             with tab2:
                 st.subheader("Listado de Trabajos Adicionales")
                 
-                obra_sel_2 = st.selectbox("Filtrar por Obra:", ["Todas"] + list(obras.values()), key="obra_filtro_trab")
+                col_f1, col_f2 = st.columns(2)
+                with col_f1:
+                    obra_codigo_2 = st.selectbox(
+                        "Filtrar por Obra:", [None] + list(obras),
+                        format_func=lambda c: "Todas" if c is None else obras[c], key="obra_filtro_trab"
+                    )
+                with col_f2:
+                    estado_sel_2 = st.selectbox("Filtrar por Estado:", ["Todos"] + ESTADOS_TRABAJO, key="estado_filtro_trab")
+                
+                estado_2 = None if estado_sel_2 == "Todos" else estado_sel_2
                 
-                if obra_sel_2 == "Todas":
-                    trabajos_todos = []
-                    for cod in obras.keys():
-                        trabajos_todos.extend(obtener_trabajos_adicionales(cod))
-                else:
-                    obra_codigo_2 = [k for k, v in obras.items() if v == obra_sel_2][0]
-                    trabajos_todos = obtener_trabajos_adicionales(obra_codigo_2)
+                # Paginación: pila de cursores que se reinicia al cambiar los filtros
+                if st.session_state.get("trab_filtro_actual") != (obra_codigo_2, estado_2):
+                    st.session_state.trab_filtro_actual = (obra_codigo_2, estado_2)
+                    st.session_state.trab_cursores = [None]
+                cursores_trab = st.session_state.trab_cursores
+                
+                # Filtro por obra y estado en el servidor, una página a la vez
+                try:
+                    trabajos_todos, siguiente_trab = listar_trabajos_adicionales(
+                        obra_codigo_2, estado_2, despues_de=cursores_trab[-1]
+                    )
+                except Exception as e:
+                    st.error(f"❌ No se pudieron cargar los trabajos adicionales: {e}")
+                    trabajos_todos, siguiente_trab = None, None
+                if obra_codigo_2 is None and trabajos_todos:
+                    trabajos_todos = [t for t in trabajos_todos if t.get("codigo_obra") in obras]
                 
-                if not trabajos_todos:
+                if trabajos_todos == []:
                     st.info("📋 No hay trabajos adicionales registrados.")
-                else:
+                elif trabajos_todos:
                     for trabajo in trabajos_todos:
                         with st.expander(f"🔧 {trabajo['descripcion']} - {trabajo['estado']}", expanded=False):
                             col1, col2, col3 = st.columns(3)
@@ -2693,29 +3344,42 @@ if st.session_state["auth"] == "jefe":
                                     eliminar_trabajo_adicional(trabajo['id'])
                                     st.success("Trabajo eliminado")
                                     st.rerun()
-            
-            # TAB 3: RESUMEN DE TRABAJOS ADICIONALES
+                
+                col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+                with col_p1:
+                    if len(cursores_trab) > 1 and st.button("← Anterior", key="trab_pag_ant", use_container_width=True):
+                        cursores_trab.pop()
+                        st.rerun()
+                with col_p2:
+                    st.caption(f"Página {len(cursores_trab)}")
+                with col_p3:
+                    if siguiente_trab and st.button("Siguiente →", key="trab_pag_sig", use_container_width=True):
+                        cursores_trab.append(siguiente_trab)
+                        st.rerun()
+            
+            # TAB 3: RESUMEN DE TRABAJOS ADICIONALES
             with tab3:
                 st.subheader("📊 Resumen Financiero")
                 
-                obra_sel_3 = st.selectbox("Seleccionar Obra:", list(obras.values()), key="obra_resumen_trab")
-                obra_codigo_3 = [k for k, v in obras.items() if v == obra_sel_3][0]
+                obra_codigo_3 = st.selectbox("Seleccionar Obra:", list(obras), format_func=obras.get, key="obra_resumen_trab")
                 
-                trabajos_resumen = obtener_trabajos_adicionales(obra_codigo_3)
+                # Totales por estado precalculados en obras_resumen (no se recorren los trabajos)
+                totales_trab = obtener_totales_trabajos_obra(obra_codigo_3)
+                if totales_trab is None:
+                    # Obras anteriores a los totales precalculados: se generan una sola vez
+                    reconstruir_totales_trabajos(obra_codigo_3)
+                    totales_trab = obtener_totales_trabajos_obra(obra_codigo_3) or {}
+                resumen_trab = resumen_trabajos_desde_totales(totales_trab)
                 
-                if not trabajos_resumen:
+                if not resumen_trab["total_trabajos"]:
                     st.info("No hay trabajos adicionales para esta obra.")
                 else:
                     # Cálculos
-                    total_costo = sum([t['costo_incurrido'] for t in trabajos_resumen])
-                    total_cobro = sum([t['precio_cobro'] for t in trabajos_resumen])
-                    total_ganancia = total_cobro - total_costo
-                    
-                    cobrados = [t for t in trabajos_resumen if t['estado'] == 'Cobrado']
-                    total_cobrado = sum([t['precio_cobro'] for t in cobrados])
-                    
-                    por_cobrar = [t for t in trabajos_resumen if t['estado'] != 'Cobrado']
-                    total_por_cobrar = sum([t['precio_cobro'] for t in por_cobrar])
+                    total_costo = resumen_trab["total_costo"]
+                    total_cobro = resumen_trab["total_cobro"]
+                    total_ganancia = resumen_trab["total_ganancia"]
+                    total_cobrado = resumen_trab["total_cobrado"]
+                    total_por_cobrar = resumen_trab["total_por_cobrar"]
                     
                     # Métricas
                     col1, col2, col3, col4 = st.columns(4)
@@ -2727,27 +3391,34 @@ if st.session_state["auth"] == "jefe":
                         st.metric("Ganancia Total", f"S/. {total_ganancia:.2f}", help="Diferencia ganancia")
                     with col4:
                         if total_cobro > 0:
-                            margen = (total_ganancia / total_cobro) * 100
-                            st.metric("Margen %", f"{margen:.1f}%")
+                            st.metric("Margen %", f"{resumen_trab['margen']:.1f}%")
                     
                     st.divider()
                     
                     # Desglose por estado
                     col1, col2, col3 = st.columns(3)
                     with col1:
-                        st.write(f"🟢 **Cobrados:** {len(cobrados)}")
+                        st.write(f"🟢 **Cobrados:** {resumen_trab['cantidad_cobrados']}")
                         st.write(f"Monto: S/. {total_cobrado:.2f}")
                     with col2:
-                        st.write(f"🟡 **Pendientes:** {len(por_cobrar)}")
+                        st.write(f"🟡 **Pendientes:** {resumen_trab['cantidad_por_cobrar']}")
                         st.write(f"Monto: S/. {total_por_cobrar:.2f}")
                     with col3:
-                        st.write(f"📊 **Total Trabajos:** {len(trabajos_resumen)}")
+                        st.write(f"📊 **Total Trabajos:** {resumen_trab['total_trabajos']}")
                         st.write(f"Ganancia: S/. {total_ganancia:.2f}")
                     
                     # Tabla detallada
                     st.divider()
                     st.write("**Detalle de Trabajos Adicionales:**")
                     
+                    try:
+                        trabajos_resumen, hay_mas_trab = listar_trabajos_adicionales(obra_codigo_3, limite=100)
+                    except Exception as e:
+                        st.error(f"❌ No se pudo cargar el detalle de trabajos adicionales: {e}")
+                        trabajos_resumen, hay_mas_trab = [], None
+                    if hay_mas_trab:
+                        st.caption(f"Se muestran los 100 más recientes de {resumen_trab['total_trabajos']}. Usa 'Ver Todos' para el resto.")
+                    
                     df_trabajos = pd.DataFrame([{
                         "Descripción": t['descripcion'],
                         "Metrado": f"{t['metrado']} {t['unidad']}",
@@ -2828,14 +3499,16 @@ if st.session_state["auth"] == "jefe":
             
             st.subheader("Gestión de Empleados - " + obra_nombre)
             
-            empleados = []
             try:
-                docs = db.collection("empleados").where("codigo_obra", "==", obra_codigo).stream()
-                empleados = [{"id": doc.id, **doc.to_dict()} for doc in docs]
+                plantel_obra = obtener_plantel(obra_codigo)
             except Exception:
-                empleados = []
+                plantel_obra = construir_plantel([])
+            empleados = plantel_obra["empleados"]
             
-            tab_empl1, tab_empl2 = st.tabs(["Agregar", "Listar"])
+            tab_empl1, tab_empl2, tab_empl3 = st.tabs(["Agregar", "Listar", "Importar"])
+
+            with tab_empl3:
+                _render_importacion("empleados", obra_codigo, key="empl_obra")
             
             with tab_empl1:
                 st.write("**Agregar Nuevo Empleado**")
@@ -2849,20 +3522,26 @@ if st.session_state["auth"] == "jefe":
                         st.error("❌ Completa todos los campos")
                     else:
                         emp_data = {
-                            "codigo_obra": obra_codigo,
                             "nombre": nombre_emp,
                             "cargo": cargo_emp,
                             "dni": dni_emp,
                             "telefono": telefono_emp
                         }
-                        db.collection("empleados").add(emp_data)
-                        st.success("✅ Empleado agregado")
-                        st.rerun()
+                        if plantel_obra["por_dni"].get(dni_emp.strip()):
+                            st.error(f"❌ Ya existe un empleado con DNI {dni_emp.strip()} en esta obra")
+                        else:
+                            ok_emp, msg_emp = agregar_empleado(obra_codigo, emp_data)
+                            if ok_emp:
+                                st.success("✅ Empleado agregado")
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {msg_emp}")
             
             with tab_empl2:
                 st.write("**Empleados de la Obra**")
                 if empleados:
-                    for emp in empleados:
+                    busqueda_emp_obra = st.text_input("🔎 Buscar por nombre, cargo o DNI", key="buscar_emp_obra")
+                    for emp in buscar_en_plantel(plantel_obra, busqueda_emp_obra):
                         # Crear un contenedor con columnas para cada empleado
                         col1, col2, col3 = st.columns([4, 1, 1])
                         
@@ -2899,15 +3578,18 @@ if st.session_state["auth"] == "jefe":
                                 with col1:
                                     if st.form_submit_button("💾 Guardar Cambios", use_container_width=True, type="primary"):
                                         # Actualizar en Firebase
-                                        db.collection("empleados").document(emp_edit['id']).update({
+                                        ok_emp, msg_emp = actualizar_empleado(emp_edit['id'], {
                                             "nombre": nuevo_nombre,
                                             "cargo": nuevo_cargo,
                                             "dni": nuevo_dni,
                                             "telefono": nuevo_telefono
-                                        })
-                                        st.success("✅ Empleado actualizado")
-                                        st.session_state.mostrar_editor_empleado = False
-                                        st.rerun()
+                                        }, obra_codigo)
+                                        if ok_emp:
+                                            st.success("✅ Empleado actualizado")
+                                            st.session_state.mostrar_editor_empleado = False
+                                            st.rerun()
+                                        else:
+                                            st.error(f"❌ {msg_emp}")
                                 
                                 with col2:
                                     if st.form_submit_button("❌ Cancelar", use_container_width=True):
@@ -2923,10 +3605,13 @@ if st.session_state["auth"] == "jefe":
                             col1, col2 = st.columns(2)
                             with col1:
                                 if st.button("✅ Sí, eliminar", use_container_width=True, type="primary"):
-                                    db.collection("empleados").document(emp_elim['id']).delete()
-                                    st.success("✅ Empleado eliminado")
-                                    st.session_state.mostrar_confirmacion_eliminar = False
-                                    st.rerun()
+                                    ok_emp, msg_emp = eliminar_empleado(emp_elim['id'], obra_codigo)
+                                    if ok_emp:
+                                        st.success("✅ Empleado eliminado")
+                                        st.session_state.mostrar_confirmacion_eliminar = False
+                                        st.rerun()
+                                    else:
+                                        st.error(f"❌ {msg_emp}")
                             
                             with col2:
                                 if st.button("❌ Cancelar", use_container_width=True):
@@ -2939,12 +3624,18 @@ if st.session_state["auth"] == "jefe":
             st.stop()  # Detener ejecución aquí cuando se muestra gestión de empleados
 
         # ==================== PANEL NORMAL DE LA OBRA ====================
-        presupuesto = obtener_presupuesto_obra(obra_codigo)
+        # Gastado y eficiencia salen del rollup de la obra (sin recorrer los partes)
+        # (obtener_rollup_obra lo reconstruye si falta o está incompleto)
+        rollup_obra = obtener_rollup_obra(obra_codigo)
+        presupuesto = rollup_obra["presupuesto_total"] if rollup_obra else obtener_presupuesto_obra(obra_codigo)
         avances = obtener_avances_obra(obra_codigo)
-        donaciones_obra = obtener_donaciones_obra(obra_codigo)
-        impacto_don = impacto_donacion_en_presupuesto(presupuesto, donaciones_obra)
+        resumen_don = _resumen_donaciones(obra_codigo)
+        impacto_don = impacto_donaciones_desde_total(presupuesto, resumen_don["total_general"])
         presupuesto_ampliado = impacto_don["presupuesto_ampliado"]
-        resumen = calcular_resumen_presupuesto(presupuesto_ampliado, avances)
+        resumen = calcular_resumen_presupuesto(
+            presupuesto_ampliado, avances,
+            gastado=rollup_obra.get("gastado_total") if rollup_obra else None
+        )
 
         st.markdown("### 💰 Resumen de Presupuesto")
         col1, col2, col3, col4, col5 = st.columns(5)
@@ -2993,7 +3684,10 @@ if st.session_state["auth"] == "jefe":
 
         st.divider()
 
-        eficiencia_promedio = calcular_eficiencia_promedio_obra(avances)
+        eficiencia_promedio = (
+            calcular_eficiencia_desde_rollup(rollup_obra) if rollup_obra
+            else calcular_eficiencia_promedio_obra(avances)
+        )
         emoji_rendimiento, texto_rendimiento, _ = obtener_estado_rendimiento(eficiencia_promedio)
 
         st.markdown("### 📊 Rendimiento de Mano de Obra")
@@ -3023,12 +3717,17 @@ if st.session_state["auth"] == "jefe":
         if eficiencia_promedio > 0:
             st.progress(min(eficiencia_promedio / 100, 1.0))
 
-        tab1, tab2, tab3, tab4, tab5 = st.tabs(["Parte Diario", "Historial de Avances", "Cronograma Valorizado", "Caja Chica", "Donaciones"])
+        # Solo se ejecuta la sección elegida; st.tabs corría las cinco en cada interacción
+        seccion_obra = _selector_seccion(SECCIONES_OBRA_JEFE, "seccion_obra_jefe")
+        if seccion_obra != "Parte Diario":
+            _preservar_estado_widgets(PREFIJOS_ESTADO_PARTE)
+        firma_prefetch = _firma_prefetch(rollup_obra, resumen_don)
+        inicio_seccion = time.perf_counter()
 
         st.divider()
 
         # ==================== TAB 1: PARTE DIARIO (JEFE) - VERSIÓN MEJORADA ====================
-        with tab1:
+        if seccion_obra == "Parte Diario":
             st.subheader("Parte Diario del Día")
             hoy = date.today()
 
@@ -3153,9 +3852,9 @@ if st.session_state["auth"] == "jefe":
 
             st.markdown("### Costos")
 
-            # Cargar empleados e insumos
-            empleados_docs = db.collection("empleados").where("codigo_obra", "==", obra_codigo).stream()
-            empleados = [{"id": d.id, **d.to_dict()} for d in empleados_docs]
+            # Cargar empleados (plantel cacheado por obra) e insumos
+            plantel_obra = obtener_plantel(obra_codigo)
+            empleados = plantel_obra["empleados"]
 
             insumos_lista = cargar_insumos()
 
@@ -3172,18 +3871,24 @@ if st.session_state["auth"] == "jefe":
                 if not empleados:
                     st.warning("⚠️ No hay empleados registrados. Ve a 'Gestión de Empleados' para agregar trabajadores.")
                 else:
+                    if len(empleados) > 15:
+                        busqueda_mo = st.text_input("🔎 Buscar empleado (nombre, cargo o DNI)", key=f"buscar_mo_{counter}")
+                        candidatos_mo = buscar_en_plantel(plantel_obra, busqueda_mo)
+                        if not candidatos_mo:
+                            st.info("🔎 Sin resultados para esa búsqueda.")
+                    else:
+                        candidatos_mo = empleados
                     col1, col2 = st.columns(2)
                     with col1:
-                        nombres_empleados = [f"{e['nombre']} - {e['cargo']} (DNI: {e['dni']})" for e in empleados]
                         st.markdown('<p style="margin-bottom: 8px; font-size: 14px; font-weight: 400; color: rgb(49, 51, 63);"><strong>Seleccionar Empleado</strong></p>', unsafe_allow_html=True)
-                        empleado_seleccionado = st.selectbox(
+                        empleado_id_sel = st.selectbox(
                             "Seleccionar Empleado",
-                            nombres_empleados,
+                            [e["id"] for e in candidatos_mo],
+                            format_func=lambda i: plantel_obra["por_id"][i]["etiqueta"],
                             key=f"empleado_mo_{counter}",
                             label_visibility="collapsed"
                         )
-                        idx_emp = nombres_empleados.index(empleado_seleccionado)
-                        empleado_data = empleados[idx_emp]
+                        empleado_data = plantel_obra["por_id"].get(empleado_id_sel)
                     with col2:
                         sueldo_text = st.text_input(
                             "Sueldo del Día (S/.)",
@@ -3198,7 +3903,7 @@ if st.session_state["auth"] == "jefe":
                             if sueldo_text.strip():
                                 st.error("❌ Ingresa un número válido")
 
-                    if st.button("Confirmar Mano de Obra", use_container_width=True, type="primary", key=f"btn_confirmar_mo_{counter}"):
+                    if st.button("Confirmar Mano de Obra", use_container_width=True, type="primary", key=f"btn_confirmar_mo_{counter}", disabled=empleado_data is None):
                         if sueldo_dia <= 0:
                             st.error("❌ El sueldo del día debe ser mayor a 0")
                         else:
@@ -3599,7 +4304,12 @@ if st.session_state["auth"] == "jefe":
                         # Sobrescribir total_general_ejecutado con el total real
                         totales["total_general_ejecutado"] = total_general_cache
 
-                        rutas_fotos = guardar_fotos_avance(obra_codigo, fotos, hoy)
+                        # Token idempotente del formulario: un doble clic o un reintento
+                        # reutiliza el mismo token y no vuelve a subir fotos ni a guardar
+                        token_envio = st.session_state.setdefault(f"token_envio_{counter}", nuevo_id_parte())
+                        if f"fotos_subidas_{token_envio}" not in st.session_state:
+                            st.session_state[f"fotos_subidas_{token_envio}"] = guardar_fotos_avance(obra_codigo, fotos, hoy)
+                        rutas_fotos = st.session_state[f"fotos_subidas_{token_envio}"]
 
                         nuevo_avance = crear_avance_dict(
                             fecha=hoy,
@@ -3621,10 +4331,11 @@ if st.session_state["auth"] == "jefe":
                             totales=totales
                         )
 
-                        exito, mensaje_db = agregar_avance(obra_codigo, nuevo_avance)
+                        exito, mensaje_db, nuevo_avance = registrar_avance(obra_codigo, nuevo_avance, token_envio)
                         if not exito:
                             st.error(f"❌ Error al guardar: {mensaje_db}")
                             return
+                        st.session_state.pop(f"fotos_subidas_{token_envio}", None)
 
                         # ==========================
                         # 🧠 GUARDAR PARA WHATSAPP
@@ -3643,31 +4354,26 @@ if st.session_state["auth"] == "jefe":
                             "rol": "jefe"
                         }
                         st.session_state.pdf_avance = nuevo_avance
-                        st.session_state.pdf_bytes = None
+                        _descartar_pdf_sesion()
 
                         # ==========================
                         # 📤 SUBIR AUTOMÁTICAMENTE A DRIVE
                         # ==========================
                         try:
-                            from modules.pdf_report import build_parte_pdf
                             from modules.drive_upload import upload_pdf_base64
                             
-                            # Generar PDF
-                            pdf_bytes = build_parte_pdf(
-                                obra_codigo=obra_codigo,
-                                obra_nombre=obra_nombre,
-                                avance=nuevo_avance,
-                                rol="jefe"
-                            )
+                            # Generar PDF (el panel reutiliza el mismo archivo)
+                            pdf_path = _avance_to_pdf_archivo(obra_codigo, obra_nombre, nuevo_avance, rol="jefe")
+                            st.session_state.pdf_path = pdf_path
                             
                             webapp_url, token = _get_drive_conf()
                             
-                            if webapp_url and token and pdf_bytes:
+                            if webapp_url and token and pdf_path:
                                 # Nombre del archivo
                                 fecha_str = nuevo_avance.get("fecha", "").replace("-", "")
                                 filename = f"PD_{obra_codigo}_{fecha_str}_JEFE.pdf"
                                 
-                                resultado = upload_pdf_base64(webapp_url, token, obra_codigo, filename, pdf_bytes)
+                                resultado = upload_pdf_base64(webapp_url, token, obra_codigo, filename, Path(pdf_path).read_bytes())
                                 if resultado.get("status") == "success":
                                     st.info(f"📤 PDF subido automáticamente a Drive: {filename}")
                         except Exception as e:
@@ -3824,7 +4530,7 @@ if st.session_state["auth"] == "jefe":
                     st.session_state.show_pdf_panel = False
                     st.session_state.pdf_meta = {}
                     st.session_state.pdf_avance = {}
-                    st.session_state.pdf_bytes = None
+                    _descartar_pdf_sesion()
                     st.rerun()
 
             else:
@@ -3865,9 +4571,33 @@ if st.session_state["auth"] == "jefe":
                 whatsapp_modal()
 
         # ==================== TAB 2: HISTORIAL DE AVANCES (JEFE) ====================
-        with tab2:
+        if seccion_obra == "Historial de Avances":
             st.subheader("Historial de Avances")
-            historial = preparar_historial_avances(obra_codigo)
+
+            grupos_duplicados = detectar_partes_duplicados(avances)
+            if grupos_duplicados:
+                with st.expander(f"⚠️ Posibles partes duplicados ({len(grupos_duplicados)})"):
+                    st.caption("Partes con el mismo responsable, fecha, partida y total ejecutado.")
+                    for grupo in grupos_duplicados:
+                        ref_dup = grupo[0]
+                        total_dup = float((ref_dup.get("totales") or {}).get("total_general_ejecutado", 0) or 0)
+                        st.write(
+                            f"**{ref_dup.get('fecha', '')}** - {ref_dup.get('nombre_partida', '') or 'Sin partida'} "
+                            f"({ref_dup.get('responsable', '')}) · S/. {total_dup:,.2f} · {len(grupo)} registros"
+                        )
+                        # Se conserva el primero; las copias se eliminan descontando su aporte del rollup
+                        for copia in grupo[1:]:
+                            if copia.get("id") and st.button(
+                                f"🗑️ Eliminar copia {copia['id']}", key=f"del_dup_{copia['id']}", type="secondary"
+                            ):
+                                ok_dup, msg_dup = eliminar_avance(obra_codigo, copia["id"])
+                                if ok_dup:
+                                    st.success(f"✅ {msg_dup}")
+                                    st.rerun()
+                                else:
+                                    st.error(f"❌ {msg_dup}")
+
+            historial = _obtener_prefetch(obra_codigo, "historial", firma_prefetch, preparar_historial_avances)
 
             if historial:
                 for item in historial:
@@ -3959,13 +4689,13 @@ if st.session_state["auth"] == "jefe":
                 st.info("No hay partes diarios registrados para esta obra aún.")
 
         # ==================== TAB 3: CRONOGRAMA VALORIZADO (JEFE) ====================
-        with tab3:
+        if seccion_obra == "Cronograma Valorizado":
             st.markdown("## 📊 Cronograma Valorizado y Control de Avance")
             st.caption("Gestiona el cronograma de la obra, visualiza la Curva S y controla los hitos de pago")
 
             # Cargar datos
-            cronograma_all = obtener_cronograma_obra(obra_codigo) or []
-            hitos = obtener_hitos_pago_obra(obra_codigo) or []
+            cronograma_all = _obtener_prefetch(obra_codigo, "cronograma", firma_prefetch, obtener_cronograma_obra) or []
+            hitos = _obtener_prefetch(obra_codigo, "hitos", firma_prefetch, obtener_hitos_pago_obra) or []
 
             for it in cronograma_all:
                 it.setdefault("estado", "Aprobado")
@@ -4080,6 +4810,9 @@ if st.session_state["auth"] == "jefe":
                             st.divider()
 
                 st.markdown("#### ➕ Agregar Nueva Partida")
+
+                with st.expander("📥 Importar cronograma desde CSV/Excel (S10 / MS Project)"):
+                    _render_importacion("cronograma", obra_codigo, key="crono_jefe")
                 
                 if "form_crono_counter" not in st.session_state:
                     st.session_state.form_crono_counter = 0
@@ -4736,23 +5469,22 @@ if st.session_state["auth"] == "jefe":
                         st.info(f"No hay hitos con estado '{filtro_hitos}'")
 
         # ===== TAB: CAJA CHICA =====
-        with tab4:
+        if seccion_obra == "Caja Chica":
             st.markdown("### 💰 Caja Chica")
             mostrar_caja_chica()
 
         # ===== TAB: DONACIONES (PRINCIPAL) =====
-        with tab5:
+        if seccion_obra == "Donaciones":
             st.markdown("### 🎁 Gestión de Donaciones")
             st.caption("Registro de aportes externos efectivo o material/insumo que amplían los recursos del proyecto")
 
             obra_codigo_tab = st.session_state.get("obra_seleccionada", "")
-            presupuesto_actual = obtener_presupuesto_obra(obra_codigo_tab)
-            donaciones_obra = obtener_donaciones_obra(obra_codigo_tab) or []
+            # Los mismos totales del encabezado (obras_resumen), sin volver a leer las donaciones
+            resumen = resumen_don
+            impacto = impacto_don
 
             # Resumen de donaciones
-            if donaciones_obra:
-                resumen = calcular_resumen_donaciones(donaciones_obra)
-                impacto = impacto_donacion_en_presupuesto(presupuesto_actual, donaciones_obra)
+            if resumen["cantidad_donaciones"]:
 
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
@@ -4777,7 +5509,7 @@ if st.session_state["auth"] == "jefe":
                     st.metric(
                         "📋 Cantidad de Donaciones",
                         resumen['cantidad_donaciones'],
-                        help="Número total de donaciones registradas"
+                        help=f"Número total de donaciones registradas ({resumen['cantidad_donantes']} donante(s))"
                     )
 
                 st.divider()
@@ -4847,12 +5579,39 @@ if st.session_state["auth"] == "jefe":
             else:
                 # Modo agregar: valores por defecto
                 tipo_inicial = "Efectivo"
-                nombre_inicial = ""
+                nombre_inicial = st.session_state.get("donante_sugerido", "")
                 cantidad_str = ""
                 unidad_inicial = ""
                 valor_unitario_str = ""
                 descripcion_inicial = ""
 
+            if not st.session_state.modo_edicion_donacion:
+                # Autocompletado de donantes ya registrados (búsqueda por prefijo en Firestore)
+                busqueda_donante = st.text_input(
+                    "🔎 Buscar donante registrado",
+                    placeholder="Escribe el inicio del nombre",
+                    key=f"buscar_donante_{obra_codigo_tab}"
+                )
+                if busqueda_donante.strip():
+                    sugerencias = buscar_donantes(obra_codigo_tab, busqueda_donante)
+                    if sugerencias:
+                        col_sug, col_usar = st.columns([3, 1])
+                        with col_sug:
+                            donante_elegido = st.selectbox(
+                                "Donantes encontrados",
+                                [d.get("nombre", "") for d in sugerencias],
+                                key=f"sugerencia_donante_{obra_codigo_tab}",
+                                label_visibility="collapsed"
+                            )
+                        with col_usar:
+                            if st.button("Usar", use_container_width=True, key=f"usar_donante_{obra_codigo_tab}"):
+                                # Nuevo contador = formulario nuevo con el nombre precargado
+                                st.session_state.donante_sugerido = donante_elegido
+                                st.session_state.form_donacion_counter += 1
+                                st.rerun()
+                    else:
+                        st.caption("Sin coincidencias: se registrará como donante nuevo.")
+
             # Formulario único para agregar/editar
             with st.form(key=f"form_donacion_{st.session_state.form_donacion_counter}"):
                 st.markdown('<p style="margin-bottom: 8px; font-size: 14px; font-weight: 400; color: rgb(49, 51, 63);"><strong>📦 Tipo de Donación</strong></p>', unsafe_allow_html=True)
@@ -5065,6 +5824,7 @@ if st.session_state["auth"] == "jefe":
                         ok, msg = agregar_donacion(obra_codigo_tab, nueva_donacion)
                         if ok:
                             st.success("✅ Donación registrada correctamente")
+                            st.session_state.pop("donante_sugerido", None)
                             st.session_state.form_donacion_counter += 1
                             st.rerun()
                         else:
@@ -5073,12 +5833,10 @@ if st.session_state["auth"] == "jefe":
             st.divider()
 
             # ========== LISTADO DE DONACIONES ==========
-            donaciones_obra = obtener_donaciones_obra(obra_codigo_tab) or []
-
-            if not donaciones_obra:
+            if not resumen["cantidad_donaciones"]:
                 st.info("📭 No hay donaciones registradas para esta obra. ¡Agrega la primera donación!")
             else:
-                st.markdown(f"#### 📋 Historial de Donaciones ({len(donaciones_obra)} registradas)")
+                st.markdown(f"#### 📋 Historial de Donaciones ({resumen['cantidad_donaciones']} registradas)")
 
                 # Filtros
                 col1, col2 = st.columns([1, 3])
@@ -5088,10 +5846,27 @@ if st.session_state["auth"] == "jefe":
                         ["Todas", "Efectivo", "Insumo"],
                         key="filtro_tipo_donacion"
                     )
+                tipo_filtro = None if filtro_tipo_don == "Todas" else filtro_tipo_don
+
+                # Paginación: pila de cursores que se reinicia al cambiar de obra o de filtro
+                if st.session_state.get("don_filtro_actual") != (obra_codigo_tab, tipo_filtro):
+                    st.session_state.don_filtro_actual = (obra_codigo_tab, tipo_filtro)
+                    st.session_state.don_cursores = [None]
+                cursores_don = st.session_state.don_cursores
 
-                donaciones_filtradas = donaciones_obra
-                if filtro_tipo_don != "Todas":
-                    donaciones_filtradas = [d for d in donaciones_obra if d.get("tipo_donacion") == filtro_tipo_don]
+                # Filtro por tipo en el servidor, una página a la vez (la primera sin filtro puede venir adelantada)
+                try:
+                    if tipo_filtro is None and cursores_don[-1] is None:
+                        donaciones_filtradas, siguiente_don = _obtener_prefetch(
+                            obra_codigo_tab, "donaciones", firma_prefetch, listar_donaciones
+                        )
+                    else:
+                        donaciones_filtradas, siguiente_don = listar_donaciones(
+                            obra_codigo_tab, tipo_filtro, despues_de=cursores_don[-1]
+                        )
+                except Exception as e:
+                    st.error(f"❌ No se pudieron cargar las donaciones: {e}")
+                    donaciones_filtradas, siguiente_don = None, None
 
                 if donaciones_filtradas:
                     # Crear encabezados de la tabla con anchos ajustados
@@ -5204,9 +5979,33 @@ if st.session_state["auth"] == "jefe":
                                 if st.button("❌ Cancelar", use_container_width=True, key="cancel_elim_donacion"):
                                     st.session_state.mostrar_confirmacion_eliminar_donacion = False
                                     st.rerun()
-                else:
+                elif donaciones_filtradas == []:
                     st.info("No hay donaciones registradas con este filtro")
 
+                col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+                with col_p1:
+                    if len(cursores_don) > 1 and st.button("← Anterior", key="don_pag_ant", use_container_width=True):
+                        cursores_don.pop()
+                        st.rerun()
+                with col_p2:
+                    st.caption(f"Página {len(cursores_don)}")
+                with col_p3:
+                    if siguiente_don and st.button("Siguiente →", key="don_pag_sig", use_container_width=True):
+                        cursores_don.append(siguiente_don)
+                        st.rerun()
+
+        if seccion_obra == "Productividad":
+            _render_productividad(obra_codigo)
+
+        if seccion_obra == "Materiales":
+            _render_materiales(obra_codigo)
+
+        if seccion_obra == "Flujo de Caja":
+            _render_flujo_caja(obra_codigo)
+
+        _registrar_tiempo_seccion(seccion_obra, inicio_seccion)
+        _prefetch_siguiente_seccion(SECCIONES_OBRA_JEFE, seccion_obra, obra_codigo, firma_prefetch)
+
     # ==================== PANTALLA DE BIENVENIDA ====================
     else:
         st.markdown("""
@@ -5231,18 +6030,42 @@ else:
         mostrar_logo_con_imagen()  # Aquí va el logo con la imagen
         st.divider()
 
-        obras = cargar_obras()
+        # ==================== COLA DE REINTENTOS (SERVIDOR) ====================
+        # Para cuando Firestore no responde. Todo queda en el disco del servidor de
+        # Streamlit (no en el celular) y se pierde si la app se vuelve a desplegar.
+        modo_offline = st.toggle(
+            "📴 Firestore no responde",
+            key="modo_offline",
+            help=(
+                "Usa la última copia de catálogos guardada en el servidor y deja los partes en una cola "
+                "del servidor hasta sincronizar. No funciona sin señal: el celular sigue necesitando "
+                "conectarse a la app, y la cola se pierde si la app se reinicia o se vuelve a desplegar."
+            )
+        )
+        obras_offline = listar_obras_con_snapshot() if modo_offline else {}
         usuario_pasante = st.session_state.get("auth", "")
 
-        obra_cod, obra_nom = obtener_obra_asignada_pasante(obras, usuario_pasante)
-        if not obra_cod:
+        if modo_offline and not obras_offline:
+            st.warning("No hay catálogos guardados en el servidor. Desactiva la opción y espera a que Firestore responda para descargarlos.")
+            st.stop()
+
+        obras = obras_asignadas_usuario(usuario_pasante, listar_obras_con_snapshot if modo_offline else cargar_obras)
+        if modo_offline:
+            # Sin Firestore solo se puede trabajar en obras con catálogos guardados en el servidor
+            obras = {c: n for c, n in obras.items() if c in obras_offline}
+        if not obras:
             st.error(
-                "Este pasante no tiene una obra asignada (no se encontró coincidencia). "
-                "Verifica que el código o nombre de la obra contenga: "
-                "'ventanilla/pachacutec' o 'molina/rinconada'."
+                "Este pasante no tiene una obra asignada. "
+                "Pide al jefe que te asigne desde '👥 Asignar Obras a Usuarios'."
             )
             st.stop()
 
+        if len(obras) > 1:
+            obra_cod = st.selectbox("Obra", list(obras), format_func=lambda c: obras[c], key="obra_pasante")
+        else:
+            obra_cod = next(iter(obras))
+        obra_nom = obras[obra_cod]
+
         if "obra_seleccionada" not in st.session_state or st.session_state.obra_seleccionada != obra_cod:
             st.session_state.obra_seleccionada = obra_cod
             st.session_state.mostrar_form_obra = False
@@ -5259,11 +6082,72 @@ else:
 
         st.subheader("Obra asignada")
         st.info(f"{obra_nom}")
-        st.caption("Rol: PASANTE (solo puede ver su obra asignada)")
+        st.caption("Rol: PASANTE (solo puede ver sus obras asignadas)")
+
+        # Copia de catálogos en el servidor: se descarga una vez por sesión mientras Firestore responda
+        snapshot_offline = cargar_snapshot_catalogos(obra_cod)
+        if not modo_offline and not st.session_state.get(f"snapshot_descargado_{obra_cod}"):
+            ok_snap, _ = descargar_snapshot_catalogos(obra_cod, obra_nom)
+            st.session_state[f"snapshot_descargado_{obra_cod}"] = ok_snap
+            if ok_snap:
+                snapshot_offline = cargar_snapshot_catalogos(obra_cod)
+
+        st.divider()
+        st.markdown("### 📴 Cola de reintentos")
+        if snapshot_offline.get("fecha_snapshot"):
+            st.caption(f"Catálogos guardados en el servidor el {snapshot_offline['fecha_snapshot'].replace('T', ' ')}")
+        else:
+            st.caption("Aún no hay catálogos guardados en el servidor.")
+
+        if not modo_offline and st.button("⬇️ Actualizar copia de catálogos", use_container_width=True, key="btn_snapshot_offline"):
+            ok_snap, msg_snap = descargar_snapshot_catalogos(obra_cod, obra_nom)
+            (st.success if ok_snap else st.error)(msg_snap)
+
+        pendientes_locales = contar_partes_pendientes(obra_cod)
+        if pendientes_locales:
+            st.warning(
+                f"📦 {pendientes_locales} parte(s) en la cola del servidor sin enviar. "
+                "Sincroniza pronto: la cola se pierde si la app se reinicia."
+            )
+            if not modo_offline and st.button("🔄 Sincronizar ahora", use_container_width=True, type="primary", key="btn_sync_offline"):
+                if not verificar_conexion():
+                    st.error("❌ Firestore no responde. Los partes siguen en la cola del servidor.")
+                else:
+                    with st.spinner("Sincronizando partes..."):
+                        res_sync = sincronizar_partes(obra_cod)
+                    limpiar_partes_sincronizados(obra_cod)
+                    st.session_state.resultado_sync_offline = res_sync
+                    st.rerun()
+
+        if st.session_state.get("resultado_sync_offline"):
+            res_sync = st.session_state.resultado_sync_offline
+            st.success(
+                f"✅ Sincronizados: {res_sync['sincronizados']} | "
+                f"⚠️ Conflictos: {res_sync['conflictos']} | ❌ Errores: {res_sync['errores']}"
+            )
+            st.session_state.resultado_sync_offline = None
+
+        conflictos_offline = listar_partes_locales(obra_cod, ESTADO_CONFLICTO)
+        if conflictos_offline:
+            with st.expander(f"⚠️ Conflictos de sincronización ({len(conflictos_offline)})"):
+                for reg in conflictos_offline:
+                    av_conf = reg.get("avance", {})
+                    pid_conf = av_conf.get("id", "")
+                    st.write(f"**{av_conf.get('fecha', '')}** - {av_conf.get('nombre_partida', '')} ({av_conf.get('responsable', '')})")
+                    st.caption(reg.get("detalle", ""))
+                    cc1, cc2 = st.columns(2)
+                    with cc1:
+                        if st.button("Reenviar", key=f"reenviar_{pid_conf}", use_container_width=True, disabled=modo_offline):
+                            resolver_conflicto(obra_cod, pid_conf, "reenviar")
+                            st.rerun()
+                    with cc2:
+                        if st.button("Descartar", key=f"descartar_{pid_conf}", use_container_width=True):
+                            resolver_conflicto(obra_cod, pid_conf, "descartar")
+                            st.rerun()
 
                 # ==================== KPI: Meta Programada ====================
-        cfg_kpi = kpi_cargar_config(obra_cod)
-        st.sidebar.markdown(f"**Meta Programada Hoy:** {float(cfg_kpi.get('avance_programado', 0.0)):.1f}%")
+        programado_hoy, _ = kpi_avance_programado(obra_cod)
+        st.sidebar.markdown(f"**Meta Programada Hoy:** {programado_hoy:.1f}%")
 
 
     st.title("Modo Pasante")
@@ -5274,63 +6158,82 @@ else:
         st.header(f"{obra_nombre}")
         _render_pdf_panel()
 
-        presupuesto = obtener_presupuesto_obra(obra_codigo)
-        avances = obtener_avances_obra(obra_codigo)
-        donaciones_obra = obtener_donaciones_obra(obra_codigo)
-        impacto_don = impacto_donacion_en_presupuesto(presupuesto, donaciones_obra)
-        presupuesto_ampliado = impacto_don["presupuesto_ampliado"]
-        resumen = calcular_resumen_presupuesto(presupuesto_ampliado, avances)
-
-        st.markdown("### 💰 Resumen de Presupuesto (lectura)")
-        col1, col2, col3, col4, col5 = st.columns(5)
-        with col1:
-            delta_don = f"+S/. {impacto_don['total_donaciones']:,.2f}" if impacto_don["total_donaciones"] > 0 else None
-            st.metric("Presupuestado", f"S/. {resumen['presupuestado']:,.2f}", delta=delta_don)
-        with col2:
-            st.metric("Gastado", f"S/. {resumen['gastado']:,.2f}", delta=f"{resumen['porcentaje_gastado']:.1f}%")
-        with col3:
-            st.metric("Disponible", f"S/. {resumen['disponible']:,.2f}")
-        with col4:
-            porcentaje = resumen['porcentaje_gastado']
-            if porcentaje < 50:
-                estado = "🟢 Saludable"
-            elif porcentaje < 80:
-                estado = "🟡 Moderado"
-            elif porcentaje < 100:
-                estado = "🟠 Crítico"
-            else:
-                estado = "🔴 Excedido"
-            st.metric("Estado", estado)
+        if modo_offline:
+            st.info(
+                "📴 Firestore no responde: los partes quedan en la cola del servidor y se envían al sincronizar. "
+                "La cola no sobrevive a un reinicio de la app."
+            )
+            st.divider()
+        else:
+            # Lectura del rollup: el pasante no necesita descargar todos los partes aquí
+            rollup_obra = obtener_rollup_obra(obra_codigo)
+            avances = None if rollup_obra else obtener_avances_obra(obra_codigo)
+            presupuesto = rollup_obra["presupuesto_total"] if rollup_obra else obtener_presupuesto_obra(obra_codigo)
+            resumen_don = _resumen_donaciones(obra_codigo)
+            impacto_don = impacto_donaciones_desde_total(presupuesto, resumen_don["total_general"])
+            presupuesto_ampliado = impacto_don["presupuesto_ampliado"]
+            resumen = calcular_resumen_presupuesto(
+                presupuesto_ampliado, avances,
+                gastado=rollup_obra.get("gastado_total") if rollup_obra else None
+            )
 
-        with col5:
-            st.metric("Donaciones", f"S/. {impacto_don['total_donaciones']:,.2f}")
+            st.markdown("### 💰 Resumen de Presupuesto (lectura)")
+            col1, col2, col3, col4, col5 = st.columns(5)
+            with col1:
+                delta_don = f"+S/. {impacto_don['total_donaciones']:,.2f}" if impacto_don["total_donaciones"] > 0 else None
+                st.metric("Presupuestado", f"S/. {resumen['presupuestado']:,.2f}", delta=delta_don)
+            with col2:
+                st.metric("Gastado", f"S/. {resumen['gastado']:,.2f}", delta=f"{resumen['porcentaje_gastado']:.1f}%")
+            with col3:
+                st.metric("Disponible", f"S/. {resumen['disponible']:,.2f}")
+            with col4:
+                porcentaje = resumen['porcentaje_gastado']
+                if porcentaje < 50:
+                    estado = "🟢 Saludable"
+                elif porcentaje < 80:
+                    estado = "🟡 Moderado"
+                elif porcentaje < 100:
+                    estado = "🟠 Crítico"
+                else:
+                    estado = "🔴 Excedido"
+                st.metric("Estado", estado)
 
-        st.progress(min(resumen['porcentaje_gastado'] / 100, 1.0))
-        st.divider()
+            with col5:
+                st.metric("Donaciones", f"S/. {impacto_don['total_donaciones']:,.2f}")
 
-        eficiencia_promedio = calcular_eficiencia_promedio_obra(avances)
-        emoji_rendimiento, texto_rendimiento, _ = obtener_estado_rendimiento(eficiencia_promedio)
+            st.progress(min(resumen['porcentaje_gastado'] / 100, 1.0))
+            st.divider()
 
-        st.markdown("### 📊 Rendimiento de Mano de Obra (lectura)")
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            st.metric("Eficiencia Promedio", f"{eficiencia_promedio:.1f}%")
-        with c2:
-            st.metric("Estado", f"{emoji_rendimiento} {texto_rendimiento}")
-        with c3:
-            if eficiencia_promedio >= 100:
-                st.metric("Superávit", f"+{eficiencia_promedio - 100:.1f}%")
-            else:
-                st.metric("Déficit", f"-{100 - eficiencia_promedio:.1f}%")
+            eficiencia_promedio = (
+                calcular_eficiencia_desde_rollup(rollup_obra) if rollup_obra
+                else calcular_eficiencia_promedio_obra(avances)
+            )
+            emoji_rendimiento, texto_rendimiento, _ = obtener_estado_rendimiento(eficiencia_promedio)
+
+            st.markdown("### 📊 Rendimiento de Mano de Obra (lectura)")
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                st.metric("Eficiencia Promedio", f"{eficiencia_promedio:.1f}%")
+            with c2:
+                st.metric("Estado", f"{emoji_rendimiento} {texto_rendimiento}")
+            with c3:
+                if eficiencia_promedio >= 100:
+                    st.metric("Superávit", f"+{eficiencia_promedio - 100:.1f}%")
+                else:
+                    st.metric("Déficit", f"-{100 - eficiencia_promedio:.1f}%")
 
-        if eficiencia_promedio > 0:
-            st.progress(min(eficiencia_promedio / 100, 1.0))
-        st.divider()
+            if eficiencia_promedio > 0:
+                st.progress(min(eficiencia_promedio / 100, 1.0))
+            st.divider()
 
-        tab1, tab2, tab3 = st.tabs(["Parte Diario", "Historial de Avances", "Cronograma Valorizado"])
+        seccion_obra = _selector_seccion(SECCIONES_OBRA_PASANTE, "seccion_obra_pasante")
+        if seccion_obra != "Parte Diario":
+            _preservar_estado_widgets(PREFIJOS_ESTADO_PARTE)
+        firma_prefetch = _firma_prefetch(None, None) if modo_offline else _firma_prefetch(rollup_obra, resumen_don)
+        inicio_seccion = time.perf_counter()
 
         # ==================== TAB 1: PARTE DIARIO (PASANTE) - VERSIÓN MEJORADA ====================
-        with tab1:
+        if seccion_obra == "Parte Diario":
             st.subheader("Parte Diario del Día")
             hoy = date.today()
 
@@ -5348,6 +6251,52 @@ else:
 
             counter = st.session_state.form_parte_diario_counter
 
+            # Catálogos: desde Firestore o desde la copia del servidor si Firestore no responde
+            if modo_offline:
+                catalogos_offline = cargar_snapshot_catalogos(obra_codigo)
+                cronograma_partidas = catalogos_offline["cronograma"]
+            else:
+                cronograma_partidas = obtener_cronograma_obra(obra_codigo) or []
+            nombres_partidas = [p.get("nombre", "Sin nombre") for p in cronograma_partidas if p.get("estado") == "Aprobado"]
+
+            # ==================== BORRADOR ====================
+            CAMPOS_BORRADOR_PAS = [
+                "responsable_input_pas", "avance_input_pas", "partida_selectbox_pas",
+                "name_partida_otra_pas", "cantidad_ejecutada_pas", "unidad_input_pas",
+                "descripcion_avance_pas", "horas_input_pas", "rendimiento_input_pas",
+                "precio_venta_pas", "obs_final_pas",
+            ]
+            LISTAS_BORRADOR_PAS = [
+                "insumos_mo_confirmados", "insumos_mat_confirmados",
+                "insumos_eq_confirmados", "insumos_otros_confirmados",
+            ]
+            usuario_borrador = st.session_state.get("auth", "") or "pasante"
+            borrador = cargar_borrador(obra_codigo, usuario_borrador)
+
+            if borrador and not st.session_state.get(f"borrador_aplicado_{counter}"):
+                st.info(f"📝 Tienes un borrador guardado el {str(borrador.get('guardado_en', '')).replace('T', ' ')}")
+                cb1, cb2 = st.columns(2)
+                with cb1:
+                    if st.button("↩️ Restaurar borrador", use_container_width=True, key=f"restaurar_borrador_pas_{counter}"):
+                        campos = dict(borrador.get("campos", {}))
+                        # La partida guardada puede ya no existir en el cronograma
+                        partida_guardada = campos.get("partida_selectbox_pas")
+                        if partida_guardada and not partida_guardada.startswith("➕") and partida_guardada not in nombres_partidas:
+                            campos["partida_selectbox_pas"] = "➕ Otra partida (especificar)"
+                            campos["name_partida_otra_pas"] = partida_guardada
+                        for campo, valor in campos.items():
+                            if valor is not None:
+                                st.session_state[f"{campo}_{counter}"] = valor
+                        for lista in LISTAS_BORRADOR_PAS:
+                            st.session_state[lista] = list(borrador.get(lista, []))
+                        st.session_state[f"fotos_borrador_{counter}"] = cargar_fotos_borrador(obra_codigo, usuario_borrador)
+                        st.session_state[f"borrador_aplicado_{counter}"] = True
+                        st.rerun()
+                with cb2:
+                    if st.button("🗑️ Descartar borrador", use_container_width=True, key=f"descartar_borrador_pas_{counter}"):
+                        eliminar_borrador(obra_codigo, usuario_borrador)
+                        st.rerun()
+
             st.markdown("### Información General")
             col1, col2 = st.columns(2)
 
@@ -5358,9 +6307,7 @@ else:
             with col2:
                 avance = st.slider("Avance logrado hoy (%)", 0, 30, 5, key=f"avance_input_pas_{counter}")
 
-            # Cargar partidas del cronograma para el selectbox
-            cronograma_partidas = obtener_cronograma_obra(obra_codigo) or []
-            nombres_partidas = [p.get("nombre", "Sin nombre") for p in cronograma_partidas if p.get("estado") == "Aprobado"]
+            # Opciones del selectbox a partir del cronograma cargado arriba
             opciones_partidas = nombres_partidas + ["➕ Otra partida (especificar)"]
             
             col1, col2 = st.columns(2)
@@ -5458,10 +6405,13 @@ else:
             st.markdown("### Costos")
 
             # Cargar empleados e insumos
-            empleados_docs = db.collection("empleados").where("codigo_obra", "==", obra_codigo).stream()
-            empleados = [{"id": d.id, **d.to_dict()} for d in empleados_docs]
-
-            insumos_lista = cargar_insumos()
+            if modo_offline:
+                plantel_obra = construir_plantel(catalogos_offline["empleados"])
+                insumos_lista = catalogos_offline["insumos"]
+            else:
+                plantel_obra = obtener_plantel(obra_codigo)
+                insumos_lista = cargar_insumos()
+            empleados = plantel_obra["empleados"]
 
             tab_mo, tab_mat, tab_eq, tab_otros = st.tabs(["Mano de Obra", "Materiales", "Equipos", "Otros"])
 
@@ -5476,18 +6426,24 @@ else:
                 if not empleados:
                     st.warning("⚠️ No hay empleados registrados. Consulta con el jefe de obra.")
                 else:
+                    if len(empleados) > 15:
+                        busqueda_mo = st.text_input("🔎 Buscar empleado (nombre, cargo o DNI)", key=f"buscar_mo_pas_{counter}")
+                        candidatos_mo = buscar_en_plantel(plantel_obra, busqueda_mo)
+                        if not candidatos_mo:
+                            st.info("🔎 Sin resultados para esa búsqueda.")
+                    else:
+                        candidatos_mo = empleados
                     col1, col2 = st.columns(2)
                     with col1:
-                        nombres_empleados = [f"{e['nombre']} - {e['cargo']} (DNI: {e['dni']})" for e in empleados]
                         st.markdown('<p style="margin-bottom: 8px; font-size: 14px; font-weight: 400; color: rgb(49, 51, 63);"><strong>Seleccionar Empleado</strong></p>', unsafe_allow_html=True)
-                        empleado_seleccionado = st.selectbox(
+                        empleado_id_sel = st.selectbox(
                             "Seleccionar Empleado",
-                            nombres_empleados,
+                            [e["id"] for e in candidatos_mo],
+                            format_func=lambda i: plantel_obra["por_id"][i]["etiqueta"],
                             key=f"empleado_mo_pas_{counter}",
                             label_visibility="collapsed"
                         )
-                        idx_emp = nombres_empleados.index(empleado_seleccionado)
-                        empleado_data = empleados[idx_emp]
+                        empleado_data = plantel_obra["por_id"].get(empleado_id_sel)
                     with col2:
                         sueldo_text = st.text_input(
                             "Sueldo del Día (S/.)",
@@ -5502,7 +6458,7 @@ else:
                             if sueldo_text.strip():
                                 st.error("❌ Ingresa un número válido")
 
-                    if st.button("Confirmar Mano de Obra", use_container_width=True, type="primary", key=f"btn_confirmar_mo_pas_{counter}"):
+                    if st.button("Confirmar Mano de Obra", use_container_width=True, type="primary", key=f"btn_confirmar_mo_pas_{counter}", disabled=empleado_data is None):
                         if sueldo_dia <= 0:
                             st.error("❌ El sueldo del día debe ser mayor a 0")
                         else:
@@ -5864,6 +6820,19 @@ else:
             st.markdown("### Finalizar Parte Diario")
             obs = st.text_area("Observaciones", key=f"obs_final_pas_{counter}")
             fotos = st.file_uploader("Fotos del avance", accept_multiple_files=True, type=["jpg", "png", "jpeg"], key=f"fotos_final_pas_{counter}")
+            fotos_borrador = st.session_state.get(f"fotos_borrador_{counter}", [])
+            if fotos_borrador:
+                st.caption(f"📷 {len(fotos_borrador)} foto(s) recuperada(s) del borrador")
+                fotos = list(fotos or []) + fotos_borrador
+
+            if st.button("💾 Guardar borrador", use_container_width=True, key=f"guardar_borrador_pas_{counter}"):
+                datos_borrador = {
+                    "campos": {c: st.session_state.get(f"{c}_{counter}") for c in CAMPOS_BORRADOR_PAS},
+                }
+                for lista in LISTAS_BORRADOR_PAS:
+                    datos_borrador[lista] = st.session_state.get(lista, [])
+                guardar_borrador(obra_codigo, usuario_borrador, datos_borrador, fotos)
+                st.success("💾 Borrador guardado en el servidor")
 
             st.session_state["cantidad_ejecutada_cache"] = cantidad_ejecutada
             st.session_state["unidad_medida_cache"] = unidad_medida
@@ -5902,11 +6871,21 @@ else:
                         # Sobrescribir total_general_ejecutado con el total real
                         totales["total_general_ejecutado"] = total_general_cache
 
-                        rutas_fotos = guardar_fotos_avance(
-                            obra_codigo,
-                            fotos,
-                            hoy
-                        )
+                        # Token idempotente del formulario: un doble clic o un reintento
+                        # reutiliza el mismo token y no vuelve a subir fotos ni a guardar
+                        token_envio = st.session_state.setdefault(f"token_envio_pas_{counter}", nuevo_id_parte())
+
+                        # Sin Firestore las fotos se suben al sincronizar
+                        if modo_offline:
+                            rutas_fotos = []
+                        else:
+                            if f"fotos_subidas_{token_envio}" not in st.session_state:
+                                st.session_state[f"fotos_subidas_{token_envio}"] = guardar_fotos_avance(
+                                    obra_codigo,
+                                    fotos,
+                                    hoy
+                                )
+                            rutas_fotos = st.session_state[f"fotos_subidas_{token_envio}"]
 
                         # 🧱 AVANCE REGISTRADO POR PASANTE
                         nuevo_avance = crear_avance_dict(
@@ -5929,18 +6908,52 @@ else:
                             insumos_mat=st.session_state.insumos_mat_confirmados,
                             insumos_eq=st.session_state.insumos_eq_confirmados,
                             insumos_otros=st.session_state.insumos_otros_confirmados,
-                            totales=totales
+                            totales=totales,
+                            estado="Pendiente"  # el jefe lo revisa en Reportes de Asistentes
                         )
 
+                        if modo_offline:
+                            exito, mensaje_db = guardar_parte_offline(obra_codigo, {**nuevo_avance, "id": token_envio}, fotos)
+                            if not exito:
+                                st.error(f"❌ {mensaje_db}")
+                                return
+
+                            eliminar_borrador(obra_codigo, usuario_borrador)
+                            st.session_state.insumos_mo_confirmados = []
+                            st.session_state.insumos_mat_confirmados = []
+                            st.session_state.insumos_eq_confirmados = []
+                            st.session_state.insumos_otros_confirmados = []
+                            st.session_state.form_parte_diario_counter += 1
+
+                            st.success(f"📦 {mensaje_db}")
+                            st.rerun()
+
                         #  Guardar SOLO avance (no toca presupuesto / hitos)
-                        exito, mensaje_db = agregar_avance(
+                        exito, mensaje_db, nuevo_avance = registrar_avance(
                             obra_codigo,
-                            nuevo_avance
+                            nuevo_avance,
+                            token_envio
                         )
 
                         if not exito:
-                            st.error(f"❌ Error al guardar: {mensaje_db}")
-                            return
+                            # Se deja en la cola del servidor con las fotos ya subidas; el
+                            # token es el mismo, así que sincronizar no lo duplica
+                            en_cola, mensaje_cola = guardar_parte_offline(obra_codigo, {**nuevo_avance, "id": token_envio}, [])
+                            if not en_cola:
+                                st.error(f"❌ Error al guardar: {mensaje_db}")
+                                return
+                            st.session_state.pop(f"fotos_subidas_{token_envio}", None)
+                            eliminar_borrador(obra_codigo, usuario_borrador)
+                            st.session_state.insumos_mo_confirmados = []
+                            st.session_state.insumos_mat_confirmados = []
+                            st.session_state.insumos_eq_confirmados = []
+                            st.session_state.insumos_otros_confirmados = []
+                            st.session_state.form_parte_diario_counter += 1
+                            st.warning(f"⚠️ No se pudo guardar en Firestore ({mensaje_db}). {mensaje_cola}")
+                            st.rerun()
+                        st.session_state.pop(f"fotos_subidas_{token_envio}", None)
+
+                        eliminar_borrador(obra_codigo, usuario_borrador)
 
                         # ==========================
                         # GUARDAR PARA WHATSAPP
@@ -5959,31 +6972,26 @@ else:
                             "rol": "pasante"
                         }
                         st.session_state.pdf_avance = nuevo_avance
-                        st.session_state.pdf_bytes = None
+                        _descartar_pdf_sesion()
 
                         # ==========================
                         # 📤 SUBIR AUTOMÁTICAMENTE A DRIVE
                         # ==========================
                         try:
-                            from modules.pdf_report import build_parte_pdf
                             from modules.drive_upload import upload_pdf_base64
                             
-                            # Generar PDF
-                            pdf_bytes = build_parte_pdf(
-                                obra_codigo=obra_codigo,
-                                obra_nombre=obra_nombre,
-                                avance=nuevo_avance,
-                                rol="pasante"
-                            )
+                            # Generar PDF (el panel reutiliza el mismo archivo)
+                            pdf_path = _avance_to_pdf_archivo(obra_codigo, obra_nombre, nuevo_avance, rol="pasante")
+                            st.session_state.pdf_path = pdf_path
                             
                             webapp_url, token = _get_drive_conf()
                             
-                            if webapp_url and token and pdf_bytes:
+                            if webapp_url and token and pdf_path:
                                 # Nombre del archivo
                                 fecha_str = nuevo_avance.get("fecha", "").replace("-", "")
                                 filename = f"PD_{obra_codigo}_{fecha_str}_PASANTE.pdf"
                                 
-                                resultado = upload_pdf_base64(webapp_url, token, obra_codigo, filename, pdf_bytes)
+                                resultado = upload_pdf_base64(webapp_url, token, obra_codigo, filename, Path(pdf_path).read_bytes())
                                 if resultado.get("status") == "success":
                                     st.info(f"📤 PDF subido automáticamente a Drive: {filename}")
                         except Exception as e:
@@ -6074,7 +7082,7 @@ else:
                     st.session_state.show_pdf_panel = False
                     st.session_state.pdf_meta = {}
                     st.session_state.pdf_avance = {}
-                    st.session_state.pdf_bytes = None
+                    _descartar_pdf_sesion()
                     st.rerun()
 
             else:
@@ -6111,264 +7119,274 @@ else:
             if st.session_state.get("abrir_whatsapp_modal", False):
                 whatsapp_modal()
         # ==================== TAB 2: HISTORIAL (PASANTE) ====================
-        with tab2:
-            st.subheader("Historial de Avances")
-            historial = preparar_historial_avances(obra_codigo)
-
-            if historial:
-                for item in historial:
-                    with st.expander(f"📅 {item['fecha_fmt']} - {item['responsable']} ({item['avance_pct']}%)"):
-                        st.write("**Responsable:**", item["responsable"])
-                        st.write("**Avance del día:**", f"{item['avance_pct']}%")
-                        if item.get("obs"):
-                            st.markdown("### 📝 Observaciones")
-                            st.write(item["obs"])
-                        if item.get("fotos"):
-                            st.markdown("### 📷 Fotos del avance")
-                            cols = st.columns(min(len(item["fotos"]), 3))
-                            for i, foto_path in enumerate(item["fotos"]):
-                                target = cols[i % 3]
-                                if foto_path and os.path.exists(foto_path):
-                                    target.image(foto_path, caption=os.path.basename(foto_path))
-                                else:
-                                    target.warning(f"No se encontró la imagen: {os.path.basename(foto_path) if foto_path else 'Archivo no especificado'}")
+        if seccion_obra == "Historial de Avances":
+            if modo_offline:
+                st.info("📴 No disponible mientras Firestore no responde. Sincroniza para ver la información actualizada.")
             else:
-                st.info("No hay partes diarios registrados para esta obra aún.")
+                st.subheader("Historial de Avances")
+                historial = _obtener_prefetch(obra_codigo, "historial", firma_prefetch, preparar_historial_avances)
+
+                if historial:
+                    for item in historial:
+                        with st.expander(f"📅 {item['fecha_fmt']} - {item['responsable']} ({item['avance_pct']}%)"):
+                            st.write("**Responsable:**", item["responsable"])
+                            st.write("**Avance del día:**", f"{item['avance_pct']}%")
+                            if item.get("obs"):
+                                st.markdown("### 📝 Observaciones")
+                                st.write(item["obs"])
+                            if item.get("fotos"):
+                                st.markdown("### 📷 Fotos del avance")
+                                cols = st.columns(min(len(item["fotos"]), 3))
+                                for i, foto_path in enumerate(item["fotos"]):
+                                    target = cols[i % 3]
+                                    if foto_path and os.path.exists(foto_path):
+                                        target.image(foto_path, caption=os.path.basename(foto_path))
+                                    else:
+                                        target.warning(f"No se encontró la imagen: {os.path.basename(foto_path) if foto_path else 'Archivo no especificado'}")
+                else:
+                    st.info("No hay partes diarios registrados para esta obra aún.")
 
         # ==================== TAB 3: CRONOGRAMA (PASANTE) ====================
-        with tab3:
-            st.subheader("Cronograma Valorizado (Pasante)")
-            st.caption("Puedes registrar Partidas e Hitos como PENDIENTE. El JEFE los aprueba/edita. Puedes eliminar lo que tú mismo registraste si te equivocas (recomendado: solo si sigue Pendiente).")
+        if seccion_obra == "Cronograma Valorizado":
+            if modo_offline:
+                st.info("📴 No disponible mientras Firestore no responde. Sincroniza para ver la información actualizada.")
+            else:
+                st.subheader("Cronograma Valorizado (Pasante)")
+                st.caption("Puedes registrar Partidas e Hitos como PENDIENTE. El JEFE los aprueba/edita. Puedes eliminar lo que tú mismo registraste si te equivocas (recomendado: solo si sigue Pendiente).")
 
-            usuario_actual = st.session_state.get("usuario_logueado") or st.session_state.get("auth") or "pasante"
+                usuario_actual = st.session_state.get("usuario_logueado") or st.session_state.get("auth") or "pasante"
 
-            cronograma_all = obtener_cronograma_obra(obra_codigo) or []
-            hitos_all = obtener_hitos_pago_obra(obra_codigo) or []
+                cronograma_all = _obtener_prefetch(obra_codigo, "cronograma", firma_prefetch, obtener_cronograma_obra) or []
+                hitos_all = _obtener_prefetch(obra_codigo, "hitos", firma_prefetch, obtener_hitos_pago_obra) or []
 
-            for it in cronograma_all:
-                it.setdefault("estado", "Aprobado")
-                it.setdefault("creado_por", "jefe")
-            for h in hitos_all:
-                h.setdefault("estado", "Pendiente")
-                h.setdefault("creado_por", "jefe")
+                for it in cronograma_all:
+                    it.setdefault("estado", "Aprobado")
+                    it.setdefault("creado_por", "jefe")
+                for h in hitos_all:
+                    h.setdefault("estado", "Pendiente")
+                    h.setdefault("creado_por", "jefe")
 
-            st.markdown("### 1) Partidas del Cronograma (Solicitudes)")
-            if "form_crono_counter_pas" not in st.session_state:
-                st.session_state.form_crono_counter_pas = 0
+                st.markdown("### 1) Partidas del Cronograma (Solicitudes)")
+                if "form_crono_counter_pas" not in st.session_state:
+                    st.session_state.form_crono_counter_pas = 0
 
-            with st.form(key=f"form_add_crono_pas_{st.session_state.form_crono_counter_pas}"):
-                c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
-                with c1:
-                    crono_nombre = st.text_input("Partida", placeholder="Ej: Cimentación")
-                with c2:
-                    crono_inicio = st.date_input("Inicio", value=date.today())
-                with c3:
-                    crono_fin = st.date_input("Fin", value=date.today())
-                with c4:
-                    # Campo de monto estilo Yape para pasante
-                    crono_monto_text = st.text_input(
-                        "Monto (S/.)",
-                        placeholder="0",
-                        key=f"crono_monto_pas_{st.session_state.form_crono_counter_pas}"
-                    )
-                    try:
-                        crono_monto = float(crono_monto_text) if crono_monto_text.strip() else 0.0
-                    except ValueError:
-                        crono_monto = 0.0
-                        if crono_monto_text.strip():
-                            st.error("❌ Ingresa un número válido")
-                crono_desc = st.text_input("Descripción (opcional)", placeholder="Ej: concreto f'c 210")
+                with st.form(key=f"form_add_crono_pas_{st.session_state.form_crono_counter_pas}"):
+                    c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
+                    with c1:
+                        crono_nombre = st.text_input("Partida", placeholder="Ej: Cimentación")
+                    with c2:
+                        crono_inicio = st.date_input("Inicio", value=date.today())
+                    with c3:
+                        crono_fin = st.date_input("Fin", value=date.today())
+                    with c4:
+                        # Campo de monto estilo Yape para pasante
+                        crono_monto_text = st.text_input(
+                            "Monto (S/.)",
+                            placeholder="0",
+                            key=f"crono_monto_pas_{st.session_state.form_crono_counter_pas}"
+                        )
+                        try:
+                            crono_monto = float(crono_monto_text) if crono_monto_text.strip() else 0.0
+                        except ValueError:
+                            crono_monto = 0.0
+                            if crono_monto_text.strip():
+                                st.error("❌ Ingresa un número válido")
+                    crono_desc = st.text_input("Descripción (opcional)", placeholder="Ej: concreto f'c 210")
 
-                if st.form_submit_button("Enviar Solicitud (Pendiente)", use_container_width=True, type="primary"):
-                    ok, msg = validar_partida_cronograma(crono_nombre, crono_inicio, crono_fin, crono_monto)
-                    if not ok:
-                        st.error(f"❌ {msg}")
-                    else:
-                        partida = {
-                            "nombre": crono_nombre.strip(),
-                            "fecha_inicio": str(crono_inicio),
-                            "fecha_fin": str(crono_fin),
-                            "monto_planificado": float(crono_monto),
-                            "descripcion": crono_desc.strip(),
-                            "estado": "Pendiente",
-                            "creado_por": usuario_actual,
-                        }
-                        ok2, msg2 = agregar_partida_cronograma(obra_codigo, partida)
-                        if ok2:
-                            st.success("✅ Solicitud enviada (Pendiente).")
-                            st.session_state.form_crono_counter_pas += 1
-                            st.rerun()
+                    if st.form_submit_button("Enviar Solicitud (Pendiente)", use_container_width=True, type="primary"):
+                        ok, msg = validar_partida_cronograma(crono_nombre, crono_inicio, crono_fin, crono_monto)
+                        if not ok:
+                            st.error(f"❌ {msg}")
                         else:
-                            st.error(f"❌ {msg2}")
+                            partida = {
+                                "nombre": crono_nombre.strip(),
+                                "fecha_inicio": str(crono_inicio),
+                                "fecha_fin": str(crono_fin),
+                                "monto_planificado": float(crono_monto),
+                                "descripcion": crono_desc.strip(),
+                                "estado": "Pendiente",
+                                "creado_por": usuario_actual,
+                            }
+                            ok2, msg2 = agregar_partida_cronograma(obra_codigo, partida)
+                            if ok2:
+                                st.success("✅ Solicitud enviada (Pendiente).")
+                                st.session_state.form_crono_counter_pas += 1
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {msg2}")
 
-            cronograma_all = obtener_cronograma_obra(obra_codigo) or []
-            for it in cronograma_all:
-                it.setdefault("estado", "Aprobado")
-                it.setdefault("creado_por", "jefe")
+                cronograma_all = obtener_cronograma_obra(obra_codigo) or []
+                for it in cronograma_all:
+                    it.setdefault("estado", "Aprobado")
+                    it.setdefault("creado_por", "jefe")
 
-            if cronograma_all:
-                dfc = pd.DataFrame(cronograma_all)
-                cols_pref = ["estado", "creado_por", "nombre", "fecha_inicio", "fecha_fin", "monto_planificado", "descripcion"]
-                cols = [c for c in cols_pref if c in dfc.columns] + [c for c in dfc.columns if c not in cols_pref]
-                st.dataframe(
-                    dfc[cols].rename(columns={
-                        "estado": "Estado",
-                        "creado_por": "Creado por",
-                        "nombre": "Partida",
-                        "fecha_inicio": "Inicio",
-                        "fecha_fin": "Fin",
-                        "monto_planificado": "Monto Planificado (S/.)",
-                        "descripcion": "Descripción",
-                    }),
-                    use_container_width=True,
-                    hide_index=True
-                )
-            else:
-                st.info("Aún no hay partidas registradas en la obra.")
-
-            propias_pendientes = [it for it in cronograma_all if it.get("creado_por") == usuario_actual and it.get("estado") == "Pendiente"]
-            if propias_pendientes:
-                st.markdown("#### Eliminar Partida (solo tus solicitudes Pendiente)")
-                opciones_del = [
-                    f"{i+1}. {it.get('nombre','(sin nombre)')} | {it.get('fecha_inicio','')} → {it.get('fecha_fin','')} | S/. {float(it.get('monto_planificado',0) or 0):,.2f}"
-                    for i, it in enumerate(propias_pendientes)
-                ]
-                if "idx_del_crono_pas" not in st.session_state:
-                    st.session_state.idx_del_crono_pas = 0
-
-                sel_del = st.selectbox(
-                    "Selecciona tu partida Pendiente",
-                    opciones_del,
-                    index=min(st.session_state.idx_del_crono_pas, len(opciones_del)-1),
-                    key="sel_del_crono_pas"
-                )
-                st.session_state.idx_del_crono_pas = opciones_del.index(sel_del)
-                item_del = propias_pendientes[st.session_state.idx_del_crono_pas]
-                pid = item_del.get("id")
+                if cronograma_all:
+                    dfc = pd.DataFrame(cronograma_all)
+                    cols_pref = ["estado", "creado_por", "nombre", "fecha_inicio", "fecha_fin", "monto_planificado", "descripcion"]
+                    cols = [c for c in cols_pref if c in dfc.columns] + [c for c in dfc.columns if c not in cols_pref]
+                    st.dataframe(
+                        dfc[cols].rename(columns={
+                            "estado": "Estado",
+                            "creado_por": "Creado por",
+                            "nombre": "Partida",
+                            "fecha_inicio": "Inicio",
+                            "fecha_fin": "Fin",
+                            "monto_planificado": "Monto Planificado (S/.)",
+                            "descripcion": "Descripción",
+                        }),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                else:
+                    st.info("Aún no hay partidas registradas en la obra.")
+
+                propias_pendientes = [it for it in cronograma_all if it.get("creado_por") == usuario_actual and it.get("estado") == "Pendiente"]
+                if propias_pendientes:
+                    st.markdown("#### Eliminar Partida (solo tus solicitudes Pendiente)")
+                    opciones_del = [
+                        f"{i+1}. {it.get('nombre','(sin nombre)')} | {it.get('fecha_inicio','')} → {it.get('fecha_fin','')} | S/. {float(it.get('monto_planificado',0) or 0):,.2f}"
+                        for i, it in enumerate(propias_pendientes)
+                    ]
+                    if "idx_del_crono_pas" not in st.session_state:
+                        st.session_state.idx_del_crono_pas = 0
+
+                    sel_del = st.selectbox(
+                        "Selecciona tu partida Pendiente",
+                        opciones_del,
+                        index=min(st.session_state.idx_del_crono_pas, len(opciones_del)-1),
+                        key="sel_del_crono_pas"
+                    )
+                    st.session_state.idx_del_crono_pas = opciones_del.index(sel_del)
+                    item_del = propias_pendientes[st.session_state.idx_del_crono_pas]
+                    pid = item_del.get("id")
 
-                if st.button("🗑️ Eliminar Partida Seleccionada", use_container_width=True, type="secondary", key="btn_del_crono_pas"):
-                    if not pid:
-                        st.error("❌ No se encontró ID para eliminar esta partida.")
-                    else:
-                        okd, msgd = eliminar_partida_cronograma(obra_codigo, pid)
-                        if okd:
-                            st.success("✅ Partida eliminada.")
-                            st.session_state.idx_del_crono_pas = 0
-                            st.rerun()
+                    if st.button("🗑️ Eliminar Partida Seleccionada", use_container_width=True, type="secondary", key="btn_del_crono_pas"):
+                        if not pid:
+                            st.error("❌ No se encontró ID para eliminar esta partida.")
                         else:
-                            st.error(f"❌ {msgd}")
+                            okd, msgd = eliminar_partida_cronograma(obra_codigo, pid)
+                            if okd:
+                                st.success("✅ Partida eliminada.")
+                                st.session_state.idx_del_crono_pas = 0
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {msgd}")
 
-            st.divider()
+                st.divider()
 
-            st.markdown("### 2) Curva S (Plan vs Real)")
-            render_curva_s(obtener_cronograma_obra(obra_codigo) or [], avances, rol="pasante")
+                st.markdown("### 2) Curva S (Plan vs Real)")
+                render_curva_s(obtener_cronograma_obra(obra_codigo) or [], obtener_avances_obra(obra_codigo), rol="pasante")
 
-            st.divider()
+                st.divider()
 
-            st.markdown("### 3) Hitos de Pago (Solicitudes)")
-            st.caption("Se guardan como Pendiente. Puedes eliminar solo los que tú creaste y estén Pendiente.")
+                st.markdown("### 3) Hitos de Pago (Solicitudes)")
+                st.caption("Se guardan como Pendiente. Puedes eliminar solo los que tú creaste y estén Pendiente.")
 
-            if "form_hito_counter_pas" not in st.session_state:
-                st.session_state.form_hito_counter_pas = 0
+                if "form_hito_counter_pas" not in st.session_state:
+                    st.session_state.form_hito_counter_pas = 0
 
-            with st.form(key=f"form_add_hito_pas_{st.session_state.form_hito_counter_pas}"):
-                c1, c2, c3 = st.columns([2, 1, 1])
-                with c1:
-                    h_desc = st.text_input("Descripción", placeholder="Ej: Valorización N°01")
-                with c2:
-                    h_fecha = st.date_input("Fecha", value=date.today())
-                with c3:
-                    # Campo de monto estilo Yape para pasante
-                    h_monto_text = st.text_input(
-                        "Monto (S/.)",
-                        placeholder="0",
-                        key=f"hito_monto_pas_{st.session_state.form_hito_counter_pas}"
-                    )
-                    try:
-                        h_monto = float(h_monto_text) if h_monto_text.strip() else 0.0
-                    except ValueError:
-                        h_monto = 0.0
-                        if h_monto_text.strip():
-                            st.error("❌ Ingresa un número válido")
+                with st.form(key=f"form_add_hito_pas_{st.session_state.form_hito_counter_pas}"):
+                    c1, c2, c3 = st.columns([2, 1, 1])
+                    with c1:
+                        h_desc = st.text_input("Descripción", placeholder="Ej: Valorización N°01")
+                    with c2:
+                        h_fecha = st.date_input("Fecha", value=date.today())
+                    with c3:
+                        # Campo de monto estilo Yape para pasante
+                        h_monto_text = st.text_input(
+                            "Monto (S/.)",
+                            placeholder="0",
+                            key=f"hito_monto_pas_{st.session_state.form_hito_counter_pas}"
+                        )
+                        try:
+                            h_monto = float(h_monto_text) if h_monto_text.strip() else 0.0
+                        except ValueError:
+                            h_monto = 0.0
+                            if h_monto_text.strip():
+                                st.error("❌ Ingresa un número válido")
 
-                h_obs = st.text_input("Observación (opcional)", placeholder="Ej: Sustento enviado / OC pendiente")
+                    h_obs = st.text_input("Observación (opcional)", placeholder="Ej: Sustento enviado / OC pendiente")
 
-                if st.form_submit_button("Agregar Hito (Pendiente)", use_container_width=True, type="primary"):
-                    ok, msg = validar_hito_pago(h_desc, h_fecha, h_monto)
-                    if not ok:
-                        st.error(f"❌ {msg}")
-                    else:
-                        hito = {
-                            "descripcion": h_desc.strip(),
-                            "fecha": str(h_fecha),
-                            "monto": float(h_monto),
-                            "estado": "Pendiente",
-                            "observacion": h_obs.strip(),
-                            "creado_por": usuario_actual,
-                        }
-                        ok2, msg2 = agregar_hito_pago(obra_codigo, hito)
-                        if ok2:
-                            st.success("✅ Hito registrado (Pendiente).")
-                            st.session_state.form_hito_counter_pas += 1
-                            st.rerun()
+                    if st.form_submit_button("Agregar Hito (Pendiente)", use_container_width=True, type="primary"):
+                        ok, msg = validar_hito_pago(h_desc, h_fecha, h_monto)
+                        if not ok:
+                            st.error(f"❌ {msg}")
                         else:
-                            st.error(f"❌ {msg2}")
+                            hito = {
+                                "descripcion": h_desc.strip(),
+                                "fecha": str(h_fecha),
+                                "monto": float(h_monto),
+                                "estado": "Pendiente",
+                                "observacion": h_obs.strip(),
+                                "creado_por": usuario_actual,
+                            }
+                            ok2, msg2 = agregar_hito_pago(obra_codigo, hito)
+                            if ok2:
+                                st.success("✅ Hito registrado (Pendiente).")
+                                st.session_state.form_hito_counter_pas += 1
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {msg2}")
 
-            hitos_all = obtener_hitos_pago_obra(obra_codigo) or []
-            for h in hitos_all:
-                h.setdefault("estado", "Pendiente")
-                h.setdefault("creado_por", "jefe")
+                hitos_all = obtener_hitos_pago_obra(obra_codigo) or []
+                for h in hitos_all:
+                    h.setdefault("estado", "Pendiente")
+                    h.setdefault("creado_por", "jefe")
 
-            if hitos_all:
-                dfh = pd.DataFrame(hitos_all)
-                cols_pref = ["descripcion", "fecha", "monto", "estado", "observacion", "creado_por"]
-                cols = [c for c in cols_pref if c in dfh.columns] + [c for c in dfh.columns if c not in cols_pref]
-                st.dataframe(
-                    dfh[cols].rename(columns={
-                        "descripcion": "Hito",
-                        "fecha": "Fecha",
-                        "monto": "Monto (S/.)",
-                        "estado": "Estado",
-                        "observacion": "Observación",
-                        "creado_por": "Creado por",
-                    }),
-                    use_container_width=True,
-                    hide_index=True
-                )
-            else:
-                st.info("Aún no hay hitos registrados en la obra.")
-
-            propias_h_pend = [h for h in hitos_all if h.get("creado_por") == usuario_actual and h.get("estado") == "Pendiente"]
-            if propias_h_pend:
-                st.markdown("#### Eliminar Hito (solo tus Pendientes)")
-                opciones_hdel = [
-                    f"{i+1}. {it.get('descripcion','(sin descripción)')} | {it.get('fecha','')} | S/. {float(it.get('monto',0) or 0):,.2f}"
-                    for i, it in enumerate(propias_h_pend)
-                ]
-                if "idx_del_hito_pas" not in st.session_state:
-                    st.session_state.idx_del_hito_pas = 0
-
-                sel_hdel = st.selectbox(
-                    "Selecciona tu hito Pendiente",
-                    opciones_hdel,
-                    index=min(st.session_state.idx_del_hito_pas, len(opciones_hdel)-1),
-                    key="sel_del_hito_pas"
-                )
-                st.session_state.idx_del_hito_pas = opciones_hdel.index(sel_hdel)
-                h_del = propias_h_pend[st.session_state.idx_del_hito_pas]
-                hid = h_del.get("id")
+                if hitos_all:
+                    dfh = pd.DataFrame(hitos_all)
+                    cols_pref = ["descripcion", "fecha", "monto", "estado", "observacion", "creado_por"]
+                    cols = [c for c in cols_pref if c in dfh.columns] + [c for c in dfh.columns if c not in cols_pref]
+                    st.dataframe(
+                        dfh[cols].rename(columns={
+                            "descripcion": "Hito",
+                            "fecha": "Fecha",
+                            "monto": "Monto (S/.)",
+                            "estado": "Estado",
+                            "observacion": "Observación",
+                            "creado_por": "Creado por",
+                        }),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                else:
+                    st.info("Aún no hay hitos registrados en la obra.")
+
+                propias_h_pend = [h for h in hitos_all if h.get("creado_por") == usuario_actual and h.get("estado") == "Pendiente"]
+                if propias_h_pend:
+                    st.markdown("#### Eliminar Hito (solo tus Pendientes)")
+                    opciones_hdel = [
+                        f"{i+1}. {it.get('descripcion','(sin descripción)')} | {it.get('fecha','')} | S/. {float(it.get('monto',0) or 0):,.2f}"
+                        for i, it in enumerate(propias_h_pend)
+                    ]
+                    if "idx_del_hito_pas" not in st.session_state:
+                        st.session_state.idx_del_hito_pas = 0
+
+                    sel_hdel = st.selectbox(
+                        "Selecciona tu hito Pendiente",
+                        opciones_hdel,
+                        index=min(st.session_state.idx_del_hito_pas, len(opciones_hdel)-1),
+                        key="sel_del_hito_pas"
+                    )
+                    st.session_state.idx_del_hito_pas = opciones_hdel.index(sel_hdel)
+                    h_del = propias_h_pend[st.session_state.idx_del_hito_pas]
+                    hid = h_del.get("id")
 
-                if st.button("🗑️ Eliminar Hito Seleccionado", use_container_width=True, type="secondary", key="btn_del_hito_pas"):
-                    if not hid:
-                        st.error("❌ No se encontró ID para eliminar este hito.")
-                    else:
-                        okd, msgd = eliminar_hito_pago(obra_codigo, hid)
-                        if okd:
-                            st.success("✅ Hito eliminado.")
-                            st.session_state.idx_del_hito_pas = 0
-                            st.rerun()
+                    if st.button("🗑️ Eliminar Hito Seleccionado", use_container_width=True, type="secondary", key="btn_del_hito_pas"):
+                        if not hid:
+                            st.error("❌ No se encontró ID para eliminar este hito.")
                         else:
-                            st.error(f"❌ {msgd}")
+                            okd, msgd = eliminar_hito_pago(obra_codigo, hid)
+                            if okd:
+                                st.success("✅ Hito eliminado.")
+                                st.session_state.idx_del_hito_pas = 0
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {msgd}")
+
+        _registrar_tiempo_seccion(seccion_obra, inicio_seccion)
+        if not modo_offline:
+            _prefetch_siguiente_seccion(SECCIONES_OBRA_PASANTE, seccion_obra, obra_codigo, firma_prefetch)
 
     else:
         st.markdown("## Bienvenido (Modo Pasante)\nSelecciona una obra desde el panel lateral para comenzar.")
@@ -0,0 +1 @@
+"""Benchmarks de las capas de lógica y datos (se ejecutan como módulos: python -m benchmarks.<nombre>)."""
@@ -0,0 +1,359 @@
+"""
+Firestore en memoria para medir la capa de datos sin credenciales ni red.
+
+Cubre lo que usan los módulos: colecciones y subcolecciones, get/set(merge)/
+update (rutas con punto)/delete/create, consultas where/order_by/limit/
+start_after/select, WriteBatch, transacciones (@transactional), get_all y los
+centinelas Increment, ArrayUnion y ArrayRemove. Cuenta lecturas y escrituras
+como las factura Firestore, para comparar versiones además del tiempo.
+
+Uso (antes de importar cualquier módulo de la app):
+    from benchmarks.firestore_falso import instalar
+    cliente = instalar()
+    from modules import database
+"""
+
+import copy
+import itertools
+import sys
+import types
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# ==================== CENTINELAS ====================
+
+
+class Increment:
+    def __init__(self, value: float):
+        self.value = value
+
+
+class ArrayUnion:
+    def __init__(self, values: Iterable[Any]):
+        self.values = list(values)
+
+
+class ArrayRemove:
+    def __init__(self, values: Iterable[Any]):
+        self.values = list(values)
+
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+
+def _resolver(actual: Any, valor: Any) -> Any:
+    if isinstance(valor, Increment):
+        return (actual if isinstance(actual, (int, float)) else 0) + valor.value
+    if isinstance(valor, ArrayUnion):
+        base = list(actual) if isinstance(actual, list) else []
+        return base + [v for v in valor.values if v not in base]
+    if isinstance(valor, ArrayRemove):
+        return [v for v in (actual if isinstance(actual, list) else []) if v not in valor.values]
+    if isinstance(valor, dict):
+        return {k: _resolver(None, v) for k, v in valor.items()}
+    return copy.deepcopy(valor)
+
+
+def _fusionar(actual: Dict[str, Any], datos: Dict[str, Any]) -> None:
+    """set(..., merge=True): los mapas anidados se fusionan, el resto se reemplaza."""
+    for k, v in datos.items():
+        if isinstance(v, dict) and isinstance(actual.get(k), dict):
+            _fusionar(actual[k], v)
+        else:
+            actual[k] = _resolver(actual.get(k), v)
+
+
+def _leer_ruta(datos: Dict[str, Any], ruta: str) -> Any:
+    actual: Any = datos
+    for parte in ruta.split("."):
+        if not isinstance(actual, dict) or parte not in actual:
+            return None
+        actual = actual[parte]
+    return actual
+
+
+def _escribir_ruta(datos: Dict[str, Any], ruta: str, valor: Any) -> None:
+    partes = ruta.split(".")
+    actual = datos
+    for parte in partes[:-1]:
+        if not isinstance(actual.get(parte), dict):
+            actual[parte] = {}
+        actual = actual[parte]
+    actual[partes[-1]] = _resolver(actual.get(partes[-1]), valor)
+
+
+def _proyectar(datos: Dict[str, Any], campos: Optional[List[str]]) -> Dict[str, Any]:
+    if campos is None:
+        return copy.deepcopy(datos)
+    resultado: Dict[str, Any] = {}
+    for campo in campos:
+        valor = _leer_ruta(datos, campo)
+        if valor is not None:
+            _escribir_ruta(resultado, campo, valor)
+    return resultado
+
+
+# ==================== DOCUMENTOS ====================
+
+
+class DocumentSnapshot:
+    def __init__(self, referencia: "DocumentReference", datos: Optional[Dict[str, Any]]):
+        self.reference = referencia
+        self.id = referencia.id
+        self.exists = datos is not None
+        self._datos = datos
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._datos) if self._datos is not None else None
+
+    def get(self, campo: str) -> Any:
+        return copy.deepcopy(_leer_ruta(self._datos or {}, campo))
+
+
+class DocumentReference:
+    def __init__(self, cliente: "ClienteFalso", coleccion: str, doc_id: str):
+        self._cliente = cliente
+        self._coleccion = coleccion
+        self.id = doc_id
+        self.path = f"{coleccion}/{doc_id}"
+
+    def collection(self, nombre: str) -> "CollectionReference":
+        return CollectionReference(self._cliente, f"{self.path}/{nombre}")
+
+    def _datos(self) -> Optional[Dict[str, Any]]:
+        return self._cliente._datos.get(self._coleccion, {}).get(self.id)
+
+    def get(self, field_paths: Optional[List[str]] = None, transaction: Any = None) -> DocumentSnapshot:
+        self._cliente.lecturas += 1
+        datos = self._datos()
+        return DocumentSnapshot(self, _proyectar(datos, field_paths) if datos is not None else None)
+
+    def set(self, datos: Dict[str, Any], merge: bool = False) -> None:
+        self._cliente._aplicar([("set", self, datos, merge)])
+
+    def create(self, datos: Dict[str, Any]) -> None:
+        self._cliente._aplicar([("create", self, datos, False)])
+
+    def update(self, datos: Dict[str, Any]) -> None:
+        self._cliente._aplicar([("update", self, datos, False)])
+
+    def delete(self) -> None:
+        self._cliente._aplicar([("delete", self, None, False)])
+
+
+# ==================== CONSULTAS ====================
+
+_OPERADORES: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a is not None and a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a is not None and a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(x in a for x in b),
+}
+
+
+class Consulta:
+    def __init__(self, cliente: "ClienteFalso", coleccion: str):
+        self._cliente = cliente
+        self._coleccion = coleccion
+        self._filtros: List[Tuple[str, str, Any]] = []
+        self._orden: List[Tuple[str, str]] = []
+        self._limite: Optional[int] = None
+        self._despues_de: Optional[str] = None
+        self._campos: Optional[List[str]] = None
+
+    def _copia(self) -> "Consulta":
+        nueva = Consulta(self._cliente, self._coleccion)
+        nueva._filtros = list(self._filtros)
+        nueva._orden = list(self._orden)
+        nueva._limite = self._limite
+        nueva._despues_de = self._despues_de
+        nueva._campos = self._campos
+        return nueva
+
+    def where(self, campo: str, operador: str, valor: Any) -> "Consulta":
+        nueva = self._copia()
+        nueva._filtros.append((campo, operador, valor))
+        return nueva
+
+    def order_by(self, campo: str, direction: str = Query.ASCENDING) -> "Consulta":
+        nueva = self._copia()
+        nueva._orden.append((campo, direction))
+        return nueva
+
+    def limit(self, n: int) -> "Consulta":
+        nueva = self._copia()
+        nueva._limite = n
+        return nueva
+
+    def start_after(self, cursor: DocumentSnapshot) -> "Consulta":
+        nueva = self._copia()
+        nueva._despues_de = cursor.id
+        return nueva
+
+    def select(self, campos: List[str]) -> "Consulta":
+        nueva = self._copia()
+        nueva._campos = list(campos)
+        return nueva
+
+    def stream(self, transaction: Any = None) -> Iterable[DocumentSnapshot]:
+        docs = [
+            (doc_id, datos)
+            for doc_id, datos in self._cliente._datos.get(self._coleccion, {}).items()
+            if all(_OPERADORES[op](_leer_ruta(datos, campo), valor) for campo, op, valor in self._filtros)
+        ]
+        # Como Firestore: ordenar por un campo excluye los documentos que no lo tienen
+        for campo, _ in self._orden:
+            docs = [d for d in docs if _leer_ruta(d[1], campo) is not None]
+        for campo, direccion in reversed(self._orden):
+            docs.sort(key=lambda d: _leer_ruta(d[1], campo), reverse=direccion == Query.DESCENDING)
+        if self._despues_de is not None:
+            ids = [doc_id for doc_id, _ in docs]
+            docs = docs[ids.index(self._despues_de) + 1:] if self._despues_de in ids else docs
+        if self._limite is not None:
+            docs = docs[:self._limite]
+        self._cliente.lecturas += max(len(docs), 1)
+        for doc_id, datos in docs:
+            ref = DocumentReference(self._cliente, self._coleccion, doc_id)
+            yield DocumentSnapshot(ref, _proyectar(datos, self._campos))
+
+    def get(self, transaction: Any = None) -> List[DocumentSnapshot]:
+        return list(self.stream(transaction))
+
+
+class CollectionReference(Consulta):
+    _ids = itertools.count(1)
+
+    @property
+    def id(self) -> str:
+        return self._coleccion.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._cliente, self._coleccion, doc_id or f"auto{next(self._ids):012d}")
+
+    def add(self, datos: Dict[str, Any]) -> Tuple[None, DocumentReference]:
+        ref = self.document()
+        ref.set(datos)
+        return None, ref
+
+
+# ==================== LOTES Y TRANSACCIONES ====================
+
+
+class WriteBatch:
+    def __init__(self, cliente: "ClienteFalso"):
+        self._cliente = cliente
+        self._operaciones: List[Tuple[str, DocumentReference, Any, bool]] = []
+
+    def set(self, ref: DocumentReference, datos: Dict[str, Any], merge: bool = False) -> None:
+        self._operaciones.append(("set", ref, datos, merge))
+
+    def create(self, ref: DocumentReference, datos: Dict[str, Any]) -> None:
+        self._operaciones.append(("create", ref, datos, False))
+
+    def update(self, ref: DocumentReference, datos: Dict[str, Any]) -> None:
+        self._operaciones.append(("update", ref, datos, False))
+
+    def delete(self, ref: DocumentReference) -> None:
+        self._operaciones.append(("delete", ref, None, False))
+
+    def commit(self) -> None:
+        if len(self._operaciones) > 500:
+            raise ValueError("Un lote admite como máximo 500 escrituras.")
+        operaciones, self._operaciones = self._operaciones, []
+        self._cliente._aplicar(operaciones)
+
+
+class Transaction(WriteBatch):
+    """Las lecturas van directo al almacén; las escrituras se aplican juntas al confirmar."""
+
+
+def transactional(fn: Callable) -> Callable:
+    def _ejecutar(transaction: Transaction, *args, **kwargs):
+        resultado = fn(transaction, *args, **kwargs)
+        transaction.commit()
+        return resultado
+    return _ejecutar
+
+
+# ==================== CLIENTE ====================
+
+
+class ClienteFalso:
+    def __init__(self):
+        self._datos: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.lecturas = 0
+        self.escrituras = 0
+
+    def collection(self, nombre: str) -> CollectionReference:
+        return CollectionReference(self, nombre)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self, **_: Any) -> Transaction:
+        return Transaction(self)
+
+    def get_all(self, refs: Iterable[DocumentReference], field_paths: Optional[List[str]] = None, transaction: Any = None):
+        for ref in refs:
+            yield ref.get(field_paths)
+
+    def contadores(self) -> Dict[str, int]:
+        return {"lecturas": self.lecturas, "escrituras": self.escrituras}
+
+    def reiniciar_contadores(self) -> None:
+        self.lecturas = 0
+        self.escrituras = 0
+
+    def _aplicar(self, operaciones: List[Tuple[str, DocumentReference, Any, bool]]) -> None:
+        # Se valida todo antes de escribir: un lote fallido no deja cambios a medias
+        for tipo, ref, _, _ in operaciones:
+            existe = ref._datos() is not None
+            if tipo == "create" and existe:
+                raise ValueError(f"El documento ya existe: {ref.path}")
+            if tipo == "update" and not existe:
+                raise ValueError(f"No existe el documento: {ref.path}")
+        for tipo, ref, datos, merge in operaciones:
+            self.escrituras += 1
+            coleccion = self._datos.setdefault(ref._coleccion, {})
+            if tipo == "delete":
+                coleccion.pop(ref.id, None)
+            elif tipo == "update":
+                for ruta, valor in datos.items():
+                    _escribir_ruta(coleccion[ref.id], ruta, valor)
+            elif merge and ref.id in coleccion:
+                _fusionar(coleccion[ref.id], datos)
+            else:
+                coleccion[ref.id] = {k: _resolver(None, v) for k, v in datos.items()}
+
+
+def instalar() -> ClienteFalso:
+    """
+    Reemplaza firebase_admin.firestore por este módulo en memoria y devuelve el
+    cliente. Los módulos de la app que ya estaban importados pasan a usarlo.
+    """
+    cliente = ClienteFalso()
+    modulo = types.ModuleType("firebase_admin.firestore")
+    modulo.client = lambda app=None: cliente
+    modulo.Increment = Increment
+    modulo.ArrayUnion = ArrayUnion
+    modulo.ArrayRemove = ArrayRemove
+    modulo.Query = Query
+    modulo.transactional = transactional
+
+    paquete = sys.modules.get("firebase_admin") or types.ModuleType("firebase_admin")
+    paquete.firestore = modulo
+    sys.modules["firebase_admin"] = paquete
+    sys.modules["firebase_admin.firestore"] = modulo
+
+    for nombre, mod in list(sys.modules.items()):
+        if nombre.startswith("modules.") and hasattr(mod, "db"):
+            mod.db = cliente
+            mod.firestore = modulo
+    return cliente
@@ -0,0 +1,181 @@
+"""
+Generador de obras sintéticas para los benchmarks.
+
+Produce datos con la misma forma que guarda la app: partidas del cronograma,
+partes diarios con costos por categoría y totales (mismo cálculo que
+calcular_totales_costos), catálogo de insumos, donaciones y movimientos de
+caja chica. Con la misma semilla genera siempre los mismos datos.
+"""
+
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+PARTIDAS = [("Muro de ladrillo", "m2", 12.0), ("Tarrajeo", "m2", 18.0), ("Concreto f'c=210", "m3", 8.0),
+            ("Encofrado", "m2", 15.0), ("Acero corrugado", "kg", 250.0), ("Excavación", "m3", 6.0)]
+
+MATERIALES = [("Cemento Portland", "bls", 32.0), ("Arena gruesa", "m3", 65.0), ("Piedra chancada", "m3", 80.0),
+              ("Ladrillo King Kong", "und", 1.2), ("Fierro 1/2\"", "kg", 4.8), ("Alambre N°16", "kg", 6.5),
+              ("Clavos 3\"", "kg", 7.0), ("Madera tornillo", "p2", 5.5), ("Agua", "m3", 8.0), ("Yeso", "bls", 18.0)]
+
+EQUIPOS = [("Mezcladora 9p3", "hm", 25.0), ("Vibrador", "hm", 12.0), ("Herramientas manuales", "%mo", 3.0)]
+
+CARGOS = [("Operario", 95.0), ("Oficial", 80.0), ("Peón", 70.0)]
+
+# (partidas, partes diarios) por escala
+ESCALAS = {
+    "pequena": (10, 100),
+    "mediana": (60, 2_000),
+    "grande": (200, 20_000),
+}
+
+INICIO_OBRA = date(2025, 1, 6)
+
+
+def _nombre_partida(i: int) -> str:
+    base, _, _ = PARTIDAS[i % len(PARTIDAS)]
+    return f"{base} - Bloque {i // len(PARTIDAS) + 1}"
+
+
+def generar_cronograma(partidas: int, rnd: random.Random) -> List[Dict[str, Any]]:
+    cronograma = []
+    for i in range(partidas):
+        inicio = INICIO_OBRA + timedelta(days=rnd.randint(0, 300))
+        cronograma.append({
+            "id": f"crono_{i}",
+            "nombre": _nombre_partida(i),
+            "fecha_inicio": inicio.isoformat(),
+            "fecha_fin": (inicio + timedelta(days=rnd.randint(5, 90))).isoformat(),
+            "monto_planificado": round(rnd.uniform(5_000, 120_000), 2),
+            "estado": "Aprobado",
+        })
+    return cronograma
+
+
+def generar_insumos() -> List[Dict[str, Any]]:
+    insumos = [{"Insumo": n, "Unidad": u, "Precio Unitario": p, "Tipo": "materiales"} for n, u, p in MATERIALES]
+    insumos += [{"Insumo": n, "Unidad": u, "Precio Unitario": p, "Tipo": "equipos"} for n, u, p in EQUIPOS]
+    return insumos
+
+
+def _linea(nombre: str, cantidad: float, precio: float) -> Dict[str, Any]:
+    return {"Insumo": nombre, "Cantidad": cantidad, "Precio Unit.": precio, "Parcial (S/)": round(cantidad * precio, 2)}
+
+
+def generar_parte(n: int, partidas: int, plantel: List[tuple], rnd: random.Random, trabajadores: int = 5) -> Dict[str, Any]:
+    i = rnd.randrange(partidas)
+    base, unidad, rendimiento = PARTIDAS[i % len(PARTIDAS)]
+    horas = rnd.choice([8, 8, 8, 6, 10])
+    cantidad = round(rendimiento * horas / 8 * rnd.uniform(0.5, 1.3), 2)
+
+    mano_obra = [
+        {"Empleado": nombre, "Cargo": cargo, "DNI": dni, "Sueldo del Día": sueldo, "Parcial (S/)": sueldo}
+        for dni, nombre, cargo, sueldo in rnd.sample(plantel, min(trabajadores, len(plantel)))
+    ]
+    materiales = [_linea(nom, round(rnd.uniform(0.05, 3.0), 3), pu) for nom, _, pu in rnd.sample(MATERIALES, 3)]
+    equipos = [_linea(nom, round(rnd.uniform(0.1, 1.0), 2), pu) for nom, _, pu in rnd.sample(EQUIPOS, 1)]
+
+    totales = {
+        "mano_de_obra": sum(m["Parcial (S/)"] for m in mano_obra),
+        "materiales": sum(m["Parcial (S/)"] for m in materiales),
+        "equipos": sum(e["Parcial (S/)"] for e in equipos),
+        "otros": 0.0,
+    }
+    totales["total_general"] = sum(totales.values())
+    totales["total_general_ejecutado"] = totales["total_general"] * cantidad
+
+    return {
+        "id": f"av_{n}",
+        "fecha": (INICIO_OBRA + timedelta(days=n % 365)).isoformat(),
+        "responsable": "bench",
+        "estado": "Aprobado",
+        "avance": round(rnd.uniform(0.5, 5.0), 1),
+        "obs": "",
+        "fotos": [],
+        "nombre_partida": _nombre_partida(i),
+        "descripcion_avance": f"Avance de {base.lower()}",
+        "partida": {
+            "nombre": _nombre_partida(i),
+            "unidad": unidad,
+            "rendimiento": rendimiento,
+            "jornal_horas": horas,
+            "cantidad_ejecutada": cantidad,
+            "precio_venta_unitario": 0,
+        },
+        "costos": {"mano_de_obra": mano_obra, "materiales": materiales, "equipos": equipos, "otros": []},
+        "totales": totales,
+    }
+
+
+def generar_plantel(n: int, rnd: random.Random) -> List[tuple]:
+    plantel = []
+    for i in range(n):
+        cargo, sueldo = rnd.choice(CARGOS)
+        plantel.append((f"{10000000 + i}", f"Trabajador {i}", cargo, sueldo))
+    return plantel
+
+
+def generar_partes(lineas_mo: int, trabajadores_por_parte: int = 5, semilla: int = 7) -> List[Dict[str, Any]]:
+    """Partes con `lineas_mo` líneas de mano de obra en total (benchmark de productividad)."""
+    rnd = random.Random(semilla)
+    plantel = generar_plantel(300, rnd)
+    return [
+        generar_parte(n, len(PARTIDAS) * 4, plantel, rnd, trabajadores_por_parte)
+        for n in range(max(1, lineas_mo // trabajadores_por_parte))
+    ]
+
+
+def generar_donaciones(n: int, rnd: random.Random) -> List[Dict[str, Any]]:
+    donaciones = []
+    for i in range(n):
+        if rnd.random() < 0.5:
+            donaciones.append({"nombre_donante": f"Donante {i % 25}", "tipo_donacion": "Efectivo",
+                               "cantidad": round(rnd.uniform(100, 5_000), 2), "valor_unitario": 0})
+        else:
+            nombre, unidad, precio = rnd.choice(MATERIALES)
+            donaciones.append({"nombre_donante": f"Donante {i % 25}", "tipo_donacion": "Insumo",
+                               "descripcion": nombre, "unidad": unidad,
+                               "cantidad": rnd.randint(1, 200), "valor_unitario": precio})
+        donaciones[-1]["fecha"] = (INICIO_OBRA + timedelta(days=rnd.randint(0, 365))).isoformat()
+    return donaciones
+
+
+def generar_movimientos(n: int, rnd: random.Random) -> List[Dict[str, Any]]:
+    movimientos = []
+    for i in range(n):
+        ingreso = rnd.random() < 0.2
+        movimientos.append({
+            "fecha": (INICIO_OBRA + timedelta(days=rnd.randint(0, 365))).isoformat(),
+            "usuario": "bench",
+            "tipo": "ingreso" if ingreso else "egreso",
+            "monto": round(rnd.uniform(500, 3_000) if ingreso else rnd.uniform(10, 400), 2),
+            "descripcion": f"Movimiento {i}",
+            "categoria": "Reposición" if ingreso else rnd.choice(["Materiales", "Transporte", "Alimentación"]),
+            "estado": "Aprobado" if ingreso or rnd.random() < 0.8 else "Pendiente",
+        })
+    return movimientos
+
+
+def generar_obra(partidas: int, partes: int, codigo: str = "OBR-BENCH", semilla: int = 7) -> Dict[str, Any]:
+    """Obra completa: {codigo, obra, cronograma, avances, insumos, donaciones, movimientos, empleados}."""
+    rnd = random.Random(semilla)
+    plantel = generar_plantel(max(10, partidas), rnd)
+    cronograma = generar_cronograma(partidas, rnd)
+    avances = [generar_parte(n, partidas, plantel, rnd) for n in range(partes)]
+    return {
+        "codigo": codigo,
+        "obra": {
+            "nombre": f"Obra sintética {codigo}",
+            "estado": "Activa",
+            "presupuesto_total": round(sum(p["monto_planificado"] for p in cronograma) * 1.1, 2),
+        },
+        "cronograma": cronograma,
+        "avances": avances,
+        "insumos": generar_insumos(),
+        "donaciones": generar_donaciones(max(5, partes // 20), rnd),
+        "movimientos": generar_movimientos(max(10, partes // 5), rnd),
+        "empleados": [
+            {"nombre": nombre, "cargo": cargo, "dni": dni, "codigo_obra": codigo}
+            for dni, nombre, cargo, _ in plantel
+        ],
+    }
@@ -0,0 +1,116 @@
+"""
+Memoria pico (RSS) al generar un dossier de partes con muchas fotos.
+
+Cada modo corre en un proceso aparte para que el pico de uno no contamine al otro:
+- bytes:   el dossier en un BytesIO y luego a bytes (lo que hacía la sesión con pdf_bytes)
+- archivo: el dossier escrito directo a un archivo temporal
+
+Uso (solo Linux/macOS, usa resource):
+    python -m benchmarks.pdf_memoria                     # 30 partes x 4 fotos distintas de 3000x2000
+    python -m benchmarks.pdf_memoria --partes 60 --fotos 5
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.generador import generar_obra
+
+
+def _rss_pico_mb() -> float:
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS, bytes
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _fotos(directorio: Path, cantidad: int) -> List[str]:
+    from PIL import Image
+
+    rutas = []
+    for i in range(cantidad):
+        ruta = directorio / f"foto_{i}.jpg"
+        # Ruido para que el JPEG pese como una foto real y no como un color plano
+        Image.effect_noise((3000, 2000), 40 + i % 40).convert("RGB").save(ruta, quality=90)
+        rutas.append(str(ruta))
+    return rutas
+
+
+def _partes(cantidad: int, fotos: List[str], por_parte: int) -> List[Dict[str, Any]]:
+    obra = generar_obra(10, cantidad)
+    return [
+        {
+            "fecha": av["fecha"],
+            "resumen_rows": [["Partida", av["nombre_partida"]], ["Descripción del avance", av["descripcion_avance"]]],
+            "tablas": [{
+                "titulo": "Materiales",
+                "headers": ["Descripción", "Cantidad", "P. Unit.", "Parcial (S/)"],
+                "rows": [[m["Insumo"], str(m["Cantidad"]), str(m["Precio Unit."]), str(m["Parcial (S/)"])]
+                         for m in av["costos"]["materiales"]],
+            }],
+            "foto_paths": fotos[n * por_parte:(n + 1) * por_parte],
+        }
+        for n, av in enumerate(obra["avances"])
+    ]
+
+
+def _correr_modo(modo: str, partes: int, fotos: int, directorio: str) -> Dict[str, Any]:
+    from modules import pdf_report
+    from modules.pdf_report import build_dossier_pdf
+
+    # Copias reducidas propias de cada modo: el segundo no reutiliza las del primero
+    pdf_report.FOTOS_TMP_DIR = Path(directorio) / f"reducidas_{modo}"
+    rutas = sorted(str(p) for p in Path(directorio).glob("foto_*.jpg"))
+    lista = _partes(partes, rutas, fotos)
+    base = _rss_pico_mb()
+    t0 = time.perf_counter()
+    if modo == "bytes":
+        buf = BytesIO()
+        build_dossier_pdf("OBR-BENCH", "Obra", "bench", "jefe", iter(lista), destino=buf)
+        tamano = len(buf.getvalue())
+    else:
+        destino = str(Path(directorio) / "dossier.pdf")
+        build_dossier_pdf("OBR-BENCH", "Obra", "bench", "jefe", iter(lista), destino=destino)
+        tamano = Path(destino).stat().st_size
+    return {
+        "modo": modo,
+        "segundos": round(time.perf_counter() - t0, 2),
+        "pdf_mb": round(tamano / 1e6, 1),
+        "rss_base_mb": base,
+        "rss_pico_mb": _rss_pico_mb(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--partes", type=int, default=30)
+    parser.add_argument("--fotos", type=int, default=4, help="fotos distintas de 3000x2000 por parte")
+    parser.add_argument("--modo", help=argparse.SUPPRESS)
+    parser.add_argument("--directorio", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        print(json.dumps(_correr_modo(args.modo, args.partes, args.fotos, args.directorio)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _fotos(Path(tmp), args.partes * args.fotos)
+        resultados = []
+        for modo in ("bytes", "archivo"):
+            salida = subprocess.run(
+                [sys.executable, "-m", "benchmarks.pdf_memoria", "--modo", modo, "--partes", str(args.partes),
+                 "--fotos", str(args.fotos), "--directorio", tmp],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            resultados.append(json.loads(salida.strip().splitlines()[-1]))
+    print(json.dumps({"partes": args.partes, "fotos_por_parte": args.fotos, "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Benchmark de modules/productividad.py con partes sintéticos.
+
+Uso:
+    python -m benchmarks.productividad                 # 100 000 líneas de mano de obra
+    python -m benchmarks.productividad --lineas 20000
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.generador import generar_partes
+from modules.productividad import calcular_productividad_obra
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lineas", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    partes = generar_partes(args.lineas)
+    tiempos = []
+    for _ in range(args.repeticiones):
+        t0 = time.perf_counter()
+        resultado = calcular_productividad_obra(partes)
+        tiempos.append(time.perf_counter() - t0)
+
+    print(json.dumps({
+        "benchmark": "productividad.calcular_productividad_obra",
+        "partes": len(partes),
+        "lineas_mo": resultado["resumen"]["lineas_mo"],
+        "mejor_s": round(min(tiempos), 4),
+        "mediana_s": round(sorted(tiempos)[len(tiempos) // 2], 4),
+        "partidas": len(resultado["por_partida"]),
+        "trabajadores": len(resultado["por_trabajador"]),
+        "atipicos": len(resultado["atipicos"]),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Suite de benchmarks de las capas de lógica y datos con obras sintéticas.
+
+- Lógica: Curva S, flujo de caja, resumen del cronograma, historial, gastos acumulados y PDF del parte.
+- Datos: registro de partes, lecturas y reconstrucción de agregados contra
+  Firestore en memoria (benchmarks.firestore_falso), con lecturas y escrituras.
+- Secciones: lecturas con las que arranca cada sección de la obra y el cambio
+  de sección con y sin prefetch de la siguiente.
+
+El resultado se guarda en JSON; con --comparar se marcan las regresiones
+respecto de una corrida anterior.
+
+Uso:
+    python -m benchmarks.suite                                   # todas las escalas
+    python -m benchmarks.suite --escalas pequena,mediana --salida bench.json
+    python -m benchmarks.suite --comparar bench_anterior.json --umbral 1.2
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.firestore_falso import ClienteFalso, instalar
+from benchmarks.generador import ESCALAS, generar_obra
+
+# Los módulos de la app crean su cliente al importarse: se instala el falso antes
+cliente = instalar()
+
+from modules import database  # noqa: E402
+from modules.curva_s import build_plan_df  # noqa: E402
+from modules.flujo_caja import construir_flujo_diario  # noqa: E402
+from modules.logic import (  # noqa: E402
+    calcular_gastos_acumulados,
+    calcular_resumen_cronograma,
+    construir_curva_s_planificada,
+    preparar_historial_avances,
+)
+
+FECHA_CORTE = date(2025, 7, 1)
+# Partes que se registran uno a uno sobre la obra ya cargada
+PARTES_NUEVOS = 20
+
+
+def _medir(fn: Callable[[], Any], repeticiones: int, bd: Optional[ClienteFalso] = None) -> Dict[str, Any]:
+    def _cronometrar() -> float:
+        t0 = time.perf_counter()
+        fn()
+        return time.perf_counter() - t0
+
+    return _medir_tiempos(_cronometrar, repeticiones, bd)
+
+
+def _medir_tiempos(fn: Callable[[], float], repeticiones: int, bd: Optional[ClienteFalso] = None) -> Dict[str, Any]:
+    """Como _medir, pero `fn` devuelve el tiempo a contar (para excluir esperas que no ve el usuario)."""
+    tiempos: List[float] = []
+    if bd:
+        bd.reiniciar_contadores()
+    try:
+        for _ in range(repeticiones):
+            tiempos.append(fn())
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    resultado: Dict[str, Any] = {
+        "mejor_s": round(min(tiempos), 5),
+        "mediana_s": round(statistics.median(tiempos), 5),
+        "repeticiones": repeticiones,
+    }
+    if bd:
+        resultado.update({k: v // repeticiones for k, v in bd.contadores().items()})
+    return resultado
+
+
+# ==================== PDF ====================
+
+def _fotos_sinteticas(directorio: Path, cantidad: int) -> List[str]:
+    from PIL import Image
+
+    rutas = []
+    for i in range(cantidad):
+        ruta = directorio / f"foto_{i}.jpg"
+        Image.new("RGB", (3000, 2000), (120 + i * 20 % 100, 110, 90)).save(ruta, quality=90)
+        rutas.append(str(ruta))
+    return rutas
+
+
+def _args_pdf(obra: Dict[str, Any], avance: Dict[str, Any], fotos: List[str]) -> Dict[str, Any]:
+    tot = avance["totales"]
+    tablas = [
+        {
+            "titulo": titulo,
+            "headers": ["Descripción", "Cantidad", "P. Unit.", "Parcial (S/)"],
+            "rows": [
+                [str(it.get("Insumo") or it.get("Empleado")), f"{float(it.get('Cantidad', 1)):,.2f}",
+                 f"{float(it.get('Precio Unit.', it.get('Sueldo del Día', 0))):,.2f}", f"{float(it['Parcial (S/)']):,.2f}"]
+                for it in avance["costos"][clave]
+            ],
+        }
+        for titulo, clave in [("Mano de Obra", "mano_de_obra"), ("Materiales", "materiales"), ("Equipos", "equipos")]
+    ]
+    return {
+        "obra_code": obra["codigo"],
+        "obra_name": obra["obra"]["nombre"],
+        "fecha": avance["fecha"],
+        "emitido_por": "bench",
+        "rol": "jefe",
+        "resumen_rows": [
+            ["Partida", avance["nombre_partida"]],
+            ["Cantidad ejecutada", f"{avance['partida']['cantidad_ejecutada']} {avance['partida']['unidad']}"],
+            ["TOTAL GENERAL (S/)", f"{tot['total_general_ejecutado']:,.2f}"],
+        ],
+        "tablas": tablas,
+        "foto_paths": fotos,
+    }
+
+
+# ==================== ESCALAS ====================
+
+def correr_logica(obra: Dict[str, Any], repeticiones: int, fotos: int) -> Dict[str, Any]:
+    cronograma, avances = obra["cronograma"], obra["avances"]
+    resultados = {
+        "construir_curva_s_planificada": _medir(lambda: construir_curva_s_planificada(cronograma, "Semanal"), repeticiones),
+        "build_plan_df": _medir(lambda: build_plan_df(cronograma, "W"), repeticiones),
+        "construir_flujo_diario": _medir(
+            lambda: construir_flujo_diario(cronograma, [], obra["movimientos"], obra["donaciones"]), repeticiones
+        ),
+        "calcular_resumen_cronograma": _medir(
+            lambda: calcular_resumen_cronograma(cronograma, avances, FECHA_CORTE), repeticiones
+        ),
+        "calcular_gastos_acumulados": _medir(lambda: calcular_gastos_acumulados(avances), repeticiones),
+        # Lee la obra del Firestore en memoria (cargada por correr_datos)
+        "preparar_historial_avances": _medir(lambda: preparar_historial_avances(obra["codigo"]), repeticiones),
+    }
+    try:
+        from modules import pdf_report
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Copias reducidas en el temporal, no en data/tmp_imgs del repositorio
+            anterior, pdf_report.FOTOS_TMP_DIR = pdf_report.FOTOS_TMP_DIR, Path(tmp) / "derivados"
+            try:
+                args = _args_pdf(obra, avances[0], _fotos_sinteticas(Path(tmp), fotos))
+                resultados["build_parte_pdf"] = _medir(lambda: pdf_report.build_parte_pdf(**args), repeticiones)
+                resultados["build_parte_pdf"]["fotos"] = fotos
+            finally:
+                pdf_report.FOTOS_TMP_DIR = anterior
+    except ImportError as e:
+        resultados["build_parte_pdf"] = {"error": f"ImportError: {e}"}
+    return resultados
+
+
+def cargar_obra(obra: Dict[str, Any]) -> None:
+    """Deja la obra en Firestore en memoria como la dejaría la app (documento, rollup y resumen)."""
+    codigo = obra["codigo"]
+    database.agregar_obra(codigo, obra["obra"]["nombre"])
+    database.db.collection("obras").document(codigo).set({
+        **obra["obra"],
+        "avance": obra["avances"],
+        "cronograma": obra["cronograma"],
+        "rollup": database.calcular_rollup(obra["avances"]),
+        "version_datos": 1,
+    }, merge=True)
+    batch = database.db.batch()
+    for i, d in enumerate(obra["donaciones"]):
+        batch.set(
+            database.db.collection("donaciones").document(f"{codigo}_don_{i}"),
+            {**d, "obra_codigo": codigo, "fecha_registro": d.get("fecha_registro", d.get("fecha"))},
+        )
+    for i, m in enumerate(obra["movimientos"]):
+        batch.set(database.db.collection("movimientos").document(f"{codigo}_mov_{i}"), {**m, "obra_codigo": codigo})
+        if (i + 1) % 400 == 0:
+            batch.commit()
+            batch = database.db.batch()
+    batch.commit()
+    database.reconstruir_resumen_obra(codigo)
+
+
+def correr_datos(obra: Dict[str, Any], repeticiones: int) -> Dict[str, Any]:
+    codigo = obra["codigo"]
+    t0 = time.perf_counter()
+    cargar_obra(obra)
+    carga_s = time.perf_counter() - t0
+
+    nuevos = iter(range(10**9))
+    plantilla = obra["avances"][-1]
+
+    def _registrar():
+        n = next(nuevos)
+        for i in range(PARTES_NUEVOS):
+            ok, msg, _ = database.registrar_avance(codigo, {**plantilla, "id": f"nuevo_{n}_{i}"})
+            if not ok:
+                raise RuntimeError(msg)
+
+    resultados = {
+        "carga_inicial_s": round(carga_s, 4),
+        f"registrar_avance_x{PARTES_NUEVOS}": _medir(_registrar, repeticiones, cliente),
+        "obtener_avances_obra": _medir(lambda: database.obtener_avances_obra(codigo), repeticiones, cliente),
+        "obtener_donaciones_obra": _medir(lambda: database.obtener_donaciones_obra(codigo), repeticiones, cliente),
+        "reconstruir_rollup_obra": _medir(lambda: database.reconstruir_rollup_obra(codigo), repeticiones, cliente),
+        "reconstruir_resumen_obra": _medir(lambda: database.reconstruir_resumen_obra(codigo), repeticiones, cliente),
+        "cargar_resumenes_obras": _medir(database.cargar_resumenes_obras, repeticiones, cliente),
+    }
+    return resultados
+
+
+# ==================== SECCIONES Y PREFETCH ====================
+# Las mismas lecturas que app._cargadores_seccion adelanta para cada sección
+
+CARGADORES_SECCION: Dict[str, Dict[str, Callable[[str], Any]]] = {
+    "historial": {"historial": preparar_historial_avances},
+    "cronograma": {"cronograma": database.obtener_cronograma_obra, "hitos": database.obtener_hitos_pago_obra},
+    "donaciones": {"donaciones": database.listar_donaciones},
+}
+
+
+def correr_secciones(obra: Dict[str, Any], repeticiones: int) -> Dict[str, Any]:
+    """
+    Lecturas de cada sección en frío y recorrido de las secciones en orden.
+    El recorrido mide solo lo que espera el usuario al cambiar de sección: con
+    prefetch, las lecturas de la siguiente corren en segundo plano mientras mira
+    la actual (esa espera no se cuenta), como en app._prefetch_siguiente_seccion.
+    """
+    codigo = obra["codigo"]
+    secciones = list(CARGADORES_SECCION)
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    def _cargar(seccion: str) -> None:
+        for cargador in CARGADORES_SECCION[seccion].values():
+            cargador(codigo)
+
+    def _recorrer(prefetch: bool) -> float:
+        espera = 0.0
+        adelantadas: List[Any] = []
+        for i, seccion in enumerate(secciones):
+            t0 = time.perf_counter()
+            if adelantadas:
+                for tarea in adelantadas:
+                    tarea.result()
+            else:
+                _cargar(seccion)
+            espera += time.perf_counter() - t0
+            adelantadas = []
+            if prefetch and i + 1 < len(secciones):
+                adelantadas = [executor.submit(c, codigo) for c in CARGADORES_SECCION[secciones[i + 1]].values()]
+                wait(adelantadas)
+        return espera
+
+    try:
+        resultados: Dict[str, Any] = {
+            f"seccion_{seccion}": _medir(lambda s=seccion: _cargar(s), repeticiones, cliente) for seccion in secciones
+        }
+        resultados["cambio_seccion_sin_prefetch"] = _medir_tiempos(lambda: _recorrer(False), repeticiones, cliente)
+        resultados["cambio_seccion_con_prefetch"] = _medir_tiempos(lambda: _recorrer(True), repeticiones, cliente)
+    finally:
+        executor.shutdown()
+    return resultados
+
+
+# ==================== SALIDA Y COMPARACIÓN ====================
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def comparar(actual: Dict[str, Any], anterior: Dict[str, Any], umbral: float) -> List[str]:
+    """Mediciones cuyo mejor tiempo empeoró más que `umbral` veces respecto de la corrida anterior."""
+    regresiones = []
+    for escala, capas in actual["escalas"].items():
+        for capa, medidas in capas.items():
+            for nombre, medida in medidas.items():
+                previa = anterior.get("escalas", {}).get(escala, {}).get(capa, {}).get(nombre)
+                if not isinstance(medida, dict) or not isinstance(previa, dict):
+                    continue
+                if "mejor_s" in medida and previa.get("mejor_s"):
+                    razon = medida["mejor_s"] / previa["mejor_s"]
+                    medida["vs_anterior"] = round(razon, 2)
+                    if razon > umbral:
+                        regresiones.append(f"{escala}/{capa}/{nombre}: x{razon:.2f}")
+    return regresiones
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escalas", default=",".join(ESCALAS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--fotos", type=int, default=2, help="fotos de 3000x2000 en el PDF")
+    parser.add_argument("--salida", default="benchmarks/resultados.json")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    parser.add_argument("--umbral", type=float, default=1.2)
+    args = parser.parse_args()
+
+    resultado: Dict[str, Any] = {
+        "generado_en": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "python": platform.python_version(),
+        "escalas": {},
+    }
+    for escala in [e.strip() for e in args.escalas.split(",") if e.strip()]:
+        partidas, partes = ESCALAS[escala]
+        obra = generar_obra(partidas, partes, codigo=f"OBR-{escala.upper()}")
+        print(f"▶ {escala}: {partidas} partidas, {partes} partes")
+        datos = correr_datos(obra, args.repeticiones)
+        resultado["escalas"][escala] = {
+            "tamano": {"partidas": partidas, "partes": partes},
+            "datos": datos,
+            "secciones": correr_secciones(obra, args.repeticiones),
+            "logica": correr_logica(obra, args.repeticiones, args.fotos),
+        }
+
+    regresiones: List[str] = []
+    if args.comparar:
+        regresiones = comparar(resultado, json.loads(Path(args.comparar).read_text(encoding="utf-8")), args.umbral)
+        resultado["regresiones"] = regresiones
+
+    Path(args.salida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps(resultado["escalas"], indent=2, ensure_ascii=False))
+    print(f"Resultados en {args.salida}")
+    for r in regresiones:
+        print(f"⚠️ Regresión {r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,18 +14,17 @@ firebase_admin.initialize_app(cred)
 
 db = firestore.client()
 
-# 📂 Rutas a los JSON (misma carpeta que el script)
-pachacutec_path = os.path.join(BASE_DIR, "pachacutec.json")
-rinconada_path = os.path.join(BASE_DIR, "rinconada.json")
-
-with open(pachacutec_path, "r", encoding="utf-8") as f:
-    pachacutec = json.load(f)
-
-with open(rinconada_path, "r", encoding="utf-8") as f:
-    rinconada = json.load(f)
-
-# 🔥 Subir a Firestore con estructura correcta
-db.collection("obras").document("Pachacutec").set(pachacutec)
-db.collection("obras").document("Rinconada").set(rinconada)
+# 📂 Obras semilla: las indicadas en registro.json (misma carpeta que el script)
+with open(os.path.join(BASE_DIR, "registro.json"), "r", encoding="utf-8") as f:
+    registro = json.load(f)["obras"]
+
+# 🔥 Subir a Firestore con estructura correcta (mismo código que en el registro de obras)
+for entrada in registro:
+    if not entrada.get("archivo_semilla"):
+        continue
+    with open(os.path.join(BASE_DIR, entrada["archivo_semilla"]), "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    db.collection("obras").document(entrada["codigo"]).set(datos)
+    db.collection("registro_obras").document(entrada["codigo"]).set(entrada, merge=True)
 
 print("✅ Obras cargadas correctamente en Firestore")
@@ -6,14 +6,57 @@ import base64
 import io
 from firebase_admin import firestore
 
+from modules.database import incrementar_resumen_obra
+
 # Obtener cliente de Firestore
 db = firestore.client()
 
 # =========================
 # FUNCIONES FIRESTORE
 # =========================
+def _actualizar_resumen_caja(obra_codigo, deltas):
+    # El resumen del portafolio no debe bloquear el registro del movimiento
+    try:
+        incrementar_resumen_obra(obra_codigo, deltas)
+    except Exception:
+        pass
+
 def guardar_movimiento(mov):
     db.collection("movimientos").add(mov)
+    monto = float(mov.get("monto", 0) or 0)
+    if mov.get("tipo") == "ingreso":
+        _actualizar_resumen_caja(mov.get("obra_codigo"), {"caja_ingresos": monto})
+    elif mov.get("estado") == "Aprobado":
+        _actualizar_resumen_caja(mov.get("obra_codigo"), {"caja_egresos": monto})
+    else:
+        _actualizar_resumen_caja(mov.get("obra_codigo"), {"caja_pendientes": 1})
+
+def resolver_movimiento(mov_id, obra_codigo, monto, aprobar, usuario):
+    """
+    Aprueba o rechaza un egreso pendiente. El estado y el contador de pendientes
+    del resumen cambian en la misma transacción, y solo si el movimiento sigue
+    Pendiente: un doble clic o dos jefes a la vez no lo descuentan dos veces.
+    Retorna False si ya estaba resuelto.
+    """
+    ref = db.collection("movimientos").document(mov_id)
+
+    @firestore.transactional
+    def _resolver(transaction):
+        snap = ref.get(transaction=transaction)
+        actual = (snap.to_dict() or {}) if snap.exists else {}
+        if actual.get("estado") != "Pendiente":
+            return False
+        transaction.update(ref, {
+            "estado": "Aprobado" if aprobar else "Rechazado",
+            "aprobado_por": usuario
+        })
+        deltas = {"caja_pendientes": -1}
+        if aprobar:
+            deltas["caja_egresos"] = float(actual.get("monto", monto) or 0)
+        incrementar_resumen_obra(obra_codigo, deltas, transaction=transaction)
+        return True
+
+    return _resolver(db.transaction())
 
 def cargar_movimientos(obra_codigo):
     # Filtrar por obra para seguridad
@@ -263,19 +306,17 @@ def mostrar_caja_chica():
                         col1, col2 = st.columns(2)
                         with col1:
                             if st.button("✅ Aprobar", key=f"apr_{row['id']}", use_container_width=True, type="primary"):
-                                db.collection("movimientos").document(row["id"]).update({
-                                    "estado": "Aprobado",
-                                    "aprobado_por": usuario
-                                })
-                                st.session_state.exito_caja = "✅ Gasto Aprobado."
+                                if resolver_movimiento(row["id"], obra_codigo, row["monto"], True, usuario):
+                                    st.session_state.exito_caja = "✅ Gasto Aprobado."
+                                else:
+                                    st.session_state.exito_caja = "ℹ️ Este gasto ya había sido resuelto."
                                 st.rerun()
                         with col2:
                             if st.button("❌ Rechazar", key=f"rec_{row['id']}", use_container_width=True):
-                                db.collection("movimientos").document(row["id"]).update({
-                                    "estado": "Rechazado",
-                                    "aprobado_por": usuario
-                                })
-                                st.session_state.exito_caja = "⚠️ Gasto Rechazado."
+                                if resolver_movimiento(row["id"], obra_codigo, row["monto"], False, usuario):
+                                    st.session_state.exito_caja = "⚠️ Gasto Rechazado."
+                                else:
+                                    st.session_state.exito_caja = "ℹ️ Este gasto ya había sido resuelto."
                                 st.rerun()
 
     # =========================
@@ -6,12 +6,17 @@ Gestiona la subida de imágenes de avances de obra a Cloudinary
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import logging
 import os
 import streamlit as st
 from datetime import datetime
 from typing import List, Optional, Tuple
 from pathlib import Path
 
+from modules.telemetria import instrumentar, medir, registrar_error
+
+log = logging.getLogger(__name__)
+
 # Configuración de Cloudinary desde secrets o variables de entorno
 def configurar_cloudinary() -> bool:
     """
@@ -50,7 +55,8 @@ def configurar_cloudinary() -> bool:
         
         return True
     except Exception as e:
-        print(f"Error configurando Cloudinary: {e}")
+        log.warning("Error configurando Cloudinary: %s", e)
+        registrar_error(e, "cloudinary.configurar", "upload")
         return False
 
 
@@ -72,6 +78,15 @@ def subir_foto_cloudinary(
     Returns:
         Tuple[bool, Optional[str], str]: (éxito, url_cloudinary, mensaje)
     """
+    with medir("cloudinary.subir_foto", "upload") as m:
+        m["bytes"] = getattr(archivo, "size", None)
+        exito, url, mensaje = _subir_foto(archivo, codigo_obra, fecha_hoy, folder)
+        if not exito:
+            m.update({"ok": False, "error": mensaje})
+        return exito, url, mensaje
+
+
+def _subir_foto(archivo, codigo_obra: str, fecha_hoy: str, folder: str) -> Tuple[bool, Optional[str], str]:
     try:
         # Generar nombre único para el archivo
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")[:20]
@@ -113,7 +128,8 @@ def subir_foto_cloudinary(
 def subir_fotos_cloudinary(
     archivos_fotos,
     codigo_obra: str,
-    fecha_hoy: str
+    fecha_hoy: str,
+    folder: str = "obras_boss"
 ) -> List[str]:
     """
     Sube múltiples fotos a Cloudinary
@@ -122,6 +138,7 @@ def subir_fotos_cloudinary(
         archivos_fotos: Lista de archivos subidos desde Streamlit
         codigo_obra: Código de la obra
         fecha_hoy: Fecha del avance (formato YYYY-MM-DD)
+        folder: Carpeta en Cloudinary de la obra (registro de obras)
         
     Returns:
         List[str]: Lista de URLs de Cloudinary de las fotos subidas exitosamente
@@ -130,23 +147,24 @@ def subir_fotos_cloudinary(
     
     # Verificar configuración de Cloudinary
     if not configurar_cloudinary():
-        print("⚠️ Cloudinary no está configurado correctamente")
+        log.warning("Cloudinary no está configurado; no se suben %d foto(s)", len(archivos_fotos or []))
         return urls_cloudinary
     
     for archivo in archivos_fotos:
         # Validar extensión
         if not validar_extension_imagen(getattr(archivo, "name", "")):
-            print(f"⚠️ Archivo {archivo.name} no tiene extensión válida")
+            log.warning("Archivo %s sin extensión de imagen válida; no se sube", getattr(archivo, "name", ""))
             continue
         
         # Subir foto
-        exito, url, mensaje = subir_foto_cloudinary(archivo, codigo_obra, fecha_hoy)
+        exito, url, mensaje = subir_foto_cloudinary(archivo, codigo_obra, fecha_hoy, folder)
         
         if exito and url:
             urls_cloudinary.append(url)
-            print(f"✅ {archivo.name} subido a Cloudinary")
+            log.info("%s subido a Cloudinary", archivo.name)
         else:
-            print(f"❌ Error subiendo {archivo.name}: {mensaje}")
+            # El error ya quedó en la telemetría (cloudinary.subir_foto)
+            log.warning("Error subiendo %s: %s", archivo.name, mensaje)
     
     return urls_cloudinary
 
@@ -162,6 +180,7 @@ def validar_extension_imagen(nombre_archivo: str, extensiones_permitidas: List[s
     return ext in extensiones_permitidas
 
 
+@instrumentar("upload", op="cloudinary.eliminar_foto")
 def eliminar_foto_cloudinary(url_cloudinary: str) -> Tuple[bool, str]:
     """
     Elimina una foto de Cloudinary dado su URL
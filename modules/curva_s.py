@@ -0,0 +1,225 @@
+"""
+Helpers de la Curva S (cronograma valorizado)
+Reparto del monto planificado por día (PV) y costo ejecutado de los partes (AC),
+re-muestreados a la frecuencia de la vista (diaria, semanal o mensual).
+
+No depende de Streamlit ni de Firestore: recibe el cronograma y los avances ya cargados.
+"""
+
+import unicodedata
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+# ==================== HELPERS ====================
+def norm_txt(s: str) -> str:
+    s = str(s or "").strip().lower()
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+def freq_label(code: str) -> str:
+    return {"D": "Diario", "W": "Semanal", "M": "Mensual"}.get(code, "Semanal")
+
+def parse_ts(x):
+    try:
+        return pd.to_datetime(x).normalize()
+    except Exception:
+        return None
+
+def autofreq_from_cronograma(items: list) -> str:
+    """
+    Elige automáticamente la vista:
+    - <= 45 días: Diario
+    - <= 210 días: Semanal
+    - > 210 días: Mensual
+    """
+    if not items:
+        return "W"
+
+    starts, ends = [], []
+    for it in items:
+        s = parse_ts(it.get("fecha_inicio"))
+        e = parse_ts(it.get("fecha_fin"))
+        if s is not None and e is not None:
+            starts.append(s)
+            ends.append(e)
+
+    if not starts or not ends:
+        return "W"
+
+    span_days = int((max(ends) - min(starts)).days) + 1
+    if span_days <= 45:
+        return "D"
+    if span_days <= 210:
+        return "W"
+    return "M"
+
+def resample_sum(df: pd.DataFrame, freq_code: str) -> pd.DataFrame:
+    """Re-muestrea sumando por periodo (manteniendo fecha como inicio del periodo)."""
+    if df.empty:
+        return df
+    df = df.copy()
+    df.index = pd.to_datetime(df.index).normalize()
+
+    if freq_code == "D":
+        return df
+
+    if freq_code == "W":
+        # Semana iniciando lunes (fecha = lunes)
+        out = df.resample("W-MON", label="left", closed="left").sum()
+        out.index = out.index.normalize()
+        return out
+
+    # Mensual (fecha = 1er día del mes)
+    out = df.resample("MS").sum()
+    out.index = out.index.normalize()
+    return out
+
+def plan_diario(crono_items: list, filtro_partida: str = None) -> pd.Series:
+    """
+    PV diario del cronograma: monto_planificado repartido uniforme entre [inicio..fin].
+    Se acumula con un arreglo de diferencias (+monto/día al inicio, −monto/día después
+    del fin) y una suma acumulada, sin una serie por partida.
+    Solo incluye los días cubiertos por alguna partida.
+    """
+    inicios, fines, montos = [], [], []
+    for it in crono_items or []:
+        # Filtrar por partida si se especifica
+        if filtro_partida and norm_txt(it.get("nombre", "")) != norm_txt(filtro_partida):
+            continue
+
+        s = parse_ts(it.get("fecha_inicio"))
+        e = parse_ts(it.get("fecha_fin"))
+        try:
+            monto = float(it.get("monto_planificado", 0) or 0)
+        except Exception:
+            monto = 0.0
+
+        if s is None or e is None or pd.isna(s) or pd.isna(e) or monto <= 0 or e < s:
+            continue
+        inicios.append(s)
+        fines.append(e)
+        montos.append(monto)
+
+    if not montos:
+        return pd.Series(dtype="float64", index=pd.DatetimeIndex([], name="fecha"), name="plan_dia")
+
+    base = min(inicios)
+    ini = np.array([(s - base).days for s in inicios])
+    fin = np.array([(e - base).days for e in fines]) + 1
+    por_dia = np.array(montos) / (fin - ini)
+
+    dias = int(fin.max())
+    monto = np.zeros(dias + 1)
+    cobertura = np.zeros(dias + 1, dtype=int)
+    np.add.at(monto, ini, por_dia)
+    np.add.at(monto, fin, -por_dia)
+    np.add.at(cobertura, ini, 1)
+    np.add.at(cobertura, fin, -1)
+
+    serie = pd.Series(
+        np.cumsum(monto)[:dias],
+        index=pd.date_range(base, periods=dias, freq="D", name="fecha"),
+        name="plan_dia",
+    )
+    return serie[np.cumsum(cobertura)[:dias] > 0]
+
+
+def avance_programado(crono_items: list, fecha_corte=None) -> float:
+    """
+    % que la obra debería llevar a la fecha de corte (hoy por defecto):
+    PV acumulado a la fecha / PV total de las partidas aprobadas. 0 si no hay plan.
+    """
+    aprobadas = [it for it in crono_items or [] if isinstance(it, dict) and it.get("estado", "Aprobado") == "Aprobado"]
+    serie = plan_diario(aprobadas)
+    pv_total = float(serie.sum())
+    if pv_total <= 0:
+        return 0.0
+    corte = pd.Timestamp(fecha_corte or date.today()).normalize()
+    return float(serie[serie.index <= corte].sum()) / pv_total * 100
+
+
+def build_plan_df(crono_items: list, freq_code: str, filtro_partida: str = None) -> pd.DataFrame:
+    """
+    Construye PV por periodo desde cronograma:
+    distribuye monto_planificado uniforme entre días [inicio..fin].
+    Retorna columns: fecha, plan_dia
+    
+    Args:
+        crono_items: Lista de partidas del cronograma
+        freq_code: Código de frecuencia para agrupar
+        filtro_partida: Nombre de partida para filtrar (None = todas)
+    """
+    series = plan_diario(crono_items, filtro_partida)
+    if series.empty:
+        return pd.DataFrame(columns=["fecha", "plan_dia"])
+
+    df = series.to_frame("plan_dia")
+    df.index.name = "fecha"
+    df = resample_sum(df, freq_code)
+    return df.reset_index()
+
+def extract_total_from_avance(av: dict) -> float:
+    """
+    Intenta obtener el costo ejecutado del avance (AC) de forma robusta.
+    Soporta distintos nombres de llave según tu modules.logic.
+    """
+    tot = av.get("totales")
+    if isinstance(tot, dict):
+        for k in ("total_ejecutado", "total_general_ejecutado", "total", "total_general", "total_costos"):
+            v = tot.get(k)
+            if isinstance(v, (int, float)):
+                return float(v)
+        # fallback: suma valores numéricos del dict
+        s = 0.0
+        for v in tot.values():
+            if isinstance(v, (int, float)):
+                s += float(v)
+        return float(s)
+
+    # fallback si el avance trae un campo directo
+    for k in ("total_ejecutado", "total_general_ejecutado", "total", "total_general", "monto", "costo"):
+        v = av.get(k)
+        if isinstance(v, (int, float)):
+            return float(v)
+
+    return 0.0
+
+def build_real_df(avances: list, freq_code: str, filtro_partida: str = None) -> pd.DataFrame:
+    """
+    Construye AC por periodo desde avances (partes diarios).
+    Retorna columns: fecha, real_dia
+    
+    Args:
+        avances: Lista de partes diarios
+        freq_code: Código de frecuencia para agrupar
+        filtro_partida: Nombre de partida para filtrar (None = todas)
+    """
+    if not avances:
+        return pd.DataFrame(columns=["fecha", "real_dia"])
+
+    rows = []
+    for av in avances:
+        # Filtrar por partida si se especifica
+        if filtro_partida:
+            nombre_en_avance = av.get("nombre_partida", "")
+            if norm_txt(nombre_en_avance) != norm_txt(filtro_partida):
+                continue
+        
+        f = av.get("fecha") or av.get("Fecha") or av.get("date")
+        ts = parse_ts(f)
+        if ts is None:
+            continue
+        total = extract_total_from_avance(av)
+        if total <= 0:
+            continue
+        rows.append((ts, float(total)))
+
+    if not rows:
+        return pd.DataFrame(columns=["fecha", "real_dia"])
+
+    df = pd.DataFrame(rows, columns=["fecha", "real_dia"]).groupby("fecha", as_index=True).sum()
+    df = resample_sum(df, freq_code)
+    df = df.reset_index()
+    return df
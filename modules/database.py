@@ -7,8 +7,17 @@ db = firestore.client()
 
 import json
 import os
+import re
+import sys
+import threading
+import time
+import unicodedata
 from typing import Dict, Any, Tuple
 
+from modules.precios import FECHA_BASE, clave_insumo, historial_insumo, insertar_version, precio_vigente
+from modules.registro_obras import registrar_obra, semillas_obras
+from modules.telemetria import instrumentar_modulo, registrar_error
+
 # ============================================================
 # Almacenamiento local (sin Firebase)
 # - Obras:    data/obras/obras.json (índice) + data/obras/<codigo>.json (detalle)
@@ -77,6 +86,33 @@ def _new_id(prefix: str) -> str:
     return f"{prefix}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
 
 
+# Límite de operaciones por WriteBatch en Firestore
+LIMITE_BATCH = 500
+
+
+def _escribir_en_lotes(coleccion: str, documentos: List[Dict[str, Any]], tamano: int = LIMITE_BATCH) -> Tuple[int, List[str]]:
+    """
+    Crea documentos nuevos con WriteBatch en bloques de `tamano` operaciones.
+    Retorna (cantidad_escrita, errores_por_bloque). Un bloque fallido no
+    impide que se intenten los siguientes.
+    """
+    col = db.collection(coleccion)
+    escritos = 0
+    errores: List[str] = []
+    for inicio in range(0, len(documentos), tamano):
+        bloque = documentos[inicio:inicio + tamano]
+        try:
+            batch = db.batch()
+            for doc in bloque:
+                batch.set(col.document(), doc)
+            batch.commit()
+            escritos += len(bloque)
+        except Exception as e:
+            registrar_error(e)
+            errores.append(f"Filas {inicio + 1}-{inicio + len(bloque)}: {e}")
+    return escritos, errores
+
+
 # ==================== DIRECTORIOS ====================
 
 '''
@@ -93,37 +129,61 @@ def inicializar_directorios() -> None:
 
 # ==================== OBRAS ====================
 
-def cargar_obras() -> Dict[str, str]:
-    docs = list(db.collection("obras").stream())
+# El índice de obras cambia poco y se consulta varias veces por rerun: se guarda
+# por proceso y se lee con proyección (solo nombre y estado, no los partes).
+TTL_INDICE_OBRAS_S = 60
+_cache_obras: Dict[str, Any] = {"t": 0.0, "indice": None}
+_lock_obras = threading.Lock()
+
+
+def invalidar_indice_obras() -> None:
+    with _lock_obras:
+        _cache_obras["indice"] = None
 
-    # Si ya hay obras, devolverlas
-    if docs:
-        return {d.id: d.id for d in docs}
 
-    # Si NO hay obras, cargarlas desde JSON
+def _sembrar_obras() -> None:
+    """Si NO hay obras, cargarlas desde los JSON de data/obras indicados en el registro de obras."""
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     JSON_DIR = os.path.join(BASE_DIR, "data", "obras")
 
-    obras_json = {
-        "Ciudad Pachacútec - Ventanilla": "pachacutec.json",
-        "La Rinconada - La Molina": "rinconada.json"
-    }
-
-    for codigo, archivo in obras_json.items():
+    for codigo, nombre, archivo in semillas_obras():
         ruta = os.path.join(JSON_DIR, archivo)
 
         with open(ruta, encoding="utf-8") as f:
             datos_json = json.load(f)
 
         # Crear obra base
-        agregar_obra(codigo, datos_json.get("nombre", codigo))
+        agregar_obra(codigo, datos_json.get("nombre", nombre))
 
         # Guardar datos del JSON
         guardar_datos_obra(codigo, datos_json)
+        _intentar(reconstruir_resumen_obra, codigo)
+
+
+def cargar_indice_obras() -> Dict[str, Dict[str, str]]:
+    """{codigo: {"nombre", "estado"}} de todas las obras, leyendo solo esos dos campos."""
+    with _lock_obras:
+        if _cache_obras["indice"] is not None and time.time() - _cache_obras["t"] < TTL_INDICE_OBRAS_S:
+            return _cache_obras["indice"]
+
+    docs = list(db.collection("obras").select(["nombre", "estado"]).stream())
+    if not docs:
+        _sembrar_obras()
+        docs = list(db.collection("obras").select(["nombre", "estado"]).stream())
+
+    indice = {
+        d.id: {"nombre": str((d.to_dict() or {}).get("nombre") or d.id), "estado": (d.to_dict() or {}).get("estado", "")}
+        for d in docs
+    }
+    with _lock_obras:
+        _cache_obras.update({"t": time.time(), "indice": indice})
+    return indice
+
+
+def cargar_obras() -> Dict[str, str]:
+    """{codigo: nombre} para los selectores de obra."""
+    return {codigo: o["nombre"] for codigo, o in cargar_indice_obras().items()}
 
-    # Volver a consultar Firestore
-    docs = db.collection("obras").stream()
-    return {d.id: d.id for d in docs}
 
 def agregar_obra(codigo: str, nombre: str) -> Tuple[bool, str]:
     if not codigo or not nombre:
@@ -138,7 +198,16 @@ def agregar_obra(codigo: str, nombre: str) -> Tuple[bool, str]:
         "avance": [],
         "presupuesto_total": 0.0,
         "cronograma": [],
-        "hitos_pago": []
+        "hitos_pago": [],
+        "rollup": calcular_rollup([])
+    })
+    _intentar(registrar_obra, codigo, nombre)
+    invalidar_indice_obras()
+    _intentar(_resumen_ref(codigo).set, {
+        **{campo: 0.0 for campo in CAMPOS_RESUMEN_NUMERICOS},
+        "nombre": nombre,
+        "plan_tramos": {},
+        "actualizado_en": datetime.now().isoformat(timespec="seconds"),
     })
     return True, "Obra creada."
 
@@ -156,22 +225,505 @@ def cargar_datos_obra(codigo_obra: str) -> Dict[str, Any]:
     return doc.to_dict()
 
 def guardar_datos_obra(codigo_obra: str, datos: Dict[str, Any]) -> None:
+    if "avance" in datos:
+        datos = {**datos, "version_datos": firestore.Increment(1)}
     db.collection("obras").document(codigo_obra).set(datos, merge=True)
+    if "nombre" in datos or "estado" in datos:
+        invalidar_indice_obras()
+
+    campos_resumen: Dict[str, Any] = {}
+    if "presupuesto_total" in datos:
+        campos_resumen["presupuesto_total"] = _float(datos["presupuesto_total"])
+    if isinstance(datos.get("cronograma"), list):
+        campos_resumen.update(_plan_resumen(datos["cronograma"]))
+    if campos_resumen:
+        _intentar(fijar_resumen_obra, codigo_obra, campos_resumen)
 
 
 # ==================== AVANCES ====================
 
-def agregar_avance(codigo_obra: str, avance_dict: Dict[str, Any]) -> Tuple[bool, str]:
+# Agregados de los avances guardados en la propia obra (campo "rollup"):
+# gastado por categoría, suma/cantidad de eficiencias y totales por partida.
+CATEGORIAS_COSTO = ["mano_de_obra", "materiales", "equipos", "otros"]
+
+
+def _float(valor: Any) -> float:
     try:
-        ref = db.collection("obras").document(codigo_obra)
-        ref.update({
-            "avance": firestore.ArrayUnion([avance_dict])
-        })
-        return True, "Avance guardado."
+        return float(valor or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _clave_partida(nombre: Any) -> str:
+    """Nombre de partida como segmento de ruta de Firestore (solo [a-z0-9_])."""
+    s = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode("ascii")
+    s = re.sub(r"[^a-z0-9]+", "_", s.lower()).strip("_")
+    return f"p_{s or 'sin_partida'}"
+
+
+def _aportes_avance(avance: Dict[str, Any]) -> Dict[str, float]:
+    """Aporte de un avance al rollup como {ruta_de_campo: valor}."""
+    from modules.logic import calcular_eficiencia_rendimiento
+
+    totales = avance.get("totales", {}) if isinstance(avance.get("totales", {}), dict) else {}
+    partida = avance.get("partida", {}) if isinstance(avance.get("partida", {}), dict) else {}
+    total = _total_avance(avance)
+
+    aportes = {"rollup.partes": 1.0, "rollup.gastado_total": total}
+    for cat in CATEGORIAS_COSTO:
+        aportes[f"rollup.gastado.{cat}"] = _float(totales.get(cat))
+
+    cantidad = _float(partida.get("cantidad_ejecutada"))
+    rendimiento = _float(partida.get("rendimiento"))
+    horas = _float(partida.get("jornal_horas"))
+    if rendimiento > 0 and horas > 0 and cantidad > 0:
+        aportes["rollup.eficiencia_suma"] = calcular_eficiencia_rendimiento(cantidad, rendimiento, horas)
+        aportes["rollup.eficiencia_n"] = 1.0
+
+    clave = _clave_partida(avance.get("nombre_partida") or partida.get("nombre"))
+    aportes[f"rollup.partidas.{clave}.cantidad"] = cantidad
+    aportes[f"rollup.partidas.{clave}.costo"] = total
+    aportes[f"rollup.partidas.{clave}.partes"] = 1.0
+    return aportes
+
+
+def _sumar_aportes(agregados: List[Dict[str, Any]], quitados: Optional[List[Dict[str, Any]]] = None) -> Dict[str, float]:
+    neto: Dict[str, float] = {}
+    for signo, avances in ((1.0, agregados or []), (-1.0, quitados or [])):
+        for a in avances:
+            for ruta, valor in _aportes_avance(a).items():
+                neto[ruta] = neto.get(ruta, 0.0) + signo * valor
+    return neto
+
+
+def _deltas_rollup(agregados: List[Dict[str, Any]], quitados: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Cambios del rollup como Increment por ruta (para transaction.update)."""
+    deltas: Dict[str, Any] = {
+        ruta: firestore.Increment(valor)
+        for ruta, valor in _sumar_aportes(agregados, quitados).items()
+        if valor
+    }
+    for a in agregados or []:
+        partida = a.get("partida", {}) if isinstance(a.get("partida", {}), dict) else {}
+        nombre = a.get("nombre_partida") or partida.get("nombre") or ""
+        deltas[f"rollup.partidas.{_clave_partida(nombre)}.nombre"] = nombre
+    return deltas
+
+
+def calcular_rollup(avances: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Recalcula el rollup completo desde la lista de avances (para reconstruir o verificar).
+    Solo este camino escribe "completo": un rollup creado por Increment sobre una obra
+    sin rollup tiene únicamente ese delta y no se toma como total.
+    """
+    rollup: Dict[str, Any] = {
+        "completo": True,
+        "partes": 0.0,
+        "gastado_total": 0.0,
+        "gastado": {cat: 0.0 for cat in CATEGORIAS_COSTO},
+        "eficiencia_suma": 0.0,
+        "eficiencia_n": 0.0,
+        "partidas": {},
+    }
+    validos = [a for a in avances or [] if isinstance(a, dict)]
+    for ruta, valor in _sumar_aportes(validos).items():
+        nodo = rollup
+        partes = ruta.split(".")[1:]
+        for parte in partes[:-1]:
+            nodo = nodo.setdefault(parte, {})
+        nodo[partes[-1]] = nodo.get(partes[-1], 0.0) + valor
+    for a in validos:
+        partida = a.get("partida", {}) if isinstance(a.get("partida", {}), dict) else {}
+        nombre = a.get("nombre_partida") or partida.get("nombre") or ""
+        rollup["partidas"][_clave_partida(nombre)]["nombre"] = nombre
+    return rollup
+
+
+def _registrar_cambio_avances(
+    transaction,
+    codigo_obra: str,
+    cambio_array: Dict[str, Any],
+    agregados: List[Dict[str, Any]],
+    quitados: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """
+    Escribe en la transacción el cambio del array de avances junto con el rollup de la obra,
+    el resumen del portafolio y la cola de revisión (partes en estado Pendiente).
+    """
+    obra_ref = db.collection("obras").document(codigo_obra)
+    transaction.update(obra_ref, {
+        **cambio_array,
+        **_deltas_rollup(agregados, quitados),
+        "version_datos": firestore.Increment(1),
+    })
+    transaction.set(_resumen_ref(codigo_obra), _deltas_avances(agregados, quitados), merge=True)
+    _actualizar_cola_revision(transaction, codigo_obra, agregados, quitados)
+    _registrar_consumo_materiales(transaction, codigo_obra, agregados, quitados)
+
+
+# Cola de revisión: un documento revision_partes/{obra}__{avance_id} por cada parte
+# Pendiente, para listar lo que falta revisar sin recorrer los avances de las obras.
+ESTADO_PENDIENTE = "Pendiente"
+
+
+def _es_pendiente(avance: Dict[str, Any]) -> bool:
+    return isinstance(avance, dict) and avance.get("estado") == ESTADO_PENDIENTE
+
+
+def _cola_ref(codigo_obra: str, avance_id: str):
+    return db.collection("revision_partes").document(f"{codigo_obra}__{avance_id}")
+
+
+def _entrada_cola(codigo_obra: str, avance: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "obra_codigo": codigo_obra,
+        "avance_id": avance.get("id", ""),
+        "fecha": str(avance.get("fecha", "")),
+        "responsable": avance.get("responsable", ""),
+        "nombre_partida": avance.get("nombre_partida", ""),
+        "avance": _pct_avance(avance),
+        "total": _total_avance(avance),
+        "creado_en": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def _actualizar_cola_revision(
+    transaction,
+    codigo_obra: str,
+    agregados: List[Dict[str, Any]],
+    quitados: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    entran = {a.get("id"): a for a in agregados if _es_pendiente(a) and a.get("id")}
+    salen = {a.get("id") for a in quitados or [] if _es_pendiente(a) and a.get("id")} - set(entran)
+    for avance_id, avance in entran.items():
+        transaction.set(_cola_ref(codigo_obra, avance_id), _entrada_cola(codigo_obra, avance))
+    for avance_id in salen:
+        transaction.delete(_cola_ref(codigo_obra, avance_id))
+
+
+def _vaciar_cola_revision(codigo_obra: str) -> None:
+    refs = [d.reference for d in db.collection("revision_partes").where("obra_codigo", "==", codigo_obra).stream()]
+    for inicio in range(0, len(refs), LIMITE_BATCH):
+        batch = db.batch()
+        for ref in refs[inicio:inicio + LIMITE_BATCH]:
+            batch.delete(ref)
+        batch.commit()
+
+
+def _reconstruir_cola_revision(codigo_obra: str, avances: List[Dict[str, Any]]) -> None:
+    _vaciar_cola_revision(codigo_obra)
+    pendientes = [a for a in avances if _es_pendiente(a) and a.get("id")]
+    for inicio in range(0, len(pendientes), LIMITE_BATCH):
+        batch = db.batch()
+        for a in pendientes[inicio:inicio + LIMITE_BATCH]:
+            batch.set(_cola_ref(codigo_obra, a["id"]), _entrada_cola(codigo_obra, a))
+        batch.commit()
+
+
+def listar_partes_pendientes(codigo_obra: Optional[str] = None, limite: int = 200) -> List[Dict[str, Any]]:
+    """Partes en revisión (más antiguos primero), de una obra o de todas. Usa el índice (obra_codigo, fecha)."""
+    try:
+        query = db.collection("revision_partes")
+        if codigo_obra:
+            query = query.where("obra_codigo", "==", codigo_obra)
+        query = query.order_by("fecha").limit(limite)
+        return [{"id": d.id, **d.to_dict()} for d in query.stream()]
+    except Exception as e:
+        registrar_error(e)
+        return []
+
+
+def contar_pendientes_por_obra() -> Dict[str, int]:
+    """Contador de partes pendientes de cada obra, desde los resúmenes (una sola consulta)."""
+    try:
+        docs = db.collection("obras_resumen").select(["partes_pendientes"]).stream()
+        return {d.id: int((d.to_dict() or {}).get("partes_pendientes", 0) or 0) for d in docs}
+    except Exception as e:
+        registrar_error(e)
+        return {}
+
+
+def resolver_partes_pendientes(
+    codigo_obra: str, avance_ids: List[str], aprobar: bool, usuario: str = ""
+) -> Tuple[bool, str]:
+    """
+    Aprueba o rechaza varios partes pendientes en una sola transacción.
+    - Aprobar: estado "Aprobado" con usuario y fecha de revisión.
+    - Rechazar: el parte se elimina de la obra (y su aporte del rollup y del resumen).
+    La cola y el contador de pendientes se actualizan en la misma escritura.
+    """
+    ids = {i for i in avance_ids or [] if i}
+    if not ids:
+        return False, "No se seleccionaron partes."
+    try:
+        obra_ref = db.collection("obras").document(codigo_obra)
+        ahora = datetime.now().isoformat(timespec="seconds")
+
+        @firestore.transactional
+        def _resolver(transaction) -> int:
+            snap = obra_ref.get(field_paths=["avance"], transaction=transaction)
+            avances = (snap.to_dict() or {}).get("avance", []) if snap.exists else []
+            objetivos = [a for a in avances if _es_pendiente(a) and a.get("id") in ids]
+            if not objetivos:
+                return 0
+            if aprobar:
+                aprobados = [
+                    {**a, "estado": "Aprobado", "revisado_por": usuario, "revisado_en": ahora} for a in objetivos
+                ]
+                por_id = {a["id"]: a for a in aprobados}
+                nuevo_array = [por_id.get(a.get("id"), a) if isinstance(a, dict) else a for a in avances]
+                _registrar_cambio_avances(transaction, codigo_obra, {"avance": nuevo_array}, aprobados, objetivos)
+            else:
+                _registrar_cambio_avances(
+                    transaction, codigo_obra, {"avance": firestore.ArrayRemove(objetivos)}, [], objetivos
+                )
+            return len(objetivos)
+
+        n = _resolver(db.transaction())
+        if not n:
+            return False, "Los partes seleccionados ya no están pendientes."
+        return True, f"{n} parte(s) {'aprobado(s)' if aprobar else 'rechazado(s)'}."
     except Exception as e:
         return False, str(e)
 
 
+def _avance_token_ref(codigo_obra: str, token: str):
+    return db.collection("obras").document(codigo_obra).collection("avance_tokens").document(token)
+
+
+def _borrar_tokens_avance(codigo_obra: str) -> None:
+    tokens = db.collection("obras").document(codigo_obra).collection("avance_tokens")
+    refs = [d.reference for d in tokens.select([]).stream()]
+    for inicio in range(0, len(refs), LIMITE_BATCH):
+        batch = db.batch()
+        for ref in refs[inicio:inicio + LIMITE_BATCH]:
+            batch.delete(ref)
+        batch.commit()
+
+
+def registrar_avance(
+    codigo_obra: str, avance_dict: Dict[str, Any], token: Optional[str] = None
+) -> Tuple[bool, str, Dict[str, Any]]:
+    """
+    Registra un parte diario de forma idempotente.
+    El token (o el "id" del avance) se reserva con un create condicional dentro
+    de la misma transacción que agrega el avance. Si ya existía, el envío es un
+    reintento: no se escribe nada y se devuelve el registro guardado la primera vez,
+    buscado en el arreglo de avances de la obra (el token solo guarda id y fecha).
+    """
+    try:
+        avance_dict = dict(avance_dict)
+        token = token or avance_dict.get("id") or _new_id("avance")
+        avance_dict["id"] = token
+
+        token_ref = _avance_token_ref(codigo_obra, token)
+
+        @firestore.transactional
+        def _registrar(transaction) -> Optional[Dict[str, Any]]:
+            snap = token_ref.get(transaction=transaction)
+            if snap.exists:
+                obra = db.collection("obras").document(codigo_obra).get(
+                    field_paths=["avance"], transaction=transaction
+                )
+                guardados = (obra.to_dict() or {}).get("avance") or []
+                return next(
+                    (a for a in guardados if isinstance(a, dict) and a.get("id") == token),
+                    {"id": token},
+                )
+            transaction.create(token_ref, {
+                "avance_id": token,
+                "creado_en": datetime.now().isoformat(timespec="seconds"),
+            })
+            _registrar_cambio_avances(
+                transaction, codigo_obra, {"avance": firestore.ArrayUnion([avance_dict])}, [avance_dict]
+            )
+            return None
+
+        existente = _registrar(db.transaction())
+        if existente is not None:
+            return True, "El parte ya estaba registrado (envío repetido).", existente
+        return True, "Avance guardado.", avance_dict
+    except Exception as e:
+        return False, str(e), {}
+
+
+def agregar_avance(codigo_obra: str, avance_dict: Dict[str, Any], token: Optional[str] = None) -> Tuple[bool, str]:
+    ok, msg, _ = registrar_avance(codigo_obra, avance_dict, token)
+    return ok, msg
+
+
+# Escrituras por transacción en agregar_avances_lote, con margen bajo el máximo de Firestore (500)
+LIMITE_ESCRITURAS_TRANSACCION = 450
+
+
+def _lotes_por_escrituras(avances: List[Dict[str, Any]], limite: int = LIMITE_ESCRITURAS_TRANSACCION) -> List[List[Dict[str, Any]]]:
+    """
+    Parte los avances en grupos cuya transacción no pase `limite` escrituras:
+    obra y resumen (2 por grupo), más token y entrada de la cola de revisión por
+    parte, más un documento del libro de consumo por insumo distinto del grupo.
+    """
+    lotes: List[List[Dict[str, Any]]] = []
+    actual: List[Dict[str, Any]] = []
+    insumos: set = set()
+    escrituras = 2
+    for a in avances:
+        propios = set(_acumular_consumo([a]))
+        costo = 1 + (1 if _es_pendiente(a) else 0) + len(propios - insumos)
+        if actual and escrituras + costo > limite:
+            lotes.append(actual)
+            actual, insumos, escrituras = [], set(), 2
+            costo = 1 + (1 if _es_pendiente(a) else 0) + len(propios)
+        actual.append(a)
+        insumos |= propios
+        escrituras += costo
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+
+def agregar_avances_lote(codigo_obra: str, avances: List[Dict[str, Any]]) -> Tuple[bool, str, List[str]]:
+    """
+    Agrega varios partes diarios (sincronización offline) en transacciones de
+    hasta LIMITE_ESCRITURAS_TRANSACCION escrituras cada una. Los que ya tienen
+    token registrado se omiten, así un reintento no duplica nada.
+    Retorna (ok, mensaje, ids_confirmados): si falla un grupo, los anteriores ya
+    quedaron guardados y sus ids vienen en la lista.
+    """
+    if not avances:
+        return True, "Nada que guardar.", []
+    avances = [dict(a) for a in avances]
+    for a in avances:
+        a.setdefault("id", _new_id("avance"))
+
+    confirmados: List[str] = []
+    guardados = 0
+    for lote in _lotes_por_escrituras(avances):
+        token_refs = [_avance_token_ref(codigo_obra, a["id"]) for a in lote]
+
+        @firestore.transactional
+        def _registrar(transaction) -> int:
+            existentes = {
+                snap.id for snap in db.get_all(token_refs, transaction=transaction) if snap.exists
+            }
+            nuevos = [a for a in lote if a["id"] not in existentes]
+            if not nuevos:
+                return 0
+            ahora = datetime.now().isoformat(timespec="seconds")
+            for a in nuevos:
+                transaction.create(_avance_token_ref(codigo_obra, a["id"]), {"avance_id": a["id"], "creado_en": ahora})
+            _registrar_cambio_avances(
+                transaction, codigo_obra, {"avance": firestore.ArrayUnion(nuevos)}, nuevos
+            )
+            return len(nuevos)
+
+        try:
+            guardados += _registrar(db.transaction())
+        except Exception as e:
+            return False, f"{len(confirmados)} de {len(avances)} parte(s) guardado(s); falló el resto: {e}", confirmados
+        confirmados += [a["id"] for a in lote]
+
+    omitidos = len(avances) - guardados
+    msg = f"{guardados} avance(s) guardado(s)."
+    if omitidos:
+        msg += f" {omitidos} ya estaban registrados."
+    return True, msg, confirmados
+
+
+def eliminar_avance(codigo_obra: str, avance_id: str) -> Tuple[bool, str]:
+    """Elimina un parte diario y descuenta su aporte del rollup y del resumen en la misma transacción."""
+    try:
+        obra_ref = db.collection("obras").document(codigo_obra)
+
+        @firestore.transactional
+        def _eliminar(transaction) -> bool:
+            snap = obra_ref.get(field_paths=["avance"], transaction=transaction)
+            avances = (snap.to_dict() or {}).get("avance", []) if snap.exists else []
+            objetivo = next((a for a in avances if isinstance(a, dict) and a.get("id") == avance_id), None)
+            if objetivo is None:
+                return False
+            _registrar_cambio_avances(
+                transaction, codigo_obra, {"avance": firestore.ArrayRemove([objetivo])}, [], [objetivo]
+            )
+            return True
+
+        if _eliminar(db.transaction()):
+            return True, "Parte diario eliminado."
+        return False, "No se encontró el parte diario."
+    except Exception as e:
+        return False, str(e)
+
+
+def obtener_rollup_obra(codigo_obra: str) -> Dict[str, Any]:
+    """
+    Lee solo el presupuesto y el rollup de la obra (sin descargar el array de avances).
+    Si el rollup falta o no tiene la marca "completo" (p. ej. lo creó un Increment de la
+    sincronización offline antes de la primera reconstrucción), se reconstruye primero.
+    Retorna {} si la obra no existe o no se pudo reconstruir.
+    """
+    ref = db.collection("obras").document(codigo_obra)
+    doc = ref.get(field_paths=["rollup", "presupuesto_total"])
+    if not doc.exists:
+        return {}
+    data = doc.to_dict() or {}
+    rollup = data.get("rollup")
+    if not isinstance(rollup, dict) or not rollup.get("completo"):
+        ok, _ = reconstruir_rollup_obra(codigo_obra)
+        if not ok:
+            return {}
+        data = ref.get(field_paths=["rollup", "presupuesto_total"]).to_dict() or {}
+        rollup = data.get("rollup") or {}
+    return {**rollup, "presupuesto_total": _float(data.get("presupuesto_total"))}
+
+
+def reconstruir_rollup_obra(codigo_obra: str) -> Tuple[bool, str]:
+    """Recalcula el rollup desde los avances en una transacción (no se pierden partes registrados en paralelo)."""
+    try:
+        obra_ref = db.collection("obras").document(codigo_obra)
+
+        @firestore.transactional
+        def _reconstruir(transaction) -> None:
+            snap = obra_ref.get(field_paths=["avance"], transaction=transaction)
+            avances = (snap.to_dict() or {}).get("avance", []) if snap.exists else []
+            transaction.update(obra_ref, {"rollup": calcular_rollup(avances if isinstance(avances, list) else [])})
+
+        _reconstruir(db.transaction())
+        return True, "Rollup reconstruido."
+    except Exception as e:
+        return False, str(e)
+
+
+def _diferencias_rollup(guardado: Any, calculado: Any, ruta: str = "rollup", tolerancia: float = 0.01) -> List[str]:
+    if isinstance(calculado, dict):
+        guardado = guardado if isinstance(guardado, dict) else {}
+        difs: List[str] = []
+        for clave in sorted(set(calculado) | set(guardado)):
+            difs += _diferencias_rollup(guardado.get(clave), calculado.get(clave), f"{ruta}.{clave}", tolerancia)
+        return difs
+    if isinstance(calculado, str) or isinstance(guardado, str):
+        return [] if guardado == calculado else [f"{ruta}: guardado={guardado!r} calculado={calculado!r}"]
+    if abs(_float(guardado) - _float(calculado)) > tolerancia:
+        return [f"{ruta}: guardado={_float(guardado):,.2f} calculado={_float(calculado):,.2f}"]
+    return []
+
+
+def verificar_rollup_obra(codigo_obra: str) -> Tuple[bool, List[str]]:
+    """Compara el rollup guardado con el recálculo completo. Retorna (coincide, diferencias)."""
+    datos = cargar_datos_obra(codigo_obra)
+    avances = datos.get("avance", []) if isinstance(datos.get("avance"), list) else []
+    difs = _diferencias_rollup(datos.get("rollup"), calcular_rollup(avances))
+    return not difs, difs
+
+
+def obtener_version_datos_obra(codigo_obra: str) -> int:
+    """Contador que sube con cada cambio en los partes; sirve de clave de caché sin descargar los avances."""
+    try:
+        doc = db.collection("obras").document(codigo_obra).get(field_paths=["version_datos"])
+        return int((doc.to_dict() or {}).get("version_datos", 0) or 0) if doc.exists else 0
+    except Exception as e:
+        registrar_error(e)
+        return 0
+
+
 def obtener_avances_obra(codigo_obra: str) -> List[Dict[str, Any]]:
     datos = cargar_datos_obra(codigo_obra)
     avances = datos.get("avance", [])
@@ -180,19 +732,222 @@ def obtener_avances_obra(codigo_obra: str) -> List[Dict[str, Any]]:
 
 def limpiar_avances_obra(codigo_obra: str) -> Tuple[bool, str]:
     """
-    Elimina todos los partes diarios (avances) de una obra.
+    Elimina todos los partes diarios (avances) de una obra, junto con sus tokens
+    de envío: si quedaran, un parte reenviado después se tomaría por repetido.
     Mantiene intacta la obra, presupuesto, cronograma y hitos de pago.
     """
     try:
         ref = db.collection("obras").document(codigo_obra)
         ref.update({
-            "avance": []
+            "avance": [],
+            "rollup": calcular_rollup([]),
+            "version_datos": firestore.Increment(1),
         })
+        _intentar(
+            fijar_resumen_obra,
+            codigo_obra,
+            {"gastado_total": 0.0, "avance_real_total": 0.0, "cantidad_partes": 0, "partes_pendientes": 0},
+        )
+        _borrar_tokens_avance(codigo_obra)
+        _intentar(_vaciar_cola_revision, codigo_obra)
+        _intentar(_borrar_consumo_materiales, codigo_obra)
         return True, "Todos los partes diarios han sido eliminados correctamente."
     except Exception as e:
         return False, f"Error al limpiar avances: {str(e)}"
 
 
+# ==================== CONSUMO DE MATERIALES ====================
+# Libro de consumo derivado de costos.materiales de cada parte: un documento
+# consumo_materiales/{obra}__{insumo} con el total consumido y su desglose por
+# partida y por día. Se mantiene con incrementos en la misma transacción que
+# registra, modifica o elimina el parte.
+#
+# Las líneas de materiales son por unidad de partida (igual que los totales):
+# lo consumido es Cantidad x cantidad_ejecutada (o la línea tal cual si no hay
+# cantidad ejecutada, el mismo criterio que _total_avance).
+
+def _clave_dia(fecha: Any) -> str:
+    digitos = re.sub(r"[^0-9]", "", str(fecha or "")[:10])
+    return f"d{digitos}" if len(digitos) == 8 else "d_sin_fecha"
+
+
+def _consumo_ref(codigo_obra: str, clave: str):
+    return db.collection("consumo_materiales").document(f"{codigo_obra}__{clave}")
+
+
+def _acumular_consumo(
+    agregados: List[Dict[str, Any]], quitados: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Consumo neto por insumo (los quitados restan), con desglose por partida y por día."""
+    libro: Dict[str, Dict[str, Any]] = {}
+    for signo, avances in ((1.0, agregados or []), (-1.0, quitados or [])):
+        for a in avances:
+            if not isinstance(a, dict):
+                continue
+            partida = a.get("partida", {}) if isinstance(a.get("partida", {}), dict) else {}
+            costos = a.get("costos", {}) if isinstance(a.get("costos", {}), dict) else {}
+            ejecutado = _float(partida.get("cantidad_ejecutada"))
+            factor = ejecutado if ejecutado > 0 else 1.0
+            nombre_partida = a.get("nombre_partida") or partida.get("nombre") or ""
+            clave_p = _clave_partida(nombre_partida)
+            clave_d = _clave_dia(a.get("fecha"))
+            for linea in costos.get("materiales") or []:
+                if not isinstance(linea, dict) or not linea.get("Insumo"):
+                    continue
+                cantidad = signo * _float(linea.get("Cantidad")) * factor
+                costo = signo * _float(linea.get("Parcial (S/)", linea.get("Parcial"))) * factor
+                nodo = libro.setdefault(clave_insumo(linea["Insumo"]), {
+                    "insumo": str(linea["Insumo"]).strip(),
+                    "cantidad": 0.0, "costo": 0.0, "lineas": 0.0,
+                    "por_partida": {}, "por_dia": {},
+                })
+                nodo["cantidad"] += cantidad
+                nodo["costo"] += costo
+                nodo["lineas"] += signo
+                p = nodo["por_partida"].setdefault(clave_p, {"nombre": nombre_partida, "cantidad": 0.0, "costo": 0.0})
+                p["cantidad"] += cantidad
+                p["costo"] += costo
+                d = nodo["por_dia"].setdefault(clave_d, {"fecha": str(a.get("fecha", ""))[:10], "cantidad": 0.0, "costo": 0.0})
+                d["cantidad"] += cantidad
+                d["costo"] += costo
+    return {k: v for k, v in libro.items() if v["lineas"] or abs(v["cantidad"]) > 1e-9 or abs(v["costo"]) > 1e-9}
+
+
+def _como_incrementos(nodo: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        k: _como_incrementos(v) if isinstance(v, dict) else (firestore.Increment(v) if isinstance(v, float) else v)
+        for k, v in nodo.items()
+    }
+
+
+def _registrar_consumo_materiales(
+    transaction,
+    codigo_obra: str,
+    agregados: List[Dict[str, Any]],
+    quitados: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    ahora = datetime.now().isoformat(timespec="seconds")
+    for clave, nodo in _acumular_consumo(agregados, quitados).items():
+        transaction.set(_consumo_ref(codigo_obra, clave), {
+            "obra_codigo": codigo_obra,
+            "insumo_clave": clave,
+            **_como_incrementos(nodo),
+            "actualizado_en": ahora,
+        }, merge=True)
+
+
+def obtener_consumo_materiales(codigo_obra: str) -> List[Dict[str, Any]]:
+    """Consumo acumulado de cada insumo de la obra (una consulta, un documento por insumo)."""
+    try:
+        docs = db.collection("consumo_materiales").where("obra_codigo", "==", codigo_obra).stream()
+        return [{"id": d.id, **d.to_dict()} for d in docs]
+    except Exception as e:
+        registrar_error(e)
+        return []
+
+
+def _borrar_consumo_materiales(codigo_obra: str) -> None:
+    refs = [d.reference for d in db.collection("consumo_materiales").where("obra_codigo", "==", codigo_obra).stream()]
+    for inicio in range(0, len(refs), LIMITE_BATCH):
+        batch = db.batch()
+        for ref in refs[inicio:inicio + LIMITE_BATCH]:
+            batch.delete(ref)
+        batch.commit()
+
+
+def reconstruir_consumo_materiales(codigo_obra: Optional[str] = None) -> Tuple[int, List[str]]:
+    """
+    Recalcula el libro de consumo desde los partes, obra por obra (nunca carga
+    todas las obras a la vez). Sin código, recorre todas las obras.
+    Retorna (obras_reconstruidas, errores).
+    """
+    if codigo_obra:
+        codigos = iter([codigo_obra])
+    else:
+        codigos = (d.id for d in db.collection("obras").select([]).stream())
+
+    ok_total = 0
+    errores: List[str] = []
+    for codigo in codigos:
+        try:
+            doc = db.collection("obras").document(codigo).get(field_paths=["avance"])
+            avances = (doc.to_dict() or {}).get("avance", []) if doc.exists else []
+            libro = _acumular_consumo([a for a in avances if isinstance(a, dict)])
+            _borrar_consumo_materiales(codigo)
+            ahora = datetime.now().isoformat(timespec="seconds")
+            items = list(libro.items())
+            for inicio in range(0, len(items), LIMITE_BATCH):
+                batch = db.batch()
+                for clave, nodo in items[inicio:inicio + LIMITE_BATCH]:
+                    batch.set(_consumo_ref(codigo, clave), {
+                        "obra_codigo": codigo, "insumo_clave": clave, **nodo, "actualizado_en": ahora,
+                    })
+                batch.commit()
+            ok_total += 1
+        except Exception as e:
+            registrar_error(e)
+            errores.append(f"{codigo}: {e}")
+    return ok_total, errores
+
+
+# ==================== EMPLEADOS ====================
+
+def obtener_empleados_obra(codigo_obra: str) -> List[Dict[str, Any]]:
+    """Empleados asignados a una obra."""
+    docs = db.collection("empleados").where("codigo_obra", "==", codigo_obra).stream()
+    return [{"id": d.id, **d.to_dict()} for d in docs]
+
+
+def agregar_empleados_lote(codigo_obra: str, empleados: List[Dict[str, Any]]) -> Tuple[int, List[str]]:
+    """Alta masiva de empleados de una obra (importación). Retorna (cantidad_escrita, errores)."""
+    docs = [{**e, "codigo_obra": codigo_obra} for e in empleados]
+    escritos, errores = _escribir_en_lotes("empleados", docs)
+    if escritos:
+        _intentar(incrementar_version_empleados, codigo_obra)
+    return escritos, errores
+
+
+# Versión del plantel por obra (y "__todos__" para el listado general): la caché
+# de modules/empleados.py solo recarga una obra cuando su versión cambia.
+CLAVE_DIRECTORIO_EMPLEADOS = "__todos__"
+
+
+def _version_empleados_ref(clave: str):
+    return db.collection("versiones_empleados").document(clave)
+
+
+def leer_version_empleados(clave: str) -> int:
+    try:
+        doc = _version_empleados_ref(clave).get()
+        return int((doc.to_dict() or {}).get("version", 0) or 0) if doc.exists else 0
+    except Exception as e:
+        registrar_error(e)
+        return -1
+
+
+def incrementar_version_empleados(
+    codigo_obra: Optional[str], batch=None, otras_obras: Optional[List[Optional[str]]] = None
+) -> None:
+    """Sube la versión de la obra (y de `otras_obras`, p. ej. la anterior de un empleado movido) y la del listado general."""
+    claves = list(dict.fromkeys(c for c in (codigo_obra, *(otras_obras or []), CLAVE_DIRECTORIO_EMPLEADOS) if c))
+    escritor = batch or db.batch()
+    for clave in claves:
+        escritor.set(_version_empleados_ref(clave), {"version": firestore.Increment(1)}, merge=True)
+    if batch is None:
+        escritor.commit()
+
+
+# ==================== CONEXIÓN ====================
+
+def verificar_conexion(timeout: float = 5.0) -> bool:
+    """Lectura mínima para saber si hay conexión con Firestore."""
+    try:
+        list(db.collection("obras").limit(1).get(timeout=timeout))
+        return True
+    except Exception:
+        return False
+
+
 # ==================== PRESUPUESTO ====================
 
 def actualizar_presupuesto_obra(codigo_obra: str, monto: float) -> Tuple[bool, str]:
@@ -200,6 +955,7 @@ def actualizar_presupuesto_obra(codigo_obra: str, monto: float) -> Tuple[bool, s
         db.collection("obras").document(codigo_obra).update({
             "presupuesto_total": float(monto or 0)
         })
+        _intentar(fijar_resumen_obra, codigo_obra, {"presupuesto_total": float(monto or 0)})
         return True, "Presupuesto actualizado."
     except Exception as e:
         return False, str(e)
@@ -209,7 +965,8 @@ def obtener_presupuesto_obra(codigo_obra: str) -> float:
     datos = cargar_datos_obra(codigo_obra)
     try:
         return float(datos.get("presupuesto_total", 0.0) or 0.0)
-    except Exception:
+    except Exception as e:
+        registrar_error(e)
         return 0.0
 
 
@@ -219,6 +976,25 @@ def cargar_insumos() -> List[Dict[str, Any]]:
     docs = db.collection("insumos").stream()
     return [d.to_dict() | {"id": d.id} for d in docs]
 
+
+def _version_insumos_ref():
+    return db.collection("catalogos").document("insumos")
+
+
+def obtener_version_insumos() -> int:
+    """Versión del catálogo de insumos: sube con cada escritura; sirve de clave para cachear el índice de precios."""
+    try:
+        doc = _version_insumos_ref().get(field_paths=["version_datos"])
+        return int((doc.to_dict() or {}).get("version_datos", 0) or 0) if doc.exists else 0
+    except Exception as e:
+        registrar_error(e)
+        return 0
+
+
+def _marcar_cambio_insumos() -> None:
+    _intentar(_version_insumos_ref().set, {"version_datos": firestore.Increment(1)}, merge=True)
+
+
 def guardar_insumos(insumos: List[Dict[str, Any]]) -> None:
     col = db.collection("insumos")
     batch = db.batch()
@@ -233,15 +1009,100 @@ def guardar_insumos(insumos: List[Dict[str, Any]]) -> None:
         batch.set(ref, insumo)
 
     batch.commit()
+    _marcar_cambio_insumos()
+
+def _con_historial(insumo: Dict[str, Any], fuente: str = "alta") -> Dict[str, Any]:
+    """
+    El precio inicial queda como primera versión del historial, vigente desde
+    FECHA_BASE: no hay un precio anterior, así que rige también para partes con
+    fecha previa al alta.
+    """
+    if insumo.get("historial_precios"):
+        return insumo
+    return {**insumo, "historial_precios": insertar_version([], insumo.get("Precio Unitario"), FECHA_BASE, fuente)}
+
 
 def agregar_insumo(nuevo_insumo: Dict[str, Any]) -> None:
-    db.collection("insumos").add(nuevo_insumo)
+    db.collection("insumos").add(_con_historial(nuevo_insumo))
+    _marcar_cambio_insumos()
+
+
+def agregar_insumos_lote(insumos: List[Dict[str, Any]]) -> Tuple[int, List[str]]:
+    """Alta masiva de insumos (importación). Retorna (cantidad_escrita, errores)."""
+    resultado = _escribir_en_lotes("insumos", [_con_historial(i, "importacion") for i in insumos])
+    _marcar_cambio_insumos()
+    return resultado
 
-def actualizar_insumo(insumo_id: str, insumo_actualizado: Dict[str, Any]) -> None:
+def actualizar_insumo(
+    insumo_id: str, insumo_actualizado: Dict[str, Any], vigente_desde: Any = None, fuente: str = "edicion"
+) -> None:
     """
     Actualiza un insumo en Firestore usando su ID de documento.
+    Un cambio de `Precio Unitario` no pisa el anterior: se agrega como versión
+    vigente desde `vigente_desde` (hoy por defecto) y `Precio Unitario` queda
+    con el precio vigente a hoy.
     """
-    db.collection("insumos").document(insumo_id).update(insumo_actualizado)
+    ref = db.collection("insumos").document(insumo_id)
+    if "Precio Unitario" not in insumo_actualizado:
+        ref.update(insumo_actualizado)
+        _marcar_cambio_insumos()
+        return
+
+    @firestore.transactional
+    def _actualizar(transaction) -> None:
+        snap = ref.get(transaction=transaction)
+        actual = snap.to_dict() or {}
+        historial = insertar_version(
+            historial_insumo(actual), insumo_actualizado["Precio Unitario"], vigente_desde, fuente
+        )
+        transaction.update(ref, {
+            **insumo_actualizado,
+            "historial_precios": historial,
+            "Precio Unitario": precio_vigente(historial),
+        })
+
+    _actualizar(db.transaction())
+    _marcar_cambio_insumos()
+
+
+def actualizar_precios_lote(
+    precios: Dict[str, Any], vigente_desde: Any = None, fuente: str = "proveedor"
+) -> Tuple[int, List[str], List[str]]:
+    """
+    Aplica una lista de precios {nombre_insumo: precio} (p. ej. de un proveedor)
+    como nuevas versiones vigentes desde `vigente_desde`, en WriteBatch de
+    LIMITE_BATCH. Los nombres se cruzan sin distinguir mayúsculas ni tildes.
+    Retorna (actualizados, no_encontrados, errores).
+    """
+    objetivo = {clave_insumo(nombre): (nombre, precio) for nombre, precio in (precios or {}).items()}
+    cambios = []
+    encontrados = set()
+    for insumo in cargar_insumos():
+        clave = clave_insumo(insumo.get("Insumo"))
+        if clave not in objetivo:
+            continue
+        encontrados.add(clave)
+        historial = insertar_version(historial_insumo(insumo), objetivo[clave][1], vigente_desde, fuente)
+        cambios.append((insumo["id"], {"historial_precios": historial, "Precio Unitario": precio_vigente(historial)}))
+
+    actualizados = 0
+    errores: List[str] = []
+    col = db.collection("insumos")
+    for inicio in range(0, len(cambios), LIMITE_BATCH):
+        bloque = cambios[inicio:inicio + LIMITE_BATCH]
+        try:
+            batch = db.batch()
+            for insumo_id, datos in bloque:
+                batch.update(col.document(insumo_id), datos)
+            batch.commit()
+            actualizados += len(bloque)
+        except Exception as e:
+            registrar_error(e)
+            errores.append(f"Insumos {inicio + 1}-{inicio + len(bloque)}: {e}")
+    if actualizados:
+        _marcar_cambio_insumos()
+    no_encontrados = [nombre for clave, (nombre, _) in objetivo.items() if clave not in encontrados]
+    return actualizados, no_encontrados, errores
 
 
 def eliminar_insumo(insumo_id: str) -> None:
@@ -249,13 +1110,15 @@ def eliminar_insumo(insumo_id: str) -> None:
     Elimina un insumo en Firestore usando su ID de documento.
     """
     db.collection("insumos").document(insumo_id).delete()
+    _marcar_cambio_insumos()
 
 
 # ==================== CRONOGRAMA VALORIZADO ====================
 
 def obtener_cronograma_obra(codigo_obra: str) -> List[Dict[str, Any]]:
-    datos = cargar_datos_obra(codigo_obra)
-    cronograma = datos.get("cronograma", [])
+    # Solo el campo cronograma: no descarga los partes de la obra
+    doc = db.collection("obras").document(codigo_obra).get(field_paths=["cronograma"])
+    cronograma = (doc.to_dict() or {}).get("cronograma", []) if doc.exists else []
     return cronograma if isinstance(cronograma, list) else []
 
 
@@ -272,6 +1135,35 @@ def agregar_partida_cronograma(codigo_obra: str, partida: Dict[str, Any]) -> Tup
         return False, str(e)
 
 
+def agregar_partidas_cronograma_lote(codigo_obra: str, partidas: List[Dict[str, Any]]) -> Tuple[bool, str]:
+    """
+    Agrega muchas partidas al cronograma con una sola escritura sobre la obra
+    (importación). Cada partida recibe su propio ID si no lo trae.
+    """
+    if not partidas:
+        return True, "Nada que guardar."
+    try:
+        base = _new_id("crono")
+        nuevas = []
+        for i, p in enumerate(partidas):
+            p = dict(p or {})
+            p.setdefault("id", f"{base}_{i:04d}")
+            nuevas.append(p)
+        db.collection("obras").document(codigo_obra).update({
+            "cronograma": firestore.ArrayUnion(nuevas),
+            "version_datos": firestore.Increment(1),
+        })
+        # Los tramos nuevos se fusionan con los existentes (sin releer el cronograma)
+        plan = _plan_resumen(nuevas)
+        _intentar(_resumen_ref(codigo_obra).set, {
+            "plan_tramos": plan["plan_tramos"],
+            "pv_total": firestore.Increment(plan["pv_total"]),
+        }, merge=True)
+        return True, f"{len(nuevas)} partida(s) agregada(s)."
+    except Exception as e:
+        return False, str(e)
+
+
 def actualizar_partida_cronograma(codigo_obra: str, partida_id: str, data_upd: Dict[str, Any]) -> Tuple[bool, str]:
     try:
         datos = cargar_datos_obra(codigo_obra)
@@ -367,6 +1259,33 @@ def eliminar_hito_pago(codigo_obra: str, hito_id: str) -> Tuple[bool, str]:
         return False, str(e)
 
 
+def obtener_datos_flujo_caja(codigo_obra: str) -> Dict[str, Any]:
+    """
+    Entradas del flujo de caja proyectado (modules.flujo_caja): cronograma e hitos
+    sin descargar los partes, egresos aprobados de caja chica y donaciones.
+    """
+    try:
+        doc = db.collection("obras").document(codigo_obra).get(field_paths=["cronograma", "hitos_pago"])
+        datos = (doc.to_dict() or {}) if doc.exists else {}
+        movimientos = [
+            d.to_dict()
+            for d in db.collection("movimientos")
+            .where("obra_codigo", "==", codigo_obra)
+            .where("tipo", "==", "egreso")
+            .where("estado", "==", "Aprobado")
+            .stream()
+        ]
+        return {
+            "cronograma": datos.get("cronograma") if isinstance(datos.get("cronograma"), list) else [],
+            "hitos": datos.get("hitos_pago") if isinstance(datos.get("hitos_pago"), list) else [],
+            "movimientos": movimientos,
+            "donaciones": obtener_donaciones_obra(codigo_obra),
+        }
+    except Exception as e:
+        registrar_error(e)
+        return {"cronograma": [], "hitos": [], "movimientos": [], "donaciones": []}
+
+
 # ============================================================
 # TRABAJOS ADICIONALES (No Contemplados)
 # ============================================================
@@ -376,42 +1295,184 @@ def obtener_trabajos_adicionales(codigo_obra: str) -> List[Dict[str, Any]]:
     try:
         trabajos = db.collection("trabajos_adicionales").where("codigo_obra", "==", codigo_obra).stream()
         return [{"id": doc.id, **doc.to_dict()} for doc in trabajos]
-    except Exception:
+    except Exception as e:
+        registrar_error(e)
         return []
 
 
+ESTADOS_TRABAJO = ["Por cobrar", "Aprobado", "Cobrado"]
+TRABAJOS_POR_PAGINA = 25
+
+
+def _clave_estado_trabajo(estado: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(estado or "Por cobrar").strip().lower()).strip("_") or "por_cobrar"
+
+
+def _totales_trabajos(
+    agregados: List[Dict[str, Any]], quitados: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Cantidad, costo y cobro por estado (los quitados restan)."""
+    totales: Dict[str, Dict[str, Any]] = {}
+    for signo, lista in ((1, agregados or []), (-1, quitados or [])):
+        for t in lista:
+            estado = str(t.get("estado") or "Por cobrar")
+            nodo = totales.setdefault(
+                _clave_estado_trabajo(estado), {"estado": estado, "cantidad": 0, "costo": 0.0, "cobro": 0.0}
+            )
+            nodo["cantidad"] += signo
+            nodo["costo"] += signo * _float(t.get("costo_incurrido"))
+            nodo["cobro"] += signo * _float(t.get("precio_cobro"))
+    return totales
+
+
+def _deltas_trabajos(
+    agregados: List[Dict[str, Any]], quitados: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Incrementos para el mapa `trabajos` de obras_resumen/{codigo}."""
+    return {
+        "trabajos": {
+            clave: {
+                "estado": nodo["estado"],
+                "cantidad": firestore.Increment(nodo["cantidad"]),
+                "costo": firestore.Increment(nodo["costo"]),
+                "cobro": firestore.Increment(nodo["cobro"]),
+            }
+            for clave, nodo in _totales_trabajos(agregados, quitados).items()
+        },
+        "actualizado_en": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
 def agregar_trabajo_adicional(codigo_obra: str, trabajo: Dict[str, Any]) -> Tuple[bool, str]:
-    """Agrega un nuevo trabajo adicional/no contemplado."""
+    """Agrega un nuevo trabajo adicional/no contemplado y suma su aporte a los totales por estado."""
     try:
         trabajo = dict(trabajo or {})
         trabajo["codigo_obra"] = codigo_obra
         trabajo.setdefault("fecha_creacion", datetime.now().isoformat())
+        # La consulta global ordena por fecha y Firestore omite los documentos sin ese campo
+        trabajo.setdefault("fecha", datetime.now().date().isoformat())
         trabajo.setdefault("estado", "Por cobrar")  # Por cobrar, Aprobado, Cobrado
-        
-        doc_ref = db.collection("trabajos_adicionales").add(trabajo)
+        trabajo.setdefault("ganancia", _float(trabajo.get("precio_cobro")) - _float(trabajo.get("costo_incurrido")))
+
+        doc_ref = db.collection("trabajos_adicionales").document()
+
+        @firestore.transactional
+        def _agregar(transaction) -> None:
+            transaction.create(doc_ref, trabajo)
+            transaction.set(_resumen_ref(codigo_obra), _deltas_trabajos([trabajo]), merge=True)
+
+        _agregar(db.transaction())
         return True, "Trabajo adicional agregado correctamente."
     except Exception as e:
         return False, str(e)
 
 
 def actualizar_trabajo_adicional(trabajo_id: str, data_upd: Dict[str, Any]) -> Tuple[bool, str]:
-    """Actualiza un trabajo adicional existente."""
+    """Actualiza un trabajo adicional; si cambia estado o montos, mueve su aporte entre los totales por estado."""
     try:
-        db.collection("trabajos_adicionales").document(trabajo_id).update(data_upd)
-        return True, "Trabajo adicional actualizado."
+        doc_ref = db.collection("trabajos_adicionales").document(trabajo_id)
+
+        @firestore.transactional
+        def _actualizar(transaction) -> bool:
+            snap = doc_ref.get(transaction=transaction)
+            if not snap.exists:
+                return False
+            anterior = snap.to_dict() or {}
+            cambios = dict(data_upd or {})
+            nuevo = {**anterior, **cambios}
+            if "costo_incurrido" in cambios or "precio_cobro" in cambios:
+                cambios["ganancia"] = _float(nuevo.get("precio_cobro")) - _float(nuevo.get("costo_incurrido"))
+            transaction.update(doc_ref, cambios)
+            codigo_obra = anterior.get("codigo_obra")
+            if codigo_obra:
+                transaction.set(_resumen_ref(codigo_obra), _deltas_trabajos([nuevo], [anterior]), merge=True)
+            return True
+
+        if _actualizar(db.transaction()):
+            return True, "Trabajo adicional actualizado."
+        return False, "No se encontró el trabajo adicional."
     except Exception as e:
         return False, str(e)
 
 
 def eliminar_trabajo_adicional(trabajo_id: str) -> Tuple[bool, str]:
-    """Elimina un trabajo adicional."""
+    """Elimina un trabajo adicional y descuenta su aporte de los totales por estado."""
     try:
-        db.collection("trabajos_adicionales").document(trabajo_id).delete()
+        doc_ref = db.collection("trabajos_adicionales").document(trabajo_id)
+
+        @firestore.transactional
+        def _eliminar(transaction) -> None:
+            snap = doc_ref.get(transaction=transaction)
+            if not snap.exists:
+                return
+            anterior = snap.to_dict() or {}
+            transaction.delete(doc_ref)
+            if anterior.get("codigo_obra"):
+                transaction.set(_resumen_ref(anterior["codigo_obra"]), _deltas_trabajos([], [anterior]), merge=True)
+
+        _eliminar(db.transaction())
         return True, "Trabajo adicional eliminado."
     except Exception as e:
         return False, str(e)
 
+
+def listar_trabajos_adicionales(
+    codigo_obra: Optional[str] = None,
+    estado: Optional[str] = None,
+    limite: int = TRABAJOS_POR_PAGINA,
+    despues_de: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Una página de trabajos adicionales, del más reciente al más antiguo, filtrando en el servidor.
+    Usa los índices compuestos de firestore.indexes.json.
+    Retorna (trabajos, id_del_ultimo) - el id se pasa como `despues_de` para la página siguiente (None si no hay más).
+    Los errores de Firestore se propagan (FailedPrecondition si falta un índice): una
+    lista vacía se confundiría con "no hay trabajos".
+    """
+    query = db.collection("trabajos_adicionales")
+    if codigo_obra:
+        query = query.where("codigo_obra", "==", codigo_obra)
+    if estado:
+        query = query.where("estado", "==", estado)
+    query = query.order_by("fecha_creacion", direction=firestore.Query.DESCENDING)
+    if despues_de:
+        cursor = db.collection("trabajos_adicionales").document(despues_de).get()
+        if cursor.exists:
+            query = query.start_after(cursor)
+    docs = list(query.limit(limite + 1).stream())
+    trabajos = [{"id": d.id, **d.to_dict()} for d in docs[:limite]]
+    siguiente = docs[limite - 1].id if len(docs) > limite else None
+    return trabajos, siguiente
+
+
+def obtener_totales_trabajos_obra(codigo_obra: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Totales por estado precalculados; None si la obra aún no los tiene."""
+    try:
+        doc = _resumen_ref(codigo_obra).get(field_paths=["trabajos"])
+        datos = (doc.to_dict() or {}) if doc.exists else {}
+        return datos.get("trabajos") if "trabajos" in datos else None
+    except Exception as e:
+        registrar_error(e)
+        return None
+
+
+def reconstruir_totales_trabajos(codigo_obra: str) -> Tuple[bool, str]:
+    """Recalcula los totales por estado recorriendo los trabajos de la obra."""
+    try:
+        totales = _totales_trabajos(obtener_trabajos_adicionales(codigo_obra))
+        fijar_resumen_obra(codigo_obra, {"trabajos": totales})
+        return True, "Totales de trabajos adicionales reconstruidos."
+    except Exception as e:
+        return False, str(e)
+
 # ==================== DONACIONES ====================
+# Los totales (efectivo, especie, cantidad) y las donaciones por donante viven
+# en obras_resumen/{obra} y se actualizan en la misma transacción que cada
+# alta, edición o baja. El encabezado de la obra y la sección Donaciones los
+# leen de ahí; el historial se pagina en el servidor.
+
+DONACIONES_POR_PAGINA = 20
+
 
 def obtener_donaciones_obra(obra_codigo: str) -> List[Dict[str, Any]]:
     """Obtiene todas las donaciones registradas para una obra."""
@@ -423,16 +1484,68 @@ def obtener_donaciones_obra(obra_codigo: str) -> List[Dict[str, Any]]:
             donacion["id"] = doc.id
             donaciones.append(donacion)
         return donaciones
-    except Exception:
+    except Exception as e:
+        registrar_error(e)
         return []
 
 
+def _totales_donaciones(donaciones: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totales de un conjunto de donaciones, con la cantidad de donaciones por donante."""
+    efectivo = especie = 0.0
+    por_donante: Dict[str, int] = {}
+    for d in donaciones:
+        ef, es = _valor_donacion(d)
+        efectivo += ef
+        especie += es
+        if normalizar_nombre_donante(d.get("nombre_donante")):
+            clave = _slug_donante(d.get("nombre_donante"))
+            por_donante[clave] = por_donante.get(clave, 0) + 1
+    return {"efectivo": efectivo, "especie": especie, "cantidad": len(donaciones), "donantes": por_donante}
+
+
+def _deltas_donaciones(
+    agregadas: List[Dict[str, Any]], quitadas: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    mas = _totales_donaciones(agregadas)
+    menos = _totales_donaciones(quitadas or [])
+    efectivo = mas["efectivo"] - menos["efectivo"]
+    especie = mas["especie"] - menos["especie"]
+    deltas: Dict[str, Any] = {
+        k: firestore.Increment(v)
+        for k, v in {
+            "donaciones_efectivo": efectivo,
+            "donaciones_especie": especie,
+            "donaciones_total": efectivo + especie,
+            "cantidad_donaciones": mas["cantidad"] - menos["cantidad"],
+        }.items()
+        if v
+    }
+    por_donante = {
+        clave: mas["donantes"].get(clave, 0) - menos["donantes"].get(clave, 0)
+        for clave in set(mas["donantes"]) | set(menos["donantes"])
+    }
+    por_donante = {k: firestore.Increment(v) for k, v in por_donante.items() if v}
+    if por_donante:
+        deltas["donaciones_por_donante"] = por_donante
+    deltas["actualizado_en"] = datetime.now().isoformat(timespec="seconds")
+    return deltas
+
+
 def agregar_donacion(obra_codigo: str, donacion: Dict[str, Any]) -> Tuple[bool, str]:
     """Agrega una nueva donación para una obra."""
     try:
         donacion["obra_codigo"] = obra_codigo
         donacion.setdefault("fecha_registro", datetime.now().isoformat())
-        db.collection("donaciones").add(donacion)
+        doc_ref = db.collection("donaciones").document()
+
+        @firestore.transactional
+        def _agregar(transaction) -> None:
+            transaction.create(doc_ref, donacion)
+            transaction.set(_resumen_ref(obra_codigo), _deltas_donaciones([donacion]), merge=True)
+
+        _agregar(db.transaction())
+        if donacion.get("nombre_donante"):
+            _intentar(agregar_donante, obra_codigo, {"nombre": donacion["nombre_donante"]})
         return True, "Donación registrada correctamente."
     except Exception as e:
         return False, str(e)
@@ -442,7 +1555,26 @@ def actualizar_donacion(obra_codigo: str, donacion_id: str, datos: Dict[str, Any
     """Actualiza los datos de una donación existente."""
     try:
         datos["fecha_actualización"] = datetime.now().isoformat()
-        db.collection("donaciones").document(donacion_id).update(datos)
+        ref = db.collection("donaciones").document(donacion_id)
+
+        @firestore.transactional
+        def _actualizar(transaction) -> bool:
+            snap = ref.get(transaction=transaction)
+            if not snap.exists:
+                return False
+            anterior = snap.to_dict() or {}
+            transaction.update(ref, datos)
+            transaction.set(
+                _resumen_ref(anterior.get("obra_codigo") or obra_codigo),
+                _deltas_donaciones([{**anterior, **datos}], [anterior]),
+                merge=True,
+            )
+            return True
+
+        if not _actualizar(db.transaction()):
+            return False, "La donación no existe."
+        if datos.get("nombre_donante"):
+            _intentar(agregar_donante, obra_codigo, {"nombre": datos["nombre_donante"]})
         return True, "Donación actualizada correctamente."
     except Exception as e:
         return False, str(e)
@@ -451,12 +1583,88 @@ def actualizar_donacion(obra_codigo: str, donacion_id: str, datos: Dict[str, Any
 def eliminar_donacion(donacion_id: str) -> Tuple[bool, str]:
     """Elimina una donación."""
     try:
-        db.collection("donaciones").document(donacion_id).delete()
+        ref = db.collection("donaciones").document(donacion_id)
+
+        @firestore.transactional
+        def _eliminar(transaction) -> None:
+            snap = ref.get(transaction=transaction)
+            if not snap.exists:
+                return
+            anterior = snap.to_dict() or {}
+            transaction.delete(ref)
+            if anterior.get("obra_codigo"):
+                transaction.set(_resumen_ref(anterior["obra_codigo"]), _deltas_donaciones([], [anterior]), merge=True)
+
+        _eliminar(db.transaction())
         return True, "Donación eliminada correctamente."
     except Exception as e:
         return False, str(e)
 
 
+def listar_donaciones(
+    obra_codigo: str,
+    tipo_donacion: Optional[str] = None,
+    limite: int = DONACIONES_POR_PAGINA,
+    despues_de: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Una página del historial de donaciones de la obra, de la más reciente a la
+    más antigua, filtrando por tipo en el servidor.
+    Retorna (donaciones, id_de_la_ultima) - el id se pasa como `despues_de` para la página siguiente.
+    Los errores de Firestore se propagan (FailedPrecondition si falta un índice): una
+    lista vacía se confundiría con "no hay donaciones".
+    """
+    query = db.collection("donaciones").where("obra_codigo", "==", obra_codigo)
+    if tipo_donacion:
+        query = query.where("tipo_donacion", "==", tipo_donacion)
+    query = query.order_by("fecha_registro", direction=firestore.Query.DESCENDING)
+    if despues_de:
+        cursor = db.collection("donaciones").document(despues_de).get()
+        if cursor.exists:
+            query = query.start_after(cursor)
+    docs = list(query.limit(limite + 1).stream())
+    donaciones = [{"id": d.id, **d.to_dict()} for d in docs[:limite]]
+    siguiente = docs[limite - 1].id if len(docs) > limite else None
+    return donaciones, siguiente
+
+
+def obtener_totales_donaciones(obra_codigo: str) -> Optional[Dict[str, Any]]:
+    """
+    Totales de donaciones del resumen de la obra (una lectura con máscara de campos).
+    None si la obra aún no tiene el desglose por donante (resumen anterior a este campo).
+    """
+    try:
+        doc = _resumen_ref(obra_codigo).get(field_paths=[
+            "donaciones_efectivo", "donaciones_especie", "donaciones_total",
+            "cantidad_donaciones", "donaciones_por_donante",
+        ])
+        datos = (doc.to_dict() or {}) if doc.exists else {}
+        if "donaciones_por_donante" not in datos and _float(datos.get("cantidad_donaciones")) > 0:
+            return None
+        return datos
+    except Exception as e:
+        registrar_error(e)
+        return None
+
+
+# Cada donante es donantes/{obra}__{nombre_normalizado_slug}: el alta es un
+# get-or-create transaccional por ID, sin recorrer los donantes de la obra.
+# nombre_normalizado (minúsculas, sin tildes) sostiene la búsqueda por prefijo.
+
+def normalizar_nombre_donante(nombre: Any) -> str:
+    """Minúsculas, sin tildes y con espacios simples ("  José  Núñez " -> "jose nunez")."""
+    s = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(s.lower().split())
+
+
+def _slug_donante(nombre: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", normalizar_nombre_donante(nombre)).strip("_") or "sin_nombre"
+
+
+def _id_donante(obra_codigo: str, nombre: Any) -> str:
+    return f"{obra_codigo}__{_slug_donante(nombre)}"
+
+
 def obtener_donantes_obra(obra_codigo: str) -> List[Dict[str, str]]:
     """Obtiene lista de donantes únicos registrados para una obra."""
     try:
@@ -467,40 +1675,92 @@ def obtener_donantes_obra(obra_codigo: str) -> List[Dict[str, str]]:
             donante["id"] = doc.id
             donantes.append(donante)
         return donantes
-    except Exception:
+    except Exception as e:
+        registrar_error(e)
+        return []
+
+
+def buscar_donantes(obra_codigo: str, prefijo: str, limite: int = 10) -> List[Dict[str, Any]]:
+    """Donantes de la obra cuyo nombre empieza por `prefijo` (sin distinguir mayúsculas ni tildes)."""
+    inicio = normalizar_nombre_donante(prefijo)
+    if not inicio:
+        return []
+    try:
+        query = (
+            db.collection("donantes")
+            .where("obra_codigo", "==", obra_codigo)
+            .where("nombre_normalizado", ">=", inicio)
+            .where("nombre_normalizado", "<", inicio + "\uf8ff")
+            .order_by("nombre_normalizado")
+            .limit(limite)
+        )
+        return [{"id": d.id, **d.to_dict()} for d in query.stream()]
+    except Exception as e:
+        registrar_error(e)
         return []
 
 
 def agregar_donante(obra_codigo: str, donante: Dict[str, Any]) -> Tuple[bool, str]:
-    """Agrega o actualiza información de un donante."""
+    """Agrega o actualiza información de un donante (una lectura y una escritura, en transacción)."""
     try:
-        donante["obra_codigo"] = obra_codigo
-        donante.setdefault("fecha_registro", datetime.now().isoformat())
-        
-        # Verificar si ya existe
-        nombre = donante.get("nombre", "").strip().lower()
-        docs = db.collection("donantes").where("obra_codigo", "==", obra_codigo).stream()
-        
-        for doc in docs:
-            if doc.to_dict().get("nombre", "").strip().lower() == nombre:
-                # Actualizar existente
-                donante.pop("fecha_registro", None)
-                donante["fecha_actualización"] = datetime.now().isoformat()
-                db.collection("donantes").document(doc.id).update(donante)
-                return True, "Donante actualizado correctamente."
-        
-        # Crear nuevo
-        db.collection("donantes").add(donante)
-        return True, "Donante registrado correctamente."
+        nombre = str(donante.get("nombre", "")).strip()
+        if not normalizar_nombre_donante(nombre):
+            return False, "El nombre del donante es requerido."
+        ref = db.collection("donantes").document(_id_donante(obra_codigo, nombre))
+        ahora = datetime.now().isoformat()
+        datos = {**donante, "nombre": nombre, "obra_codigo": obra_codigo,
+                 "nombre_normalizado": normalizar_nombre_donante(nombre)}
+
+        @firestore.transactional
+        def _upsert(transaction) -> bool:
+            snap = ref.get(transaction=transaction)
+            if snap.exists:
+                datos.pop("fecha_registro", None)
+                transaction.update(ref, {**datos, "fecha_actualización": ahora})
+                return False
+            transaction.create(ref, {**datos, "fecha_registro": datos.get("fecha_registro", ahora)})
+            return True
+
+        creado = _upsert(db.transaction())
+        return True, "Donante registrado correctamente." if creado else "Donante actualizado correctamente."
     except Exception as e:
         return False, str(e)
 
 
 def actualizar_donante(donante_id: str, datos: Dict[str, Any]) -> Tuple[bool, str]:
-    """Actualiza la información de un donante."""
+    """
+    Actualiza la información de un donante. Si cambia el nombre, el documento
+    pasa a su nuevo ID en la misma transacción (falla si ese nombre ya existe).
+    """
     try:
-        datos["fecha_actualización"] = datetime.now().isoformat()
-        db.collection("donantes").document(donante_id).update(datos)
+        datos = {**datos, "fecha_actualización": datetime.now().isoformat()}
+        ref = db.collection("donantes").document(donante_id)
+        if "nombre" not in datos:
+            ref.update(datos)
+            return True, "Donante actualizado correctamente."
+
+        datos["nombre"] = str(datos["nombre"]).strip()
+        datos["nombre_normalizado"] = normalizar_nombre_donante(datos["nombre"])
+
+        @firestore.transactional
+        def _renombrar(transaction) -> Optional[str]:
+            snap = ref.get(transaction=transaction)
+            if not snap.exists:
+                return "El donante no existe."
+            actual = snap.to_dict() or {}
+            nuevo_ref = db.collection("donantes").document(_id_donante(actual.get("obra_codigo", ""), datos["nombre"]))
+            if nuevo_ref.id == ref.id:
+                transaction.update(ref, datos)
+                return None
+            if nuevo_ref.get(transaction=transaction).exists:
+                return "Ya existe un donante con ese nombre en la obra."
+            transaction.create(nuevo_ref, {**actual, **datos})
+            transaction.delete(ref)
+            return None
+
+        error = _renombrar(db.transaction())
+        if error:
+            return False, error
         return True, "Donante actualizado correctamente."
     except Exception as e:
         return False, str(e)
@@ -512,4 +1772,430 @@ def eliminar_donante(donante_id: str) -> Tuple[bool, str]:
         db.collection("donantes").document(donante_id).delete()
         return True, "Donante eliminado correctamente."
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
+
+
+def _marca_donante(datos: Dict[str, Any]) -> str:
+    """Última escritura del donante (fechas ISO, comparables como texto)."""
+    return max(str(datos.get("fecha_actualización") or ""), str(datos.get("fecha_registro") or ""))
+
+
+def migrar_donantes(codigo_obra: Optional[str] = None) -> Tuple[int, List[str]]:
+    """
+    Pasa los donantes creados con ID automático a su ID determinístico
+    (los repetidos por nombre se fusionan; en cada campo gana el registro con la
+    escritura más reciente y se conserva la fecha de registro más antigua).
+    Retorna (donantes_migrados, errores).
+    """
+    query = db.collection("donantes")
+    if codigo_obra:
+        query = query.where("obra_codigo", "==", codigo_obra)
+    grupos: Dict[str, List[Any]] = {}
+    for doc in query.stream():
+        d = doc.to_dict() or {}
+        grupos.setdefault(_id_donante(d.get("obra_codigo", ""), d.get("nombre", "")), []).append((doc, d))
+
+    migrados = 0
+    errores: List[str] = []
+    batch = db.batch()
+    operaciones = 0
+    pendientes: List[str] = []
+
+    def _confirmar() -> int:
+        try:
+            batch.commit()
+            return len(pendientes)
+        except Exception as e:
+            registrar_error(e)
+            errores.append(f"{', '.join(pendientes)}: {e}")
+            return 0
+
+    for destino, docs in grupos.items():
+        antiguos = [doc for doc, _ in docs if doc.id != destino]
+        if not antiguos:
+            continue
+        fusion: Dict[str, Any] = {}
+        for _, d in sorted(docs, key=lambda par: _marca_donante(par[1])):
+            fusion.update(d)
+        registros = [str(d["fecha_registro"]) for _, d in docs if d.get("fecha_registro")]
+        if registros:
+            fusion["fecha_registro"] = min(registros)
+        fusion["nombre_normalizado"] = normalizar_nombre_donante(fusion.get("nombre", ""))
+
+        if operaciones + 1 + len(antiguos) > LIMITE_BATCH and operaciones:
+            migrados += _confirmar()
+            batch, operaciones, pendientes = db.batch(), 0, []
+        batch.set(db.collection("donantes").document(destino), fusion, merge=True)
+        for doc in antiguos:
+            batch.delete(doc.reference)
+        operaciones += 1 + len(antiguos)
+        pendientes += [doc.id for doc in antiguos]
+    if operaciones:
+        migrados += _confirmar()
+    return migrados, errores
+
+
+# ==================== CONFIGURACIÓN KPI ====================
+# Metas por obra en el campo `kpi` del documento de la obra. Cada escritura sube
+# `kpi.version` dentro de una transacción: si otra sesión guardó antes, se rechaza
+# en lugar de pisar sus cambios.
+# El avance programado de hoy se deriva del cronograma aprobado (curva_s.avance_programado);
+# `avance_programado_manual` solo se usa en obras sin cronograma aprobado.
+
+KPI_DEFECTO: Dict[str, Any] = {"avance_programado_manual": 0.0, "version": 0}
+
+
+def obtener_config_kpi(codigo_obra: str) -> Dict[str, Any]:
+    try:
+        doc = db.collection("obras").document(codigo_obra).get(field_paths=["kpi"])
+        kpi = (doc.to_dict() or {}).get("kpi") if doc.exists else None
+    except Exception as e:
+        registrar_error(e)
+        kpi = None
+    return {**KPI_DEFECTO, **(kpi if isinstance(kpi, dict) else {})}
+
+
+def guardar_config_kpi(
+    codigo_obra: str, cambios: Dict[str, Any], version_esperada: Optional[int] = None, usuario: str = ""
+) -> Tuple[bool, str]:
+    """
+    Aplica `cambios` sobre la configuración KPI y sube su versión.
+    Con `version_esperada` la escritura solo procede si nadie guardó desde esa versión.
+    """
+    try:
+        ref = db.collection("obras").document(codigo_obra)
+        cambios = {k: v for k, v in (cambios or {}).items() if k not in ("version", "actualizado_en", "actualizado_por")}
+
+        @firestore.transactional
+        def _guardar(transaction) -> Optional[int]:
+            snap = ref.get(field_paths=["kpi"], transaction=transaction)
+            actual = (snap.to_dict() or {}).get("kpi") if snap.exists else None
+            actual = actual if isinstance(actual, dict) else {}
+            version = int(actual.get("version", 0) or 0)
+            if version_esperada is not None and version != int(version_esperada):
+                return None
+            transaction.set(ref, {"kpi": {
+                **actual,
+                **cambios,
+                "version": version + 1,
+                "actualizado_en": datetime.now().isoformat(timespec="seconds"),
+                "actualizado_por": usuario,
+            }}, merge=True)
+            return version + 1
+
+        version = _guardar(db.transaction())
+        if version is None:
+            return False, "Otra sesión modificó la configuración KPI. Recarga para ver el valor actual."
+        return True, f"Configuración KPI guardada (versión {version})."
+    except Exception as e:
+        return False, str(e)
+
+
+def migrar_config_kpi_archivos(directorio: Union[os.PathLike, str] = "obras_kpi") -> Tuple[int, List[str]]:
+    """
+    Pasa los archivos locales obras_kpi/<codigo>.json al campo `kpi` de cada obra
+    (migración única). El avance programado tecleado queda como `avance_programado_manual`.
+    No pisa obras que ya tienen configuración en Firestore. Retorna (migradas, errores).
+    """
+    migradas = 0
+    errores: List[str] = []
+    if not os.path.isdir(directorio):
+        return migradas, errores
+    for nombre in sorted(os.listdir(directorio)):
+        if not nombre.endswith(".json"):
+            continue
+        codigo = nombre[:-len(".json")]
+        try:
+            with open(os.path.join(directorio, nombre), "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            if not isinstance(datos, dict):
+                errores.append(f"{nombre}: formato inválido")
+                continue
+            if obtener_config_kpi(codigo)["version"]:
+                continue
+            if "avance_programado" in datos:
+                datos["avance_programado_manual"] = float(datos.pop("avance_programado") or 0)
+            ok, msg = guardar_config_kpi(codigo, datos, version_esperada=0, usuario="migracion")
+            if ok:
+                migradas += 1
+            else:
+                errores.append(f"{codigo}: {msg}")
+        except Exception as e:
+            registrar_error(e)
+            errores.append(f"{nombre}: {e}")
+    return migradas, errores
+
+
+# ==================== ASIGNACIONES DE USUARIOS ====================
+# asignaciones_usuarios/{usuario}: {"usuario", "obras": {codigo: nombre}, ...}
+# Un documento por usuario: sus obras se resuelven con una sola lectura,
+# sin recorrer la colección de obras.
+
+def _asignacion_ref(usuario: str):
+    return db.collection("asignaciones_usuarios").document(str(usuario).strip())
+
+
+def obtener_obras_asignadas(usuario: str) -> Dict[str, str]:
+    """{codigo: nombre} de las obras asignadas al usuario ({} si no tiene asignación)."""
+    if not str(usuario or "").strip():
+        return {}
+    try:
+        doc = _asignacion_ref(usuario).get()
+        obras = (doc.to_dict() or {}).get("obras") if doc.exists else None
+        return dict(obras) if isinstance(obras, dict) else {}
+    except Exception as e:
+        registrar_error(e)
+        return {}
+
+
+def listar_asignaciones_usuarios() -> Dict[str, Dict[str, str]]:
+    """{usuario: {codigo: nombre}} de todos los usuarios con asignación."""
+    try:
+        return {
+            d.id: dict((d.to_dict() or {}).get("obras") or {})
+            for d in db.collection("asignaciones_usuarios").stream()
+        }
+    except Exception as e:
+        registrar_error(e)
+        return {}
+
+
+def guardar_asignacion_usuario(usuario: str, obras: Dict[str, str], asignado_por: str = "") -> Tuple[bool, str]:
+    """Reemplaza las obras asignadas al usuario."""
+    usuario = str(usuario or "").strip()
+    if not usuario or "/" in usuario:
+        return False, "Usuario inválido."
+    try:
+        _asignacion_ref(usuario).set({
+            "usuario": usuario,
+            "obras": {str(c): str(n or c) for c, n in (obras or {}).items()},
+            "actualizado_en": datetime.now().isoformat(timespec="seconds"),
+            "actualizado_por": asignado_por,
+        })
+        return True, f"{len(obras or {})} obra(s) asignada(s) a {usuario}."
+    except Exception as e:
+        return False, str(e)
+
+
+def eliminar_asignacion_usuario(usuario: str) -> Tuple[bool, str]:
+    try:
+        _asignacion_ref(usuario).delete()
+        return True, "Asignación eliminada."
+    except Exception as e:
+        return False, str(e)
+
+
+# ==================== RESUMEN POR OBRA (PORTAFOLIO) ====================
+# Un documento obras_resumen/{codigo} por obra, mantenido con incrementos en
+# cada escritura. El portafolio se arma con una sola consulta a esta colección.
+
+CAMPOS_RESUMEN_NUMERICOS = [
+    "presupuesto_total",
+    "gastado_total",
+    "avance_real_total",
+    "cantidad_partes",
+    "donaciones_efectivo",
+    "donaciones_especie",
+    "donaciones_total",
+    "cantidad_donaciones",
+    "caja_ingresos",
+    "caja_egresos",
+    "caja_pendientes",
+    "pv_total",
+    "partes_pendientes",
+]
+
+
+def _resumen_ref(codigo_obra: str):
+    return db.collection("obras_resumen").document(codigo_obra)
+
+
+def _total_avance(avance: Dict[str, Any]) -> float:
+    """Mismo criterio que calcular_gastos_acumulados: total ejecutado o, si falta, total general."""
+    totales = avance.get("totales", {}) if isinstance(avance.get("totales", {}), dict) else {}
+    try:
+        return float(totales.get("total_general_ejecutado", 0) or totales.get("total_general", 0) or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _pct_avance(avance: Dict[str, Any]) -> float:
+    try:
+        return float(avance.get("avance_pct", avance.get("avance", 0)) or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _valor_donacion(donacion: Dict[str, Any]) -> Tuple[float, float]:
+    """Retorna (efectivo, especie) de una donación, igual que calcular_resumen_donaciones."""
+    tipo = str((donacion or {}).get("tipo_donacion", "")).lower()
+    try:
+        cantidad = float(donacion.get("cantidad", 0) or 0)
+        valor_unitario = float(donacion.get("valor_unitario", 0) or 0)
+    except (ValueError, TypeError):
+        return 0.0, 0.0
+    if tipo == "efectivo":
+        return cantidad, 0.0
+    if tipo == "insumo":
+        return 0.0, cantidad * valor_unitario
+    return 0.0, 0.0
+
+
+def _tramo_plan(partida: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Tramo del plan (PV) de una partida aprobada; None si no aporta al plan."""
+    if not isinstance(partida, dict) or partida.get("estado", "Aprobado") != "Aprobado":
+        return None
+    try:
+        monto = float(partida.get("monto_planificado", 0) or 0)
+    except (ValueError, TypeError):
+        return None
+    inicio = str(partida.get("fecha_inicio", ""))[:10]
+    fin = str(partida.get("fecha_fin", ""))[:10]
+    if monto <= 0 or not inicio or not fin or fin < inicio:
+        return None
+    return {"inicio": inicio, "fin": fin, "monto": monto}
+
+
+def _plan_resumen(cronograma: List[Dict[str, Any]]) -> Dict[str, Any]:
+    tramos = {}
+    for i, it in enumerate(cronograma or []):
+        tramo = _tramo_plan(it)
+        if tramo:
+            tramos[str(it.get("id") or f"sin_id_{i}")] = tramo
+    return {"plan_tramos": tramos, "pv_total": sum(t["monto"] for t in tramos.values())}
+
+
+def _deltas_avances(agregados: List[Dict[str, Any]], quitados: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    quitados = quitados or []
+    return {
+        "gastado_total": firestore.Increment(
+            sum(_total_avance(a) for a in agregados) - sum(_total_avance(a) for a in quitados)
+        ),
+        "avance_real_total": firestore.Increment(
+            sum(_pct_avance(a) for a in agregados) - sum(_pct_avance(a) for a in quitados)
+        ),
+        "cantidad_partes": firestore.Increment(len(agregados) - len(quitados)),
+        "partes_pendientes": firestore.Increment(
+            sum(1 for a in agregados if _es_pendiente(a)) - sum(1 for a in quitados if _es_pendiente(a))
+        ),
+        "actualizado_en": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def incrementar_resumen_obra(codigo_obra: str, deltas: Dict[str, float], transaction=None) -> None:
+    """Suma `deltas` a los campos numéricos del resumen (crea el documento si no existe)."""
+    data: Dict[str, Any] = {k: firestore.Increment(v) for k, v in (deltas or {}).items() if v}
+    if not data:
+        return
+    data["actualizado_en"] = datetime.now().isoformat(timespec="seconds")
+    if transaction is not None:
+        transaction.set(_resumen_ref(codigo_obra), data, merge=True)
+    else:
+        _resumen_ref(codigo_obra).set(data, merge=True)
+
+
+def fijar_resumen_obra(codigo_obra: str, campos: Dict[str, Any], transaction=None) -> None:
+    """Reemplaza campos concretos del resumen (presupuesto, plan, nombre)."""
+    data = dict(campos or {})
+    data["actualizado_en"] = datetime.now().isoformat(timespec="seconds")
+    if transaction is not None:
+        transaction.set(_resumen_ref(codigo_obra), data, merge=list(data.keys()))
+    else:
+        _resumen_ref(codigo_obra).set(data, merge=list(data.keys()))
+
+
+def _intentar(funcion, *args, **kwargs) -> None:
+    """
+    El resumen nunca debe impedir la escritura principal; si falla se corrige con
+    reconstruir_resumen_obra. El error queda en la telemetría como operación propia
+    (las funciones públicas ya lo registran en su envoltura).
+    """
+    try:
+        funcion(*args, **kwargs)
+    except Exception as e:
+        if not getattr(funcion, "__telemetria__", False):
+            registrar_error(e, f"database.{funcion.__name__.lstrip('_')}", "firestore")
+
+
+def obtener_resumen_obra(codigo_obra: str) -> Dict[str, Any]:
+    doc = _resumen_ref(codigo_obra).get()
+    return ({"codigo": doc.id, **doc.to_dict()}) if doc.exists else {}
+
+
+def cargar_resumenes_obras() -> List[Dict[str, Any]]:
+    """Resumen de todas las obras con una sola consulta."""
+    return [{"codigo": d.id, **d.to_dict()} for d in db.collection("obras_resumen").stream()]
+
+
+def reconstruir_resumen_obra(codigo_obra: str) -> Tuple[bool, str]:
+    """Recalcula el resumen desde las fuentes (obra, donaciones y caja chica) y lo sobrescribe."""
+    try:
+        doc = db.collection("obras").document(codigo_obra).get()
+        if not doc.exists:
+            return False, "No existe la obra."
+        datos = _ensure_estructura_obra(doc.to_dict())
+        avances = [a for a in datos.get("avance", []) if isinstance(a, dict)]
+
+        donaciones = _totales_donaciones(
+            [d.to_dict() for d in db.collection("donaciones").where("obra_codigo", "==", codigo_obra).stream()]
+        )
+
+        ingresos = egresos = 0.0
+        pendientes = 0
+        for d in db.collection("movimientos").where("obra_codigo", "==", codigo_obra).stream():
+            m = d.to_dict()
+            monto = float(m.get("monto", 0) or 0)
+            if m.get("tipo") == "ingreso":
+                ingresos += monto
+            elif m.get("tipo") == "egreso" and m.get("estado") == "Aprobado":
+                egresos += monto
+            elif m.get("tipo") == "egreso" and m.get("estado") == "Pendiente":
+                pendientes += 1
+
+        resumen = {
+            "nombre": datos.get("nombre", codigo_obra),
+            "presupuesto_total": float(datos.get("presupuesto_total", 0) or 0),
+            "gastado_total": sum(_total_avance(a) for a in avances),
+            "avance_real_total": sum(_pct_avance(a) for a in avances),
+            "cantidad_partes": len(avances),
+            "partes_pendientes": sum(1 for a in avances if _es_pendiente(a)),
+            "donaciones_efectivo": donaciones["efectivo"],
+            "donaciones_especie": donaciones["especie"],
+            "donaciones_total": donaciones["efectivo"] + donaciones["especie"],
+            "cantidad_donaciones": donaciones["cantidad"],
+            "donaciones_por_donante": donaciones["donantes"],
+            "caja_ingresos": ingresos,
+            "caja_egresos": egresos,
+            "caja_pendientes": pendientes,
+            **_plan_resumen(datos.get("cronograma", [])),
+            "trabajos": _totales_trabajos(obtener_trabajos_adicionales(codigo_obra)),
+            "actualizado_en": datetime.now().isoformat(timespec="seconds"),
+        }
+        _resumen_ref(codigo_obra).set(resumen)
+        _reconstruir_cola_revision(codigo_obra, avances)
+        return True, "Resumen reconstruido."
+    except Exception as e:
+        return False, str(e)
+
+
+def reconstruir_resumenes_obras() -> Tuple[int, List[str]]:
+    """Reconstruye el resumen de todas las obras. Retorna (cantidad_ok, errores)."""
+    ok_total = 0
+    errores: List[str] = []
+    for d in db.collection("obras").select([]).stream():
+        ok, msg = reconstruir_resumen_obra(d.id)
+        if ok:
+            ok_total += 1
+        else:
+            errores.append(f"{d.id}: {msg}")
+    return ok_total, errores
+
+
+# ==================== TELEMETRÍA ====================
+# Cada función pública de este módulo queda medida (latencia, documentos, errores).
+# Va al final: app y logic importan los nombres ya envueltos.
+instrumentar_modulo(
+    sys.modules[__name__],
+    "firestore",
+    excluir={"calcular_rollup", "normalizar_nombre_donante", "invalidar_indice_obras", "inicializar_directorios"},
+)
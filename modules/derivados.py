@@ -0,0 +1,214 @@
+"""
+Almacén de imágenes derivadas (data/tmp_imgs)
+Copias reducidas de fotos para los PDF, identificadas por el contenido de la foto
+original y la variante (tamaño, calidad): dos fotos con el mismo nombre de archivo
+no se pisan y la misma foto subida dos veces comparte su copia.
+
+- Escritura atómica (archivo temporal + os.replace): un PDF que se arma en paralelo
+  nunca lee una copia a medio escribir.
+- Tope de tamaño LRU por directorio: al pasar LIMITE_BYTES se borran las copias
+  usadas hace más tiempo (la fecha de modificación se actualiza en cada uso).
+- en_uso(): mientras dura un armado (un PDF cuyas imágenes lazy=2 se leen al
+  dibujar cada página), las copias entregadas desde su inicio no se desalojan.
+- barrer() al iniciar la app: temporales huérfanos, archivos con nombres anteriores
+  al almacén y exceso sobre el tope.
+"""
+
+import hashlib
+import itertools
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DERIVADOS_DIR = BASE_DIR / "data" / "tmp_imgs"
+LIMITE_BYTES = 512 * 1024 * 1024
+# Un temporal más viejo que esto es de una escritura que se interrumpió
+TTL_TEMPORAL_S = 3600
+
+_NOMBRE_DERIVADO = re.compile(r"^[0-9a-f]{32}_[A-Za-z0-9_.-]+\.jpg$")
+
+# Por directorio: {"entradas": {ruta: (ultimo_uso, bytes)}, "bytes": total}; se arma al primer uso
+_indices: Dict[str, Dict[str, Any]] = {}
+# Armados en curso: {id: inicio}
+_armados: Dict[int, float] = {}
+_secuencia = itertools.count()
+# Huella de contenido por (ruta, mtime, tamaño): no se vuelve a leer una foto que no cambió
+_huellas: Dict[Tuple[str, int, int], str] = {}
+_lock = threading.Lock()
+
+
+# ==================== HUELLAS ====================
+
+def huella_contenido(ruta: Any) -> str:
+    """SHA-256 (32 caracteres) del contenido del archivo."""
+    p = Path(ruta)
+    st = p.stat()
+    clave = (str(p.resolve()), st.st_mtime_ns, st.st_size)
+    huella = _huellas.get(clave)
+    if huella is None:
+        h = hashlib.sha256()
+        with p.open("rb") as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(bloque)
+        huella = h.hexdigest()[:32]
+        if len(_huellas) > 50_000:
+            _huellas.clear()
+        _huellas[clave] = huella
+    return huella
+
+
+# ==================== ÍNDICE Y DESALOJO ====================
+
+def _leer_directorio(directorio: Path) -> Dict[str, Any]:
+    """Índice del directorio armado desde el disco."""
+    entradas: Dict[str, Tuple[float, int]] = {}
+    if directorio.exists():
+        for p in directorio.glob("*.jpg"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entradas[str(p)] = (st.st_mtime, st.st_size)
+    return {"entradas": entradas, "bytes": sum(t for _, t in entradas.values())}
+
+
+def _estado(directorio: Path) -> Dict[str, Any]:
+    """Índice del directorio (con el lock tomado)."""
+    clave = str(directorio.resolve())
+    if clave not in _indices:
+        _indices[clave] = _leer_directorio(directorio)
+    return _indices[clave]
+
+
+@contextmanager
+def en_uso() -> Iterator[None]:
+    """Mientras dura el bloque, las copias entregadas desde su inicio no se desalojan."""
+    clave = next(_secuencia)
+    with _lock:
+        _armados[clave] = time.time()
+    try:
+        yield
+    finally:
+        with _lock:
+            _armados.pop(clave, None)
+
+
+def _desalojar(estado: Dict[str, Any], limite: int, conservar: str = "") -> int:
+    """
+    Borra las copias menos usadas hasta quedar bajo `limite` (con el lock tomado).
+    Las usadas desde el inicio del armado en curso más antiguo se conservan aunque
+    el directorio quede un rato sobre el tope. Retorna cuántas borró.
+    """
+    if estado["bytes"] <= limite:
+        return 0
+    protegidas_desde = min(_armados.values(), default=float("inf"))
+    entradas = estado["entradas"]
+    borradas = 0
+    for ruta, (uso, tamano) in sorted(entradas.items(), key=lambda kv: kv[1][0]):
+        if estado["bytes"] <= limite or uso >= protegidas_desde:
+            break
+        if ruta == conservar:
+            continue
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        del entradas[ruta]
+        estado["bytes"] -= tamano
+        borradas += 1
+    return borradas
+
+
+def barrer(directorio: Any = None, limite: int = LIMITE_BYTES) -> Dict[str, int]:
+    """
+    Limpieza al iniciar: temporales huérfanos, copias con nombres anteriores al
+    almacén (<stem>_mx1600_q80.jpg, que podían mezclar fotos de obras distintas)
+    y exceso sobre el tope. Retorna {"temporales", "antiguos", "desalojados", "bytes"}.
+    """
+    directorio = Path(directorio) if directorio else DERIVADOS_DIR
+    resultado = {"temporales": 0, "antiguos": 0, "desalojados": 0, "bytes": 0}
+    if not directorio.exists():
+        return resultado
+    limite_tmp = time.time() - TTL_TEMPORAL_S
+    for p in directorio.iterdir():
+        try:
+            if p.suffix == ".tmp":
+                if p.stat().st_mtime < limite_tmp:
+                    p.unlink()
+                    resultado["temporales"] += 1
+            elif p.is_file() and not _NOMBRE_DERIVADO.match(p.name):
+                p.unlink()
+                resultado["antiguos"] += 1
+        except OSError:
+            continue
+    with _lock:
+        estado = _indices[str(directorio.resolve())] = _leer_directorio(directorio)
+        resultado["desalojados"] = _desalojar(estado, limite)
+        resultado["bytes"] = estado["bytes"]
+    return resultado
+
+
+# ==================== DERIVADOS ====================
+
+def obtener_derivado(
+    origen: Any,
+    variante: str,
+    crear: Callable[[str], None],
+    directorio: Any = None,
+    limite: int = LIMITE_BYTES,
+) -> str:
+    """
+    Ruta de la copia `variante` de la foto `origen`. Si no existe, `crear(ruta_tmp)`
+    la escribe en un temporal que luego se publica de forma atómica.
+    """
+    directorio = Path(directorio) if directorio else DERIVADOS_DIR
+    destino = directorio / f"{huella_contenido(origen)}_{variante}.jpg"
+    ahora = time.time()
+    if destino.exists():
+        # Marca de uso para el LRU, con el lock tomado: un desalojo en paralelo no
+        # puede borrarla entre la marca y la entrega
+        with _lock:
+            try:
+                os.utime(destino, (ahora, ahora))
+                entradas = _estado(directorio)["entradas"]
+                entradas[str(destino)] = (ahora, entradas.get(str(destino), (0, destino.stat().st_size))[1])
+                return str(destino)
+            except FileNotFoundError:
+                # Se desalojó entre exists() y utime(): se vuelve a crear
+                pass
+
+    directorio.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    os.close(fd)
+    try:
+        crear(tmp)
+        tamano = os.path.getsize(tmp)
+        os.replace(tmp, destino)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    with _lock:
+        estado = _estado(directorio)
+        previo = estado["entradas"].get(str(destino))
+        estado["entradas"][str(destino)] = (ahora, tamano)
+        estado["bytes"] += tamano - (previo[1] if previo else 0)
+        _desalojar(estado, limite, conservar=str(destino))
+    return str(destino)
+
+
+def uso_derivados(directorio: Any = None) -> Dict[str, int]:
+    """{"archivos", "bytes"} del almacén según el índice en memoria."""
+    directorio = Path(directorio) if directorio else DERIVADOS_DIR
+    with _lock:
+        estado = _estado(directorio)
+        return {"archivos": len(estado["entradas"]), "bytes": estado["bytes"]}
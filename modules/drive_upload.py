@@ -1,41 +1,19 @@
 import base64
 import requests
 
-# Mapeo de códigos de obra locales a códigos Apps Script
-OBRA_CODE_MAP = {
-    # La Molina / Rinconada -> OBR-001
-    "rinconada": "OBR-001",
-    "la_molina": "OBR-001",
-    "molina": "OBR-001",
-    
-    # Ventanilla / Pachacutec -> OBR-002
-    "pachacutec": "OBR-002",
-    "ventanilla": "OBR-002",
-    
-    # Test obra -> OBR-002 (por defecto)
-    "test01": "OBR-002",
-}
+from modules.registro_obras import codigo_drive, guardar_carpeta_drive, resolver_obra
+from modules.telemetria import medir
+
 
 def _normalize_obra_code(obra_code: str) -> str:
-    """Convierte código de obra local al formato esperado por Apps Script."""
-    obra_lower = str(obra_code or "").strip().lower()
-    
-    # Si ya está en formato OBR-XXX, devolverlo tal cual
-    if obra_lower.startswith("obr-"):
-        return obra_code.upper()
-    
-    # Buscar en el mapeo
-    mapped = OBRA_CODE_MAP.get(obra_lower)
-    if mapped:
-        return mapped
-    
-    # Fallback: intentar buscar coincidencias parciales
-    for key, value in OBRA_CODE_MAP.items():
-        if key in obra_lower or obra_lower in key:
-            return value
-    
-    # Por defecto, usar OBR-002 si no se encuentra
-    return "OBR-002"
+    """
+    Convierte el código de obra local al código de Apps Script usando el registro de obras.
+    Una obra que no está en el registro es un error: no se sube a la carpeta de otra obra.
+    """
+    codigo = codigo_drive(obra_code)
+    if not codigo:
+        raise ValueError(f"La obra '{obra_code}' no está en el registro de obras; no se sabe a qué carpeta de Drive subir.")
+    return codigo
 
 def crear_carpeta_obra(webapp_url: str, token: str, nombre_obra: str, codigo_obra: str) -> dict:
     """
@@ -56,9 +34,14 @@ def crear_carpeta_obra(webapp_url: str, token: str, nombre_obra: str, codigo_obr
         "folderName": f"{codigo_obra} - {nombre_obra}",
         "obraCode": codigo_obra
     }
-    r = requests.post(webapp_url, json=payload, timeout=60)
-    r.raise_for_status()
-    return r.json()
+    with medir("drive.crear_carpeta", "upload"):
+        r = requests.post(webapp_url, json=payload, timeout=60)
+        r.raise_for_status()
+        resultado = r.json()
+    # Las subidas siguientes usan esta carpeta directamente
+    if isinstance(resultado, dict) and resultado.get("folderId"):
+        guardar_carpeta_drive(codigo_obra, resultado["folderId"], resultado.get("folderUrl", ""))
+    return resultado
 
 def upload_pdf_base64(webapp_url: str, token: str, obra_code: str, filename: str, pdf_bytes: bytes, folder_id: str = None) -> dict:
     """
@@ -70,7 +53,7 @@ def upload_pdf_base64(webapp_url: str, token: str, obra_code: str, filename: str
         obra_code: Código de la obra
         filename: Nombre del archivo PDF
         pdf_bytes: Contenido del PDF en bytes
-        folder_id: ID de la carpeta de Drive (opcional, usa carpeta por defecto si no se proporciona)
+        folder_id: ID de la carpeta de Drive (opcional, por defecto la guardada en el registro de obras)
     
     Returns:
         dict con status, fileId, fileUrl
@@ -86,11 +69,17 @@ def upload_pdf_base64(webapp_url: str, token: str, obra_code: str, filename: str
         "pdfBase64": base64.b64encode(pdf_bytes).decode("utf-8"),
     }
     
-    # Agregar folder_id si se proporciona
+    # Carpeta guardada al crearla: Apps Script no tiene que buscarla por código
+    folder_id = folder_id or (resolver_obra(obra_code) or {}).get("drive_folder_id")
     if folder_id:
         payload["folderId"] = folder_id
     
-    r = requests.post(webapp_url, json=payload, timeout=180)
-    r.raise_for_status()
-    return r.json()
+    with medir("drive.subir_pdf", "upload") as m:
+        m["bytes"] = len(pdf_bytes)
+        r = requests.post(webapp_url, json=payload, timeout=180)
+        r.raise_for_status()
+        resultado = r.json()
+        if isinstance(resultado, dict) and resultado.get("ok") is False:
+            m.update({"ok": False, "error": resultado.get("error", "")})
+        return resultado
 
@@ -0,0 +1,212 @@
+"""
+Directorio de empleados (plantel por obra)
+Mantiene en memoria el plantel de cada obra con índices por id y por DNI y una
+clave de búsqueda sin tildes, para no consultar Firestore en cada render del
+parte diario.
+
+La caché se invalida por obra: cada alta, edición o baja incrementa
+versiones_empleados/{codigo} de la obra guardada en el empleado (y de la nueva
+si se traslada), más versiones_empleados/__todos__ para el listado general. Mientras la versión no cambie, el plantel no se vuelve a descargar.
+"""
+
+import threading
+import time
+import unicodedata
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from firebase_admin import firestore
+
+from modules.database import (
+    CLAVE_DIRECTORIO_EMPLEADOS as CLAVE_DIRECTORIO,
+    incrementar_version_empleados,
+    leer_version_empleados,
+)
+
+db = firestore.client()
+
+# Dentro de este intervalo se confía en la caché sin leer la versión
+TTL_VERIFICACION_S = 30
+# Pasado este intervalo se recarga aunque la versión no haya cambiado
+TTL_MAXIMO_S = 600
+
+_cache: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+# ==================== ÍNDICES Y BÚSQUEDA ====================
+
+def normalizar_busqueda(texto: Any) -> str:
+    """Minúsculas, sin tildes y con espacios simples ("Núñez  José" -> "nunez jose")."""
+    t = unicodedata.normalize("NFKD", str(texto or ""))
+    t = "".join(c for c in t if not unicodedata.combining(c))
+    return " ".join(t.lower().split())
+
+
+def etiqueta_empleado(empleado: Dict[str, Any]) -> str:
+    return f"{empleado.get('nombre', '')} - {empleado.get('cargo', '')} (DNI: {empleado.get('dni', '')})"
+
+
+def construir_plantel(empleados: List[Dict[str, Any]], version: int = 0) -> Dict[str, Any]:
+    """
+    Arma el plantel indexado a partir de una lista de empleados (de Firestore o
+    de la copia offline):
+    - empleados: ordenados por nombre
+    - por_id / por_dni: acceso directo
+    - claves: texto normalizado (nombre, cargo y DNI) alineado con `empleados`
+    """
+    ordenados = sorted(
+        (dict(e) for e in empleados or [] if isinstance(e, dict)),
+        key=lambda e: normalizar_busqueda(e.get("nombre")),
+    )
+    for e in ordenados:
+        e["etiqueta"] = etiqueta_empleado(e)
+    ahora = time.time()
+    return {
+        "version": version,
+        "cargado_en": ahora,
+        "verificado_en": ahora,
+        "empleados": ordenados,
+        "por_id": {e["id"]: e for e in ordenados if e.get("id")},
+        "por_dni": {str(e["dni"]).strip(): e for e in ordenados if str(e.get("dni", "")).strip()},
+        "claves": [normalizar_busqueda(f"{e.get('nombre', '')} {e.get('cargo', '')} {e.get('dni', '')}") for e in ordenados],
+    }
+
+
+def buscar_en_plantel(plantel: Dict[str, Any], texto: str, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Empleados cuyo nombre, cargo o DNI contiene todas las palabras buscadas (sin distinguir tildes)."""
+    palabras = normalizar_busqueda(texto).split()
+    if not palabras:
+        resultado = plantel["empleados"]
+    else:
+        resultado = [
+            e for e, clave in zip(plantel["empleados"], plantel["claves"])
+            if all(p in clave for p in palabras)
+        ]
+    return resultado[:limite] if limite else resultado
+
+
+# ==================== CACHÉ POR OBRA ====================
+
+def _cargar_empleados(clave: str) -> List[Dict[str, Any]]:
+    query = db.collection("empleados")
+    if clave != CLAVE_DIRECTORIO:
+        query = query.where("codigo_obra", "==", clave)
+    return [{"id": d.id, **d.to_dict()} for d in query.stream()]
+
+
+def _obtener(clave: str, forzar: bool = False) -> Dict[str, Any]:
+    ahora = time.time()
+    with _lock:
+        actual = _cache.get(clave)
+    if actual and not forzar:
+        if ahora - actual["verificado_en"] < TTL_VERIFICACION_S:
+            return actual
+        if ahora - actual["cargado_en"] < TTL_MAXIMO_S and leer_version_empleados(clave) == actual["version"]:
+            actual["verificado_en"] = ahora
+            return actual
+
+    # La versión se lee antes que los empleados: si cambia en medio, la próxima verificación recarga
+    version = leer_version_empleados(clave)
+    plantel = construir_plantel(_cargar_empleados(clave), version)
+    with _lock:
+        _cache[clave] = plantel
+    return plantel
+
+
+def obtener_plantel(codigo_obra: str, forzar: bool = False) -> Dict[str, Any]:
+    """Plantel indexado de una obra (cacheado por versión)."""
+    return _obtener(codigo_obra, forzar)
+
+
+def obtener_directorio(forzar: bool = False) -> Dict[str, Any]:
+    """Todos los empleados registrados (listado general)."""
+    return _obtener(CLAVE_DIRECTORIO, forzar)
+
+
+def buscar_empleados(codigo_obra: str, texto: str, limite: Optional[int] = 50) -> List[Dict[str, Any]]:
+    return buscar_en_plantel(obtener_plantel(codigo_obra), texto, limite)
+
+
+def empleado_por_id(codigo_obra: str, empleado_id: str) -> Optional[Dict[str, Any]]:
+    return obtener_plantel(codigo_obra)["por_id"].get(empleado_id)
+
+
+def empleado_por_dni(codigo_obra: str, dni: str) -> Optional[Dict[str, Any]]:
+    return obtener_plantel(codigo_obra)["por_dni"].get(str(dni or "").strip())
+
+
+def invalidar_plantel(codigo_obra: Optional[str] = None) -> None:
+    """Descarta la caché local de una obra (y del listado general)."""
+    with _lock:
+        if codigo_obra:
+            _cache.pop(codigo_obra, None)
+        _cache.pop(CLAVE_DIRECTORIO, None)
+
+
+# ==================== ALTAS, EDICIÓN Y BAJAS ====================
+
+def agregar_empleado(codigo_obra: Optional[str], datos: Dict[str, Any]) -> Tuple[bool, str]:
+    try:
+        data = {k: v.strip() if isinstance(v, str) else v for k, v in (datos or {}).items()}
+        data.setdefault("fecha_registro", date.today().isoformat())
+        if codigo_obra:
+            data["codigo_obra"] = codigo_obra
+        batch = db.batch()
+        batch.set(db.collection("empleados").document(), data)
+        incrementar_version_empleados(codigo_obra, batch)
+        batch.commit()
+        invalidar_plantel(codigo_obra)
+        return True, f"Empleado {data.get('nombre', '')} agregado correctamente."
+    except Exception as e:
+        return False, str(e)
+
+
+def _obra_guardada(transaction, ref) -> Optional[str]:
+    snap = ref.get(field_paths=["codigo_obra"], transaction=transaction)
+    return (snap.to_dict() or {}).get("codigo_obra") if snap.exists else None
+
+
+def _invalidar_obras(obras: List[Optional[str]]) -> None:
+    for codigo in dict.fromkeys(obras):
+        invalidar_plantel(codigo)
+
+
+def actualizar_empleado(empleado_id: str, cambios: Dict[str, Any], codigo_obra: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Edita un empleado. La obra guardada se lee en la misma transacción: se sube
+    la versión de esa obra y de la nueva (si cambia), no solo de `codigo_obra`,
+    así una edición desde el listado general o un traslado no deja cachés viejas.
+    """
+    try:
+        ref = db.collection("empleados").document(empleado_id)
+
+        @firestore.transactional
+        def _actualizar(transaction) -> List[Optional[str]]:
+            obras = [_obra_guardada(transaction, ref), cambios.get("codigo_obra"), codigo_obra]
+            transaction.update(ref, cambios)
+            incrementar_version_empleados(obras[0], transaction, obras[1:])
+            return obras
+
+        _invalidar_obras(_actualizar(db.transaction()))
+        return True, "Empleado actualizado."
+    except Exception as e:
+        return False, str(e)
+
+
+def eliminar_empleado(empleado_id: str, codigo_obra: Optional[str] = None) -> Tuple[bool, str]:
+    """Da de baja un empleado; la versión se sube en la obra guardada en su documento."""
+    try:
+        ref = db.collection("empleados").document(empleado_id)
+
+        @firestore.transactional
+        def _eliminar(transaction) -> List[Optional[str]]:
+            obras = [_obra_guardada(transaction, ref), codigo_obra]
+            transaction.delete(ref)
+            incrementar_version_empleados(obras[0], transaction, obras[1:])
+            return obras
+
+        _invalidar_obras(_eliminar(db.transaction()))
+        return True, "Empleado eliminado."
+    except Exception as e:
+        return False, str(e)
@@ -0,0 +1,213 @@
+"""
+Flujo de caja proyectado por obra y del portafolio
+Arma una serie diaria con un monto por concepto (ingresos positivos, egresos negativos):
+- hitos: hitos de pago en su fecha estimada
+- donaciones: donaciones en efectivo
+- gasto_plan: gasto planificado de las partidas aprobadas (mismo reparto diario que la Curva S)
+- caja_chica: egresos aprobados de caja chica
+y la posición de caja acumulada (saldo), diaria o semanal.
+
+Los escenarios ("el hito X se retrasa 30 días") se aplican como deltas sobre la
+serie base ya calculada: solo se mueven los montos de los hitos afectados y se
+vuelve a acumular el delta, sin rehacer el resto de la serie.
+
+No depende de Streamlit ni de Firestore: recibe los datos ya cargados.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from modules.curva_s import parse_ts, plan_diario, resample_sum
+
+CONCEPTOS = ["hitos", "donaciones", "gasto_plan", "caja_chica"]
+COLUMNAS = CONCEPTOS + ["neto", "saldo"]
+
+
+def _monto(valor: Any) -> float:
+    try:
+        return float(valor or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _serie_por_fecha(fechas: List[Any], montos: List[float]) -> pd.Series:
+    """Suma los montos por día (descarta fechas inválidas)."""
+    s = pd.Series(montos, index=pd.to_datetime(pd.Series(fechas, dtype="object"), errors="coerce"), dtype="float64")
+    s = s[s.index.notna()]
+    s.index = s.index.normalize()
+    return s.groupby(level=0).sum()
+
+
+# ==================== FUENTES ====================
+
+def tabla_hitos(hitos: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Hitos con fecha y monto válidos: id, descripcion, fecha, monto, estado."""
+    filas = []
+    for i, h in enumerate(hitos or []):
+        if not isinstance(h, dict):
+            continue
+        fecha = parse_ts(h.get("fecha"))
+        monto = _monto(h.get("monto"))
+        if fecha is None or pd.isna(fecha) or monto <= 0:
+            continue
+        filas.append({
+            "id": str(h.get("id") or f"hito_{i}"),
+            "descripcion": h.get("descripcion", ""),
+            "fecha": fecha,
+            "monto": monto,
+            "estado": h.get("estado", "Pendiente"),
+        })
+    return pd.DataFrame(filas, columns=["id", "descripcion", "fecha", "monto", "estado"])
+
+
+def _egresos_caja(movimientos: Any) -> pd.Series:
+    """
+    Egresos aprobados de caja chica como montos negativos.
+    Los ingresos de caja chica son reposiciones desde la propia obra, no entradas de dinero.
+    """
+    df = pd.DataFrame(movimientos) if not isinstance(movimientos, pd.DataFrame) else movimientos
+    if df.empty or not {"fecha", "monto", "tipo"}.issubset(df.columns):
+        return pd.Series(dtype="float64")
+    estado = df["estado"] if "estado" in df.columns else pd.Series("", index=df.index)
+    df = df[(df["tipo"] == "egreso") & (estado == "Aprobado")]
+    return -_serie_por_fecha(df["fecha"].tolist(), pd.to_numeric(df["monto"], errors="coerce").fillna(0.0).tolist())
+
+
+def _donaciones_efectivo(donaciones: List[Dict[str, Any]]) -> pd.Series:
+    """Donaciones en efectivo por fecha (las donaciones en especie no entran a caja)."""
+    fechas, montos = [], []
+    for d in donaciones or []:
+        if not isinstance(d, dict) or str(d.get("tipo_donacion", "")).lower() != "efectivo":
+            continue
+        fechas.append(d.get("fecha") or d.get("fecha_registro"))
+        montos.append(_monto(d.get("cantidad")))
+    return _serie_por_fecha(fechas, montos)
+
+
+# ==================== SERIE DIARIA ====================
+
+def _acumular(flujos: pd.DataFrame, saldo_inicial: float) -> pd.DataFrame:
+    flujos["neto"] = flujos[CONCEPTOS].sum(axis=1)
+    flujos["saldo"] = saldo_inicial + flujos["neto"].cumsum()
+    return flujos
+
+
+def construir_flujo_diario(
+    cronograma: List[Dict[str, Any]],
+    hitos: List[Dict[str, Any]],
+    movimientos: Any = None,
+    donaciones: Optional[List[Dict[str, Any]]] = None,
+    saldo_inicial: float = 0.0,
+) -> pd.DataFrame:
+    """
+    Flujo diario de la obra: una fila por día entre el primer y el último movimiento,
+    con las columnas CONCEPTOS, neto y saldo (posición de caja al cierre del día).
+    """
+    h = tabla_hitos(hitos)
+    series = {
+        "hitos": h.groupby("fecha")["monto"].sum() if not h.empty else pd.Series(dtype="float64"),
+        "donaciones": _donaciones_efectivo(donaciones or []),
+        "gasto_plan": -plan_diario([it for it in cronograma or [] if it.get("estado", "Aprobado") == "Aprobado"]),
+        "caja_chica": _egresos_caja(movimientos if movimientos is not None else []),
+    }
+    fechas = [s.index for s in series.values() if not s.empty]
+    if not fechas:
+        return pd.DataFrame(columns=COLUMNAS, index=pd.DatetimeIndex([], name="fecha"), dtype="float64")
+
+    rango = pd.date_range(min(f.min() for f in fechas), max(f.max() for f in fechas), freq="D", name="fecha")
+    flujos = pd.DataFrame({c: s.reindex(rango, fill_value=0.0) for c, s in series.items()}, index=rango)
+    return _acumular(flujos.astype("float64"), float(saldo_inicial or 0))
+
+
+def saldo_inicial_de(diario: pd.DataFrame) -> float:
+    """Saldo antes del primer día de la serie."""
+    if diario.empty:
+        return 0.0
+    return float(diario["saldo"].iloc[0] - diario["neto"].iloc[0])
+
+
+def posicion_caja(diario: pd.DataFrame, freq_code: str = "D") -> pd.DataFrame:
+    """Flujo por periodo (D, W o M, mismos periodos que la Curva S) con el saldo al cierre de cada periodo."""
+    if diario.empty or freq_code == "D":
+        return diario
+    flujos = resample_sum(diario[CONCEPTOS].copy(), freq_code)
+    return _acumular(flujos, saldo_inicial_de(diario))
+
+
+# ==================== ESCENARIOS ====================
+
+def delta_escenario(hitos: List[Dict[str, Any]], retrasos: Dict[str, int]) -> pd.Series:
+    """
+    Cambio diario en el concepto `hitos` cuando los hitos de `retrasos` ({id: días})
+    se cobran días después (o antes, con días negativos): −monto en la fecha original
+    y +monto en la nueva.
+    """
+    h = tabla_hitos(hitos)
+    h = h[h["id"].isin([k for k, v in (retrasos or {}).items() if v])]
+    if h.empty:
+        return pd.Series(dtype="float64")
+    dias = pd.to_timedelta(h["id"].map(retrasos).astype(int), unit="D")
+    delta = pd.concat([
+        pd.Series(-h["monto"].to_numpy(), index=pd.DatetimeIndex(h["fecha"])),
+        pd.Series(h["monto"].to_numpy(), index=pd.DatetimeIndex(h["fecha"] + dias)),
+    ])
+    delta = delta.groupby(level=0).sum()
+    return delta[delta != 0]
+
+
+def aplicar_escenario(base: pd.DataFrame, delta: pd.Series) -> pd.DataFrame:
+    """
+    Serie del escenario a partir de la base: suma el delta de hitos y corrige el
+    saldo con la suma acumulada del delta. Si un hito sale del rango, la serie se extiende.
+    """
+    if delta.empty:
+        return base
+    saldo_inicial = saldo_inicial_de(base) if not base.empty else 0.0
+    inicio = min(base.index.min(), delta.index.min()) if not base.empty else delta.index.min()
+    fin = max(base.index.max(), delta.index.max()) if not base.empty else delta.index.max()
+    rango = pd.date_range(inicio, fin, freq="D", name="fecha")
+
+    escenario = base.reindex(rango)
+    escenario[CONCEPTOS + ["neto"]] = escenario[CONCEPTOS + ["neto"]].fillna(0.0)
+    # Días agregados antes de la base: saldo inicial; después: último saldo de la base
+    escenario["saldo"] = escenario["saldo"].ffill().fillna(saldo_inicial)
+
+    d = delta.reindex(rango, fill_value=0.0).to_numpy()
+    escenario["hitos"] += d
+    escenario["neto"] += d
+    escenario["saldo"] += np.cumsum(d)
+    return escenario
+
+
+# ==================== RESUMEN Y PORTAFOLIO ====================
+
+def resumen_flujo(diario: pd.DataFrame) -> Dict[str, Any]:
+    """Saldo final, saldo mínimo y su fecha, primer día en déficit, ingresos y egresos totales."""
+    if diario.empty:
+        return {"saldo_final": 0.0, "saldo_minimo": 0.0, "fecha_saldo_minimo": None,
+                "primer_deficit": None, "ingresos": 0.0, "egresos": 0.0}
+    conceptos = diario[CONCEPTOS]
+    deficit = diario.index[diario["saldo"] < 0]
+    return {
+        "saldo_final": float(diario["saldo"].iloc[-1]),
+        "saldo_minimo": float(diario["saldo"].min()),
+        "fecha_saldo_minimo": diario["saldo"].idxmin().date(),
+        "primer_deficit": deficit[0].date() if len(deficit) else None,
+        "ingresos": float(conceptos.clip(lower=0).to_numpy().sum()),
+        "egresos": float(-conceptos.clip(upper=0).to_numpy().sum()),
+    }
+
+
+def flujo_portafolio(diarios: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Suma los flujos diarios de varias obras sobre el rango común; el saldo parte de la suma de saldos iniciales."""
+    diarios = {c: d for c, d in (diarios or {}).items() if not d.empty}
+    if not diarios:
+        return pd.DataFrame(columns=COLUMNAS, index=pd.DatetimeIndex([], name="fecha"), dtype="float64")
+    rango = pd.date_range(
+        min(d.index.min() for d in diarios.values()), max(d.index.max() for d in diarios.values()),
+        freq="D", name="fecha",
+    )
+    flujos = sum(d[CONCEPTOS].reindex(rango, fill_value=0.0) for d in diarios.values())
+    return _acumular(flujos, sum(saldo_inicial_de(d) for d in diarios.values()))
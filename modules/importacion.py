@@ -0,0 +1,360 @@
+"""
+Importación masiva de cronograma, insumos, empleados y listas de precios desde CSV/Excel.
+
+Acepta las exportaciones habituales de S10 y MS Project: los encabezados se
+reconocen por alias (sin importar mayúsculas ni tildes), la validación se hace
+en una sola pasada vectorizada con las mismas reglas que los formularios
+(`validar_partida_cronograma`, `validar_insumo`, alta de empleados) y la
+escritura se hace en bloque.
+"""
+from __future__ import annotations
+
+import io
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from modules.database import (
+    agregar_empleados_lote,
+    agregar_insumos_lote,
+    agregar_partidas_cronograma_lote,
+    actualizar_precios_lote,
+    cargar_insumos,
+    obtener_empleados_obra,
+)
+from modules.precios import clave_insumo
+
+# Alias de columnas (normalizados: minúsculas, sin tildes, espacios simples)
+ALIAS_CRONOGRAMA = {
+    "nombre": ["nombre", "partida", "descripcion de partida", "nombre de tarea", "tarea", "task name", "name", "actividad"],
+    "fecha_inicio": ["fecha inicio", "fecha_inicio", "inicio", "comienzo", "start", "fecha de inicio"],
+    "fecha_fin": ["fecha fin", "fecha_fin", "fin", "termino", "finish", "fecha de fin", "fecha final"],
+    "monto_planificado": ["monto", "monto planificado", "monto_planificado", "costo", "cost", "parcial", "presupuesto", "total"],
+    "descripcion": ["descripcion", "notas", "notes", "observaciones"],
+}
+
+ALIAS_INSUMOS = {
+    "Insumo": ["insumo", "nombre", "descripcion", "recurso", "descripcion del recurso"],
+    "Unidad": ["unidad", "und", "und.", "unid", "unidad de medida"],
+    "Precio Unitario": ["precio unitario", "precio", "p.u.", "pu", "precio s/.", "costo unitario"],
+    "Tipo": ["tipo", "tipo de recurso", "categoria", "clase"],
+}
+
+# Lista de precios de proveedor: solo nombre y precio
+ALIAS_PRECIOS = {
+    "Insumo": ALIAS_INSUMOS["Insumo"],
+    "Precio Unitario": ALIAS_INSUMOS["Precio Unitario"],
+}
+
+ALIAS_EMPLEADOS = {
+    "nombre": ["nombre", "nombres", "nombre completo", "apellidos y nombres", "trabajador"],
+    "cargo": ["cargo", "categoria", "ocupacion", "puesto"],
+    "dni": ["dni", "documento", "nro documento", "doc. identidad"],
+    "telefono": ["telefono", "celular", "numero", "numero de contacto"],
+}
+
+# Tipos de insumo que usa el parte diario
+TIPOS_INSUMO = {
+    "mano de obra": "mano de obra",
+    "mo": "mano de obra",
+    "materiales": "materiales",
+    "material": "materiales",
+    "mat": "materiales",
+    "equipos": "equipos",
+    "equipo": "equipos",
+    "equipos y herramientas": "equipos",
+    "eq": "equipos",
+    "otros": "otros",
+    "subcontratos": "otros",
+    "subcontrato": "otros",
+}
+
+MAX_FILAS_IMPORTACION = 20000
+
+# Montos: prefijo de moneda y formatos aceptados (sin espacios); otro uso de separadores es ambiguo
+_PREFIJO_MONEDA = r"(?i)^\s*S/\.?\s*"
+_MONTO_SIMPLE = r"-?(?:\d+\.?|\d*\.\d+)"                                          # 1234 | 1234.5
+_MONTO_COMA_MILES = r"-?[1-9]\d{0,2}(?:,\d{3})+(?:\.\d+)?"                          # 12,500,000 | 1,234.50
+_MONTO_PUNTO_MILES = r"-?[1-9]\d{0,2}(?:\.\d{3})+,\d+|-?[1-9]\d{0,2}(?:\.\d{3}){2,}"  # 1.234,50 | 1.234.567
+_MONTO_COMA_DECIMAL = r"-?\d*,\d+"                                                 # 1234,5 | 0,125
+_GRUPO_PUNTO = r"-?[1-9]\d{0,2}\.\d{3}"                                           # 1.234: ¿miles o decimal?
+_GRUPO_COMA = r"-?[1-9]\d{0,2},\d{3}"                                              # 1,000: ¿miles o decimal?
+MENSAJE_MONTO_AMBIGUO = "Formato de número ambiguo: usa punto decimal (ej. 1234.50 o 1,234.50)"
+
+
+# ==================== LECTURA ====================
+
+def _normalizar_encabezado(texto: Any) -> str:
+    s = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(s.strip().lower().replace("_", " ").split())
+
+
+def leer_archivo_tabla(archivo, nombre_archivo: Optional[str] = None) -> pd.DataFrame:
+    """Lee un CSV o Excel (archivo subido de Streamlit o ruta) como tabla de texto."""
+    nombre = (nombre_archivo or getattr(archivo, "name", "") or str(archivo)).lower()
+    if nombre.endswith((".xlsx", ".xlsm", ".xls")):
+        return pd.read_excel(archivo, dtype=str)
+
+    data = archivo.getvalue() if hasattr(archivo, "getvalue") else open(archivo, "rb").read()
+    for encoding in ("utf-8-sig", "latin-1"):
+        try:
+            return pd.read_csv(io.BytesIO(data), dtype=str, sep=None, engine="python", encoding=encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("No se pudo leer el archivo (codificación no reconocida).")
+
+
+def normalizar_columnas(df: pd.DataFrame, alias: Dict[str, List[str]]) -> pd.DataFrame:
+    """Renombra las columnas reconocidas a su nombre interno y descarta filas vacías."""
+    mapa: Dict[str, str] = {}
+    for col in df.columns:
+        clave = _normalizar_encabezado(col)
+        for destino, opciones in alias.items():
+            if destino not in mapa.values() and clave in opciones:
+                mapa[col] = destino
+                break
+    df = df.rename(columns=mapa)
+    df = df[[c for c in df.columns if c in alias]].copy()
+    for destino in alias:
+        if destino not in df.columns:
+            df[destino] = None
+    df = df.dropna(how="all")
+    return df
+
+
+def _texto(serie: pd.Series) -> pd.Series:
+    return serie.fillna("").astype(str).str.strip()
+
+
+def _numero(serie: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Convierte una columna de montos de texto a float. Retorna (valores, ambiguos):
+    NaN si no es número; `ambiguos` marca los que no tienen una lectura única
+    ('1,23,45', '12,34.5'), que se rechazan en vez de adivinar.
+
+    - 'S/.' al inicio se quita como prefijo, no carácter por carácter.
+    - Con punto y coma, el último es el decimal: '1,234.50' y '1.234,50' -> 1234.5.
+    - Un solo separador seguido de exactamente 3 dígitos ('1,000', '1.234') puede
+      ser de miles o decimal. Lo decide el resto de la columna: si los demás
+      valores solo usan punto decimal ('2,500.75', '12.5') o solo coma decimal
+      ('1.234,50', '12,5'), se lee con esa convención; si no, es ambiguo.
+    - Con otra cantidad de dígitos el separador es decimal ('1234,5', '0,125');
+      varios grupos ('12,500,000', '1.234.567') solo pueden ser de miles.
+    - Si la columna mezcla las dos convenciones, todo valor con separador es ambiguo.
+    """
+    s = _texto(serie).str.replace(_PREFIJO_MONEDA, "", regex=True).str.replace(r"\s", "", regex=True)
+    grupo_punto = s.str.fullmatch(_GRUPO_PUNTO)
+    grupo_coma = s.str.fullmatch(_GRUPO_COMA)
+    dudoso = grupo_punto | grupo_coma
+
+    simple = ~dudoso & s.str.fullmatch(_MONTO_SIMPLE)
+    coma_miles = ~dudoso & s.str.fullmatch(_MONTO_COMA_MILES)
+    punto_miles = s.str.fullmatch(_MONTO_PUNTO_MILES)
+    coma_decimal = ~dudoso & ~coma_miles & s.str.fullmatch(_MONTO_COMA_DECIMAL)
+
+    # Convención de la columna según los valores que no dejan duda
+    usa_punto = ((simple & s.str.contains(".", regex=False)) | coma_miles).any()
+    usa_coma = (punto_miles | coma_decimal).any()
+    if usa_punto and not usa_coma:
+        simple |= grupo_punto
+        coma_miles |= grupo_coma
+    elif usa_coma and not usa_punto:
+        punto_miles |= grupo_punto
+        coma_decimal |= grupo_coma
+    elif usa_punto and usa_coma:
+        # Columna con las dos convenciones: ningún separador es confiable
+        simple &= ~s.str.contains(".", regex=False)
+        coma_miles = punto_miles = coma_decimal = pd.Series(False, index=s.index)
+
+    s = s.where(~coma_miles, s.str.replace(",", "", regex=False))
+    s = s.where(~punto_miles, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    s = s.where(~coma_decimal, s.str.replace(",", ".", regex=False))
+
+    reconocido = simple | coma_miles | punto_miles | coma_decimal
+    ambiguos = ~reconocido & s.str.fullmatch(r"-?[\d.,]*\d[\d.,]*")
+    return pd.to_numeric(s.where(reconocido), errors="coerce"), ambiguos
+
+
+def _fecha(serie: pd.Series) -> pd.Series:
+    """Fechas dd/mm/aaaa o ISO; quita el día de la semana que agrega MS Project ('lun 03/02/25')."""
+    s = _texto(serie).str.replace(r"^[^\d]+\s+", "", regex=True)
+    iso = s.str.match(r"^\d{4}-\d{2}-\d{2}")
+    fechas = pd.to_datetime(s.where(~iso), dayfirst=True, errors="coerce")
+    fechas = fechas.fillna(pd.to_datetime(s.where(iso), errors="coerce"))
+    return fechas.dt.normalize()
+
+
+def _registrar_errores(errores: List[Dict[str, Any]], mascara: pd.Series, mensaje: str, pendientes: pd.Series) -> pd.Series:
+    """Anota `mensaje` en las filas aún válidas que cumplen `mascara` (primer error por fila, como los formularios)."""
+    nuevas = mascara & pendientes
+    for fila in nuevas[nuevas].index:
+        errores.append({"fila": int(fila), "error": mensaje})
+    return pendientes & ~nuevas
+
+
+def _preparar(df: pd.DataFrame, alias: Dict[str, List[str]]) -> pd.DataFrame:
+    if len(df) > MAX_FILAS_IMPORTACION:
+        raise ValueError(f"El archivo supera el máximo de {MAX_FILAS_IMPORTACION} filas.")
+    df = normalizar_columnas(df, alias)
+    # Número de fila tal como la ve el usuario en el archivo (encabezado = fila 1)
+    df.index = df.index + 2
+    return df
+
+
+# ==================== VALIDACIÓN VECTORIZADA ====================
+
+def validar_cronograma_df(df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Mismas reglas que `validar_partida_cronograma`. Retorna (partidas_validas, errores)."""
+    df = _preparar(df, ALIAS_CRONOGRAMA)
+    nombre = _texto(df["nombre"])
+    inicio = _fecha(df["fecha_inicio"])
+    fin = _fecha(df["fecha_fin"])
+    monto, monto_ambiguo = _numero(df["monto_planificado"])
+
+    errores: List[Dict[str, Any]] = []
+    ok = pd.Series(True, index=df.index)
+    ok = _registrar_errores(errores, nombre == "", "Debes ingresar el nombre de la partida", ok)
+    ok = _registrar_errores(errores, inicio.isna() | fin.isna(), "Fechas inválidas", ok)
+    ok = _registrar_errores(errores, fin < inicio, "La fecha fin no puede ser anterior a la fecha inicio", ok)
+    ok = _registrar_errores(errores, monto_ambiguo, MENSAJE_MONTO_AMBIGUO, ok)
+    ok = _registrar_errores(errores, monto.isna(), "El monto planificado debe ser un número válido", ok)
+    ok = _registrar_errores(errores, monto <= 0, "El monto planificado debe ser mayor a 0", ok)
+
+    validos = pd.DataFrame({
+        "nombre": nombre[ok],
+        "fecha_inicio": inicio[ok].dt.strftime("%Y-%m-%d"),
+        "fecha_fin": fin[ok].dt.strftime("%Y-%m-%d"),
+        "monto_planificado": monto[ok].astype(float),
+        "descripcion": _texto(df["descripcion"])[ok],
+    })
+    return validos.to_dict("records"), sorted(errores, key=lambda e: e["fila"])
+
+
+def validar_insumos_df(df: pd.DataFrame, insumos_existentes: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Mismas reglas que `validar_insumo` más control de duplicados. Retorna (insumos_validos, errores)."""
+    df = _preparar(df, ALIAS_INSUMOS)
+    nombre = _texto(df["Insumo"])
+    unidad = _texto(df["Unidad"])
+    precio, precio_ambiguo = _numero(df["Precio Unitario"])
+    tipo = _texto(df["Tipo"]).map(_normalizar_encabezado).map(TIPOS_INSUMO)
+
+    clave = nombre.str.lower()
+    existentes = {str(i.get("Insumo", "")).strip().lower() for i in insumos_existentes or []}
+
+    errores: List[Dict[str, Any]] = []
+    ok = pd.Series(True, index=df.index)
+    ok = _registrar_errores(errores, nombre == "", "El nombre del insumo es requerido", ok)
+    ok = _registrar_errores(errores, unidad == "", "La unidad es requerida", ok)
+    ok = _registrar_errores(errores, precio_ambiguo, MENSAJE_MONTO_AMBIGUO, ok)
+    ok = _registrar_errores(errores, precio.isna(), "El precio debe ser un número válido", ok)
+    ok = _registrar_errores(errores, precio < 0, "El precio no puede ser negativo", ok)
+    ok = _registrar_errores(errores, clave.isin(existentes), "El insumo ya existe en el catálogo", ok)
+    ok = _registrar_errores(errores, clave.duplicated(keep="first"), "Insumo repetido en el archivo", ok)
+
+    validos = pd.DataFrame({
+        "Insumo": nombre[ok],
+        "Unidad": unidad[ok],
+        "Precio Unitario": precio[ok].astype(float),
+        "Tipo": tipo[ok].fillna("materiales"),
+    })
+    return validos.to_dict("records"), sorted(errores, key=lambda e: e["fila"])
+
+
+def validar_precios_df(df: pd.DataFrame) -> Tuple[Dict[str, float], List[Dict[str, Any]]]:
+    """Lista de precios de proveedor. Retorna ({insumo: precio}, errores)."""
+    df = _preparar(df, ALIAS_PRECIOS)
+    nombre = _texto(df["Insumo"])
+    precio, precio_ambiguo = _numero(df["Precio Unitario"])
+
+    errores: List[Dict[str, Any]] = []
+    ok = pd.Series(True, index=df.index)
+    ok = _registrar_errores(errores, nombre == "", "El nombre del insumo es requerido", ok)
+    ok = _registrar_errores(errores, precio_ambiguo, MENSAJE_MONTO_AMBIGUO, ok)
+    ok = _registrar_errores(errores, precio.isna(), "El precio debe ser un número válido", ok)
+    ok = _registrar_errores(errores, precio < 0, "El precio no puede ser negativo", ok)
+    ok = _registrar_errores(errores, nombre.map(clave_insumo).duplicated(keep="first"), "Insumo repetido en el archivo", ok)
+
+    return dict(zip(nombre[ok], precio[ok].astype(float))), sorted(errores, key=lambda e: e["fila"])
+
+
+def validar_empleados_df(df: pd.DataFrame, empleados_existentes: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Mismas reglas que el alta de empleados (DNI de 8 dígitos, sin repetir). Retorna (empleados_validos, errores)."""
+    df = _preparar(df, ALIAS_EMPLEADOS)
+    nombre = _texto(df["nombre"])
+    cargo = _texto(df["cargo"])
+    # Excel suele convertir el DNI en número y perder ceros a la izquierda
+    dni = _texto(df["dni"]).str.replace(r"\.0$", "", regex=True)
+    dni = dni.where(~dni.str.fullmatch(r"\d{1,7}"), dni.str.zfill(8))
+    telefono = _texto(df["telefono"]).str.replace(r"\.0$", "", regex=True)
+
+    existentes = {str(e.get("dni", "")).strip() for e in empleados_existentes or []}
+
+    errores: List[Dict[str, Any]] = []
+    ok = pd.Series(True, index=df.index)
+    ok = _registrar_errores(errores, nombre == "", "El nombre es requerido", ok)
+    ok = _registrar_errores(errores, cargo == "", "El cargo es requerido", ok)
+    ok = _registrar_errores(errores, dni == "", "El DNI es requerido", ok)
+    ok = _registrar_errores(errores, ~dni.str.fullmatch(r"\d{8}"), "El DNI debe tener 8 dígitos", ok)
+    ok = _registrar_errores(errores, dni.isin(existentes), "Ya existe un empleado con ese DNI en la obra", ok)
+    ok = _registrar_errores(errores, dni.duplicated(keep="first"), "DNI repetido en el archivo", ok)
+
+    validos = pd.DataFrame({
+        "nombre": nombre[ok],
+        "cargo": cargo[ok],
+        "dni": dni[ok],
+        "telefono": telefono[ok],
+    })
+    return validos.to_dict("records"), sorted(errores, key=lambda e: e["fila"])
+
+
+# ==================== IMPORTACIÓN ====================
+
+def _resultado(total: int, importados: int, errores: List[Dict[str, Any]], mensaje: str) -> Dict[str, Any]:
+    return {"total": total, "importados": importados, "errores": errores, "mensaje": mensaje}
+
+
+def importar_cronograma(codigo_obra: str, archivo, creado_por: str = "jefe", nombre_archivo: Optional[str] = None) -> Dict[str, Any]:
+    df = leer_archivo_tabla(archivo, nombre_archivo)
+    partidas, errores = validar_cronograma_df(df)
+    for p in partidas:
+        p["estado"] = "Aprobado"
+        p["creado_por"] = creado_por
+        p["origen"] = "importacion"
+
+    ok, msg = agregar_partidas_cronograma_lote(codigo_obra, partidas)
+    if not ok:
+        return _resultado(len(df), 0, errores, f"Error al guardar: {msg}")
+    return _resultado(len(df), len(partidas), errores, msg)
+
+
+def importar_insumos(archivo, nombre_archivo: Optional[str] = None) -> Dict[str, Any]:
+    df = leer_archivo_tabla(archivo, nombre_archivo)
+    insumos, errores = validar_insumos_df(df, cargar_insumos())
+    escritos, errores_lote = agregar_insumos_lote(insumos)
+    errores += [{"fila": None, "error": e} for e in errores_lote]
+    return _resultado(len(df), escritos, errores, f"{escritos} insumo(s) importado(s).")
+
+
+def importar_precios_proveedor(
+    archivo, vigente_desde: Any = None, fuente: str = "proveedor", nombre_archivo: Optional[str] = None
+) -> Dict[str, Any]:
+    """Nuevas versiones de precio para los insumos del catálogo (los que no existen se reportan)."""
+    df = leer_archivo_tabla(archivo, nombre_archivo)
+    precios, errores = validar_precios_df(df)
+    actualizados, no_encontrados, errores_lote = actualizar_precios_lote(precios, vigente_desde, fuente)
+    errores += [{"fila": None, "error": f"No existe en el catálogo: {n}"} for n in no_encontrados]
+    errores += [{"fila": None, "error": e} for e in errores_lote]
+    return _resultado(len(df), actualizados, errores, f"{actualizados} precio(s) actualizado(s).")
+
+
+def importar_empleados(codigo_obra: str, archivo, nombre_archivo: Optional[str] = None) -> Dict[str, Any]:
+    df = leer_archivo_tabla(archivo, nombre_archivo)
+    empleados, errores = validar_empleados_df(df, obtener_empleados_obra(codigo_obra))
+    hoy = datetime.now().date().isoformat()
+    for e in empleados:
+        e["fecha_registro"] = hoy
+    escritos, errores_lote = agregar_empleados_lote(codigo_obra, empleados)
+    errores += [{"fila": None, "error": e} for e in errores_lote]
+    return _resultado(len(df), escritos, errores, f"{escritos} empleado(s) importado(s).")
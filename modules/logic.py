@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime, date
+import logging
 import os
 from pathlib import Path
 from typing import Any, Dict, List, Tuple, Optional
@@ -8,7 +9,12 @@ from typing import Any, Dict, List, Tuple, Optional
 import pandas as pd
 
 from modules.database import obtener_avances_obra, cargar_insumos
+from modules.precios import clave_insumo, precio_a_fecha
 from modules.cloudinary_upload import subir_fotos_cloudinary, configurar_cloudinary
+from modules.registro_obras import carpeta_cloudinary
+from modules.telemetria import registrar_error
+
+log = logging.getLogger(__name__)
 
 # Raíz del proyecto (robusto ante ejecución desde otro directorio)
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -142,17 +148,18 @@ def guardar_fotos_avance(codigo_obra: str, fotos, fecha_hoy: date) -> List[str]:
     if configurar_cloudinary():
         try:
             fecha_str = str(fecha_hoy)
-            urls_cloudinary = subir_fotos_cloudinary(fotos, codigo_obra, fecha_str)
+            urls_cloudinary = subir_fotos_cloudinary(fotos, codigo_obra, fecha_str, carpeta_cloudinary(codigo_obra))
             
             if urls_cloudinary and len(urls_cloudinary) > 0:
-                print(f"✅ {len(urls_cloudinary)} fotos subidas a Cloudinary")
+                log.info("%d fotos subidas a Cloudinary", len(urls_cloudinary))
                 return urls_cloudinary
             else:
-                print("⚠️ No se pudieron subir fotos a Cloudinary, usando almacenamiento local")
+                log.warning("No se pudieron subir fotos a Cloudinary (%s); se guardan en disco local", codigo_obra)
         except Exception as e:
-            print(f"⚠️ Error con Cloudinary: {e}, usando almacenamiento local")
+            log.warning("Error con Cloudinary (%s): %s; se guardan en disco local", codigo_obra, e)
+            registrar_error(e, "cloudinary.subir_fotos", "upload")
     else:
-        print("ℹ️ Cloudinary no configurado, usando almacenamiento local")
+        log.info("Cloudinary no configurado; las fotos se guardan en disco local")
     
     # Fallback: Guardar localmente (comportamiento original)
     rutas_fotos: List[str] = []
@@ -186,16 +193,19 @@ def crear_avance_dict(
     unidad_medida: str = "",
     horas_mano_obra: float = 0,
     cantidad_ejecutada: float = 0,
+    precio_venta_unitario: float = 0,
     descripcion_avance: str = "",
     insumos_mo: Optional[list] = None,
     insumos_mat: Optional[list] = None,
     insumos_eq: Optional[list] = None,
     insumos_otros: Optional[list] = None,
     totales: Optional[dict] = None,
+    estado: str = "Aprobado",
 ) -> Dict[str, Any]:
     return {
         "fecha": str(fecha),
         "responsable": responsable,
+        "estado": estado,
         "avance": avance_pct,
         "obs": observaciones,
         "fotos": rutas_fotos,
@@ -207,6 +217,7 @@ def crear_avance_dict(
             "unidad": unidad_medida,
             "jornal_horas": horas_mano_obra,
             "cantidad_ejecutada": cantidad_ejecutada,
+            "precio_venta_unitario": precio_venta_unitario,
         },
         "costos": {
             "mano_de_obra": insumos_mo or [],
@@ -226,6 +237,39 @@ def crear_avance_dict(
     }
 
 
+def _normalizar_clave(texto: Any) -> str:
+    return " ".join(str(texto or "").strip().lower().split())
+
+
+def clave_duplicado_avance(avance: Dict[str, Any]) -> Tuple[str, str, str, float]:
+    """Clave de comparación: responsable, fecha, partida y total ejecutado (al céntimo)."""
+    partida = avance.get("nombre_partida") or (avance.get("partida") or {}).get("nombre", "")
+    totales = avance.get("totales") or {}
+    total = totales.get("total_general_ejecutado", totales.get("total_general", 0))
+    try:
+        total = round(float(total or 0), 2)
+    except (ValueError, TypeError):
+        total = 0.0
+    return (
+        _normalizar_clave(avance.get("responsable")),
+        str(avance.get("fecha", ""))[:10],
+        _normalizar_clave(partida),
+        total,
+    )
+
+
+def detectar_partes_duplicados(avances: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Agrupa los partes casi idénticos (misma clave de duplicado) del historial.
+    Devuelve solo los grupos con más de un parte, en orden de aparición.
+    """
+    grupos: Dict[Tuple[str, str, str, float], List[Dict[str, Any]]] = {}
+    for a in avances or []:
+        if isinstance(a, dict):
+            grupos.setdefault(clave_duplicado_avance(a), []).append(a)
+    return [g for g in grupos.values() if len(g) > 1]
+
+
 def preparar_historial_avances(codigo_obra: str) -> List[Dict[str, Any]]:
     avances = obtener_avances_obra(codigo_obra)
     if not avances:
@@ -260,6 +304,91 @@ def preparar_historial_avances(codigo_obra: str) -> List[Dict[str, Any]]:
     return items
 
 
+
+def _reporte_asistente(avance: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila plana de un parte diario para la revisión por asistente."""
+    partida = avance.get("partida", {}) if isinstance(avance.get("partida", {}), dict) else {}
+    totales = avance.get("totales", {}) if isinstance(avance.get("totales", {}), dict) else {}
+    costos = avance.get("costos", {}) if isinstance(avance.get("costos", {}), dict) else {}
+    return {
+        "id": avance.get("id", ""),
+        "responsable": str(avance.get("responsable") or "Desconocido"),
+        "dia": str(avance.get("fecha", "")),
+        "actividad": partida.get("nombre", "Sin actividad especificada"),
+        "horas": partida.get("jornal_horas", 8),
+        "avance": avance.get("avance", 0),
+        "cantidad_ejecutada": partida.get("cantidad_ejecutada", 0),
+        "unidad": partida.get("unidad", ""),
+        "rendimiento": partida.get("rendimiento", 0),
+        "observaciones": avance.get("observaciones", ""),
+        "fotos": avance.get("fotos", []),
+        "estado": avance.get("estado", "Aprobado"),
+        "total_mo": totales.get("mano_de_obra", 0) or 0,
+        "total_mat": totales.get("materiales", 0) or 0,
+        "total_eq": totales.get("equipos", 0) or 0,
+        "total_otros": totales.get("otros", 0) or 0,
+        "costos": costos,
+    }
+
+
+def agrupar_reportes_asistentes(avances: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Agrupa los partes de una obra por asistente en una sola pasada (groupby).
+    Retorna:
+    - reportes: {asistente: [reporte, ...]} ordenados por día ascendente
+    - estadisticas: {asistente: {reportes, pendientes, horas, avance, total_mo, ..., total_ejecutado, primera_fecha, ultima_fecha}}
+    - general: los mismos totales para toda la obra
+    """
+    filas = [_reporte_asistente(a) for a in avances or [] if isinstance(a, dict)]
+    vacio = {"reportes": 0, "pendientes": 0, "horas": 0.0, "avance": 0.0, "total_mo": 0.0, "total_mat": 0.0,
+             "total_eq": 0.0, "total_otros": 0.0, "total_ejecutado": 0.0, "primera_fecha": "", "ultima_fecha": ""}
+    if not filas:
+        return {"reportes": {}, "estadisticas": {}, "general": dict(vacio, asistentes=0)}
+
+    df = pd.DataFrame(filas, columns=["responsable", "dia", "estado", "horas", "avance",
+                                      "total_mo", "total_mat", "total_eq", "total_otros"])
+    numericas = ["horas", "avance", "total_mo", "total_mat", "total_eq", "total_otros"]
+    df[numericas] = df[numericas].apply(pd.to_numeric, errors="coerce").fillna(0.0)
+    df["total_ejecutado"] = df[["total_mo", "total_mat", "total_eq", "total_otros"]].sum(axis=1)
+    df["pendiente"] = (df["estado"] == "Pendiente").astype(int)
+    df["orden"] = range(len(df))
+
+    stats = df.groupby("responsable", sort=True).agg(
+        reportes=("dia", "size"),
+        pendientes=("pendiente", "sum"),
+        horas=("horas", "sum"),
+        avance=("avance", "sum"),
+        total_mo=("total_mo", "sum"),
+        total_mat=("total_mat", "sum"),
+        total_eq=("total_eq", "sum"),
+        total_otros=("total_otros", "sum"),
+        total_ejecutado=("total_ejecutado", "sum"),
+        primera_fecha=("dia", "min"),
+        ultima_fecha=("dia", "max"),
+    )
+    estadisticas: Dict[str, Dict[str, Any]] = {}
+    for asistente, v in stats.iterrows():
+        fila_stats = {c: float(v[c]) for c in numericas + ["total_ejecutado"]}
+        fila_stats.update(
+            reportes=int(v["reportes"]),
+            pendientes=int(v["pendientes"]),
+            primera_fecha=str(v["primera_fecha"]),
+            ultima_fecha=str(v["ultima_fecha"]),
+        )
+        estadisticas[str(asistente)] = fila_stats
+
+    for fila, total in zip(filas, df["total_ejecutado"].tolist()):
+        fila["total_ejecutado"] = total
+    reportes: Dict[str, List[Dict[str, Any]]] = {}
+    for idx in df.sort_values(["responsable", "dia", "orden"])["orden"].tolist():
+        reportes.setdefault(str(filas[idx]["responsable"]), []).append(filas[idx])
+
+    general = {c: sum(e[c] for e in estadisticas.values()) for c in vacio if not c.endswith("fecha")}
+    general["primera_fecha"] = str(df["dia"].min())
+    general["ultima_fecha"] = str(df["dia"].max())
+    general["asistentes"] = len(estadisticas)
+    return {"reportes": reportes, "estadisticas": estadisticas, "general": general}
+
 def preparar_tabla_insumos():
     return cargar_insumos()
 
@@ -277,7 +406,18 @@ def calcular_parcial(cantidad: float, precio_unitario: float) -> float:
     return float(cantidad) * float(precio_unitario)
 
 
-def obtener_precio_insumo(insumos_lista: List[Dict[str, Any]], nombre_insumo: str) -> float:
+def obtener_precio_insumo(
+    insumos_lista: List[Dict[str, Any]],
+    nombre_insumo: str,
+    fecha: Any = None,
+    indice: Optional[Dict[str, Tuple[List[str], List[float]]]] = None,
+) -> float:
+    """
+    Precio del catálogo; con `fecha` e `indice` (construir_indice_precios, armado
+    una vez por versión del catálogo), el vigente a esa fecha.
+    """
+    if fecha is not None and indice is not None:
+        return precio_a_fecha(indice, nombre_insumo, fecha, 0.0)
     for i in insumos_lista or []:
         if i.get("Insumo") == nombre_insumo:
             try:
@@ -342,9 +482,12 @@ def calcular_gastos_acumulados(avances: List[Dict[str, Any]]) -> float:
     return total_gastado
 
 
-def calcular_resumen_presupuesto(presupuesto_total: Any, avances: List[Dict[str, Any]]) -> Dict[str, float]:
+def calcular_resumen_presupuesto(presupuesto_total: Any, avances: Optional[List[Dict[str, Any]]], gastado: Optional[float] = None) -> Dict[str, float]:
+    """Si se pasa `gastado` (rollup de la obra) no se recorren los avances."""
     presupuestado = float(presupuesto_total) if presupuesto_total else 0.0
-    gastado = calcular_gastos_acumulados(avances)
+    if gastado is None:
+        gastado = calcular_gastos_acumulados(avances)
+    gastado = float(gastado or 0.0)
     disponible = presupuestado - gastado
     porcentaje_gastado = (gastado / presupuestado * 100) if presupuestado > 0 else 0.0
 
@@ -391,6 +534,14 @@ def calcular_eficiencia_promedio_obra(avances: List[Dict[str, Any]]) -> float:
     return sum(eficiencias) / len(eficiencias)
 
 
+def calcular_eficiencia_desde_rollup(rollup: Dict[str, Any]) -> float:
+    """Promedio de eficiencia a partir de la suma y cantidad acumuladas en el rollup."""
+    n = float((rollup or {}).get("eficiencia_n", 0) or 0)
+    if n <= 0:
+        return 0.0
+    return float(rollup.get("eficiencia_suma", 0) or 0) / n
+
+
 # ==================== CRONOGRAMA VALORIZADO (Curva S) ====================
 
 def _parse_date_any(x: Any) -> Optional[pd.Timestamp]:
@@ -715,6 +866,20 @@ def calcular_resumen_donaciones(donaciones: List[Dict[str, Any]]) -> Dict[str, A
     }
 
 
+def resumen_donaciones_desde_totales(totales: Dict[str, Any]) -> Dict[str, Any]:
+    """Mismo formato que calcular_resumen_donaciones, desde los totales de obras_resumen."""
+    totales = totales or {}
+    efectivo = float(totales.get("donaciones_efectivo", 0) or 0)
+    especie = float(totales.get("donaciones_especie", 0) or 0)
+    return {
+        "total_efectivo": efectivo,
+        "total_especie": especie,
+        "total_general": efectivo + especie,
+        "cantidad_donantes": sum(1 for n in (totales.get("donaciones_por_donante") or {}).values() if (n or 0) > 0),
+        "cantidad_donaciones": int(totales.get("cantidad_donaciones", 0) or 0),
+    }
+
+
 def impacto_donacion_en_presupuesto(presupuesto_original: float, donaciones: List[Dict[str, Any]]) -> Dict[str, float]:
     """
     Calcula el impacto de las donaciones en el presupuesto:
@@ -723,10 +888,14 @@ def impacto_donacion_en_presupuesto(presupuesto_original: float, donaciones: Lis
     - Presupuesto ampliado
     - Porcentaje ampliación
     """
+    return impacto_donaciones_desde_total(presupuesto_original, calcular_resumen_donaciones(donaciones)["total_general"])
+
+
+def impacto_donaciones_desde_total(presupuesto_original: float, total_donaciones: float) -> Dict[str, float]:
+    """Impacto en el presupuesto a partir del total ya calculado (p. ej. del resumen de la obra)."""
     presupuesto_original = float(presupuesto_original or 0)
-    resumen = calcular_resumen_donaciones(donaciones)
-    total_donaciones = resumen["total_general"]
-    
+    total_donaciones = float(total_donaciones or 0)
+
     presupuesto_ampliado = presupuesto_original + total_donaciones
     porcentaje_ampliacion = (total_donaciones / presupuesto_original * 100) if presupuesto_original > 0 else 0
     
@@ -736,3 +905,188 @@ def impacto_donacion_en_presupuesto(presupuesto_original: float, donaciones: Lis
         "presupuesto_ampliado": presupuesto_ampliado,
         "porcentaje_ampliacion": porcentaje_ampliacion,
     }
+
+
+# ==================== TRABAJOS ADICIONALES ====================
+
+def _resumen_trabajos(por_estado: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    total_costo = sum(v["costo"] for v in por_estado.values())
+    total_cobro = sum(v["cobro"] for v in por_estado.values())
+    total_ganancia = total_cobro - total_costo
+    cobrado = por_estado.get("Cobrado", {"cantidad": 0, "cobro": 0.0})
+    total_trabajos = sum(v["cantidad"] for v in por_estado.values())
+    return {
+        "total_trabajos": total_trabajos,
+        "total_costo": total_costo,
+        "total_cobro": total_cobro,
+        "total_ganancia": total_ganancia,
+        "margen": (total_ganancia / total_cobro * 100) if total_cobro > 0 else 0.0,
+        "cantidad_cobrados": cobrado["cantidad"],
+        "total_cobrado": cobrado["cobro"],
+        "cantidad_por_cobrar": total_trabajos - cobrado["cantidad"],
+        "total_por_cobrar": total_cobro - cobrado["cobro"],
+        "por_estado": por_estado,
+    }
+
+
+def resumen_trabajos_desde_totales(totales: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Totales de costo/cobro/ganancia y desglose por estado, a partir de los totales precalculados por estado."""
+    por_estado: Dict[str, Dict[str, float]] = {}
+    for clave, nodo in (totales or {}).items():
+        cantidad = int(round(float(nodo.get("cantidad", 0) or 0)))
+        if cantidad <= 0:
+            continue
+        por_estado[str(nodo.get("estado") or clave)] = {
+            "cantidad": cantidad,
+            "costo": float(nodo.get("costo", 0) or 0),
+            "cobro": float(nodo.get("cobro", 0) or 0),
+        }
+    return _resumen_trabajos(por_estado)
+
+
+# ==================== CONSUMO DE MATERIALES ====================
+
+def _precio_catalogo_consumo(consumo: Dict[str, Any], indice: Dict[str, Tuple[List[str], List[float]]]) -> Optional[float]:
+    """Precio de catálogo vigente en cada día de consumo, ponderado por la cantidad de ese día."""
+    cantidad = valor = 0.0
+    for dia in (consumo.get("por_dia") or {}).values():
+        q = float(dia.get("cantidad", 0) or 0)
+        precio = precio_a_fecha(indice, consumo.get("insumo"), dia.get("fecha"))
+        if precio is None or q <= 0 or not dia.get("fecha"):
+            continue
+        cantidad += q
+        valor += q * precio
+    return valor / cantidad if cantidad > 0 else None
+
+
+def analizar_consumo_materiales(
+    consumos: List[Dict[str, Any]],
+    insumos_catalogo: List[Dict[str, Any]],
+    indice_precios: Optional[Dict[str, Tuple[List[str], List[float]]]] = None,
+) -> pd.DataFrame:
+    """
+    Una fila por insumo consumido: cantidad y costo acumulados, precio medio
+    pagado y su variación frente al precio del catálogo de insumos (cruce por
+    nombre normalizado, la misma clave del libro de consumo). Con `indice_precios`
+    el precio de catálogo es el vigente en las fechas de consumo, no el de hoy.
+    """
+    columnas = ["insumo", "unidad", "cantidad", "costo", "precio_promedio", "precio_catalogo", "variacion_pct", "partidas", "lineas"]
+    filas = [{
+        "clave": c.get("insumo_clave") or clave_insumo(c.get("insumo")),
+        "insumo": c.get("insumo", ""),
+        "cantidad": float(c.get("cantidad", 0) or 0),
+        "costo": float(c.get("costo", 0) or 0),
+        "partidas": sum(1 for p in (c.get("por_partida") or {}).values() if float(p.get("cantidad", 0) or 0) > 0),
+        "lineas": int(c.get("lineas", 0) or 0),
+        "precio_a_fecha": _precio_catalogo_consumo(c, indice_precios) if indice_precios else None,
+    } for c in consumos or []]
+    if not filas:
+        return pd.DataFrame(columns=columnas)
+
+    df = pd.DataFrame(filas)
+    catalogo = pd.DataFrame([{
+        "clave": clave_insumo(i.get("Insumo")),
+        "unidad": i.get("Unidad", ""),
+        "precio_catalogo": float(i.get("Precio Unitario", 0) or 0),
+    } for i in insumos_catalogo or [] if i.get("Insumo")], columns=["clave", "unidad", "precio_catalogo"])
+    df = df.merge(catalogo.drop_duplicates("clave", keep="last"), on="clave", how="left")
+    df["precio_catalogo"] = pd.to_numeric(df["precio_a_fecha"], errors="coerce").fillna(df["precio_catalogo"])
+
+    df["precio_promedio"] = (df["costo"] / df["cantidad"].where(df["cantidad"] > 0)).round(2)
+    df["variacion_pct"] = (
+        (df["precio_promedio"] - df["precio_catalogo"]) / df["precio_catalogo"].where(df["precio_catalogo"] > 0) * 100
+    ).round(1)
+    df["unidad"] = df["unidad"].fillna("")
+    return df[columnas].sort_values("costo", ascending=False).reset_index(drop=True)
+
+
+def consumo_por_partida(consumo: Dict[str, Any]) -> pd.DataFrame:
+    """Desglose de un insumo por partida, de mayor a menor consumo."""
+    filas = [
+        {"partida": p.get("nombre", clave), "cantidad": float(p.get("cantidad", 0) or 0), "costo": float(p.get("costo", 0) or 0)}
+        for clave, p in (consumo.get("por_partida") or {}).items()
+    ]
+    df = pd.DataFrame(filas, columns=["partida", "cantidad", "costo"])
+    return df[df["cantidad"].abs() > 1e-9].sort_values("cantidad", ascending=False).reset_index(drop=True)
+
+
+def consumo_acumulado_diario(consumo: Dict[str, Any]) -> pd.DataFrame:
+    """Consumo diario de un insumo con su acumulado (fechas sin parte no aparecen)."""
+    filas = [
+        {"fecha": d.get("fecha", ""), "cantidad": float(d.get("cantidad", 0) or 0), "costo": float(d.get("costo", 0) or 0)}
+        for d in (consumo.get("por_dia") or {}).values()
+    ]
+    df = pd.DataFrame(filas, columns=["fecha", "cantidad", "costo"])
+    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
+    df = df.dropna(subset=["fecha"]).groupby("fecha", as_index=False)[["cantidad", "costo"]].sum()
+    df["cantidad_acumulada"] = df["cantidad"].cumsum()
+    df["costo_acumulado"] = df["costo"].cumsum()
+    return df
+
+
+# ==================== PORTAFOLIO DE OBRAS ====================
+
+def calcular_pv_a_fecha(plan_tramos: Dict[str, Dict[str, Any]], fecha_corte: Optional[date] = None) -> float:
+    """PV acumulado a la fecha de corte, con el mismo reparto diario uniforme que construir_curva_s_planificada."""
+    fecha_corte = fecha_corte or date.today()
+    pv = 0.0
+    for tramo in (plan_tramos or {}).values():
+        try:
+            fi = date.fromisoformat(str(tramo["inicio"])[:10])
+            ff = date.fromisoformat(str(tramo["fin"])[:10])
+            monto = float(tramo.get("monto", 0) or 0)
+        except (KeyError, ValueError, TypeError):
+            continue
+        dias = (ff - fi).days + 1
+        if dias <= 0 or monto <= 0:
+            continue
+        transcurridos = min(max((fecha_corte - fi).days + 1, 0), dias)
+        pv += monto * transcurridos / dias
+    return pv
+
+
+def construir_resumen_portafolio(resumenes: List[Dict[str, Any]], fecha_corte: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Indicadores por obra a partir de los documentos de obras_resumen
+    (sin leer avances, donaciones ni movimientos).
+    """
+    filas = []
+    for r in resumenes or []:
+        presupuesto = float(r.get("presupuesto_total", 0) or 0)
+        donaciones = float(r.get("donaciones_total", 0) or 0)
+        presupuesto_ampliado = presupuesto + donaciones
+        gastado = float(r.get("gastado_total", 0) or 0)
+        pv_total = float(r.get("pv_total", 0) or 0)
+        pv_a_fecha = calcular_pv_a_fecha(r.get("plan_tramos"), fecha_corte)
+
+        filas.append({
+            "codigo": r.get("codigo", ""),
+            "nombre": r.get("nombre") or r.get("codigo", ""),
+            "presupuesto": presupuesto,
+            "donaciones": donaciones,
+            "presupuesto_ampliado": presupuesto_ampliado,
+            "gastado": gastado,
+            "porcentaje_gastado": (gastado / presupuesto_ampliado * 100) if presupuesto_ampliado > 0 else None,
+            "avance_real": float(r.get("avance_real_total", 0) or 0),
+            "avance_programado": (pv_a_fecha / pv_total * 100) if pv_total > 0 else 0.0,
+            "pv_a_fecha": pv_a_fecha,
+            "spi": (gastado / pv_a_fecha) if pv_a_fecha > 0 else 0.0,
+            "caja_saldo": float(r.get("caja_ingresos", 0) or 0) - float(r.get("caja_egresos", 0) or 0),
+            "caja_pendientes": int(r.get("caja_pendientes", 0) or 0),
+            "cantidad_partes": int(r.get("cantidad_partes", 0) or 0),
+            "actualizado_en": r.get("actualizado_en", ""),
+        })
+    return sorted(filas, key=lambda f: str(f["nombre"]))
+
+
+def calcular_totales_portafolio(filas: List[Dict[str, Any]]) -> Dict[str, float]:
+    presupuesto = sum(f["presupuesto_ampliado"] for f in filas)
+    gastado = sum(f["gastado"] for f in filas)
+    return {
+        "obras": len(filas),
+        "presupuesto_ampliado": presupuesto,
+        "gastado": gastado,
+        "porcentaje_gastado": (gastado / presupuesto * 100) if presupuesto > 0 else 0.0,
+        "donaciones": sum(f["donaciones"] for f in filas),
+        "caja_saldo": sum(f["caja_saldo"] for f in filas),
+    }
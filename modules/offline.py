@@ -0,0 +1,416 @@
+"""
+Cola de reintentos del parte diario (en el servidor)
+Cuando Firestore no responde, el parte diario se puede seguir llenando: los
+borradores y los partes completos (con sus fotos) quedan en el disco del
+servidor de Streamlit, los catálogos se leen de la última copia guardada ahí y
+todo se envía en bloque al sincronizar.
+
+No es un modo sin señal para el celular: el navegador sigue necesitando llegar
+al servidor, y nada se guarda en el dispositivo. El disco del servidor no es
+durable: un redeploy o reinicio del contenedor borra la cola, así que se
+sincroniza apenas Firestore vuelve a responder.
+
+Estructura en disco (data/offline/):
+    catalogos/<codigo>.json          copia de insumos, empleados y cronograma
+    borradores/<codigo>__<usuario>.json
+    partes/<codigo>/<id>.json        parte completo pendiente de sincronizar
+    partes/<codigo>/<id>/            fotos del parte
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Raíz del proyecto (robusto ante ejecución desde otro directorio)
+BASE_DIR = Path(__file__).resolve().parent.parent
+OFFLINE_DIR = BASE_DIR / "data" / "offline"
+CATALOGOS_DIR = OFFLINE_DIR / "catalogos"
+BORRADORES_DIR = OFFLINE_DIR / "borradores"
+PARTES_DIR = OFFLINE_DIR / "partes"
+
+# Estados de sincronización de un parte guardado localmente
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_SINCRONIZADO = "sincronizado"
+ESTADO_CONFLICTO = "conflicto"
+
+# Campos que no participan en la comparación de contenido (cambian al sincronizar)
+_CAMPOS_NO_COMPARABLES = {"fotos", "sincronizado_en", "origen"}
+
+
+# ==================== UTILIDADES DE DISCO ====================
+
+def _slug(texto: str) -> str:
+    texto = str(texto or "").strip()
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in texto) or "sin_nombre"
+
+
+def _leer_json(path: Path, default: Any) -> Any:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except Exception:
+        return default
+
+
+def _escribir_json(path: Path, data: Any) -> None:
+    """Escritura atómica: se escribe a un temporal y luego se reemplaza."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + f".tmp{os.getpid()}")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def nuevo_id_parte() -> str:
+    """ID idempotente generado en el cliente (no depende del reloj del servidor)."""
+    return f"avance_{uuid.uuid4().hex}"
+
+
+def huella_avance(avance: Dict[str, Any]) -> str:
+    """Hash estable del contenido de un avance, sin los campos que cambian al sincronizar."""
+    data = {k: v for k, v in (avance or {}).items() if k not in _CAMPOS_NO_COMPARABLES}
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ==================== CATÁLOGOS LOCALES ====================
+
+def guardar_snapshot_catalogos(
+    codigo_obra: str,
+    nombre_obra: str,
+    insumos: List[Dict[str, Any]],
+    empleados: List[Dict[str, Any]],
+    cronograma: List[Dict[str, Any]],
+) -> None:
+    _escribir_json(CATALOGOS_DIR / f"{_slug(codigo_obra)}.json", {
+        "codigo_obra": codigo_obra,
+        "nombre_obra": nombre_obra,
+        "fecha_snapshot": datetime.now().isoformat(timespec="seconds"),
+        "insumos": insumos or [],
+        "empleados": empleados or [],
+        "cronograma": cronograma or [],
+    })
+
+
+def descargar_snapshot_catalogos(codigo_obra: str, nombre_obra: str) -> Tuple[bool, str]:
+    """Descarga desde Firestore los catálogos que usa el parte diario y los guarda localmente."""
+    try:
+        from modules.database import cargar_insumos, obtener_cronograma_obra, obtener_empleados_obra
+
+        guardar_snapshot_catalogos(
+            codigo_obra,
+            nombre_obra,
+            cargar_insumos(),
+            obtener_empleados_obra(codigo_obra),
+            obtener_cronograma_obra(codigo_obra),
+        )
+        return True, "Catálogos guardados para uso sin conexión."
+    except Exception as e:
+        return False, f"No se pudieron descargar los catálogos: {e}"
+
+
+def cargar_snapshot_catalogos(codigo_obra: str) -> Dict[str, Any]:
+    data = _leer_json(CATALOGOS_DIR / f"{_slug(codigo_obra)}.json", {})
+    if not isinstance(data, dict):
+        data = {}
+    data.setdefault("insumos", [])
+    data.setdefault("empleados", [])
+    data.setdefault("cronograma", [])
+    return data
+
+
+def listar_obras_con_snapshot() -> Dict[str, str]:
+    """Obras disponibles sin conexión: {codigo: nombre}."""
+    obras: Dict[str, str] = {}
+    if not CATALOGOS_DIR.exists():
+        return obras
+    for p in sorted(CATALOGOS_DIR.glob("*.json")):
+        data = _leer_json(p, {})
+        if isinstance(data, dict) and data.get("codigo_obra"):
+            obras[data["codigo_obra"]] = data.get("nombre_obra") or data["codigo_obra"]
+    return obras
+
+
+# ==================== BORRADORES ====================
+
+class _FotoLocal(io.BytesIO):
+    """Foto leída de disco con la misma interfaz que un UploadedFile de Streamlit."""
+
+    def __init__(self, path: Path):
+        super().__init__(path.read_bytes())
+        self.name = path.name
+
+
+def _borrador_path(codigo_obra: str, usuario: str) -> Path:
+    return BORRADORES_DIR / f"{_slug(codigo_obra)}__{_slug(usuario)}.json"
+
+
+def _borrador_fotos_dir(codigo_obra: str, usuario: str) -> Path:
+    return BORRADORES_DIR / f"{_slug(codigo_obra)}__{_slug(usuario)}_fotos"
+
+
+def guardar_borrador(codigo_obra: str, usuario: str, datos: Dict[str, Any], fotos=None) -> None:
+    """Guarda el formulario a medio llenar (y sus fotos, si se pasan)."""
+    datos = dict(datos or {})
+    datos["guardado_en"] = datetime.now().isoformat(timespec="seconds")
+    if fotos:
+        fotos_dir = _borrador_fotos_dir(codigo_obra, usuario)
+        shutil.rmtree(fotos_dir, ignore_errors=True)
+        fotos_dir.mkdir(parents=True, exist_ok=True)
+        for i, f in enumerate(fotos, start=1):
+            with open(fotos_dir / f"{i:02d}_{_slug(getattr(f, 'name', 'foto.jpg'))}", "wb") as out:
+                out.write(f.getbuffer())
+        datos["cantidad_fotos"] = len(fotos)
+    _escribir_json(_borrador_path(codigo_obra, usuario), datos)
+
+
+def cargar_borrador(codigo_obra: str, usuario: str) -> Optional[Dict[str, Any]]:
+    data = _leer_json(_borrador_path(codigo_obra, usuario), None)
+    return data if isinstance(data, dict) else None
+
+
+def cargar_fotos_borrador(codigo_obra: str, usuario: str) -> List[io.BytesIO]:
+    fotos_dir = _borrador_fotos_dir(codigo_obra, usuario)
+    if not fotos_dir.exists():
+        return []
+    return [_FotoLocal(p) for p in sorted(fotos_dir.iterdir()) if p.is_file()]
+
+
+def eliminar_borrador(codigo_obra: str, usuario: str) -> None:
+    try:
+        _borrador_path(codigo_obra, usuario).unlink()
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(_borrador_fotos_dir(codigo_obra, usuario), ignore_errors=True)
+
+
+# ==================== PARTES PENDIENTES ====================
+
+def _parte_path(codigo_obra: str, parte_id: str) -> Path:
+    return PARTES_DIR / _slug(codigo_obra) / f"{parte_id}.json"
+
+
+def guardar_parte_offline(codigo_obra: str, avance: Dict[str, Any], fotos) -> Tuple[bool, str]:
+    """
+    Deja un parte diario completo en la cola del servidor para sincronizarlo
+    después. Las fotos (si aún no se subieron) se copian junto al parte; el ID del avance se fija aquí y es el
+    mismo que se usará al sincronizar (reintentos idempotentes).
+    """
+    try:
+        avance = dict(avance or {})
+        avance.setdefault("id", nuevo_id_parte())
+        avance["origen"] = "offline"
+        parte_id = avance["id"]
+
+        fotos_dir = PARTES_DIR / _slug(codigo_obra) / parte_id
+        fotos_dir.mkdir(parents=True, exist_ok=True)
+        fotos_locales: List[str] = []
+        for i, f in enumerate(fotos or [], start=1):
+            nombre = f"{i:02d}_{_slug(getattr(f, 'name', 'foto.jpg'))}"
+            destino = fotos_dir / nombre
+            with open(destino, "wb") as out:
+                out.write(f.getbuffer())
+            fotos_locales.append(str(destino))
+
+        _escribir_json(_parte_path(codigo_obra, parte_id), {
+            "codigo_obra": codigo_obra,
+            "avance": avance,
+            "fotos_locales": fotos_locales,
+            "fotos_subidas": [],
+            "estado_sync": ESTADO_PENDIENTE,
+            "creado_en": datetime.now().isoformat(timespec="seconds"),
+            "huella": huella_avance(avance),
+            "detalle": "",
+        })
+        return True, "Parte guardado en la cola del servidor. Se enviará al sincronizar."
+    except Exception as e:
+        return False, f"No se pudo guardar el parte en la cola del servidor: {e}"
+
+
+def listar_partes_locales(codigo_obra: Optional[str] = None, estado: Optional[str] = None) -> List[Dict[str, Any]]:
+    if not PARTES_DIR.exists():
+        return []
+    carpetas = [PARTES_DIR / _slug(codigo_obra)] if codigo_obra else [p for p in PARTES_DIR.iterdir() if p.is_dir()]
+    partes: List[Dict[str, Any]] = []
+    for carpeta in carpetas:
+        for p in sorted(carpeta.glob("*.json")):
+            data = _leer_json(p, None)
+            if not isinstance(data, dict):
+                continue
+            if estado and data.get("estado_sync") != estado:
+                continue
+            partes.append(data)
+    return partes
+
+
+def contar_partes_pendientes(codigo_obra: Optional[str] = None) -> int:
+    return len(listar_partes_locales(codigo_obra, ESTADO_PENDIENTE))
+
+
+def _guardar_registro(registro: Dict[str, Any]) -> None:
+    _escribir_json(_parte_path(registro["codigo_obra"], registro["avance"]["id"]), registro)
+
+
+def _es_mismo_parte(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Un parte sin ID en Firestore que coincide en responsable/fecha/partida se considera el mismo."""
+    pa = a.get("partida") if isinstance(a.get("partida"), dict) else {}
+    pb = b.get("partida") if isinstance(b.get("partida"), dict) else {}
+    return (
+        str(a.get("responsable", "")).strip().lower() == str(b.get("responsable", "")).strip().lower()
+        and str(a.get("fecha", "")) == str(b.get("fecha", ""))
+        and str(pa.get("nombre", a.get("nombre_partida", ""))).strip().lower()
+        == str(pb.get("nombre", b.get("nombre_partida", ""))).strip().lower()
+    )
+
+
+def detectar_conflicto(registro: Dict[str, Any], remotos_por_id: Dict[str, Dict[str, Any]], remotos_sin_id: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """
+    Compara un parte local contra la copia de Firestore.
+    Retorna (resultado, detalle) con resultado en: "nuevo", "ya_sincronizado", "conflicto".
+    """
+    avance = registro["avance"]
+    remoto = remotos_por_id.get(avance["id"])
+    if remoto is not None:
+        if huella_avance(remoto) == registro.get("huella"):
+            return "ya_sincronizado", "El parte ya existe en el servidor."
+        return "conflicto", "Existe un parte con el mismo ID pero con contenido distinto."
+    for otro in remotos_sin_id:
+        if _es_mismo_parte(avance, otro):
+            return "conflicto", "Ya hay un parte del mismo responsable, fecha y partida en el servidor."
+    return "nuevo", ""
+
+
+def sincronizar_partes(codigo_obra: Optional[str] = None) -> Dict[str, int]:
+    """
+    Envía a Firestore todos los partes pendientes (de una obra o de todas).
+    Por obra: una lectura de la copia remota, subida de fotos y la escritura en
+    transacciones acotadas; si una falla, los partes de las anteriores quedan
+    sincronizados y el resto sigue pendiente con el error en `detalle`.
+    """
+    from modules.database import obtener_avances_obra, agregar_avances_lote
+    from modules.logic import guardar_fotos_avance
+
+    resultado = {"sincronizados": 0, "conflictos": 0, "errores": 0}
+    pendientes = listar_partes_locales(codigo_obra, ESTADO_PENDIENTE)
+
+    por_obra: Dict[str, List[Dict[str, Any]]] = {}
+    for reg in pendientes:
+        por_obra.setdefault(reg["codigo_obra"], []).append(reg)
+
+    for cod, registros in por_obra.items():
+        try:
+            remotos = obtener_avances_obra(cod)
+        except Exception:
+            resultado["errores"] += len(registros)
+            continue
+        remotos_por_id = {r["id"]: r for r in remotos if isinstance(r, dict) and r.get("id")}
+        remotos_sin_id = [r for r in remotos if isinstance(r, dict) and not r.get("id")]
+
+        listos: List[Dict[str, Any]] = []
+        for reg in registros:
+            estado, detalle = detectar_conflicto(reg, remotos_por_id, remotos_sin_id)
+            if estado == "ya_sincronizado":
+                reg["estado_sync"] = ESTADO_SINCRONIZADO
+                _guardar_registro(reg)
+                resultado["sincronizados"] += 1
+                continue
+            if estado == "conflicto":
+                reg["estado_sync"] = ESTADO_CONFLICTO
+                reg["detalle"] = detalle
+                _guardar_registro(reg)
+                resultado["conflictos"] += 1
+                continue
+
+            # Subir fotos una sola vez (se recuerdan las URLs por si falla la escritura)
+            if reg.get("fotos_locales") and not reg.get("fotos_subidas"):
+                try:
+                    archivos = [_FotoLocal(Path(p)) for p in reg["fotos_locales"] if Path(p).exists()]
+                    fecha = reg["avance"].get("fecha") or datetime.now().date().isoformat()
+                    reg["fotos_subidas"] = guardar_fotos_avance(cod, archivos, fecha)
+                    _guardar_registro(reg)
+                except Exception as e:
+                    reg["detalle"] = f"Error subiendo fotos: {e}"
+                    _guardar_registro(reg)
+                    resultado["errores"] += 1
+                    continue
+            listos.append(reg)
+
+        if not listos:
+            continue
+
+        avances = []
+        for reg in listos:
+            avance = dict(reg["avance"])
+            avance["fotos"] = reg.get("fotos_subidas") or avance.get("fotos") or []
+            avance["sincronizado_en"] = datetime.now().isoformat(timespec="seconds")
+            avances.append(avance)
+
+        ok, msg, confirmados = agregar_avances_lote(cod, avances)
+        confirmados = set(confirmados)
+        for reg in listos:
+            if reg["avance"]["id"] in confirmados:
+                reg["estado_sync"] = ESTADO_SINCRONIZADO
+                reg["detalle"] = ""
+                resultado["sincronizados"] += 1
+            else:
+                reg["detalle"] = msg
+                resultado["errores"] += 1
+            _guardar_registro(reg)
+
+    return resultado
+
+
+def resolver_conflicto(codigo_obra: str, parte_id: str, accion: str) -> Tuple[bool, str]:
+    """
+    accion = "descartar": elimina la copia local.
+    accion = "reenviar": asigna un ID nuevo y lo vuelve a dejar pendiente.
+    """
+    path = _parte_path(codigo_obra, parte_id)
+    reg = _leer_json(path, None)
+    if not isinstance(reg, dict):
+        return False, "No se encontró el parte local."
+
+    fotos_dir = PARTES_DIR / _slug(codigo_obra) / parte_id
+
+    if accion == "descartar":
+        path.unlink(missing_ok=True)
+        shutil.rmtree(fotos_dir, ignore_errors=True)
+        return True, "Parte local descartado."
+
+    if accion == "reenviar":
+        avance = dict(reg["avance"])
+        avance["id"] = nuevo_id_parte()
+        reg["avance"] = avance
+        # Las fotos viven en una carpeta con el ID del parte: se mueven con el ID nuevo
+        if fotos_dir.exists():
+            nuevo_dir = PARTES_DIR / _slug(codigo_obra) / avance["id"]
+            shutil.move(str(fotos_dir), str(nuevo_dir))
+            reg["fotos_locales"] = [str(nuevo_dir / Path(p).name) for p in reg.get("fotos_locales") or []]
+        reg["huella"] = huella_avance(avance)
+        reg["estado_sync"] = ESTADO_PENDIENTE
+        reg["detalle"] = ""
+        _guardar_registro(reg)
+        path.unlink(missing_ok=True)
+        return True, "Parte marcado para reenviarse como nuevo."
+
+    return False, "Acción no reconocida."
+
+
+def limpiar_partes_sincronizados(codigo_obra: Optional[str] = None) -> int:
+    """Borra del disco los partes ya sincronizados (y sus fotos)."""
+    borrados = 0
+    for reg in listar_partes_locales(codigo_obra, ESTADO_SINCRONIZADO):
+        cod = reg["codigo_obra"]
+        pid = reg["avance"]["id"]
+        _parte_path(cod, pid).unlink(missing_ok=True)
+        shutil.rmtree(PARTES_DIR / _slug(cod) / pid, ignore_errors=True)
+        borrados += 1
+    return borrados
@@ -1,7 +1,20 @@
+"""
+Parte diario y dossier de partes en PDF.
+
+Los PDF se escriben en un archivo temporal (data/tmp_pdfs) y la sesión guarda solo
+la ruta; limpiar_pdfs borra los que pasaron su TTL. Las fotos se reducen a los
+píxeles que ocupan en la página a DPI_FOTOS y se insertan por ruta (se leen del
+disco al dibujar la página, no se cargan todas antes).
+"""
+
+import os
+import tempfile
+import time
 from io import BytesIO
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.lib import colors
@@ -11,33 +24,86 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from PIL import Image as PILImage, ImageOps
 from pathlib import Path
 
+from modules.derivados import DERIVADOS_DIR, en_uso, obtener_derivado
+from modules.telemetria import instrumentar
+
 # Raíz del proyecto (para rutas absolutas)
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+PDF_TMP_DIR = BASE_DIR / "data" / "tmp_pdfs"
+FOTOS_TMP_DIR = DERIVADOS_DIR
+# Resolución de las fotos a su tamaño impreso: suficiente para ver detalle al hacer zoom
+DPI_FOTOS = 150
+TTL_PDF_S = 2 * 3600
+
+# Área de la foto en la página (A4 con los márgenes del documento)
+FOTO_MAX_W = A4[0] - 3.2*cm
+FOTO_MAX_H = A4[1] - 6.0*cm
+
+# Streams binarios: sin ASCII85 las fotos ocupan 20% menos en memoria y en el PDF.
+# ReportLab solo lo permite como ajuste global (rl_config se lee en cada stream, no
+# hay opción por documento), así que vale para todo el proceso desde que se importa
+# este módulo. Es el único que genera PDF en la app; cambiarlo y restaurarlo en cada
+# armado no serviría con varios armados en paralelo en hilos distintos.
+rl_config.useA85 = 0
+
 styles = getSampleStyleSheet()
 
-def optimize_image_for_pdf(in_path: str, out_dir: str | None = None, max_side=1600, quality=80) -> str:
-    # Asegura directorio temporal dentro del proyecto
-    if out_dir is None:
-        out_dir = str(BASE_DIR / 'data' / 'tmp_imgs')
+# Orientaciones EXIF que giran la foto 90°
+_EXIF_GIRADA = {5, 6, 7, 8}
+
+def preparar_foto(in_path: str, max_w: float = FOTO_MAX_W, max_h: float = FOTO_MAX_H,
+                  dpi: int = DPI_FOTOS, out_dir: str | None = None) -> Tuple[str, float, float]:
+    """
+    Reduce la foto a los píxeles que ocupará en la página a `dpi` y retorna
+    (ruta, ancho_pt, alto_pt) ya ajustados a max_w x max_h. Las JPEG se decodifican
+    directamente a escala reducida (draft), sin abrir la foto completa en memoria.
+    La copia reducida queda en el almacén de derivados (modules.derivados).
+    """
+    with PILImage.open(in_path) as img:
+        girada = img.getexif().get(0x0112) in _EXIF_GIRADA
+        w, h = (img.height, img.width) if girada else img.size
+    escala = min(max_w / w, max_h / h)
+    ancho_pt, alto_pt = w * escala, h * escala
+    # Píxeles necesarios a su tamaño impreso (nunca más que la original)
+    objetivo = (
+        min(w, max(1, round(ancho_pt / 72 * dpi))),
+        min(h, max(1, round(alto_pt / 72 * dpi))),
+    )
 
-    in_path = Path(in_path)
-    out_dir = Path(out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
+    def _crear(tmp: str) -> None:
+        with PILImage.open(in_path) as original:
+            original.draft("RGB", (objetivo[1], objetivo[0]) if girada else objetivo)
+            img = ImageOps.exif_transpose(original).convert("RGB")
+            if img.size != objetivo:
+                img = img.resize(objetivo, PILImage.Resampling.LANCZOS)
+            img.save(tmp, "JPEG", quality=80, optimize=True)
 
-    img = PILImage.open(in_path)
-    img = ImageOps.exif_transpose(img)  # respeta rotación del celular
-    img = img.convert("RGB")
+    ruta = obtener_derivado(in_path, f"{objetivo[0]}x{objetivo[1]}_q80", _crear, directorio=out_dir or FOTOS_TMP_DIR)
+    return ruta, ancho_pt, alto_pt
 
-    w, h = img.size
-    scale = min(max_side / max(w, h), 1.0)
-    if scale < 1.0:
-        new_size = (int(w * scale), int(h * scale))
-        img = img.resize(new_size, PILImage.Resampling.LANCZOS)
+def limpiar_pdfs(ttl_s: float = TTL_PDF_S, directorio: str | None = None) -> int:
+    """Borra los PDF temporales con más de `ttl_s` segundos. Retorna cuántos borró."""
+    directorio = Path(directorio) if directorio else PDF_TMP_DIR
+    if not directorio.exists():
+        return 0
+    limite = time.time() - ttl_s
+    borrados = 0
+    for p in directorio.glob("*.pdf"):
+        try:
+            if p.stat().st_mtime < limite:
+                p.unlink()
+                borrados += 1
+        except OSError:
+            continue
+    return borrados
 
-    out_path = out_dir / f"{in_path.stem}_mx{max_side}_q{quality}.jpg"
-    img.save(out_path, "JPEG", quality=quality, optimize=True, progressive=True)
-    return str(out_path)
+def _nuevo_pdf_tmp(prefijo: str = "parte") -> str:
+    PDF_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    limpiar_pdfs()
+    fd, ruta = tempfile.mkstemp(dir=PDF_TMP_DIR, prefix=f"{prefijo}_", suffix=".pdf")
+    os.close(fd)
+    return ruta
 
 def _table(data, col_widths=None):
     """Crea una tabla con estilo estándar, soportando Paragraphs en celdas."""
@@ -71,35 +137,18 @@ def _format_text_for_cell(text: str, max_length: int = 200) -> Any:
     style.leading = 11
     return Paragraph(text, style)
 
-def build_parte_pdf(
-    obra_code: str,
-    obra_name: str,
-    fecha: str,
-    emitido_por: str,
-    rol: str,
-    resumen_rows: List[List[str]],
-    tablas: List[Dict[str, Any]],   # cada item: {"titulo": str, "headers": [...], "rows": [[...], ...]}
-    foto_paths: List[str],
-) -> bytes:
-    buf = BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=1.6*cm, rightMargin=1.6*cm, topMargin=1.4*cm, bottomMargin=1.4*cm)
+def _doc(destino: Any) -> SimpleDocTemplate:
+    return SimpleDocTemplate(destino, pagesize=A4, leftMargin=1.6*cm, rightMargin=1.6*cm, topMargin=1.4*cm, bottomMargin=1.4*cm)
 
-    story = []
-    
-    # Título principal
-    story.append(Paragraph("<b>PARTE DIARIO DE OBRA</b>", styles["Title"]))
-    story.append(Spacer(1, 6))
+def _tamano_archivo(destino: Any) -> Dict[str, Any]:
+    return {"bytes": os.path.getsize(destino)} if isinstance(destino, str) else {}
 
-    # Metadatos de la obra
-    meta = [
-        ["Obra", f"{obra_code} – {obra_name}"],
-        ["Fecha", fecha],
-        ["Emitido por", emitido_por],
-        ["Rol", rol.upper()],
-        ["Generado", datetime.now().strftime("%d/%m/%Y %H:%M:%S")],
-    ]
-    story.append(Table(meta, colWidths=[4*cm, 12*cm]))
-    story.append(Spacer(1, 12))
+def _story_parte(
+    resumen_rows: List[List[str]],
+    tablas: List[Dict[str, Any]],
+) -> List[Any]:
+    """Resumen del avance y tablas de costos de un parte."""
+    story = []
 
     # Resumen con soporte para textos largos
     story.append(Paragraph("<b>Resumen del Avance</b>", styles["Heading2"]))
@@ -126,28 +175,116 @@ def build_parte_pdf(
         story.append(Spacer(1, 4))
         story.append(_table([tb["headers"]] + tb["rows"]))
         story.append(Spacer(1, 10))
+    return story
 
-    # Evidencias fotográficas
-    if foto_paths:
-        story.append(PageBreak())
-        story.append(Paragraph("<b>Evidencia Fotográfica</b>", styles["Title"]))
-        story.append(Spacer(1, 10))
+def _story_fotos(foto_paths: List[str], titulo: str = "Evidencia Fotográfica", dpi: int = DPI_FOTOS) -> List[Any]:
+    """Una foto por página, reducida a su tamaño impreso e insertada por ruta."""
+    if not foto_paths:
+        return []
+    story = [PageBreak(), Paragraph(f"<b>{titulo}</b>", styles["Title"]), Spacer(1, 10)]
+    for i, p in enumerate(foto_paths, start=1):
+        ruta, ancho, alto = preparar_foto(p, dpi=dpi)
+        # lazy=2: el archivo se abre al dibujar la página y se cierra enseguida
+        story.append(Image(ruta, width=ancho, height=alto, lazy=2))
+        story.append(Spacer(1, 6))
+        story.append(Paragraph(f"<b>Foto {i}/{len(foto_paths)}</b>", styles["BodyText"]))
+        if i != len(foto_paths):
+            story.append(PageBreak())
+    return story
+
+def _meta(obra_code: str, obra_name: str, fecha: str, emitido_por: str, rol: str) -> Table:
+    return Table([
+        ["Obra", f"{obra_code} – {obra_name}"],
+        ["Fecha", fecha],
+        ["Emitido por", emitido_por],
+        ["Rol", rol.upper()],
+        ["Generado", datetime.now().strftime("%d/%m/%Y %H:%M:%S")],
+    ], colWidths=[4*cm, 12*cm])
 
-        fotos_opt = [optimize_image_for_pdf(p) for p in foto_paths]
-        for i, p in enumerate(fotos_opt, start=1):
-            img = Image(p)
-            # Ajuste grande en página
-            max_w = A4[0] - 3.2*cm
-            max_h = A4[1] - 6.0*cm
-            scale = min(max_w / img.imageWidth, max_h / img.imageHeight)
-            img.drawWidth = img.imageWidth * scale
-            img.drawHeight = img.imageHeight * scale
-
-            story.append(img)
-            story.append(Spacer(1, 6))
-            story.append(Paragraph(f"<b>Foto {i}/{len(fotos_opt)}</b>", styles["BodyText"]))
-            if i != len(fotos_opt):
-                story.append(PageBreak())
-
-    doc.build(story)
+def _story_parte_completo(obra_code, obra_name, fecha, emitido_por, rol, resumen_rows, tablas, foto_paths, dpi) -> List[Any]:
+    story = [
+        Paragraph("<b>PARTE DIARIO DE OBRA</b>", styles["Title"]),
+        Spacer(1, 6),
+        _meta(obra_code, obra_name, fecha, emitido_por, rol),
+        Spacer(1, 12),
+    ]
+    return story + _story_parte(resumen_rows, tablas) + _story_fotos(foto_paths, dpi=dpi)
+
+@instrumentar("pdf")
+def build_parte_pdf(
+    obra_code: str,
+    obra_name: str,
+    fecha: str,
+    emitido_por: str,
+    rol: str,
+    resumen_rows: List[List[str]],
+    tablas: List[Dict[str, Any]],   # cada item: {"titulo": str, "headers": [...], "rows": [[...], ...]}
+    foto_paths: List[str],
+    dpi: int = DPI_FOTOS,
+) -> bytes:
+    """PDF del parte en memoria (para partes sueltos; la app usa build_parte_pdf_archivo)."""
+    buf = BytesIO()
+    with en_uso():
+        _doc(buf).build(_story_parte_completo(obra_code, obra_name, fecha, emitido_por, rol, resumen_rows, tablas, foto_paths, dpi))
     return buf.getvalue()
+
+@instrumentar("pdf", medidas=_tamano_archivo)
+def build_parte_pdf_archivo(
+    obra_code: str,
+    obra_name: str,
+    fecha: str,
+    emitido_por: str,
+    rol: str,
+    resumen_rows: List[List[str]],
+    tablas: List[Dict[str, Any]],
+    foto_paths: List[str],
+    destino: Optional[str] = None,
+    dpi: int = DPI_FOTOS,
+) -> str:
+    """Escribe el PDF del parte en `destino` (por defecto un temporal de PDF_TMP_DIR) y retorna la ruta."""
+    destino = destino or _nuevo_pdf_tmp("parte")
+    with en_uso():
+        _doc(destino).build(_story_parte_completo(obra_code, obra_name, fecha, emitido_por, rol, resumen_rows, tablas, foto_paths, dpi))
+    return destino
+
+def _story_dossier(obra_code, obra_name, emitido_por, rol, partes, titulo, dpi) -> List[Any]:
+    story: List[Any] = [
+        Paragraph(f"<b>{titulo}</b>", styles["Title"]),
+        Spacer(1, 6),
+        Table([
+            ["Obra", f"{obra_code} – {obra_name}"],
+            ["Emitido por", emitido_por],
+            ["Rol", rol.upper()],
+            ["Generado", datetime.now().strftime("%d/%m/%Y %H:%M:%S")],
+        ], colWidths=[4*cm, 12*cm]),
+    ]
+    for n, parte in enumerate(partes, start=1):
+        fecha = str(parte.get("fecha") or "")
+        story += [PageBreak(), Paragraph(f"<b>Parte {n} – {fecha}</b>", styles["Heading1"]), Spacer(1, 6)]
+        story += _story_parte(parte.get("resumen_rows") or [], parte.get("tablas") or [])
+        story += _story_fotos(parte.get("foto_paths") or [], titulo=f"Evidencia Fotográfica – {fecha}", dpi=dpi)
+    return story
+
+@instrumentar("pdf", medidas=_tamano_archivo)
+def build_dossier_pdf(
+    obra_code: str,
+    obra_name: str,
+    emitido_por: str,
+    rol: str,
+    partes: Iterable[Dict[str, Any]],   # cada item: {"fecha", "resumen_rows", "tablas", "foto_paths"}
+    titulo: str = "DOSSIER DE PARTES DIARIOS",
+    destino: Any = None,
+    dpi: int = DPI_FOTOS,
+) -> str:
+    """
+    Varios partes en un solo PDF (p. ej. el dossier mensual), cada uno desde una
+    página nueva con sus fotos. Se escribe en `destino` (ruta o archivo abierto;
+    por defecto un temporal) y lo retorna. Las fotos se insertan por ruta, así que la memoria no crece
+    con la resolución de las originales.
+    """
+    destino = destino or _nuevo_pdf_tmp("dossier")
+    # Las fotos lazy=2 se leen al dibujar cada página: sus copias no se desalojan hasta terminar
+    with en_uso():
+        _doc(destino).build(_story_dossier(obra_code, obra_name, emitido_por, rol, partes, titulo, dpi))
+    return destino
+
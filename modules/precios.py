@@ -0,0 +1,108 @@
+"""
+Historial de precios del catálogo de insumos
+Cada insumo guarda `historial_precios`: versiones con fecha de vigencia
+({"desde": "YYYY-MM-DD", "precio": float, "fuente": str}) ordenadas por fecha.
+`Precio Unitario` sigue siendo el precio vigente hoy, para los formularios.
+
+El índice por insumo (fechas y precios en listas paralelas) permite consultar
+el precio a una fecha con búsqueda binaria, sin leer partes ni Firestore.
+
+No depende de Firestore: recibe los insumos ya cargados.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_right
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+# Vigencia asignada al precio de los insumos creados antes del historial
+FECHA_BASE = "1900-01-01"
+
+
+def clave_insumo(nombre: Any) -> str:
+    """Nombre de insumo como segmento de ruta/ID de Firestore (solo [a-z0-9_])."""
+    s = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode("ascii")
+    s = re.sub(r"[^a-z0-9]+", "_", s.lower()).strip("_")
+    return f"i_{s or 'sin_nombre'}"
+
+
+def _fecha_iso(fecha: Any) -> str:
+    if fecha is None:
+        return date.today().isoformat()
+    if isinstance(fecha, date):
+        return fecha.isoformat()
+    return str(fecha)[:10]
+
+
+def _precio(valor: Any) -> float:
+    try:
+        return float(valor or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# ==================== VERSIONES ====================
+
+def historial_insumo(insumo: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Versiones ordenadas por vigencia; un insumo sin historial tiene una sola versión desde FECHA_BASE."""
+    historial = [v for v in insumo.get("historial_precios") or [] if isinstance(v, dict) and v.get("desde")]
+    if not historial:
+        return [{"desde": FECHA_BASE, "precio": _precio(insumo.get("Precio Unitario")), "fuente": ""}]
+    return sorted(historial, key=lambda v: str(v["desde"]))
+
+
+def insertar_version(
+    historial: List[Dict[str, Any]], precio: Any, desde: Any = None, fuente: str = ""
+) -> List[Dict[str, Any]]:
+    """Nuevo historial con la versión agregada (reemplaza la de la misma fecha)."""
+    desde = _fecha_iso(desde)
+    nuevo = [v for v in historial or [] if str(v.get("desde")) != desde]
+    nuevo.append({"desde": desde, "precio": _precio(precio), "fuente": fuente or ""})
+    return sorted(nuevo, key=lambda v: str(v["desde"]))
+
+
+def precio_vigente(historial: List[Dict[str, Any]], fecha: Any = None, defecto: float = 0.0) -> float:
+    """
+    Precio de la última versión con vigencia <= fecha (hoy por defecto). Antes de
+    la primera versión rige la primera: es el precio más antiguo que se conoce.
+    """
+    if not historial:
+        return defecto
+    fechas = [str(v["desde"]) for v in historial]
+    i = bisect_right(fechas, _fecha_iso(fecha))
+    return _precio(historial[max(i, 1) - 1]["precio"])
+
+
+# ==================== ÍNDICE Y CONSULTAS ====================
+
+def construir_indice_precios(insumos: List[Dict[str, Any]]) -> Dict[str, Tuple[List[str], List[float]]]:
+    """
+    {clave_insumo: (fechas_ordenadas, precios)} para consultas por fecha en O(log n).
+    Se arma una vez por versión del catálogo (ver obtener_version_insumos) y se
+    pasa a las consultas.
+    """
+    indice: Dict[str, Tuple[List[str], List[float]]] = {}
+    for insumo in insumos or []:
+        if not isinstance(insumo, dict) or not insumo.get("Insumo"):
+            continue
+        historial = historial_insumo(insumo)
+        indice[clave_insumo(insumo["Insumo"])] = (
+            [str(v["desde"]) for v in historial],
+            [_precio(v.get("precio")) for v in historial],
+        )
+    return indice
+
+
+def precio_a_fecha(
+    indice: Dict[str, Tuple[List[str], List[float]]], insumo: str, fecha: Any = None, defecto: Optional[float] = None
+) -> Optional[float]:
+    """Precio de catálogo del insumo vigente a la fecha (`defecto` si no está en el catálogo)."""
+    serie = indice.get(clave_insumo(insumo))
+    if not serie:
+        return defecto
+    fechas, precios = serie
+    i = bisect_right(fechas, _fecha_iso(fecha))
+    # Antes de la primera versión rige la primera (igual que precio_vigente)
+    return precios[max(i, 1) - 1]
+
@@ -0,0 +1,202 @@
+"""
+Analítica de productividad sobre los partes diarios históricos
+Arma tablas planas (una fila por parte y una por línea de mano de obra) y
+calcula con pandas, sin recorrer fila por fila:
+- productividad por partida (eficiencia ponderada, HH por unidad, costo MO por unidad)
+- productividad por trabajador (agrupada por DNI)
+- tendencia semanal de HH por unidad y eficiencia por partida
+- partes atípicos (HH por unidad muy lejos de la mediana de su partida)
+
+No depende de Firestore: recibe la lista de avances ya cargada.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Mismo valor que modules.logic.HORAS_DIA_ESTANDAR (rendimiento expresado en unidades por día)
+HORAS_DIA_ESTANDAR = 8
+# Puntaje z robusto (mediana/MAD) a partir del cual un parte se marca como atípico
+UMBRAL_ATIPICO = 3.5
+
+COLUMNAS_PARTES = ["avance_id", "fecha", "partida", "unidad", "cantidad", "rendimiento", "horas", "trabajadores"]
+COLUMNAS_LINEAS = ["avance_id", "dni", "empleado", "cargo", "costo"]
+
+
+# ==================== TABLAS PLANAS ====================
+
+def _filas(avances: List[Dict[str, Any]]) -> Tuple[List[tuple], List[tuple]]:
+    """Único recorrido en Python: aplana el JSON anidado de cada parte."""
+    partes: List[tuple] = []
+    lineas: List[tuple] = []
+    for i, a in enumerate(avances or []):
+        if not isinstance(a, dict):
+            continue
+        partida = a.get("partida") if isinstance(a.get("partida"), dict) else {}
+        costos = a.get("costos") if isinstance(a.get("costos"), dict) else {}
+        mano_obra = [m for m in costos.get("mano_de_obra") or [] if isinstance(m, dict)]
+        avance_id = a.get("id") or f"sin_id_{i}"
+        partes.append((
+            avance_id,
+            a.get("fecha"),
+            a.get("nombre_partida") or partida.get("nombre") or "Sin partida",
+            partida.get("unidad", ""),
+            partida.get("cantidad_ejecutada"),
+            partida.get("rendimiento"),
+            partida.get("jornal_horas"),
+            len(mano_obra),
+        ))
+        for m in mano_obra:
+            lineas.append((
+                avance_id,
+                str(m.get("DNI") or m.get("dni") or "").strip(),
+                m.get("Empleado") or m.get("nombre") or "",
+                m.get("Cargo") or m.get("cargo") or "",
+                m.get("Parcial (S/)", m.get("Sueldo del Día")),
+            ))
+    return partes, lineas
+
+
+def construir_tablas(avances: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Retorna (partes, lineas_mo):
+    - partes: una fila por parte con HH, producción esperada, eficiencia y HH por unidad
+    - lineas_mo: una fila por trabajador y parte, con su parte proporcional de lo ejecutado
+    """
+    filas_partes, filas_lineas = _filas(avances)
+    dp = pd.DataFrame(filas_partes, columns=COLUMNAS_PARTES)
+    dl = pd.DataFrame(filas_lineas, columns=COLUMNAS_LINEAS)
+
+    for col in ["cantidad", "rendimiento", "horas"]:
+        dp[col] = pd.to_numeric(dp[col], errors="coerce").fillna(0.0)
+    dp["fecha"] = pd.to_datetime(dp["fecha"], errors="coerce")
+    dp["semana"] = dp["fecha"].dt.to_period("W-SUN").dt.start_time
+    dl["costo"] = pd.to_numeric(dl["costo"], errors="coerce").fillna(0.0)
+
+    dp["costo_mo"] = dp["avance_id"].map(dl.groupby("avance_id")["costo"].sum()).fillna(0.0)
+    # Sin líneas de MO se asume una cuadrilla de una persona
+    dp["hh"] = dp["horas"] * dp["trabajadores"].clip(lower=1)
+    dp["produccion_esperada"] = dp["rendimiento"] * dp["horas"] / HORAS_DIA_ESTANDAR
+
+    # Mismo criterio que calcular_eficiencia_rendimiento: solo partes con rendimiento, horas y cantidad
+    medible = (dp["rendimiento"] > 0) & (dp["horas"] > 0) & (dp["cantidad"] > 0)
+    dp["cantidad_medible"] = dp["cantidad"].where(medible, 0.0)
+    dp["esperada_medible"] = dp["produccion_esperada"].where(medible, 0.0)
+    dp["eficiencia"] = (dp["cantidad"] / dp["produccion_esperada"] * 100).where(medible)
+    dp["hh_por_unidad"] = (dp["hh"] / dp["cantidad"]).where(dp["cantidad"] > 0)
+
+    dl = dl.merge(
+        dp[["avance_id", "fecha", "semana", "partida", "horas", "trabajadores", "cantidad",
+            "cantidad_medible", "esperada_medible"]],
+        on="avance_id",
+        how="left",
+    )
+    participacion = 1.0 / dl["trabajadores"].clip(lower=1)
+    dl["cantidad_atribuida"] = dl["cantidad"] * participacion
+    dl["cantidad_medible"] = dl["cantidad_medible"] * participacion
+    dl["esperada_medible"] = dl["esperada_medible"] * participacion
+    dl["clave"] = dl["dni"].where(dl["dni"] != "", "sin DNI: " + dl["empleado"].astype(str))
+    return dp, dl
+
+
+def _eficiencia_ponderada(cantidad: pd.Series, esperada: pd.Series) -> pd.Series:
+    """Eficiencia del grupo = ejecutado / esperado (los partes grandes pesan más que los pequeños)."""
+    return (cantidad / esperada.where(esperada > 0) * 100).round(1)
+
+
+# ==================== AGREGADOS ====================
+
+def productividad_por_partida(partes: pd.DataFrame) -> pd.DataFrame:
+    g = partes.groupby("partida").agg(
+        unidad=("unidad", "last"),
+        partes=("avance_id", "size"),
+        cantidad=("cantidad", "sum"),
+        hh=("hh", "sum"),
+        costo_mo=("costo_mo", "sum"),
+        cantidad_medible=("cantidad_medible", "sum"),
+        esperada_medible=("esperada_medible", "sum"),
+        primera_fecha=("fecha", "min"),
+        ultima_fecha=("fecha", "max"),
+    )
+    g["eficiencia_ponderada"] = _eficiencia_ponderada(g["cantidad_medible"], g["esperada_medible"])
+    g["hh_por_unidad"] = (g["hh"] / g["cantidad"].where(g["cantidad"] > 0)).round(3)
+    g["costo_mo_por_unidad"] = (g["costo_mo"] / g["cantidad"].where(g["cantidad"] > 0)).round(2)
+    return g.drop(columns=["cantidad_medible", "esperada_medible"]).reset_index().sort_values("hh", ascending=False)
+
+
+def productividad_por_trabajador(lineas: pd.DataFrame) -> pd.DataFrame:
+    g = lineas.groupby("clave").agg(
+        dni=("dni", "last"),
+        empleado=("empleado", "last"),
+        cargo=("cargo", "last"),
+        jornadas=("avance_id", "nunique"),
+        partidas=("partida", "nunique"),
+        horas=("horas", "sum"),
+        costo=("costo", "sum"),
+        cantidad_atribuida=("cantidad_atribuida", "sum"),
+        cantidad_medible=("cantidad_medible", "sum"),
+        esperada_medible=("esperada_medible", "sum"),
+        ultima_fecha=("fecha", "max"),
+    )
+    g["eficiencia_ponderada"] = _eficiencia_ponderada(g["cantidad_medible"], g["esperada_medible"])
+    g["hh_por_unidad"] = (g["horas"] / g["cantidad_atribuida"].where(g["cantidad_atribuida"] > 0)).round(3)
+    return (
+        g.drop(columns=["cantidad_medible", "esperada_medible"])
+        .reset_index(drop=True)
+        .sort_values("horas", ascending=False)
+    )
+
+
+def tendencia_semanal(partes: pd.DataFrame) -> pd.DataFrame:
+    """HH por unidad y eficiencia por semana y partida, con la variación respecto a la semana anterior."""
+    g = (
+        partes.dropna(subset=["semana"])
+        .groupby(["partida", "semana"])
+        .agg(
+            partes=("avance_id", "size"),
+            cantidad=("cantidad", "sum"),
+            hh=("hh", "sum"),
+            cantidad_medible=("cantidad_medible", "sum"),
+            esperada_medible=("esperada_medible", "sum"),
+        )
+        .reset_index()
+        .sort_values(["partida", "semana"])
+    )
+    g["hh_por_unidad"] = (g["hh"] / g["cantidad"].where(g["cantidad"] > 0)).round(3)
+    g["eficiencia_ponderada"] = _eficiencia_ponderada(g["cantidad_medible"], g["esperada_medible"])
+    g["variacion_hh_por_unidad_pct"] = (g.groupby("partida")["hh_por_unidad"].pct_change() * 100).round(1)
+    return g.drop(columns=["cantidad_medible", "esperada_medible"])
+
+
+def detectar_atipicos(partes: pd.DataFrame, umbral: float = UMBRAL_ATIPICO) -> pd.DataFrame:
+    """Partes cuyo HH por unidad se aleja de la mediana de su partida (z robusto = 0.6745·(x−mediana)/MAD)."""
+    d = partes.dropna(subset=["hh_por_unidad"])[["avance_id", "fecha", "partida", "cantidad", "hh", "hh_por_unidad"]].copy()
+    if d.empty:
+        return d.assign(mediana_partida=[], z_robusto=[])
+    d["mediana_partida"] = d.groupby("partida")["hh_por_unidad"].transform("median")
+    desvio = (d["hh_por_unidad"] - d["mediana_partida"]).abs()
+    mad = desvio.groupby(d["partida"]).transform("median")
+    d["z_robusto"] = (0.6745 * (d["hh_por_unidad"] - d["mediana_partida"]) / mad.where(mad > 0)).round(2)
+    return d[d["z_robusto"].abs() > umbral].sort_values("z_robusto", key=np.abs, ascending=False)
+
+
+def calcular_productividad_obra(avances: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Todos los agregados de productividad de una obra."""
+    partes, lineas = construir_tablas(avances)
+    esperada = float(partes["esperada_medible"].sum())
+    return {
+        "partes": partes,
+        "por_partida": productividad_por_partida(partes),
+        "por_trabajador": productividad_por_trabajador(lineas),
+        "por_semana": tendencia_semanal(partes),
+        "atipicos": detectar_atipicos(partes),
+        "resumen": {
+            "partes": int(len(partes)),
+            "lineas_mo": int(len(lineas)),
+            "trabajadores": int(lineas["clave"].nunique()),
+            "hh_total": float(partes["hh"].sum()),
+            "costo_mo_total": float(partes["costo_mo"].sum()),
+            "eficiencia_ponderada": (float(partes["cantidad_medible"].sum()) / esperada * 100) if esperada > 0 else 0.0,
+        },
+    }
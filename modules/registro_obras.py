@@ -0,0 +1,268 @@
+"""
+Registro de obras
+Un único lugar con los datos de cada obra que usan las integraciones:
+código, nombre, código de la obra en Apps Script (Drive), ID de su carpeta de
+Drive, carpeta de Cloudinary y alias (nombres con los que se la conoce).
+
+registro_obras/{codigo}:
+    {"codigo", "nombre", "codigo_drive", "drive_folder_id", "drive_folder_url",
+     "cloudinary_folder", "alias": [...], "archivo_semilla"}
+
+El índice se carga una vez por proceso y se consulta en O(1) por código, nombre,
+código de Drive o alias (sin tildes ni mayúsculas). Si una obra no está, se
+recarga antes de darla por desconocida (otra sesión pudo registrarla), como
+mucho cada INTERVALO_RECARGA_S, y la ausencia se recuerda TTL_AUSENTE_S para
+que las consultas repetidas de un código desconocido no relean la colección.
+
+Las obras de data/obras/registro.json completan el índice en memoria; se
+escriben en Firestore con sembrar_registro(), una vez por proceso, fuera de
+las consultas.
+"""
+
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from firebase_admin import firestore
+
+db = firestore.client()
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+REGISTRO_SEMILLA_PATH = BASE_DIR / "data" / "obras" / "registro.json"
+CARPETA_CLOUDINARY_DEFECTO = "obras_boss"
+
+# Recargas por obra no encontrada: como mucho una cada INTERVALO_RECARGA_S, y un
+# código que no se encontró tras recargar no vuelve a provocar otra por TTL_AUSENTE_S
+INTERVALO_RECARGA_S = 30
+TTL_AUSENTE_S = 300
+
+_indice: Dict[str, Any] = {}
+_ausentes: Dict[str, float] = {}
+_ultima_recarga = {"t": 0.0}
+_lock = threading.Lock()
+
+
+# ==================== ÍNDICE ====================
+
+def clave_obra(texto: Any) -> str:
+    """Código, nombre o alias normalizado: "Ciudad Pachacútec - Ventanilla" -> "ciudad_pachacutec_ventanilla"."""
+    t = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", t.lower()).strip("_")
+
+
+def construir_indice(entradas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    {"por_codigo": {codigo: entrada}, "por_clave": {clave: codigo}}.
+    El código y el nombre propios ganan sobre el alias de otra obra. Un código de
+    Drive compartido por varias obras no se usa como alias de ninguna.
+    """
+    por_codigo = {str(e["codigo"]): e for e in entradas if isinstance(e, dict) and e.get("codigo")}
+    usos_drive = Counter(clave_obra(e.get("codigo_drive")) for e in por_codigo.values())
+    por_clave: Dict[str, str] = {}
+    for codigo, e in por_codigo.items():
+        drive = [e.get("codigo_drive")] if usos_drive[clave_obra(e.get("codigo_drive"))] == 1 else []
+        for alias in list(e.get("alias") or []) + drive:
+            if clave_obra(alias):
+                por_clave.setdefault(clave_obra(alias), codigo)
+    for codigo, e in por_codigo.items():
+        for propio in (codigo, e.get("nombre")):
+            if clave_obra(propio):
+                por_clave[clave_obra(propio)] = codigo
+    return {"por_codigo": por_codigo, "por_clave": por_clave}
+
+
+def _entradas_semilla() -> List[Dict[str, Any]]:
+    try:
+        with REGISTRO_SEMILLA_PATH.open("r", encoding="utf-8") as f:
+            obras = json.load(f).get("obras", [])
+        return [o for o in obras if isinstance(o, dict) and o.get("codigo")]
+    except Exception:
+        return []
+
+
+def _faltantes_semilla(entradas: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """{codigo: campos} de la semilla que las entradas aún no tienen."""
+    faltantes = {}
+    for e in _entradas_semilla():
+        codigo = str(e["codigo"])
+        faltan = {k: v for k, v in e.items() if k not in entradas.get(codigo, {})}
+        if faltan:
+            faltantes[codigo] = faltan
+    return faltantes
+
+
+def _leer_registro() -> List[Dict[str, Any]]:
+    """Entradas de Firestore completadas (solo en memoria) con los campos de la semilla que aún no tienen."""
+    entradas = {d.id: d.to_dict() for d in db.collection("registro_obras").stream()}
+    for codigo, faltan in _faltantes_semilla(entradas).items():
+        entradas[codigo] = {**entradas.get(codigo, {}), **faltan}
+    return list(entradas.values())
+
+
+def indice_registro(recargar: bool = False) -> Dict[str, Any]:
+    global _indice
+    with _lock:
+        if recargar or not _indice:
+            _indice = construir_indice(_leer_registro())
+            _ultima_recarga["t"] = time.monotonic()
+        return _indice
+
+
+def sembrar_registro() -> int:
+    """Escribe en Firestore las obras y campos de la semilla que faltan. Retorna cuántas obras completó."""
+    entradas = {d.id: d.to_dict() for d in db.collection("registro_obras").stream()}
+    faltantes = _faltantes_semilla(entradas)
+    if faltantes:
+        batch = db.batch()
+        for codigo, faltan in faltantes.items():
+            batch.set(db.collection("registro_obras").document(codigo), faltan, merge=True)
+        batch.commit()
+    return len(faltantes)
+
+
+def _actualizar_indice(entrada: Dict[str, Any]) -> None:
+    """Aplica una entrada recién escrita al índice en memoria (sin releer la colección)."""
+    global _indice
+    with _lock:
+        if _indice:
+            entradas = {**_indice["por_codigo"], str(entrada["codigo"]): entrada}
+            _indice = construir_indice(list(entradas.values()))
+
+
+# ==================== CONSULTAS ====================
+
+def _puede_recargar(clave: str) -> bool:
+    """Una obra no encontrada recarga el índice salvo que se haya recargado hace poco o ya se sepa ausente."""
+    ahora = time.monotonic()
+    with _lock:
+        if ahora - _ausentes.get(clave, float("-inf")) < TTL_AUSENTE_S:
+            return False
+        return ahora - _ultima_recarga["t"] >= INTERVALO_RECARGA_S
+
+
+def resolver_obra(codigo_o_alias: Any) -> Optional[Dict[str, Any]]:
+    """Entrada del registro de la obra; None si no está registrada."""
+    clave = clave_obra(codigo_o_alias)
+    if not clave:
+        return None
+    indice = indice_registro()
+    codigo = indice["por_clave"].get(clave)
+    if not codigo and _puede_recargar(clave):
+        indice = indice_registro(recargar=True)
+        codigo = indice["por_clave"].get(clave)
+        if not codigo:
+            with _lock:
+                if len(_ausentes) > 10_000:
+                    _ausentes.clear()
+                _ausentes[clave] = time.monotonic()
+    return indice["por_codigo"][codigo] if codigo else None
+
+
+def codigo_drive(codigo_o_alias: Any) -> Optional[str]:
+    """
+    Código que espera Apps Script para la obra. Las obras registradas sin código
+    de Drive usan su propio código (con el que se creó su carpeta).
+    """
+    entrada = resolver_obra(codigo_o_alias)
+    if entrada:
+        return str(entrada.get("codigo_drive") or entrada["codigo"])
+    texto = str(codigo_o_alias or "").strip()
+    # Códigos de Apps Script escritos directamente
+    return texto.upper() if texto.lower().startswith("obr-") else None
+
+
+def carpeta_cloudinary(codigo_o_alias: Any) -> str:
+    entrada = resolver_obra(codigo_o_alias) or {}
+    return str(entrada.get("cloudinary_folder") or CARPETA_CLOUDINARY_DEFECTO)
+
+
+def semillas_obras() -> List[Tuple[str, str, str]]:
+    """(codigo, nombre, archivo) de las obras que se cargan desde data/obras cuando Firestore está vacío."""
+    return [
+        (str(e["codigo"]), str(e.get("nombre") or e["codigo"]), str(e["archivo_semilla"]))
+        for e in _entradas_semilla()
+        if e.get("archivo_semilla")
+    ]
+
+
+# ==================== ESCRITURA ====================
+
+def registrar_obra(
+    codigo: str,
+    nombre: str,
+    codigo_drive: Optional[str] = None,
+    alias: Optional[List[str]] = None,
+    cloudinary_folder: Optional[str] = None,
+) -> Tuple[bool, str]:
+    """
+    Crea o actualiza la entrada de la obra (los campos en None no se tocan).
+    Rechaza un código de Drive que ya tiene otra obra: apuntaría a su carpeta.
+    """
+    codigo = str(codigo or "").strip()
+    if not codigo or "/" in codigo:
+        return False, "Código de obra inválido."
+    try:
+        if codigo_drive and clave_obra(codigo_drive):
+            duenas = [
+                c for c, e in indice_registro(recargar=True)["por_codigo"].items()
+                if c != codigo and clave_obra(e.get("codigo_drive")) == clave_obra(codigo_drive)
+            ]
+            if duenas:
+                return False, f"El código de Drive {codigo_drive} ya es de la obra {duenas[0]}."
+        datos: Dict[str, Any] = {"codigo": codigo, "nombre": nombre or codigo}
+        if codigo_drive is not None:
+            datos["codigo_drive"] = codigo_drive
+        if alias is not None:
+            datos["alias"] = [a for a in alias if str(a).strip()]
+        if cloudinary_folder is not None:
+            datos["cloudinary_folder"] = cloudinary_folder
+        datos["actualizado_en"] = datetime.now().isoformat(timespec="seconds")
+        ref = db.collection("registro_obras").document(codigo)
+        ref.set(datos, merge=True)
+        _actualizar_indice(ref.get().to_dict())
+        return True, "Obra registrada."
+    except Exception as e:
+        return False, str(e)
+
+
+def guardar_carpeta_drive(codigo_o_alias: Any, folder_id: str, folder_url: str = "") -> Tuple[bool, str]:
+    """Guarda el folderId devuelto por Apps Script: las subidas siguientes van directo a esa carpeta."""
+    entrada = resolver_obra(codigo_o_alias)
+    codigo = entrada["codigo"] if entrada else str(codigo_o_alias or "").strip()
+    if not codigo or not folder_id:
+        return False, "Falta la obra o el ID de carpeta."
+    try:
+        ref = db.collection("registro_obras").document(codigo)
+        ref.set({
+            "codigo": codigo,
+            "drive_folder_id": folder_id,
+            "drive_folder_url": folder_url or "",
+            "actualizado_en": datetime.now().isoformat(timespec="seconds"),
+        }, merge=True)
+        _actualizar_indice(ref.get().to_dict())
+        return True, "Carpeta de Drive guardada."
+    except Exception as e:
+        return False, str(e)
+
+
+def sincronizar_registro(obras: Dict[str, str]) -> Tuple[int, List[str]]:
+    """Registra las obras ({codigo: nombre}) que aún no están en el registro. Retorna (registradas, errores)."""
+    registradas = 0
+    errores: List[str] = []
+    sembrar_registro()
+    existentes = indice_registro(recargar=True)["por_codigo"]
+    for codigo, nombre in (obras or {}).items():
+        if codigo in existentes:
+            continue
+        ok, msg = registrar_obra(codigo, nombre)
+        if ok:
+            registradas += 1
+        else:
+            errores.append(f"{codigo}: {msg}")
+    return registradas, errores
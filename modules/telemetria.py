@@ -0,0 +1,252 @@
+"""
+Telemetría de rendimiento en proceso
+Registra latencia, documentos leídos, bytes transferidos y errores de cada
+operación (lecturas/escrituras de Firestore, subidas a Cloudinary y Drive,
+armado de PDF y secciones de la interfaz) en un buffer circular en memoria.
+
+- medir(op, categoria): context manager; el bloque puede completar docs/bytes.
+- instrumentar(categoria): decorador; cuenta documentos si la función retorna una
+  lista y marca error si retorna (False, mensaje) como las funciones de database.
+- registrar_error(e): para los except que atrapan y retornan un valor por defecto
+  ([], None, -1...); marca como error la medición en curso del hilo.
+- instrumentar_modulo(modulo, categoria): envuelve las funciones públicas de un módulo.
+- resumen_operaciones(): p50/p95 por operación; exportar_jsonl() / exportar_prometheus().
+
+El buffer guarda las últimas TAMANO_BUFFER mediciones del proceso (todas las sesiones).
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set
+
+TAMANO_BUFFER = 5000
+
+_buffer: Deque[Dict[str, Any]] = deque(maxlen=TAMANO_BUFFER)
+_lock = threading.Lock()
+# Por hilo: profundidad de llamadas instrumentadas (las anidadas se marcan para no
+# sumarlas dos veces) y pila de mediciones en curso (para registrar_error)
+_local = threading.local()
+
+
+# ==================== REGISTRO ====================
+
+def registrar(
+    op: str,
+    ms: float,
+    categoria: str = "",
+    ok: bool = True,
+    error: str = "",
+    docs: Optional[int] = None,
+    bytes_: Optional[int] = None,
+    anidada: bool = False,
+) -> None:
+    evento = {
+        "ts": round(time.time(), 3),
+        "op": op,
+        "categoria": categoria,
+        "ms": round(ms, 3),
+        "ok": ok,
+    }
+    if error:
+        evento["error"] = str(error)[:300]
+    if docs is not None:
+        evento["docs"] = int(docs)
+    if bytes_ is not None:
+        evento["bytes"] = int(bytes_)
+    if anidada:
+        evento["anidada"] = True
+    with _lock:
+        _buffer.append(evento)
+
+
+@contextmanager
+def medir(op: str, categoria: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Mide el bloque. El dict que entrega acepta "docs", "bytes", "ok" y "error";
+    si el bloque lanza una excepción se registra como error y se vuelve a lanzar.
+    """
+    datos: Dict[str, Any] = {}
+    profundidad = getattr(_local, "profundidad", 0)
+    _local.profundidad = profundidad + 1
+    if not hasattr(_local, "medidas"):
+        _local.medidas = []
+    _local.medidas.append(datos)
+    inicio = time.perf_counter()
+    try:
+        yield datos
+    except Exception as e:
+        datos.update({"ok": False, "error": _texto_error(e)})
+        raise
+    finally:
+        _local.profundidad = profundidad
+        _local.medidas.pop()
+        registrar(
+            op, (time.perf_counter() - inicio) * 1000, categoria,
+            ok=datos.get("ok", True), error=datos.get("error", ""),
+            docs=datos.get("docs"), bytes_=datos.get("bytes"), anidada=profundidad > 0,
+        )
+
+
+def _texto_error(error: Any) -> str:
+    return f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+
+def registrar_error(error: Any, op: Optional[str] = None, categoria: str = "") -> None:
+    """
+    Anota un error atrapado que no se relanza (la función sigue y retorna [], None,
+    -1...). Sin `op` marca la medición en curso del hilo, que es la llamada
+    instrumentada que lo atrapó; con `op`, o fuera de toda medición, registra un
+    evento de error propio.
+    """
+    medidas = getattr(_local, "medidas", None)
+    if op is None and medidas:
+        medidas[-1].update({"ok": False, "error": _texto_error(error)})
+        return
+    registrar(op or "sin_medicion", 0.0, categoria, ok=False, error=_texto_error(error), anidada=bool(medidas))
+
+
+def _medidas_resultado(resultado: Any) -> Dict[str, Any]:
+    """docs de una lista de resultados; error de un (False, mensaje, ...)."""
+    if isinstance(resultado, list):
+        return {"docs": len(resultado)}
+    if isinstance(resultado, bytes):
+        return {"bytes": len(resultado)}
+    if isinstance(resultado, tuple) and resultado and resultado[0] is False:
+        return {"ok": False, "error": str(resultado[1]) if len(resultado) > 1 else "False"}
+    return {}
+
+
+def instrumentar(categoria: str, op: Optional[str] = None, medidas: Optional[Callable[[Any], Dict[str, Any]]] = None):
+    """Decorador: registra cada llamada como `op` (por defecto modulo.funcion)."""
+    def decorador(funcion: Callable) -> Callable:
+        nombre = op or f"{funcion.__module__.rsplit('.', 1)[-1]}.{funcion.__name__}"
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(nombre, categoria) as m:
+                resultado = funcion(*args, **kwargs)
+                m.update(_medidas_resultado(resultado))
+                if medidas:
+                    try:
+                        m.update(medidas(resultado) or {})
+                    except Exception:
+                        pass
+                return resultado
+
+        envoltura.__telemetria__ = True
+        return envoltura
+    return decorador
+
+
+def instrumentar_modulo(modulo: Any, categoria: str, excluir: Optional[Set[str]] = None) -> int:
+    """
+    Reemplaza en `modulo` sus funciones públicas (definidas en él, no importadas)
+    por su versión instrumentada. Debe llamarse al final del módulo, antes de que
+    otros importen sus nombres. Retorna cuántas envolvió.
+    """
+    envueltas = 0
+    for nombre, funcion in list(vars(modulo).items()):
+        if (
+            nombre.startswith("_")
+            or nombre in (excluir or set())
+            or not inspect.isfunction(funcion)
+            or funcion.__module__ != modulo.__name__
+            or getattr(funcion, "__telemetria__", False)
+        ):
+            continue
+        setattr(modulo, nombre, instrumentar(categoria)(funcion))
+        envueltas += 1
+    return envueltas
+
+
+# ==================== CONSULTA Y EXPORTACIÓN ====================
+
+def eventos(categoria: Optional[str] = None) -> List[Dict[str, Any]]:
+    with _lock:
+        lista = list(_buffer)
+    return [e for e in lista if categoria is None or e["categoria"] == categoria]
+
+
+def limpiar() -> None:
+    with _lock:
+        _buffer.clear()
+
+
+def _percentil(ordenados: List[float], q: float) -> float:
+    """Percentil por interpolación lineal sobre una lista ya ordenada."""
+    if not ordenados:
+        return 0.0
+    pos = (len(ordenados) - 1) * q
+    i = int(pos)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (pos - i)
+
+
+def resumen_operaciones(incluir_anidadas: bool = True) -> List[Dict[str, Any]]:
+    """Por operación: llamadas, errores, p50/p95/máx en ms, docs y bytes totales; de la más lenta (p95) a la más rápida."""
+    grupos: Dict[tuple, List[Dict[str, Any]]] = {}
+    for e in eventos():
+        if incluir_anidadas or not e.get("anidada"):
+            grupos.setdefault((e["categoria"], e["op"]), []).append(e)
+    filas = []
+    for (categoria, op), lista in grupos.items():
+        ms = sorted(e["ms"] for e in lista)
+        filas.append({
+            "categoria": categoria,
+            "op": op,
+            "llamadas": len(lista),
+            "errores": sum(1 for e in lista if not e["ok"]),
+            "p50_ms": round(_percentil(ms, 0.50), 2),
+            "p95_ms": round(_percentil(ms, 0.95), 2),
+            "max_ms": round(ms[-1], 2),
+            "total_ms": round(sum(ms), 1),
+            "docs": sum(e.get("docs", 0) for e in lista),
+            "bytes": sum(e.get("bytes", 0) for e in lista),
+        })
+    return sorted(filas, key=lambda f: f["p95_ms"], reverse=True)
+
+
+def exportar_jsonl() -> str:
+    """Un evento por línea (JSON), en orden de llegada."""
+    return "\n".join(json.dumps(e, ensure_ascii=False) for e in eventos())
+
+
+def _etiquetas(fila: Dict[str, Any]) -> str:
+    op = fila["op"].replace("\\", "\\\\").replace('"', '\\"')
+    return f'categoria="{fila["categoria"]}",op="{op}"'
+
+
+def exportar_prometheus(prefijo: str = "boss") -> str:
+    """
+    Formato de texto de Prometheus: summary de latencia (p50, p95) y gauges de
+    errores, docs y bytes. Son gauges y no counters porque salen del buffer
+    circular: bajan cuando las mediciones viejas salen del buffer.
+    """
+    filas = resumen_operaciones()
+    lineas = [
+        f"# HELP {prefijo}_operacion_ms Latencia por operación en milisegundos (buffer en memoria).",
+        f"# TYPE {prefijo}_operacion_ms summary",
+    ]
+    for f in filas:
+        et = _etiquetas(f)
+        lineas += [
+            f'{prefijo}_operacion_ms{{{et},quantile="0.5"}} {f["p50_ms"]}',
+            f'{prefijo}_operacion_ms{{{et},quantile="0.95"}} {f["p95_ms"]}',
+            f"{prefijo}_operacion_ms_sum{{{et}}} {f['total_ms']}",
+            f"{prefijo}_operacion_ms_count{{{et}}} {f['llamadas']}",
+        ]
+    for metrica, campo, ayuda in [
+        ("errores", "errores", "Operaciones que fallaron (buffer en memoria)."),
+        ("documentos", "docs", "Documentos retornados (buffer en memoria)."),
+        ("bytes", "bytes", "Bytes transferidos (buffer en memoria)."),
+    ]:
+        lineas += [f"# HELP {prefijo}_{metrica} {ayuda}", f"# TYPE {prefijo}_{metrica} gauge"]
+        lineas += [f"{prefijo}_{metrica}{{{_etiquetas(f)}}} {f[campo]}" for f in filas]
+    lineas.append(f"# generado {datetime.now().isoformat(timespec='seconds')}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,89 @@
+"""
+Verifica y reconstruye los agregados precalculados de las obras:
+- rollup de cada obra (gastado por categoría, eficiencia, totales por partida)
+- documento obras_resumen/{codigo} del portafolio
+- libro de consumo de materiales (consumo_materiales), con --materiales
+- IDs determinísticos de donantes (migración única), con --donantes
+- configuración KPI de obras_kpi/*.json al documento de cada obra (migración única), con --kpi
+- registro de obras (registro_obras) para las obras creadas antes del registro, con --registro
+
+Uso:
+    python reconstruir_resumenes.py              # solo verifica
+    python reconstruir_resumenes.py --reparar    # reconstruye los que no coinciden
+    python reconstruir_resumenes.py --materiales # recalcula el consumo de materiales de todas las obras
+    python reconstruir_resumenes.py --donantes   # pasa los donantes antiguos a su ID determinístico
+    python reconstruir_resumenes.py --kpi        # sube obras_kpi/*.json a Firestore
+    python reconstruir_resumenes.py --registro   # registra las obras que faltan en registro_obras
+"""
+
+import sys
+
+import firebase_admin
+from firebase_admin import credentials
+
+cred = credentials.Certificate("firebase_key.json")
+firebase_admin.initialize_app(cred)
+
+# Los módulos crean su cliente de Firestore al importarse
+from modules.database import (  # noqa: E402
+    cargar_obras,
+    verificar_rollup_obra,
+    reconstruir_rollup_obra,
+    reconstruir_resumen_obra,
+    reconstruir_consumo_materiales,
+    migrar_donantes,
+    migrar_config_kpi_archivos,
+)
+from modules.registro_obras import sincronizar_registro  # noqa: E402
+
+
+def main():
+    reparar = "--reparar" in sys.argv
+    obras = cargar_obras()
+    con_diferencias = 0
+
+    for codigo in obras:
+        coincide, difs = verificar_rollup_obra(codigo)
+        if coincide:
+            print(f"✓ {codigo}: rollup correcto")
+        else:
+            con_diferencias += 1
+            print(f"✗ {codigo}: {len(difs)} diferencia(s)")
+            for d in difs[:10]:
+                print(f"    {d}")
+
+        if reparar:
+            ok1, msg1 = reconstruir_rollup_obra(codigo)
+            ok2, msg2 = reconstruir_resumen_obra(codigo)
+            estado = "✓" if ok1 and ok2 else "✗"
+            print(f"  {estado} reconstruido: {msg1} / {msg2}")
+
+    print(f"\n{len(obras)} obra(s) revisada(s), {con_diferencias} con diferencias.")
+
+    if "--materiales" in sys.argv:
+        ok, errores = reconstruir_consumo_materiales()
+        print(f"Consumo de materiales: {ok} obra(s) reconstruida(s), {len(errores)} error(es).")
+        for e in errores[:10]:
+            print(f"    {e}")
+
+    if "--donantes" in sys.argv:
+        migrados, errores = migrar_donantes()
+        print(f"Donantes: {migrados} migrado(s), {len(errores)} error(es).")
+        for e in errores[:10]:
+            print(f"    {e}")
+
+    if "--kpi" in sys.argv:
+        migradas, errores = migrar_config_kpi_archivos("obras_kpi")
+        print(f"Configuración KPI: {migradas} obra(s) migrada(s), {len(errores)} error(es).")
+        for e in errores[:10]:
+            print(f"    {e}")
+
+    if "--registro" in sys.argv:
+        registradas, errores = sincronizar_registro(obras)
+        print(f"Registro de obras: {registradas} obra(s) registrada(s), {len(errores)} error(es).")
+        for e in errores[:10]:
+            print(f"    {e}")
+
+
+if __name__ == "__main__":
+    main()
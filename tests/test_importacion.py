@@ -0,0 +1,82 @@
+"""Conversión de montos de la importación masiva (sin Firestore: usa el cliente en memoria)."""
+
+import math
+
+import pandas as pd
+import pytest
+
+from benchmarks.firestore_falso import instalar
+
+instalar()
+
+from modules.importacion import MENSAJE_MONTO_AMBIGUO, _numero, validar_precios_df  # noqa: E402
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("S/. 1,234.50", 1234.5),
+    ("S/1,234.50", 1234.5),
+    ("s/. 85", 85.0),
+    ("1.234,50", 1234.5),
+    ("12,500,000", 12500000.0),
+    ("1.234.567", 1234567.0),
+    ("1234,5", 1234.5),
+    ("0,125", 0.125),
+    ("1234,567", 1234.567),
+    ("1234.50", 1234.5),
+    ("-3,5", -3.5),
+    ("1 234,50", 1234.5),
+])
+def test_numero_interpreta_separadores(texto, esperado):
+    valores, ambiguos = _numero(pd.Series([texto]))
+    assert valores.iloc[0] == pytest.approx(esperado)
+    assert not ambiguos.iloc[0]
+
+
+@pytest.mark.parametrize("texto", ["1,23,45", "12,34.5", "1.2.3", "1,234,5", "1.234,567.8", "1,000", "1.234", "S/. 2.500"])
+def test_numero_rechaza_ambiguos(texto):
+    valores, ambiguos = _numero(pd.Series([texto]))
+    assert math.isnan(valores.iloc[0])
+    assert ambiguos.iloc[0]
+
+
+@pytest.mark.parametrize("columna, esperado", [
+    (["1,000", "2,500.75"], [1000.0, 2500.75]),
+    (["1,000", "12,500,000", "85"], [1000.0, 12500000.0, 85.0]),
+    (["1.234", "0.5"], [1.234, 0.5]),
+    (["1.234", "1.234,50"], [1234.0, 1234.5]),
+    (["1,000", "12,5"], [1.0, 12.5]),
+    (["S/. 2.500", "1.234.567"], [2500.0, 1234567.0]),
+])
+def test_numero_infiere_convencion_por_columna(columna, esperado):
+    valores, ambiguos = _numero(pd.Series(columna))
+    assert list(valores) == pytest.approx(esperado)
+    assert not ambiguos.any()
+
+
+@pytest.mark.parametrize("columna, ambiguo", [
+    (["1,000", "85", "1200"], [True, False, False]),
+    (["1,000", "1.234,50", "2,500.75"], [True, True, True]),
+    (["1.234", "12,5", "99.9"], [True, True, True]),
+])
+def test_numero_rechaza_columnas_sin_convencion(columna, ambiguo):
+    valores, ambiguos = _numero(pd.Series(columna))
+    assert list(ambiguos) == ambiguo
+    assert valores[ambiguos].isna().all()
+    assert not valores[~ambiguos].isna().any()
+
+
+@pytest.mark.parametrize("texto", ["", "abc", "S/.", None])
+def test_numero_invalido_no_es_ambiguo(texto):
+    valores, ambiguos = _numero(pd.Series([texto], dtype=object))
+    assert math.isnan(valores.iloc[0])
+    assert not ambiguos.iloc[0]
+
+
+def test_precios_reporta_fila_ambigua():
+    df = pd.DataFrame({"Insumo": ["Cemento", "Arena", "Fierro"], "Precio": ["S/. 1,234.50", "1,23,45", "abc"]})
+    precios, errores = validar_precios_df(df)
+    assert precios == {"Cemento": 1234.5}
+    assert errores == [
+        {"fila": 3, "error": MENSAJE_MONTO_AMBIGUO},
+        {"fila": 4, "error": "El precio debe ser un número válido"},
+    ]